@@ -1,9 +1,10 @@
 from ._version import __version__
 
-from .config import load_config
+from ._lazy import lazy_import
 
-from . import utils
-from . import features
-from . import data
-from . import nn
-from . import trainer
+# The submodules are imported on first access, such that `import graphium` stays fast
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    submodules=["config", "utils", "features", "data", "nn", "trainer"],
+    attributes={"load_config": "config"},
+)
@@ -0,0 +1,58 @@
+r"""
+Lazy loading of the submodules and public attributes of the packages, following PEP 562, such that
+importing a package does not import the heavy dependencies of the modules that are not used.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import sys
+import importlib
+import importlib.util
+
+
+def lazy_import(
+    package_name: str,
+    submodules: Sequence[str] = (),
+    attributes: Optional[Dict[str, str]] = None,
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]], List[str]]:
+    r"""
+    Make the module-level `__getattr__`, `__dir__` and `__all__` of a package, which import the
+    submodules and attributes on first access.
+
+    Example:
+        ```python
+        __getattr__, __dir__, __all__ = lazy_import(
+            __name__, submodules=["utils"], attributes={"load_config": "config"}
+        )
+        ```
+
+    Parameters:
+        package_name: The name of the package, i.e. `__name__` in its `__init__.py`
+        submodules: The submodules listed in `__all__`. All the submodules are accessible as attributes.
+        attributes: The public attributes of the package, mapped to the submodule defining them,
+            relative to the package
+
+    Returns:
+        __getattr__: The module-level `__getattr__` of the package
+        __dir__: The module-level `__dir__` of the package
+        __all__: The public names of the package
+    """
+    submodules = list(submodules)
+    attributes = {} if attributes is None else dict(attributes)
+
+    def __getattr__(name: str) -> Any:
+        if name in attributes:
+            module = importlib.import_module(f"{package_name}.{attributes[name]}")
+            value = getattr(module, name)
+        elif (name in submodules) or (importlib.util.find_spec(f"{package_name}.{name}") is not None):
+            value = importlib.import_module(f"{package_name}.{name}")
+        else:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        # Cache the value, such that `__getattr__` is only called once per name
+        setattr(sys.modules[package_name], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package_name])) | set(submodules) | set(attributes))
+
+    return __getattr__, __dir__, list(attributes) + submodules
@@ -0,0 +1,11 @@
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "run_dataloader_benchmark": "dataloader",
+        "run_flag_benchmark": "flag",
+        "run_segment_reduce_benchmark": "segment_reduce",
+        "run_quantization_benchmark": "quantization",
+    },
+)
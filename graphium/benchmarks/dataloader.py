@@ -0,0 +1,403 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import os
+import json
+import time
+import platform
+import threading
+import itertools
+import tempfile
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+import psutil
+import torch
+from loguru import logger
+from torch.utils.data import DataLoader, Dataset
+from pytorch_lightning.trainer.states import RunningStage
+
+import graphium
+from graphium.data.datamodule import MultitaskFromSmilesDataModule
+
+_DATA_DIR = os.path.dirname(os.path.abspath(graphium.data.__file__))
+
+# Bundled datasets that can be benchmarked offline. The values are the `task_specific_args`
+# of the `MultitaskFromSmilesDataModule`, without the `df_path` being read yet.
+BUNDLED_DATASETS = {
+    "micro_ZINC": {
+        "zinc": {
+            "df_path": os.path.join(_DATA_DIR, "micro_ZINC", "micro_ZINC.csv"),
+            "smiles_col": "SMILES",
+            "label_cols": ["SA", "logp", "score"],
+        },
+    },
+    "tiny_ZINC": {
+        "SA": {
+            "df_path": os.path.join(_DATA_DIR, "multitask", "tiny_ZINC_SA.csv"),
+            "smiles_col": "SMILES",
+            "label_cols": ["SA"],
+        },
+        "logp": {
+            "df_path": os.path.join(_DATA_DIR, "multitask", "tiny_ZINC_logp.csv"),
+            "smiles_col": "SMILES",
+            "label_cols": ["logp"],
+        },
+        "score": {
+            "df_path": os.path.join(_DATA_DIR, "multitask", "tiny_ZINC_score.csv"),
+            "smiles_col": "SMILES",
+            "label_cols": ["score"],
+        },
+    },
+    "micro_qm9": {
+        "qm9": {
+            "df_path": os.path.join(_DATA_DIR, "QM9", "micro_qm9.csv"),
+            "smiles_col": "smiles",
+            "label_cols": ["mu", "alpha", "homo", "lumo", "gap", "r2", "zpve", "cv"],
+        },
+    },
+}
+
+DEFAULT_FEATURIZATION = {
+    "atom_property_list_onehot": ["atomic-number", "valence"],
+    "atom_property_list_float": ["mass", "electronegativity", "in-ring"],
+    "edge_property_list": ["bond-type-onehot", "stereo", "in-ring"],
+    "add_self_loop": False,
+    "explicit_H": False,
+    "use_bonds_weights": False,
+}
+
+
+class _TimedDataset(Dataset):
+    def __init__(self, dataset: Dataset):
+        r"""
+        Wrap a dataset to measure the time spent in `__getitem__`.
+        Each element is returned as a tuple `(datum, elapsed_seconds)`.
+        """
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        start = time.perf_counter()
+        datum = self.dataset[idx]
+        return datum, time.perf_counter() - start
+
+
+class _TimedCollate:
+    def __init__(self, collate_fn: Callable):
+        r"""
+        Wrap a collate function to measure the time spent collating, and forward
+        the time spent in `__getitem__` by the `_TimedDataset`.
+        The batch is returned as a tuple `(batch, timings)`.
+        """
+        self.collate_fn = collate_fn
+
+    def __call__(self, elements):
+        getitem_time = sum(elapsed for _, elapsed in elements)
+        start = time.perf_counter()
+        batch = self.collate_fn([datum for datum, _ in elements])
+        timings = {"getitem_s": getitem_time, "collate_s": time.perf_counter() - start}
+        return batch, timings
+
+
+class PeakRssSampler:
+    def __init__(self, interval_s: float = 0.01):
+        r"""
+        Context manager sampling, in a background thread, the resident set size of the current
+        process and of the children started within the context (e.g. the dataloader workers). Unlike the process-lifetime
+        high-water mark of `getrusage`, the peaks are measured only while the context is active,
+        such that consecutive measurements in the same process are independent.
+
+        Parameters:
+            interval_s: Time between two samples, in seconds
+        """
+        self.interval_s = interval_s
+        self._process = psutil.Process()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.start_rss_main = 0
+        self.peak_rss_main = 0
+        self.peak_rss_workers = 0
+        self._previous_children = set()
+
+    def _sample(self) -> None:
+        rss_main = self._process.memory_info().rss
+        rss_workers = 0
+        for child in self._process.children(recursive=True):
+            if child.pid in self._previous_children:
+                continue
+            try:
+                rss_workers += child.memory_info().rss
+            except psutil.Error:
+                pass  # The worker terminated in the meantime
+        self.peak_rss_main = max(self.peak_rss_main, rss_main)
+        self.peak_rss_workers = max(self.peak_rss_workers, rss_workers)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval_s):
+            self._sample()
+
+    def __enter__(self) -> "PeakRssSampler":
+        self.start_rss_main = self.peak_rss_main = self._process.memory_info().rss
+        self.peak_rss_workers = 0
+        self._previous_children = {child.pid for child in self._process.children(recursive=True)}
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop_event.set()
+        self._thread.join()
+        self._sample()
+
+    def results(self) -> Dict[str, float]:
+        r"""
+        Get the peak RSS of the main process during the context, its increase from the start
+        of the context, and the peak of the summed RSS of the new children, in MB.
+        """
+        return {
+            "peak_rss_main_mb": self.peak_rss_main / 1024**2,
+            "rss_main_increase_mb": (self.peak_rss_main - self.start_rss_main) / 1024**2,
+            "peak_rss_workers_mb": self.peak_rss_workers / 1024**2,
+        }
+
+
+def make_benchmark_datamodule(
+    dataset_name: str,
+    load_from_file: bool,
+    processed_graph_data_path: Optional[str] = None,
+    featurization: Optional[Dict[str, Any]] = None,
+    featurization_n_jobs: int = 0,
+    **datamodule_kwargs,
+) -> MultitaskFromSmilesDataModule:
+    r"""
+    Create the datamodule of one of the bundled datasets, and prepare the data.
+
+    Parameters:
+        dataset_name: Name of the bundled dataset, one of `BUNDLED_DATASETS`
+        load_from_file: Whether to load the samples from files during data loading
+        processed_graph_data_path: Where to save the processed graphs when `load_from_file=True`
+        featurization: Arguments of the featurizer. Defaults to `DEFAULT_FEATURIZATION`
+        featurization_n_jobs: Number of jobs for the featurization
+        datamodule_kwargs: Other arguments to `MultitaskFromSmilesDataModule`
+
+    Returns:
+        datamodule: The prepared and setup datamodule
+    """
+    if dataset_name not in BUNDLED_DATASETS:
+        raise ValueError(f"Unknown dataset `{dataset_name}`, available: {list(BUNDLED_DATASETS.keys())}")
+    if load_from_file and (processed_graph_data_path is None):
+        raise ValueError("`processed_graph_data_path` must be provided when `load_from_file=True`")
+
+    task_specific_args = {}
+    for task, task_args in deepcopy(BUNDLED_DATASETS[dataset_name]).items():
+        task_args.setdefault("task_level", "graph")
+        task_args.setdefault("split_val", 0.2)
+        task_args.setdefault("split_test", 0.2)
+        task_args.setdefault("seed", 42)
+        task_specific_args[task] = task_args
+
+    datamodule = MultitaskFromSmilesDataModule(
+        task_specific_args=task_specific_args,
+        processed_graph_data_path=processed_graph_data_path if load_from_file else None,
+        featurization=featurization if featurization is not None else DEFAULT_FEATURIZATION,
+        featurization_n_jobs=featurization_n_jobs,
+        **datamodule_kwargs,
+    )
+    datamodule.prepare_data()
+    datamodule.setup(stage="fit")
+    return datamodule
+
+
+def benchmark_dataloader(
+    dataset: Dataset,
+    collate_fn: Callable,
+    batch_size: int,
+    num_workers: int,
+    persistent_workers: bool,
+    n_epochs: int = 2,
+    shuffle: bool = True,
+) -> Dict[str, Any]:
+    r"""
+    Iterate a dataloader for a few epochs, and measure its throughput and where the time is spent.
+
+    Parameters:
+        dataset: The dataset to load from
+        collate_fn: The collate function of the dataloader
+        batch_size: The batch size
+        num_workers: The number of dataloader workers
+        persistent_workers: Whether to keep the workers alive between epochs
+        n_epochs: Number of epochs to iterate. The first epoch includes the start-up of the workers.
+        shuffle: Whether to shuffle the dataset
+
+    Returns:
+        results: Dictionary of the measurements, with one entry per epoch under the key `"epochs"`,
+            and the average of all epochs except the first one (unless there is a single epoch)
+            for the keys `"graphs_per_s"`, `"nodes_per_s"`, `"getitem_s"`, `"collate_s"`,
+            `"main_wait_s"`, `"worker_idle_fraction"` and `"epoch_s"`. The memory measured
+            during the iteration is given by the keys of `PeakRssSampler.results`.
+    """
+    loader = DataLoader(
+        _TimedDataset(dataset),
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        persistent_workers=persistent_workers and (num_workers > 0),
+        collate_fn=_TimedCollate(collate_fn),
+    )
+
+    epochs = []
+    with PeakRssSampler() as rss_sampler:
+        for _ in range(n_epochs):
+            num_graphs, num_nodes, num_batches = 0, 0, 0
+            getitem_time, collate_time, wait_time = 0.0, 0.0, 0.0
+            epoch_start = time.perf_counter()
+            wait_start = epoch_start
+            for batch, timings in loader:
+                wait_time += time.perf_counter() - wait_start
+                num_batches += 1
+                num_graphs += batch["features"].num_graphs
+                num_nodes += batch["features"].num_nodes
+                getitem_time += timings["getitem_s"]
+                collate_time += timings["collate_s"]
+                wait_start = time.perf_counter()
+            epoch_time = time.perf_counter() - epoch_start
+
+            # With workers, the time not spent loading or collating is idle time of the workers
+            worker_idle_fraction = 0.0
+            if num_workers > 0:
+                worker_time = num_workers * epoch_time
+                worker_idle_fraction = max(0.0, 1.0 - (getitem_time + collate_time) / worker_time)
+
+            epochs.append(
+                {
+                    "epoch_s": epoch_time,
+                    "num_batches": num_batches,
+                    "num_graphs": num_graphs,
+                    "num_nodes": num_nodes,
+                    "graphs_per_s": num_graphs / epoch_time,
+                    "nodes_per_s": num_nodes / epoch_time,
+                    "getitem_s": getitem_time,
+                    "collate_s": collate_time,
+                    "main_wait_s": wait_time,
+                    "worker_idle_fraction": worker_idle_fraction,
+                }
+            )
+    del loader
+
+    steady_epochs = epochs[1:] if len(epochs) > 1 else epochs
+    results = {
+        key: float(np.mean([epoch[key] for epoch in steady_epochs]))
+        for key in [
+            "graphs_per_s",
+            "nodes_per_s",
+            "getitem_s",
+            "collate_s",
+            "main_wait_s",
+            "worker_idle_fraction",
+            "epoch_s",
+        ]
+    }
+    results["epochs"] = epochs
+    results.update(rss_sampler.results())
+    return results
+
+
+def run_dataloader_benchmark(
+    dataset_names: Iterable[str] = ("micro_ZINC",),
+    num_workers: Iterable[int] = (0, 2),
+    batch_sizes: Iterable[int] = (16, 128),
+    load_from_file: Iterable[bool] = (False, True),
+    persistent_workers: Iterable[bool] = (False, True),
+    n_epochs: int = 2,
+    featurization: Optional[Dict[str, Any]] = None,
+    output_path: Optional[Union[str, os.PathLike]] = None,
+) -> Dict[str, Any]:
+    r"""
+    Benchmark the training dataloader for every combination of the given options.
+    The combinations with `persistent_workers=True` and `num_workers=0` are skipped
+    since persistent workers require at least one worker.
+
+    Parameters:
+        dataset_names: Names of the bundled datasets, see `BUNDLED_DATASETS`
+        num_workers: Number of dataloader workers to benchmark
+        batch_sizes: Batch sizes to benchmark
+        load_from_file: Whether to load the samples from memory (`False`) or files (`True`)
+        persistent_workers: Whether to keep the workers alive between epochs
+        n_epochs: Number of epochs to iterate for each combination
+        featurization: Arguments of the featurizer. Defaults to `DEFAULT_FEATURIZATION`
+        output_path: Path of a JSON file where to write the results
+
+    Returns:
+        report: Dictionary with the keys `"metadata"` for the versions of the packages
+            and the machine, and `"results"` with one entry per combination.
+    """
+    report = {
+        "metadata": {
+            "graphium_version": graphium.__version__,
+            "torch_version": torch.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "n_epochs": n_epochs,
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for dataset_name, from_file in itertools.product(dataset_names, load_from_file):
+            datamodule = make_benchmark_datamodule(
+                dataset_name=dataset_name,
+                load_from_file=from_file,
+                processed_graph_data_path=os.path.join(tmp_dir, dataset_name),
+                featurization=featurization,
+            )
+            collate_fn = datamodule.get_dataloader_kwargs(stage=RunningStage.TRAINING, shuffle=True)[
+                "collate_fn"
+            ]
+
+            for workers, batch_size, persistent in itertools.product(
+                num_workers, batch_sizes, persistent_workers
+            ):
+                if persistent and (workers == 0):
+                    continue
+                config = {
+                    "dataset": dataset_name,
+                    "num_workers": workers,
+                    "batch_size": batch_size,
+                    "load_from_file": from_file,
+                    "persistent_workers": persistent,
+                }
+                logger.info(f"Benchmarking dataloader with {config}")
+                results = benchmark_dataloader(
+                    dataset=datamodule.train_ds,
+                    collate_fn=collate_fn,
+                    batch_size=batch_size,
+                    num_workers=workers,
+                    persistent_workers=persistent,
+                    n_epochs=n_epochs,
+                )
+                logger.info(
+                    f"{results['graphs_per_s']:.1f} graphs/s, {results['nodes_per_s']:.1f} nodes/s, "
+                    f"getitem={results['getitem_s']:.3f}s, collate={results['collate_s']:.3f}s"
+                )
+                report["results"].append({**config, **results})
+
+    if output_path is not None:
+        with open(output_path, "w") as file:
+            json.dump(report, file, indent=2)
+        logger.info(f"Dataloader benchmark written to `{output_path}`")
+
+    return report
+
+
+def benchmark_report_to_dataframe(report: Dict[str, Any]) -> pd.DataFrame:
+    r"""
+    Convert the report of `run_dataloader_benchmark` to a dataframe with one row per combination,
+    without the per-epoch details. Useful to compare the reports of two releases.
+    """
+    rows = [{key: val for key, val in result.items() if key != "epochs"} for result in report["results"]]
+    return pd.DataFrame(rows)
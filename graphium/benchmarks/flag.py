@@ -0,0 +1,183 @@
+from typing import Any, Dict, Iterable, Optional, Union
+
+import os
+import json
+import time
+import platform
+from copy import copy
+
+import numpy as np
+import pandas as pd
+import torch
+from loguru import logger
+from mup import set_base_shapes
+from pytorch_lightning.trainer.states import RunningStage
+
+import graphium
+from graphium.benchmarks.dataloader import make_benchmark_datamodule
+from graphium.nn.architectures import FullGraphMultiTaskNetwork
+from graphium.trainer.predictor import PredictorModule
+
+
+def make_benchmark_predictor(
+    datamodule,
+    n_flag_steps: int,
+    flag_alpha: float = 0.01,
+    hidden_dim: int = 64,
+    depth: int = 4,
+    layer_type: str = "pyg:gine",
+) -> PredictorModule:
+    r"""
+    Create a small `PredictorModule` matching the tasks of a prepared benchmark datamodule.
+
+    Parameters:
+        datamodule: A datamodule from `make_benchmark_datamodule`
+        n_flag_steps: Number of FLAG ascent steps. `0` trains without FLAG.
+        flag_alpha: Step size of FLAG
+        hidden_dim: Hidden dimension of the GNN and the heads
+        depth: Number of GNN layers
+        layer_type: Type of GNN layer
+
+    Returns:
+        predictor: The predictor module
+    """
+    in_dims = datamodule.in_dims
+    out_dims = {task: len(args["label_cols"]) for task, args in datamodule.task_specific_args.items()}
+
+    model_kwargs = dict(
+        pre_nn_kwargs=dict(in_dim=in_dims["feat"], out_dim=hidden_dim, hidden_dims=hidden_dim, depth=1),
+        pre_nn_edges_kwargs=dict(in_dim=in_dims["edge_feat"], out_dim=16, hidden_dims=16, depth=1),
+        gnn_kwargs=dict(
+            in_dim=hidden_dim,
+            out_dim=hidden_dim,
+            hidden_dims=hidden_dim,
+            depth=depth,
+            in_dim_edges=16,
+            layer_type=layer_type,
+        ),
+        graph_output_nn_kwargs=dict(
+            graph=dict(pooling=["sum"], out_dim=hidden_dim, hidden_dims=hidden_dim, depth=1),
+        ),
+        task_heads_kwargs={
+            task: dict(task_level="graph", out_dim=out_dim, hidden_dims=hidden_dim, depth=2)
+            for task, out_dim in out_dims.items()
+        },
+    )
+
+    predictor = PredictorModule(
+        model_class=FullGraphMultiTaskNetwork,
+        model_kwargs=model_kwargs,
+        loss_fun={task: "mse" for task in out_dims.keys()},
+        metrics={task: {} for task in out_dims.keys()},
+        metrics_on_progress_bar={task: [] for task in out_dims.keys()},
+        flag_kwargs={"n_steps": n_flag_steps, "alpha": flag_alpha},
+        task_norms=datamodule.task_norms,
+    )
+
+    # The optimizer is a `MuAdam`, which requires the base shapes of the parameters, as in `load_mup`
+    model = predictor.model
+    base = model.__class__(**model.make_mup_base_kwargs(divide_factor=2))
+    predictor.model = set_base_shapes(model, base, rescale_params=False)
+    return predictor
+
+
+def benchmark_training_step(predictor: PredictorModule, batches: Iterable[Dict[str, Any]]) -> float:
+    r"""
+    Time the training step of the predictor, including the backward pass of the final loss.
+
+    Parameters:
+        predictor: The predictor module, in training mode
+        batches: The batches to iterate. A shallow copy of each batch, of its features and of its labels is used,
+            since the steps pop the labels and the forward pass overwrites the features.
+
+    Returns:
+        step_time: The mean time of a training step, in seconds
+    """
+    step_times = []
+    for batch in batches:
+        batch = {
+            **batch,
+            "features": copy(batch["features"]),
+            "labels": {key: batch["labels"][key] for key in batch["labels"].keys},
+        }
+        predictor.zero_grad()
+        start = time.perf_counter()
+        step_dict = predictor.training_step(batch)
+        step_dict["loss"].backward()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        step_times.append(time.perf_counter() - start)
+    return float(np.mean(step_times))
+
+
+def run_flag_benchmark(
+    dataset_name: str = "micro_ZINC",
+    n_flag_steps: Iterable[int] = (1, 2, 3, 4, 5),
+    batch_size: int = 64,
+    n_batches: int = 10,
+    n_warmup: int = 2,
+    output_path: Optional[Union[str, os.PathLike]] = None,
+) -> Dict[str, Any]:
+    r"""
+    Benchmark the training step time with FLAG adversarial augmentation, relative to a plain training step.
+
+    Parameters:
+        dataset_name: Name of the bundled dataset, see `graphium.benchmarks.dataloader.BUNDLED_DATASETS`
+        n_flag_steps: Number of FLAG ascent steps to benchmark
+        batch_size: The batch size
+        n_batches: Number of timed batches
+        n_warmup: Number of batches used to warm-up before timing
+        output_path: Path of a JSON file where to write the results
+
+    Returns:
+        report: Dictionary with the keys `"metadata"` and `"results"`, with one entry per number of FLAG steps,
+            including the plain training step for `n_flag_steps=0`.
+    """
+    datamodule = make_benchmark_datamodule(
+        dataset_name=dataset_name, load_from_file=False, batch_size_training=batch_size
+    )
+    dataloader = datamodule.get_dataloader(datamodule.train_ds, shuffle=False, stage=RunningStage.TRAINING)
+    batches = []
+    for batch in dataloader:
+        batches.append(batch)
+        if len(batches) >= n_warmup + n_batches:
+            break
+
+    report = {
+        "metadata": {
+            "graphium_version": graphium.__version__,
+            "torch_version": torch.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": dataset_name,
+            "batch_size": batch_size,
+            "n_batches": len(batches) - n_warmup,
+        },
+        "results": [],
+    }
+
+    base_time = None
+    for n_steps in [0] + [n for n in n_flag_steps if n > 0]:
+        torch.manual_seed(42)
+        predictor = make_benchmark_predictor(datamodule, n_flag_steps=n_steps)
+        predictor.train()
+        benchmark_training_step(predictor, batches[:n_warmup])
+        step_time = benchmark_training_step(predictor, batches[n_warmup:])
+        if n_steps == 0:
+            base_time = step_time
+        result = {"n_flag_steps": n_steps, "step_s": step_time, "relative_step_time": step_time / base_time}
+        logger.info(
+            f"FLAG n_steps={n_steps}: {1000 * step_time:.1f} ms/step, x{result['relative_step_time']:.2f}"
+        )
+        report["results"].append(result)
+
+    if output_path is not None:
+        with open(output_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    return report
+
+
+def flag_report_to_dataframe(report: Dict[str, Any]) -> pd.DataFrame:
+    r"""Convert the report of `run_flag_benchmark` to a dataframe with one row per number of FLAG steps"""
+    return pd.DataFrame(report["results"])
@@ -0,0 +1,166 @@
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import os
+import json
+import time
+import platform
+from copy import copy
+
+import numpy as np
+import pandas as pd
+import torch
+import pytorch_lightning as pl
+from torch import nn
+from loguru import logger
+from pytorch_lightning.trainer.states import RunningStage
+
+import graphium
+from graphium.benchmarks.dataloader import make_benchmark_datamodule
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.inference.quantization import QUANTIZATION_MODES, quantization_report, quantize_model
+from graphium.trainer.predictor import PredictorModule
+
+
+@torch.inference_mode()
+def benchmark_inference(
+    predictor: PredictorModule, model: nn.Module, batches: List[Dict[str, Any]], n_warmup: int = 1
+) -> float:
+    r"""
+    Measure the inference throughput of a model on CPU.
+
+    Parameters:
+        predictor: The predictor, used to convert the features to its type
+        model: The model to benchmark, such as the original model of the predictor or a quantized copy
+        batches: The batches to predict. The first `n_warmup` batches are not timed.
+        n_warmup: Number of batches used to warm-up before timing
+
+    Returns:
+        molecules_per_s: The number of molecules predicted per second
+    """
+    features = [predictor._convert_features_dtype(batch["features"]) for batch in batches]
+    num_molecules, elapsed = 0, 0.0
+    for ii, feat in enumerate(features):
+        feat = copy(feat)  # The forward overwrites the features of the batch
+        start = time.perf_counter()
+        model(feat)
+        if ii >= n_warmup:
+            elapsed += time.perf_counter() - start
+            num_molecules += feat.num_graphs
+    return num_molecules / elapsed
+
+
+def run_quantization_benchmark(
+    dataset_name: str = "micro_ZINC",
+    modes: Iterable[str] = QUANTIZATION_MODES,
+    layer_type: str = "pyg:gine",
+    hidden_dim: int = 256,
+    batch_size: int = 128,
+    n_batches: int = 5,
+    n_warmup: int = 1,
+    n_train_steps: int = 20,
+    output_path: Optional[Union[str, os.PathLike]] = None,
+) -> Dict[str, Any]:
+    r"""
+    Benchmark the CPU inference throughput of the quantized models relative to `float32`,
+    and report their accuracy per task on the validation split, see `quantization_report`.
+
+    Parameters:
+        dataset_name: Name of the bundled dataset, see `graphium.benchmarks.dataloader.BUNDLED_DATASETS`
+        modes: The quantization modes to benchmark, among `QUANTIZATION_MODES`
+        layer_type: Type of GNN layer
+        hidden_dim: Hidden dimension of the GNN and the heads
+        batch_size: The batch size
+        n_batches: Number of timed batches of the training split
+        n_warmup: Number of batches used to warm-up before timing
+        n_train_steps: Number of training steps of the model before the benchmark,
+            such that the accuracy is measured on a model fitting the labels
+        output_path: Path of a JSON file where to write the results
+
+    Returns:
+        report: Dictionary with the keys `"metadata"` and `"results"`, with one entry per mode,
+            including the `float32` reference with `mode="fp32"`.
+    """
+    datamodule = make_benchmark_datamodule(
+        dataset_name=dataset_name, load_from_file=False, batch_size_training=batch_size
+    )
+    torch.manual_seed(42)
+    predictor = make_benchmark_predictor(
+        datamodule, n_flag_steps=0, hidden_dim=hidden_dim, layer_type=layer_type
+    )
+    if n_train_steps > 0:
+        trainer = pl.Trainer(
+            max_steps=n_train_steps,
+            logger=False,
+            enable_checkpointing=False,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+            num_sanity_val_steps=0,
+        )
+        trainer.fit(predictor, datamodule=datamodule)
+    predictor = predictor.cpu().eval()
+
+    dataloader = datamodule.get_dataloader(datamodule.train_ds, shuffle=False, stage=RunningStage.TRAINING)
+    batches = []
+    for batch in dataloader:
+        batches.append(batch)
+        if len(batches) >= n_warmup + n_batches:
+            break
+    val_batches = list(
+        datamodule.get_dataloader(datamodule.val_ds, shuffle=False, stage=RunningStage.VALIDATING)
+    )
+
+    report = {
+        "metadata": {
+            "graphium_version": graphium.__version__,
+            "torch_version": torch.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "num_threads": torch.get_num_threads(),
+            "quantized_engine": torch.backends.quantized.engine,
+            "dataset": dataset_name,
+            "layer_type": layer_type,
+            "hidden_dim": hidden_dim,
+            "batch_size": batch_size,
+            "n_batches": len(batches) - n_warmup,
+            "n_train_steps": n_train_steps,
+        },
+        "results": [],
+    }
+
+    base_throughput = benchmark_inference(predictor, predictor.model, batches, n_warmup=n_warmup)
+    report["results"].append(
+        {"mode": "fp32", "molecules_per_s": base_throughput, "speedup": 1.0, "tasks": {}}
+    )
+    logger.info(f"Inference fp32: {base_throughput:.1f} molecules/s")
+    for mode in modes:
+        quantized_model = quantize_model(predictor.model, mode)
+        throughput = benchmark_inference(predictor, quantized_model, batches, n_warmup=n_warmup)
+        result = {
+            "mode": mode,
+            "molecules_per_s": throughput,
+            "speedup": throughput / base_throughput,
+            "tasks": quantization_report(predictor, quantized_model, val_batches),
+        }
+        logger.info(f"Inference {mode}: {throughput:.1f} molecules/s, x{result['speedup']:.2f}")
+        report["results"].append(result)
+
+    if output_path is not None:
+        with open(output_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    return report
+
+
+def quantization_report_to_dataframe(report: Dict[str, Any]) -> pd.DataFrame:
+    r"""
+    Convert the report of `run_quantization_benchmark` to a dataframe with one row per mode and task,
+    and one row for the `float32` reference
+    """
+    rows = []
+    for result in report["results"]:
+        row = {key: value for key, value in result.items() if key != "tasks"}
+        if len(result["tasks"]) == 0:
+            rows.append(row)
+        for task_key, metrics in result["tasks"].items():
+            rows.append({**row, "task": task_key, **metrics})
+    return pd.DataFrame(rows)
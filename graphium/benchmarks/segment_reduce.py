@@ -0,0 +1,157 @@
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+import os
+import json
+import time
+import platform
+
+import numpy as np
+import pandas as pd
+import torch
+from torch import Tensor
+from loguru import logger
+from torch_scatter import scatter
+
+import graphium
+from graphium.nn.pyg_layers.segment_reduce import segment_aggregate
+
+
+def multi_scatter_aggregate(x: Tensor, index: Tensor, aggregators: Sequence[str], dim_size: int) -> Tensor:
+    r"""
+    Reference implementation of `segment_aggregate`, with one `scatter` call per aggregator,
+    as previously done by the PNA layer and the pooling layers.
+    """
+    outs = []
+    for aggregator in aggregators:
+        if aggregator in ["sum", "mean", "min", "max"]:
+            out = scatter(x, index, 0, None, dim_size, reduce=aggregator)
+        elif aggregator == "logsum":
+            out = scatter(x, index, 0, None, dim_size, reduce="mean")
+            num_nodes = scatter(torch.ones_like(x[:, 0]), index, 0, None, dim_size, reduce="sum")
+            out = out * torch.log(num_nodes).unsqueeze(-1)
+        elif aggregator in ["var", "std"]:
+            mean = scatter(x, index, 0, None, dim_size, reduce="mean")
+            mean_squares = scatter(x * x, index, 0, None, dim_size, reduce="mean")
+            out = mean_squares - mean * mean
+            if aggregator == "std":
+                out = torch.sqrt(torch.relu(out) + 1e-5)
+        else:
+            raise ValueError(f'Unknown aggregator "{aggregator}".')
+        outs.append(out)
+    return torch.cat(outs, dim=-1)
+
+
+def _time_function(func: Callable[[Tensor], Tensor], x: Tensor, n_repeats: int, backward: bool) -> float:
+    """Mean time of `func(x)` in seconds, with the backward pass of the sum of the output if `backward`"""
+    x = x.detach().requires_grad_(backward)
+    times = []
+    for _ in range(n_repeats + 1):
+        start = time.perf_counter()
+        out = func(x)
+        if backward:
+            out.sum().backward()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    return float(np.mean(times[1:]))  # The first call is a warm-up
+
+
+def run_segment_reduce_benchmark(
+    num_graphs: int = 2000,
+    num_feats: int = 128,
+    min_nodes: int = 5,
+    max_nodes: int = 45,
+    aggregators: Sequence[str] = ("mean", "max", "min", "std"),
+    n_repeats: int = 10,
+    device: Union[str, torch.device] = "cpu",
+    seed: int = 42,
+    output_path: Optional[Union[str, os.PathLike]] = None,
+) -> Dict[str, Any]:
+    r"""
+    Benchmark the fused `segment_aggregate` against one `scatter` call per aggregator, on random
+    graphs with a sorted index, such as the `batch` vector for the pooling, and with a shuffled
+    index, such as the destination nodes of the messages of the PNA layer.
+
+    Parameters:
+        num_graphs: The number of segments
+        num_feats: The number of features
+        min_nodes: The minimum number of rows per segment
+        max_nodes: The maximum number of rows per segment
+        aggregators: The aggregators to compute
+        n_repeats: Number of timed repetitions, after one warm-up
+        device: The device of the tensors
+        seed: The random seed
+        output_path: Path of a JSON file where to write the results
+
+    Returns:
+        report: Dictionary with the keys `"metadata"` and `"results"`, with one entry per
+            implementation and type of index, with the forward and forward-backward times
+    """
+    generator = torch.Generator().manual_seed(seed)
+    num_nodes = torch.randint(min_nodes, max_nodes + 1, (num_graphs,), generator=generator)
+    sorted_index = torch.repeat_interleave(torch.arange(num_graphs), num_nodes)
+    shuffled_index = sorted_index[torch.randperm(sorted_index.shape[0], generator=generator)]
+    x = torch.randn(sorted_index.shape[0], num_feats, generator=generator).to(device)
+    aggregators = list(aggregators)
+
+    report = {
+        "metadata": {
+            "graphium_version": graphium.__version__,
+            "torch_version": torch.__version__,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "device": str(device),
+            "num_graphs": num_graphs,
+            "num_rows": int(sorted_index.shape[0]),
+            "num_feats": num_feats,
+            "aggregators": aggregators,
+        },
+        "results": [],
+    }
+
+    for index_type, index in [("sorted", sorted_index), ("shuffled", shuffled_index)]:
+        index = index.to(device)
+        functions = {
+            "multi_scatter": lambda x: multi_scatter_aggregate(x, index, aggregators, dim_size=num_graphs),
+            "fused": lambda x: segment_aggregate(
+                x, index, aggregators, dim_size=num_graphs, is_sorted=index_type == "sorted"
+            )[0],
+        }
+        with torch.no_grad():
+            expected = functions["multi_scatter"](x)
+            max_abs_diff = float((functions["fused"](x) - expected).abs().max())
+
+        for name, func in functions.items():
+            with torch.no_grad():
+                forward_s = _time_function(func, x, n_repeats=n_repeats, backward=False)
+            forward_backward_s = _time_function(func, x, n_repeats=n_repeats, backward=True)
+            result = {
+                "implementation": name,
+                "index": index_type,
+                "forward_ms": 1000 * forward_s,
+                "forward_backward_ms": 1000 * forward_backward_s,
+                "max_abs_diff": max_abs_diff,
+            }
+            logger.info(
+                f"{name} - {index_type} index: {result['forward_ms']:.1f} ms forward, "
+                f"{result['forward_backward_ms']:.1f} ms forward-backward"
+            )
+            report["results"].append(result)
+
+    if output_path is not None:
+        with open(output_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    return report
+
+
+def segment_reduce_report_to_dataframe(report: Dict[str, Any]) -> pd.DataFrame:
+    r"""
+    Convert the report of `run_segment_reduce_benchmark` to a dataframe with one row per implementation
+    and type of index, and the speedup of the fused implementation relative to the multi-scatter one.
+    """
+    df = pd.DataFrame(report["results"])
+    reference = df[df["implementation"] == "multi_scatter"].set_index("index")
+    for key in ["forward_ms", "forward_backward_ms"]:
+        df[f"{key[:-3]}_speedup"] = df["index"].map(reference[key]) / df[key]
+    return df
@@ -1,2 +1,6 @@
 from .main import main_cli
 from .data import data_cli
+from .benchmark import benchmark_cli
+from .predict import predict
+from .serve import serve
+from .export import export
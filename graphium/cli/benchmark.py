@@ -0,0 +1,175 @@
+import click
+
+from loguru import logger
+
+from .main import main_cli
+
+
+@main_cli.group(name="benchmark", help="Graphium performance benchmarks.")
+def benchmark_cli():
+    pass
+
+
+@benchmark_cli.command(name="dataloader", help="Benchmark the dataloader throughput on the bundled datasets.")
+@click.option(
+    "-d",
+    "--dataset",
+    "dataset_names",
+    type=click.Choice(["micro_ZINC", "tiny_ZINC", "micro_qm9"]),
+    multiple=True,
+    default=["micro_ZINC"],
+    help="Bundled dataset to benchmark. Can be repeated.",
+)
+@click.option(
+    "-w", "--num-workers", type=int, multiple=True, default=[0, 2], help="Number of workers. Can be repeated."
+)
+@click.option(
+    "-b", "--batch-size", type=int, multiple=True, default=[16, 128], help="Batch size. Can be repeated."
+)
+@click.option(
+    "--load-from-file",
+    type=click.Choice(["no", "yes", "both"]),
+    default="both",
+    help="Whether to load the samples from memory, from files, or benchmark both.",
+)
+@click.option(
+    "--persistent-workers",
+    type=click.Choice(["no", "yes", "both"]),
+    default="both",
+    help="Whether to use persistent workers, or benchmark both.",
+)
+@click.option("-e", "--n-epochs", type=int, default=2, help="Number of epochs per combination.")
+@click.option(
+    "-o", "--output", type=str, default=None, help="Path of the JSON file where to write the results."
+)
+def dataloader(dataset_names, num_workers, batch_size, load_from_file, persistent_workers, n_epochs, output):
+    from graphium.benchmarks.dataloader import run_dataloader_benchmark, benchmark_report_to_dataframe
+
+    choices = {"no": [False], "yes": [True], "both": [False, True]}
+    report = run_dataloader_benchmark(
+        dataset_names=dataset_names,
+        num_workers=num_workers,
+        batch_sizes=batch_size,
+        load_from_file=choices[load_from_file],
+        persistent_workers=choices[persistent_workers],
+        n_epochs=n_epochs,
+        output_path=output,
+    )
+    logger.info("\n" + benchmark_report_to_dataframe(report).to_string())
+
+
+@benchmark_cli.command(name="flag", help="Benchmark the FLAG training step time relative to a plain step.")
+@click.option(
+    "-d",
+    "--dataset",
+    "dataset_name",
+    type=click.Choice(["micro_ZINC", "tiny_ZINC", "micro_qm9"]),
+    default="micro_ZINC",
+    help="Bundled dataset to benchmark.",
+)
+@click.option(
+    "-n",
+    "--n-steps",
+    type=int,
+    multiple=True,
+    default=[1, 2, 3, 4, 5],
+    help="Number of FLAG ascent steps. Can be repeated.",
+)
+@click.option("-b", "--batch-size", type=int, default=64, help="Batch size.")
+@click.option("--n-batches", type=int, default=10, help="Number of timed batches.")
+@click.option(
+    "-o", "--output", type=str, default=None, help="Path of the JSON file where to write the results."
+)
+def flag(dataset_name, n_steps, batch_size, n_batches, output):
+    from graphium.benchmarks.flag import run_flag_benchmark, flag_report_to_dataframe
+
+    report = run_flag_benchmark(
+        dataset_name=dataset_name,
+        n_flag_steps=n_steps,
+        batch_size=batch_size,
+        n_batches=n_batches,
+        output_path=output,
+    )
+    logger.info("\n" + flag_report_to_dataframe(report).to_string())
+
+
+@benchmark_cli.command(
+    name="segment-reduce",
+    help="Benchmark the fused segment reduction of the PNA and pooling layers against one scatter per aggregator.",
+)
+@click.option("-g", "--num-graphs", type=int, default=2000, help="Number of graphs.")
+@click.option("-f", "--num-feats", type=int, default=128, help="Number of features.")
+@click.option(
+    "-a",
+    "--aggregator",
+    "aggregators",
+    type=click.Choice(["sum", "mean", "logsum", "min", "max", "var", "std"]),
+    multiple=True,
+    default=["mean", "max", "min", "std"],
+    help="Aggregator to compute. Can be repeated.",
+)
+@click.option("-n", "--n-repeats", type=int, default=10, help="Number of timed repetitions.")
+@click.option("--device", type=str, default="cpu", help="Device of the tensors.")
+@click.option(
+    "-o", "--output", type=str, default=None, help="Path of the JSON file where to write the results."
+)
+def segment_reduce(num_graphs, num_feats, aggregators, n_repeats, device, output):
+    from graphium.benchmarks.segment_reduce import (
+        run_segment_reduce_benchmark,
+        segment_reduce_report_to_dataframe,
+    )
+
+    report = run_segment_reduce_benchmark(
+        num_graphs=num_graphs,
+        num_feats=num_feats,
+        aggregators=aggregators,
+        n_repeats=n_repeats,
+        device=device,
+        output_path=output,
+    )
+    logger.info("\n" + segment_reduce_report_to_dataframe(report).to_string())
+
+
+@benchmark_cli.command(
+    name="quantization",
+    help="Benchmark the CPU inference throughput of the quantized models, and their accuracy per task.",
+)
+@click.option(
+    "-d",
+    "--dataset",
+    "dataset_name",
+    type=click.Choice(["micro_ZINC", "tiny_ZINC", "micro_qm9"]),
+    default="micro_ZINC",
+    help="Bundled dataset to benchmark.",
+)
+@click.option(
+    "-m",
+    "--mode",
+    "modes",
+    type=click.Choice(["int8", "bf16", "int8-bf16"]),
+    multiple=True,
+    default=["int8", "bf16", "int8-bf16"],
+    help="Quantization mode. Can be repeated.",
+)
+@click.option("-l", "--layer-type", type=str, default="pyg:gine", help="Type of GNN layer.")
+@click.option("--hidden-dim", type=int, default=256, help="Hidden dimension of the GNN and the heads.")
+@click.option("-b", "--batch-size", type=int, default=128, help="Batch size.")
+@click.option("--n-batches", type=int, default=5, help="Number of timed batches.")
+@click.option("--n-train-steps", type=int, default=20, help="Number of training steps before the benchmark.")
+@click.option(
+    "-o", "--output", type=str, default=None, help="Path of the JSON file where to write the results."
+)
+def quantization(dataset_name, modes, layer_type, hidden_dim, batch_size, n_batches, n_train_steps, output):
+    from graphium.benchmarks.quantization import run_quantization_benchmark, quantization_report_to_dataframe
+
+    report = run_quantization_benchmark(
+        dataset_name=dataset_name,
+        modes=modes,
+        layer_type=layer_type,
+        hidden_dim=hidden_dim,
+        batch_size=batch_size,
+        n_batches=n_batches,
+        n_train_steps=n_train_steps,
+        output_path=output,
+    )
+    logger.info("\n" + quantization_report_to_dataframe(report).to_string())
@@ -0,0 +1,45 @@
+import click
+import yaml
+
+from loguru import logger
+
+from .main import main_cli
+
+
+@main_cli.command(
+    name="export",
+    help="Export a checkpoint for inference, with the unused task heads pruned and the layers fused.",
+)
+@click.option("-c", "--checkpoint", type=str, required=True, help="Path of the model checkpoint.")
+@click.option("-o", "--output", type=str, required=True, help="Path of the exported model.")
+@click.option(
+    "-t",
+    "--task",
+    "tasks",
+    type=str,
+    multiple=True,
+    default=None,
+    help="Task head to keep. Can be repeated. Defaults to all the tasks.",
+)
+@click.option("--trace", is_flag=True, default=False, help="Save a TorchScript trace of the model.")
+@click.option(
+    "--featurization",
+    type=str,
+    default=None,
+    help="YAML config with `datamodule.args.featurization`, for checkpoints saved without the featurization.",
+)
+def export(checkpoint, output, tasks, trace, featurization):
+    from graphium.inference import export_inference_model
+
+    if featurization is not None:
+        with open(featurization, "r") as file:
+            featurization = yaml.safe_load(file)["datamodule"]["args"]["featurization"]
+
+    max_abs_diff = export_inference_model(
+        checkpoint_path=checkpoint,
+        output_path=output,
+        tasks=list(tasks) if len(tasks) > 0 else None,
+        trace=trace,
+        featurization=featurization,
+    )
+    logger.info(f"Exported the tasks {list(max_abs_diff.keys())} to {output}.")
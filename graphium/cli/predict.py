@@ -0,0 +1,110 @@
+import click
+import yaml
+
+from loguru import logger
+
+from .main import main_cli
+
+
+@main_cli.command(
+    name="predict", help="Predict the properties or fingerprints of molecules with a checkpoint."
+)
+@click.option("-c", "--checkpoint", type=str, required=True, help="Path of the model checkpoint.")
+@click.option(
+    "-i",
+    "--input",
+    "input_path",
+    type=str,
+    required=True,
+    help="CSV, TSV or parquet file with the SMILES, a text file with one SMILES per line, or '-' for stdin.",
+)
+@click.option("-o", "--output", type=str, required=True, help="Path of the output parquet file.")
+@click.option(
+    "--outputs",
+    type=click.Choice(["preds", "fingerprints", "both"]),
+    default="preds",
+    help="Whether to write the predictions, the fingerprints, or both.",
+)
+@click.option("--smiles-col", type=str, default="smiles", help="Column of the SMILES.")
+@click.option("--id-col", type=str, default=None, help="Column of the molecule identifiers to keep.")
+@click.option("--chunk-size", type=int, default=10_000, help="Number of molecules read and written at once.")
+@click.option("-b", "--batch-size", type=int, default=256, help="Number of molecules per forward pass.")
+@click.option("-j", "--n-jobs", type=int, default=0, help="Number of workers for the featurization.")
+@click.option("-d", "--device", type=str, default="cpu", help="Device of the model.")
+@click.option(
+    "--concat-last-layers",
+    type=int,
+    multiple=True,
+    default=[0],
+    help="Layers to concatenate as fingerprints, 0 being the last layer. Can be repeated.",
+)
+@click.option(
+    "--featurization",
+    type=str,
+    default=None,
+    help="YAML config with `datamodule.args.featurization`, for checkpoints saved without the featurization.",
+)
+@click.option(
+    "--cache-dir",
+    type=str,
+    default=None,
+    help="Folder of a persistent cache of the outputs, keyed by the checkpoint content and the molecule.",
+)
+@click.option("--cache-size-mb", type=float, default=1024.0, help="Maximum size of the cache of each output.")
+@click.option(
+    "--cache-dtype",
+    type=click.Choice(["float16", "float32"]),
+    default="float16",
+    help="Storage type of the cache.",
+)
+@click.option(
+    "--quantization",
+    type=click.Choice(["int8", "bf16", "int8-bf16"]),
+    default=None,
+    help="Quantized inference on CPU: int8 linear layers, bfloat16 message passing, or both.",
+)
+def predict(
+    checkpoint,
+    input_path,
+    output,
+    outputs,
+    smiles_col,
+    id_col,
+    chunk_size,
+    batch_size,
+    n_jobs,
+    device,
+    concat_last_layers,
+    featurization,
+    cache_dir,
+    cache_size_mb,
+    cache_dtype,
+    quantization,
+):
+    from graphium.inference import predict_to_parquet
+
+    if featurization is not None:
+        with open(featurization, "r") as file:
+            featurization = yaml.safe_load(file)["datamodule"]["args"]["featurization"]
+
+    counts = predict_to_parquet(
+        checkpoint_path=checkpoint,
+        input_path=input_path,
+        output_path=output,
+        outputs=["preds", "fingerprints"] if outputs == "both" else [outputs],
+        smiles_col=smiles_col,
+        id_col=id_col,
+        chunk_size=chunk_size,
+        featurization=featurization,
+        batch_size=batch_size,
+        n_jobs=n_jobs,
+        device=device,
+        concat_last_layers=list(concat_last_layers),
+        cache_dir=cache_dir,
+        cache_max_size_mb=cache_size_mb,
+        cache_dtype=cache_dtype,
+        quantization=quantization,
+    )
+    logger.info(
+        f"Predicted {counts['num_molecules']} molecules ({counts['num_failed']} failed) into {output}."
+    )
@@ -0,0 +1,55 @@
+import click
+
+from loguru import logger
+
+from .main import main_cli
+
+
+@main_cli.command(name="serve", help="Serve the predictions of a checkpoint on a local HTTP server.")
+@click.option("-c", "--checkpoint", type=str, required=True, help="Path of the model checkpoint.")
+@click.option("--host", type=str, default="127.0.0.1", help="Host to listen to.")
+@click.option("-p", "--port", type=int, default=8000, help="Port to listen to.")
+@click.option(
+    "--outputs",
+    type=click.Choice(["preds", "fingerprints", "both"]),
+    default="preds",
+    help="Whether to return the predictions, the fingerprints, or both.",
+)
+@click.option("-b", "--max-batch-size", type=int, default=64, help="Maximum number of molecules per batch.")
+@click.option(
+    "-l", "--max-latency-ms", type=float, default=5.0, help="Maximum time to wait for other requests."
+)
+@click.option("--feature-cache-mb", type=float, default=64.0, help="Size of the featurization cache.")
+@click.option("--prediction-cache-mb", type=float, default=64.0, help="Size of the prediction cache.")
+@click.option("-d", "--device", type=str, default="cpu", help="Device of the model.")
+def serve(
+    checkpoint,
+    host,
+    port,
+    outputs,
+    max_batch_size,
+    max_latency_ms,
+    feature_cache_mb,
+    prediction_cache_mb,
+    device,
+):
+    from graphium.inference.server import make_server
+
+    server = make_server(
+        checkpoint,
+        host=host,
+        port=port,
+        max_batch_size=max_batch_size,
+        max_latency_ms=max_latency_ms,
+        outputs=["preds", "fingerprints"] if outputs == "both" else [outputs],
+        feature_cache_mb=feature_cache_mb,
+        prediction_cache_mb=prediction_cache_mb,
+        device=device,
+    )
+    logger.info(f"Serving `{checkpoint}` on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
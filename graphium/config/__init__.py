@@ -1,7 +1,15 @@
 from ._load import load_config
 
-from ._loader import load_architecture
-from ._loader import load_datamodule
-from ._loader import load_metrics
-from ._loader import load_predictor
-from ._loader import load_trainer
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "load_architecture": "_loader",
+        "load_datamodule": "_loader",
+        "load_metrics": "_loader",
+        "load_predictor": "_loader",
+        "load_trainer": "_loader",
+    },
+)
+__all__ = ["load_config"] + __all__
@@ -1,12 +1,16 @@
-from .utils import load_micro_zinc
-from .utils import load_tiny_zinc
+from graphium._lazy import lazy_import
 
-from .collate import graphium_collate_fn
-
-from .datamodule import GraphOGBDataModule
-from .datamodule import MultitaskFromSmilesDataModule
-from .datamodule import FakeDataModule
-
-from .dataset import SingleTaskDataset
-from .dataset import MultitaskDataset
-from .dataset import FakeDataset
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "load_micro_zinc": "utils",
+        "load_tiny_zinc": "utils",
+        "graphium_collate_fn": "collate",
+        "GraphOGBDataModule": "datamodule",
+        "MultitaskFromSmilesDataModule": "datamodule",
+        "FakeDataModule": "datamodule",
+        "SingleTaskDataset": "dataset",
+        "MultitaskDataset": "dataset",
+        "FakeDataset": "dataset",
+    },
+)
@@ -0,0 +1,582 @@
+r"""
+Chunked data cache of the single-task datasets, with one file per task, split and chunk of rows, written
+and read in parallel. The records, such as the `GraphDict` features and the labels, are stored as columns
+of concatenated arrays, such that loading a chunk only reads and decompresses a few large buffers, and the
+records are rebuilt on access as views of these buffers.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import os
+import json
+import mmap
+import zlib
+import pickle
+import struct
+import importlib.util
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fsspec
+import numpy as np
+import torch
+from scipy.sparse import issparse
+from torch_geometric.data import Data
+
+from graphium.utils import fs
+
+CACHE_CODECS = ["none", "zlib", "lz4", "zstd"]
+CACHE_FIELDS = ["labels", "features", "smiles", "indices", "weights", "unique_ids"]
+
+_FORMAT_VERSION = 1
+_INDEX_FILE = "index.json"
+_HEADER_SIZE = struct.Struct("<Q")
+
+
+def available_codecs() -> List[str]:
+    """Get the compression codecs available in the environment, among `CACHE_CODECS`"""
+    codecs = ["none", "zlib"]
+    if importlib.util.find_spec("lz4") is not None:
+        codecs.append("lz4")
+    if importlib.util.find_spec("zstandard") is not None:
+        codecs.append("zstd")
+    return codecs
+
+
+def default_codec() -> str:
+    """Get the fastest available codec, `"zstd"` or `"lz4"`, or `"none"` if neither is installed"""
+    codecs = available_codecs()
+    for codec in ["zstd", "lz4"]:
+        if codec in codecs:
+            return codec
+    return "none"
+
+
+def _get_codec(codec: str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """Get the compression and decompression functions of a codec"""
+    if codec not in CACHE_CODECS:
+        raise ValueError(f"Unknown codec `{codec}`, choose from {CACHE_CODECS}")
+    if codec not in available_codecs():
+        raise ImportError(
+            f"The codec `{codec}` requires the package `{'zstandard' if codec == 'zstd' else codec}`"
+        )
+    if codec == "zstd":
+        import zstandard
+
+        # The (de)compressors are not thread-safe, so one is created per call
+        return (
+            lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    if codec == "lz4":
+        import lz4.frame
+
+        return lz4.frame.compress, lz4.frame.decompress
+    if codec == "zlib":
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    return bytes, (lambda data: data)
+
+
+class _Leaf:
+    """Values of a leaf of the records, stored as a constant, a column of arrays, or a list of objects"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.values = []
+
+    def template(self, columns: Dict[str, Any]) -> Tuple:
+        values = self.values
+        first = values[0]
+        is_tensor = isinstance(first, torch.Tensor)
+        array_type = torch.Tensor if is_tensor else np.ndarray
+        if isinstance(first, (np.ndarray, torch.Tensor)) and all(
+            isinstance(value, array_type) for value in values
+        ):
+            arrays = [value.numpy() if is_tensor else value for value in values]
+            dtype, trailing = arrays[0].dtype, arrays[0].shape[1:]
+            ndim = arrays[0].ndim
+            if (dtype != object) and all(
+                (array.dtype == dtype) and (array.ndim == ndim) and (array.shape[1:] == trailing)
+                for array in arrays
+            ):
+                if ndim == 0:
+                    arrays = [array.reshape(1) for array in arrays]
+                lengths = np.array([array.shape[0] for array in arrays], dtype=np.int64)
+                columns[f"{self.name}.offsets"] = np.concatenate([[0], np.cumsum(lengths)])
+                columns[f"{self.name}.values"] = (
+                    np.concatenate(arrays, axis=0)
+                    if len(arrays) > 0
+                    else np.zeros((0,) + trailing, dtype=dtype)
+                )
+                return ("array", self.name, is_tensor, ndim == 0)
+        elif all((value is first) or _equal(value, first) for value in values):
+            return ("const", first)
+        columns[f"{self.name}.objects"] = list(values)
+        return ("object", self.name)
+
+
+def _equal(value: Any, other: Any) -> bool:
+    try:
+        return (type(value) == type(other)) and bool(value == other)
+    except Exception:
+        return False
+
+
+class _Mismatch(Exception):
+    """The records do not have the same structure"""
+
+
+def _make_node(obj: Any, name: str, leaves: List[_Leaf]) -> Tuple:
+    """Make the structure of a record, with one `_Leaf` per array or scalar"""
+    if isinstance(obj, Data):
+        return ("pyg", type(obj), _make_node(obj.to_dict(), name, leaves))
+    if issparse(obj):
+        # Like `pickle`, the sparse matrices are rebuilt from their attributes, without the slow `__init__`
+        return ("state", type(obj), _make_node(obj.__dict__, name, leaves))
+    if isinstance(obj, dict):
+        keys = tuple(obj.keys())
+        children = tuple(_make_node(obj[key], f"{name}.{ii}", leaves) for ii, key in enumerate(keys))
+        return ("dict", type(obj), keys, children)
+    if isinstance(obj, (list, tuple)) and (type(obj) in (list, tuple)):
+        children = tuple(_make_node(value, f"{name}.{ii}", leaves) for ii, value in enumerate(obj))
+        return ("sequence", type(obj), children)
+    leaf = _Leaf(name)
+    leaves.append(leaf)
+    return ("leaf", len(leaves) - 1)
+
+
+def _collect(node: Tuple, obj: Any, leaves: List[_Leaf]) -> None:
+    """Add the values of a record to the leaves, checking that it has the same structure"""
+    kind = node[0]
+    if kind == "leaf":
+        if isinstance(obj, (dict, Data)) or issparse(obj) or (type(obj) in (list, tuple)):
+            raise _Mismatch()
+        leaves[node[1]].values.append(obj)
+    elif kind == "pyg":
+        if type(obj) is not node[1]:
+            raise _Mismatch()
+        _collect(node[2], obj.to_dict(), leaves)
+    elif kind == "state":
+        if type(obj) is not node[1]:
+            raise _Mismatch()
+        _collect(node[2], obj.__dict__, leaves)
+    elif kind == "dict":
+        if (type(obj) is not node[1]) or (tuple(obj.keys()) != node[2]):
+            raise _Mismatch()
+        for key, child in zip(node[2], node[3]):
+            _collect(child, obj[key], leaves)
+    elif kind == "sequence":
+        if (type(obj) is not node[1]) or (len(obj) != len(node[2])):
+            raise _Mismatch()
+        for value, child in zip(obj, node[2]):
+            _collect(child, value, leaves)
+
+
+def _finalize(node: Tuple, templates: List[Tuple]) -> Tuple:
+    """Replace the leaves of the structure by their templates"""
+    kind = node[0]
+    if kind == "leaf":
+        return templates[node[1]]
+    if kind in ["pyg", "state"]:
+        return (kind, node[1], _finalize(node[2], templates))
+    if kind == "dict":
+        return ("dict", node[1], node[2], tuple(_finalize(child, templates) for child in node[3]))
+    return ("sequence", node[1], tuple(_finalize(child, templates) for child in node[2]))
+
+
+class ColumnarRecords(Sequence):
+    def __init__(self, template: Tuple, columns: Dict[str, Any], length: int):
+        r"""
+        Read-only sequence of records with the same structure, such as `GraphDict`, pyg `Data`, or
+        label arrays, stored as columns. Each array of the records is a slice of a column of
+        concatenated arrays, and each record is rebuilt on access from views of the columns.
+        Use `ColumnarRecords.from_records` to build it.
+
+        Parameters:
+            template: The structure of the records
+            columns: The concatenated arrays, their offsets, and the lists of the other values
+            length: The number of records
+        """
+        self.template = template
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def from_records(cls, records: Sequence[Any]) -> Optional["ColumnarRecords"]:
+        r"""
+        Convert a list of records to columns.
+
+        Parameters:
+            records: The records, with the same nested structure of dictionaries, lists, tuples,
+                pyg `Data`, scipy sparse matrices, arrays, tensors and other values
+
+        Returns:
+            The records as columns, or `None` if they do not have the same structure
+        """
+        if len(records) == 0:
+            return None
+        leaves: List[_Leaf] = []
+        node = _make_node(records[0], "r", leaves)
+        try:
+            for record in records:
+                _collect(node, record, leaves)
+        except _Mismatch:
+            return None
+        columns = {}
+        templates = [leaf.template(columns) for leaf in leaves]
+        return cls(_finalize(node, templates), columns, len(records))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return [self[ii] for ii in range(*idx.indices(self.length))]
+        idx = int(idx)
+        if idx < 0:
+            idx += self.length
+        if not (0 <= idx < self.length):
+            raise IndexError(f"Index {idx} out of range for {self.length} records")
+        return self._build(self.template, idx)
+
+    def _build(self, node: Tuple, idx: int) -> Any:
+        kind = node[0]
+        if kind == "array":
+            _, name, is_tensor, is_scalar = node
+            offsets = self.columns[f"{name}.offsets"]
+            value = self.columns[f"{name}.values"][offsets[idx] : offsets[idx + 1]]
+            if is_scalar:
+                value = value.reshape(())
+            return torch.from_numpy(value) if is_tensor else value
+        if kind == "const":
+            return node[1]
+        if kind == "object":
+            return self.columns[f"{node[1]}.objects"][idx]
+        if kind == "pyg":
+            return node[1].from_dict(self._build(node[2], idx))
+        if kind == "state":
+            record = node[1].__new__(node[1])
+            record.__dict__.update(self._build(node[2], idx))
+            return record
+        if kind == "dict":
+            # Bypass the `__init__` of the subclasses, such as `GraphDict`, which would modify the values
+            record = node[1].__new__(node[1])
+            dict.update(record, zip(node[2], [self._build(child, idx) for child in node[3]]))
+            return record
+        return node[1](self._build(child, idx) for child in node[2])
+
+
+class ChainedSequence(Sequence):
+    def __init__(self, parts: Sequence[Sequence[Any]]):
+        """Read-only concatenation of several sequences, such as the chunks of a split"""
+        self.parts = list(parts)
+        self.offsets = np.cumsum([0] + [len(part) for part in self.parts])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return [self[ii] for ii in range(*idx.indices(len(self)))]
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not (0 <= idx < len(self)):
+            raise IndexError(f"Index {idx} out of range for {len(self)} elements")
+        part = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        return self.parts[part][idx - self.offsets[part]]
+
+
+class PatchedSequence(Sequence):
+    def __init__(self, base: Sequence[Any], positions: np.ndarray, others: List[Any]):
+        r"""
+        Read-only sequence where the values at `positions` are taken from `others`, and all the other
+        values from `base`, in order. Used for the records of mostly the same type, such as the features
+        with a few molecules that failed featurization.
+
+        Parameters:
+            base: The values at all the positions not in `positions`
+            positions: The sorted positions of the values in `others`
+            others: The other values
+        """
+        self.base = base
+        self.positions = positions
+        self.others = others
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.others)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Any:
+        if isinstance(idx, slice):
+            return [self[ii] for ii in range(*idx.indices(len(self)))]
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not (0 <= idx < len(self)):
+            raise IndexError(f"Index {idx} out of range for {len(self)} elements")
+        num_before = int(np.searchsorted(self.positions, idx))
+        if (num_before < len(self.positions)) and (self.positions[num_before] == idx):
+            return self.others[num_before]
+        return self.base[idx - num_before]
+
+
+def _encode_field(values: Any) -> Tuple[Any, Dict[str, Any]]:
+    """Encode a field of a dataset as a description and a dictionary of columns"""
+    if values is None:
+        return None, {}
+    if isinstance(values, np.ndarray):
+        return ("ndarray",), {"values": values}
+    records = ColumnarRecords.from_records(values)
+    if records is not None:
+        return ("columnar", records.template, records.length), records.columns
+
+    # Keep the records of the most common type as columns, and only pickle the other ones
+    types = [type(value) for value in values]
+    main_type = Counter(types).most_common(1)[0][0] if len(types) > 0 else None
+    positions = np.array([ii for ii, value_type in enumerate(types) if value_type is not main_type])
+    records = None
+    if len(positions) > 0:
+        records = ColumnarRecords.from_records([value for value in values if type(value) is main_type])
+    if records is None:
+        return ("pickle",), {"objects": list(values)}
+    columns = {"positions": positions.astype(np.int64), "others": [values[ii] for ii in positions]}
+    columns.update({f"base.{name}": column for name, column in records.columns.items()})
+    return ("patched", records.template, records.length), columns
+
+
+def _decode_field(description: Any, columns: Dict[str, Any]) -> Any:
+    if description is None:
+        return None
+    if description[0] == "ndarray":
+        return columns["values"]
+    if description[0] == "pickle":
+        return columns["objects"]
+    if description[0] == "patched":
+        base_columns = {
+            name[len("base.") :]: column for name, column in columns.items() if name.startswith("base.")
+        }
+        base = ColumnarRecords(description[1], base_columns, description[2])
+        return PatchedSequence(base, columns["positions"], columns["others"])
+    return ColumnarRecords(description[1], columns, description[2])
+
+
+def write_chunk(path: str, fields: Dict[str, Any], codec: str) -> int:
+    r"""
+    Write a chunk of rows of a dataset to a file, with the arrays stored as raw, optionally compressed,
+    buffers after a small pickled header.
+
+    Parameters:
+        path: The path of the file
+        fields: The values of each field, as lists of records or arrays, or `None`
+        codec: The compression codec, among `CACHE_CODECS`
+
+    Returns:
+        nbytes: The size of the file
+    """
+    compress, _ = _get_codec(codec)
+    header = {"version": _FORMAT_VERSION, "codec": codec, "fields": {}, "blobs": []}
+    blobs = []
+    position = 0
+    for field, values in fields.items():
+        description, columns = _encode_field(values)
+        header["fields"][field] = description
+        for name, column in columns.items():
+            if isinstance(column, np.ndarray):
+                column = np.ascontiguousarray(column)
+                raw = column.view(np.uint8).reshape(-1).data if column.size > 0 else b""
+                meta = {"dtype": column.dtype.str, "shape": column.shape}
+            else:
+                raw = pickle.dumps(column, protocol=pickle.HIGHEST_PROTOCOL)
+                meta = {"dtype": None, "shape": None}
+            blob = compress(raw)
+            header["blobs"].append(
+                {"field": field, "name": name, "start": position, "size": len(blob), **meta}
+            )
+            blobs.append(blob)
+            position += len(blob)
+
+    header = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    with fsspec.open(path, "wb") as file:
+        file.write(_HEADER_SIZE.pack(len(header)))
+        file.write(header)
+        for blob in blobs:
+            file.write(blob)
+    return _HEADER_SIZE.size + len(header) + position
+
+
+def _is_local(path: str) -> bool:
+    return "file" in fsspec.core.url_to_fs(path)[0].protocol
+
+
+def read_chunk(path: str, use_mmap: bool = False) -> Dict[str, Any]:
+    r"""
+    Read a chunk written by `write_chunk`. The file is read with a single call, and the uncompressed
+    arrays are views of the read buffer.
+
+    Parameters:
+        path: The path of the file
+        use_mmap: Whether to memory-map the local files written with the codec `"none"`, instead of reading
+            them. The arrays are then copy-on-write views of the file, which are only loaded in memory when
+            accessed, and shared between the processes reading the same file.
+
+    Returns:
+        fields: The values of each field
+    """
+    if use_mmap and _is_local(path):
+        with open(fsspec.core.url_to_fs(path)[1], "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        header_size = _HEADER_SIZE.unpack_from(buffer, 0)[0]
+        codec = pickle.loads(buffer[_HEADER_SIZE.size : _HEADER_SIZE.size + header_size])["codec"]
+        if codec != "none":
+            buffer = bytearray(buffer)  # The compressed files are decompressed in memory anyway
+    else:
+        with fsspec.open(path, "rb") as file:
+            buffer = bytearray(file.read())
+    view = memoryview(buffer)
+    header_size = _HEADER_SIZE.unpack_from(view, 0)[0]
+    header = pickle.loads(view[_HEADER_SIZE.size : _HEADER_SIZE.size + header_size])
+    if header["version"] != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported cache format version {header['version']}")
+    _, decompress = _get_codec(header["codec"])
+    start = _HEADER_SIZE.size + header_size
+
+    columns = {field: {} for field in header["fields"]}
+    for blob in header["blobs"]:
+        raw = decompress(view[start + blob["start"] : start + blob["start"] + blob["size"]])
+        if blob["dtype"] is None:
+            column = pickle.loads(raw)
+        else:
+            if isinstance(raw, bytes):
+                raw = bytearray(raw)  # Writable, such that the tensors can be built from the arrays
+            column = np.frombuffer(raw, dtype=np.dtype(blob["dtype"])).reshape(blob["shape"])
+        columns[blob["field"]][blob["name"]] = column
+    return {
+        field: _decode_field(description, columns[field]) for field, description in header["fields"].items()
+    }
+
+
+def _take(values: Any, indices: np.ndarray) -> Any:
+    if values is None:
+        return None
+    if isinstance(values, (np.ndarray, torch.Tensor)):
+        return values[indices]
+    return [values[ii] for ii in indices]
+
+
+def save_datasets_to_chunks(
+    path: str,
+    datasets: Dict[str, Any],
+    split_indices: Dict[str, Dict[str, Iterable[int]]],
+    codec: Optional[str] = None,
+    chunk_size: int = 100_000,
+    n_jobs: int = -1,
+) -> Dict[str, Dict[str, List[Any]]]:
+    r"""
+    Save the single-task datasets to a folder, with one file per task, split and chunk of `chunk_size` rows,
+    written in parallel threads, and an `index.json` file listing the chunks.
+
+    Parameters:
+        path: The folder of the cache, local or remote
+        datasets: The `SingleTaskDataset` of each task
+        split_indices: The indices of the rows of each split, such as `"train"`, of each task
+        codec: The compression codec, among `CACHE_CODECS`. Defaults to `default_codec()`.
+        chunk_size: Maximum number of rows per file
+        n_jobs: Number of threads. Use -1 to use all the available cores.
+
+    Returns:
+        labels: The labels of each split of each task, in the order of the rows, such that the label
+            statistics can be computed without reading the datasets again
+    """
+    codec = default_codec() if codec is None else codec
+    _get_codec(codec)  # Fail early if the codec is not available
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+
+    index = {"version": _FORMAT_VERSION, "codec": codec, "tasks": {}}
+    jobs = []
+    labels = {}
+    for task_idx, (task, dataset) in enumerate(datasets.items()):
+        index["tasks"][task] = {}
+        labels[task] = {}
+        for split, task_indices in split_indices.items():
+            indices = np.asarray(task_indices[task], dtype=np.int64).reshape(-1)
+            index["tasks"][task][split] = []
+            labels[task][split] = _take(dataset.labels, indices)
+            # An empty split still has one chunk, to keep the fields of the dataset
+            for chunk_idx, start in enumerate(range(0, max(len(indices), 1), chunk_size)):
+                chunk_indices = indices[start : start + chunk_size]
+                filename = f"{task_idx:03d}-{split}-{chunk_idx:05d}.chunk"
+                index["tasks"][task][split].append({"file": filename, "length": len(chunk_indices)})
+                jobs.append((fs.join(path, filename), dataset, chunk_indices))
+
+    def _write(job):
+        chunk_path, dataset, chunk_indices = job
+        fields = {field: _take(getattr(dataset, field), chunk_indices) for field in CACHE_FIELDS}
+        if fields["smiles"] is not None:
+            fields["smiles"] = list(fields["smiles"])
+        return write_chunk(chunk_path, fields, codec=codec)
+
+    fs.mkdir(path)
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        index["nbytes"] = int(sum(executor.map(_write, jobs)))
+
+    # The index is written last, such that an interrupted save is not considered as a valid cache
+    with fsspec.open(fs.join(path, _INDEX_FILE), "w") as file:
+        json.dump(index, file)
+    return labels
+
+
+def load_datasets_from_chunks(
+    path: str, n_jobs: int = -1, use_mmap: bool = False
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, np.ndarray]]]:
+    r"""
+    Load the chunks saved by `save_datasets_to_chunks`, reading the files in parallel threads.
+    The rows of the splits of each task are concatenated, in the order of the splits.
+
+    Parameters:
+        path: The folder of the cache, local or remote
+        n_jobs: Number of threads. Use -1 to use all the available cores.
+        use_mmap: Whether to memory-map the uncompressed chunks, see `read_chunk`
+
+    Returns:
+        fields: The fields of each task, among `CACHE_FIELDS`, to build a `SingleTaskDataset`
+        split_indices: The indices of the rows of each split of each task,
+            such as `split_indices[task]["train"]`
+    """
+    with fsspec.open(fs.join(path, _INDEX_FILE), "r") as file:
+        index = json.load(file)
+    if index["version"] != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported cache format version {index['version']}")
+    n_jobs = os.cpu_count() if n_jobs == -1 else max(n_jobs, 1)
+
+    files = [
+        chunk["file"] for splits in index["tasks"].values() for chunks in splits.values() for chunk in chunks
+    ]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        chunks = dict(
+            zip(files, executor.map(lambda file: read_chunk(fs.join(path, file), use_mmap=use_mmap), files))
+        )
+
+    fields, split_indices = {}, {}
+    for task, splits in index["tasks"].items():
+        parts = [chunks[chunk["file"]] for split_chunks in splits.values() for chunk in split_chunks]
+        fields[task] = {field: _concat_field([part[field] for part in parts]) for field in CACHE_FIELDS}
+        split_indices[task] = {}
+        start = 0
+        for split, split_chunks in splits.items():
+            length = sum(chunk["length"] for chunk in split_chunks)
+            split_indices[task][split] = np.arange(start, start + length)
+            start += length
+    return fields, split_indices
+
+
+def _concat_field(parts: List[Any]) -> Any:
+    """Concatenate the values of a field over the chunks"""
+    if (len(parts) == 0) or (parts[0] is None):
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], np.ndarray):
+        return np.concatenate(parts, axis=0)
+    if all(isinstance(part, list) for part in parts):
+        return [value for part in parts for value in part]
+    return ChainedSequence([part for part in parts if len(part) > 0])
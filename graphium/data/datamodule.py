@@ -1,4 +1,4 @@
-from typing import Type, List, Dict, Union, Any, Callable, Optional, Tuple, Iterable, Literal
+from typing import Type, List, Dict, Union, Any, Callable, Optional, Sequence, Tuple, Iterable, Literal
 
 import os
 import glob
@@ -36,22 +36,35 @@ from graphium.features import (
     mol_to_graph_dict,
     GraphDict,
     mol_to_pyggraph,
+    FeaturizationProfiler,
 )
 from graphium.data.utils import graphium_package_path
 from graphium.utils.arg_checker import check_arg_iterator
-from graphium.utils.hashing import get_md5_hash
+from graphium.utils.hashing import get_structured_hash
 from graphium.data.smiles_transform import (
     did_featurization_fail,
     BatchingSmilesTransform,
+    ProfilingBatchingSmilesTransform,
     smiles_to_unique_mol_ids,
 )
 from graphium.data.collate import graphium_collate_fn
 import graphium.data.dataset as Datasets
 from graphium.data.normalization import LabelNormalization
 from graphium.data.multilevel_utils import extract_labels
+from graphium.data.chunked_cache import save_datasets_to_chunks, load_datasets_from_chunks, PatchedSequence
+from graphium.data.distributed import get_rank_and_world_size, map_sharded
+from graphium.data.quarantine import FeaturizationQuarantine, PrefilteredTransform
+from graphium.features.conformers import (
+    ConformerGenerator,
+    ConformerStore,
+    ConformerTransform,
+    generate_conformers,
+)
 
 torch.multiprocessing.set_sharing_strategy("file_system")
 
+CACHE_DATA_FORMATS = ["torch", "chunked"]
+
 
 PCQM4M_meta = {
     "num tasks": 1,
@@ -763,6 +776,17 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         featurization_batch_size: int = 1000,
         collate_fn: Optional[Callable] = None,
         prepare_dict_or_graph: str = "pyg:graph",
+        sample_cache_size_mb: float = 0.0,
+        sample_cache_policy: str = "lru",
+        featurization_profile: bool = False,
+        cache_data_format: str = "torch",
+        cache_data_codec: Optional[str] = None,
+        cache_data_n_jobs: int = -1,
+        prepare_data_distributed: bool = False,
+        featurization_quarantine_path: Optional[Union[str, os.PathLike]] = None,
+        conformer_cache_dir: Optional[Union[str, os.PathLike]] = None,
+        conformer_generation: Optional[Dict[str, Any]] = None,
+        conformer_cache_dtype: str = "float32",
         **kwargs,
     ):
         """
@@ -839,6 +863,47 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
                   pyg `Data` will be created during data-loading, but faster with large
                   `num_workers`, and less likely to cause memory issues with the parallelization.
                 - "pyg:graph": Process molecules as `pyg.data.Data`.
+            sample_cache_size_mb: Size in MB of the in-memory cache of decoded samples, per dataloader worker.
+                Only used when loading the samples from `processed_graph_data_path`. Set to `0` to disable it.
+            sample_cache_policy: Eviction policy of the sample cache, either "lru" or "fifo".
+            featurization_profile: Whether to record the time spent in each stage of the featurization.
+                The report is logged after the featurization, and the profiler is available
+                as `self.featurization_profiler`.
+            cache_data_format: The format of the data cache in `cache_data_path`, among `CACHE_DATA_FORMATS`.
+
+                - "torch": A single file written with `torch.save`
+                - "chunked": A folder with one file per task, split and chunk of rows, written and read
+                  in parallel, with the arrays stored as compressed columns, and the label statistics
+                  computed while saving. See `graphium.data.chunked_cache`.
+            cache_data_codec: The compression codec of the "chunked" format, among `"none"`, `"zlib"`,
+                `"lz4"` and `"zstd"`. Defaults to the fastest available one.
+            cache_data_n_jobs: Number of threads to write and read the "chunked" format.
+                Use -1 to use all available cores.
+            prepare_data_distributed: Whether the data is prepared by all the ranks of a distributed run,
+                instead of only the first one. The `prepare_data` is then skipped when running with several
+                ranks, and the data is prepared in `setup`: each rank computes the molecular IDs and the
+                features of a shard of the molecules, and memory-maps the shards of the other ranks from a
+                `<data_hash>.shards` folder of `cache_data_path`, which must be on a filesystem shared by all
+                the ranks. Only the first rank saves the data cache. See `graphium.data.distributed`.
+                The `featurization_n_jobs` are used by each rank.
+            featurization_quarantine_path: Path of a JSON lines file quarantining the molecules that failed
+                featurization, such that the next `prepare_data` does not featurize them again, unless the
+                featurization parameters change. The SMILES are also pre-filtered before the featurization,
+                rejecting the unparseable ones and the ones with more than `max_num_atoms` heavy atoms without
+                sanitizing them. The failures per reason and the time saved are logged, and available
+                as `self.featurization_quarantine`. See `graphium.data.quarantine`.
+            conformer_cache_dir: Folder of the conformer stores. If provided, the conformers used by the
+                `"positions_3d"` conformer property and the `"conformer-bond-length"` edge property are embedded
+                by a dedicated stage before the featurization, in parallel with `featurization_n_jobs`, and stored
+                by molecule id in a sub-folder specific to the `conformer_generation` parameters. The stores are
+                reused across the featurization parameters, and the molecules already embedded are skipped.
+                The success rate and the throughput are logged, and available as `self.conformer_stats`.
+                Concurrent runs must not share the same folder, except the ranks of `prepare_data_distributed`.
+                See `graphium.features.conformers`.
+            conformer_generation: Keyword arguments of the `ConformerGenerator`, such as the `timeout_s` of
+                each molecule, or the `large_num_atoms` from which the molecules are embedded with several
+                threads.
+            conformer_cache_dtype: The dtype of the stored positions, `"float32"` or `"float16"`.
         """
         BaseDataModule.__init__(
             self,
@@ -863,6 +928,8 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         self.featurization_progress = featurization_progress
         self.featurization_backend = featurization_backend
         self.featurization_batch_size = featurization_batch_size
+        self.featurization_profile = featurization_profile
+        self.featurization_profiler = None
 
         self.task_train_indices = None
         self.task_val_indices = None
@@ -878,9 +945,36 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         self.test_ds = None
 
         self.cache_data_path = cache_data_path
+        if cache_data_format not in CACHE_DATA_FORMATS:
+            raise ValueError(
+                f"Unknown `cache_data_format` {cache_data_format}, choose from {CACHE_DATA_FORMATS}"
+            )
+        self.cache_data_format = cache_data_format
+        self.cache_data_codec = cache_data_codec
+        self.cache_data_n_jobs = cache_data_n_jobs
         self.processed_graph_data_path = processed_graph_data_path
+        if prepare_data_distributed and (
+            (cache_data_path is None) or (processed_graph_data_path is not None)
+        ):
+            raise ValueError(
+                "`prepare_data_distributed` requires a shared `cache_data_path`, "
+                "and is not supported with `processed_graph_data_path`"
+            )
+        self.prepare_data_distributed = prepare_data_distributed
+        self.featurization_quarantine_path = featurization_quarantine_path
+        self.featurization_quarantine = None
+        self.conformer_cache_dir = conformer_cache_dir
+        self.conformer_generator = None
+        if conformer_cache_dir is not None:
+            self.conformer_generator = ConformerGenerator(
+                **({} if conformer_generation is None else conformer_generation)
+            )
+        self.conformer_cache_dtype = conformer_cache_dtype
+        self.conformer_stats = None
 
         self.load_from_file = processed_graph_data_path is not None
+        self.sample_cache_size_mb = sample_cache_size_mb
+        self.sample_cache_policy = sample_cache_policy
 
         self.task_norms = {}
 
@@ -917,7 +1011,16 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             - Filter out the data corresponding to molecules which failed featurization.
             - Create a corresponding SingletaskDataset
             - Split the SingletaskDataset according to the task-specific splits for train, val and test
+
+        With `prepare_data_distributed` and several ranks, the data is instead prepared by all the ranks in `setup`.
         """
+        if self.prepare_data_distributed and (get_rank_and_world_size()[1] > 1):
+            logger.info("The data is prepared by all the ranks in `setup`, with `prepare_data_distributed`")
+            return
+        self._prepare_data()
+
+    def _prepare_data(self):
+        """Prepare the data, see `prepare_data`"""
         if self._data_is_prepared:
             logger.info("Data is already prepared. Skipping the preparation")
             return
@@ -1013,18 +1116,56 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             for count in range(len(dataset_args["smiles"])):
                 all_tasks.append(task)
         # Get all unique mol ids
-        all_mol_ids = smiles_to_unique_mol_ids(
-            all_smiles,
+        get_mol_ids = partial(
+            smiles_to_unique_mol_ids,
             n_jobs=self.featurization_n_jobs,
             featurization_batch_size=self.featurization_batch_size,
             backend=self.featurization_backend,
         )
+        if self.prepare_data_distributed:
+            all_mol_ids = self._map_sharded(get_mol_ids, all_smiles, name="mol_ids")
+        else:
+            all_mol_ids = get_mol_ids(all_smiles)
         unique_mol_ids, unique_idx, inv = np.unique(all_mol_ids, return_index=True, return_inverse=True)
 
         smiles_to_featurize = [all_smiles[ii] for ii in unique_idx]
 
+        # Skip the molecules in quarantine
+        quarantined = []
+        if self.featurization_quarantine_path is not None:
+            signature = self.smiles_transformer
+            if self.conformer_generator is not None:
+                signature = [signature, self._get_conformer_signature()]
+            self.featurization_quarantine = FeaturizationQuarantine(
+                self.featurization_quarantine_path, signature=get_structured_hash(signature)
+            )
+            quarantined = [
+                ii for ii, mol_id in enumerate(unique_mol_ids) if mol_id in self.featurization_quarantine
+            ]
+            quarantined_set = set(quarantined)
+            smiles_to_featurize = [
+                smiles for ii, smiles in enumerate(smiles_to_featurize) if ii not in quarantined_set
+            ]
+            mol_ids_to_featurize = [
+                mol_id for ii, mol_id in enumerate(unique_mol_ids) if ii not in quarantined_set
+            ]
+        else:
+            mol_ids_to_featurize = unique_mol_ids
+
+        # The conformer stage needs the molecule ids of the SMILES
+        if self.conformer_generator is not None:
+            smiles_to_featurize = list(zip(smiles_to_featurize, mol_ids_to_featurize))
+
         # Convert SMILES to features
-        features, _ = self._featurize_molecules(smiles_to_featurize)
+        if self.prepare_data_distributed:
+            features = self._map_sharded(
+                lambda smiles: self._featurize_molecules(smiles)[0], smiles_to_featurize, name="features"
+            )
+        else:
+            features, _ = self._featurize_molecules(smiles_to_featurize)
+
+        if self.featurization_quarantine is not None:
+            features = self._update_featurization_quarantine(features, unique_mol_ids, quarantined)
 
         # Store the features (including Nones, which will be filtered in the next step)
         for task in task_dataset_args.keys():
@@ -1103,7 +1244,8 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
 
         # When a cache path is provided but no cache is found, save to cache
         elif (self.cache_data_path is not None) and (not cache_data_exists):
-            self.save_data_to_cache()
+            if (not self.prepare_data_distributed) or (get_rank_and_world_size()[0] == 0):
+                self.save_data_to_cache()
 
         self._data_is_prepared = True
 
@@ -1118,6 +1260,9 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             stage (str): Either 'fit', 'test', or None.
         """
 
+        if self.prepare_data_distributed:
+            self._prepare_data()
+
         # Can possibly get rid of setup because a single dataset will have molecules exclusively in train, val or test
         # Produce the label sizes to update the collate function
         labels_size = {}
@@ -1218,6 +1363,8 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             data_path=self._path_to_load_from_file(stage) if load_from_file else None,
             load_from_file=load_from_file,
             files_ready=files_ready,
+            sample_cache_size_mb=self.sample_cache_size_mb,
+            sample_cache_policy=self.sample_cache_policy,
         )  # type: ignore
 
         if stage == "train":
@@ -1288,20 +1435,19 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         """
         if self.task_norms and train:
             for task in dataset.labels_size.keys():
-                # if the label type is graph_*, we need to stack them as the tensor shape is (num_labels, )
-                if task.startswith("graph"):
-                    labels = np.stack(
-                        np.array([datum["labels"][task] for datum in dataset if task in datum["labels"]]),
-                        axis=0,
-                    )
-                # for other tasks with node_ and edge_, the label shape is [num_nodes/num_edges, num_labels]
-                # we can concatenate them directly
-                else:
-                    labels = np.concatenate(
-                        [datum["labels"][task] for datum in dataset if task in datum["labels"]], axis=0
-                    )
-
-                self.task_norms[task].calculate_statistics(labels)
+                labels = [datum["labels"][task] for datum in dataset if task in datum["labels"]]
+                self._calculate_task_statistics(task, labels)
+
+    def _calculate_task_statistics(self, task: str, labels: List[np.ndarray]):
+        """Calculate the statistics of the labels of a task, and store them in `self.task_norms[task]`"""
+        # if the label type is graph_*, we need to stack them as the tensor shape is (num_labels, )
+        if task.startswith("graph"):
+            labels = np.stack(np.array(labels), axis=0)
+        # for other tasks with node_ and edge_, the label shape is [num_nodes/num_edges, num_labels]
+        # we can concatenate them directly
+        else:
+            labels = np.concatenate(labels, axis=0)
+        self.task_norms[task].calculate_statistics(labels)
 
     def get_label_statistics(
         self,
@@ -1446,6 +1592,77 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         return collate_fn
 
     # Cannot be used as is for the multitask version, because sample_idx does not apply.
+    def _map_sharded(self, fn: Callable[[List[Any]], Sequence[Any]], values: Sequence[Any], name: str):
+        """
+        Apply `fn` to the shard of `values` of the current rank, and gather the outputs of all the ranks
+        from the `<data_hash>.shards` folder of `cache_data_path`. See `graphium.data.distributed.map_sharded`.
+        """
+        rank, world_size = get_rank_and_world_size()
+        path = fs.join(self.cache_data_path, f"{self.data_hash}.shards")
+        return map_sharded(fn, values, path=path, name=name, rank=rank, world_size=world_size)
+
+    def _update_featurization_quarantine(
+        self, features: Sequence[Any], unique_mol_ids: np.ndarray, quarantined: List[int]
+    ) -> Sequence[Any]:
+        """
+        Add the molecules that failed featurization to the quarantine, and the errors of the
+        molecules skipped because they are quarantined to the features.
+
+        Parameters:
+            features: The features of the molecules not in quarantine
+            unique_mol_ids: The ids of all the molecules
+            quarantined: The indices of the quarantined molecules
+
+        Returns:
+            features: The features of all the molecules
+        """
+        quarantine = self.featurization_quarantine
+        errors = [quarantine.skip(unique_mol_ids[ii]) for ii in quarantined]
+        features = PatchedSequence(features, positions=np.asarray(quarantined, dtype=np.int64), others=errors)
+        for ii, feat in enumerate(features):
+            if did_featurization_fail(feat):
+                quarantine.add(unique_mol_ids[ii], feat)
+        # With `prepare_data_distributed`, all the ranks have the same failures, and only the first one writes them
+        if (not self.prepare_data_distributed) or (get_rank_and_world_size()[0] == 0):
+            quarantine.flush()
+        logger.info(quarantine.report())
+        return features
+
+    def _get_conformer_signature(self) -> Dict[str, str]:
+        """Get the parameters of the conformer stage changing the features"""
+        return {"generator": self.conformer_generator.get_signature(), "dtype": self.conformer_cache_dtype}
+
+    def _generate_conformers(
+        self, smiles_and_ids: List[Tuple[str, str]]
+    ) -> List[Tuple[str, Optional[np.ndarray]]]:
+        """
+        Run the conformer stage, embedding the molecules missing from the conformer store.
+
+        Parameters:
+            smiles_and_ids: The pairs of SMILES and molecule id
+
+        Returns:
+            smiles_and_positions: The pairs of SMILES and positions, or `None` for the failed molecules,
+                to featurize with `ConformerTransform`
+        """
+        smiles, mol_ids = zip(*smiles_and_ids) if len(smiles_and_ids) > 0 else ([], [])
+        rank = get_rank_and_world_size()[0] if self.prepare_data_distributed else 0
+        store = ConformerStore(
+            fs.join(self.conformer_cache_dir, self.conformer_generator.get_signature()),
+            dtype=self.conformer_cache_dtype,
+            writer=f"rank{rank:05d}",
+        )
+        self.conformer_stats = generate_conformers(
+            self.conformer_generator,
+            smiles,
+            mol_ids,
+            store,
+            n_jobs=self.featurization_n_jobs,
+            backend=self.featurization_backend,
+            progress=self.featurization_progress,
+        )
+        return [(this_smiles, store.get(mol_id)) for this_smiles, mol_id in zip(smiles, mol_ids)]
+
     def _featurize_molecules(self, smiles: Iterable[str]) -> Tuple[List, List]:
         """
         Precompute the features (graphs, fingerprints, etc.) from the SMILES.
@@ -1459,7 +1676,8 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             For now we compute in advance and hold everything in memory.
 
         Parameters:
-            smiles: A list of all the molecular SMILES to featurize
+            smiles: A list of all the molecular SMILES to featurize, or of the pairs of SMILES and molecule id
+                when the conformers are generated by the conformer stage
             sample_idx: The indexes corresponding to the sampled SMILES.
                 If not provided, computed from `numpy.arange`.
 
@@ -1468,6 +1686,10 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             idx_none: A list of the indexes that failed featurization
         """
 
+        inputs = smiles
+        if self.conformer_generator is not None:
+            inputs = self._generate_conformers(smiles)
+
         batch_size = BatchingSmilesTransform.parse_batch_size(
             numel=len(smiles),
             desired_batch_size=self.featurization_batch_size,
@@ -1475,9 +1697,17 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         )
 
         # Loop all the smiles and compute the features
+        batching_cls = (
+            ProfilingBatchingSmilesTransform if self.featurization_profile else BatchingSmilesTransform
+        )
+        transform = self.smiles_transformer
+        if self.featurization_quarantine_path is not None:
+            transform = PrefilteredTransform(transform, max_num_atoms=transform.keywords.get("max_num_atoms"))
+        if self.conformer_generator is not None:
+            transform = ConformerTransform(transform)
         features = dm.parallelized_with_batches(
-            BatchingSmilesTransform(self.smiles_transformer),
-            smiles,
+            batching_cls(transform),
+            inputs,
             batch_size=batch_size,
             progress=True,
             n_jobs=self.featurization_n_jobs,
@@ -1485,6 +1715,13 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             tqdm_kwargs={"desc": f"featurizing_smiles, batch={batch_size}"},
         )
 
+        # Gather the profiling records from all the workers
+        if self.featurization_profile:
+            features, records = zip(*features) if len(features) > 0 else ([], [])
+            features = list(features)
+            self.featurization_profiler = FeaturizationProfiler(records)
+            logger.info(self.featurization_profiler.report())
+
         # Warn about None molecules
         idx_none = [ii for ii, feat in enumerate(features) if did_featurization_fail(feat)]
         if len(idx_none) > 0:
@@ -1874,12 +2111,16 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         """
         Get a hash specific to a dataset and smiles_transformer.
         Useful to cache the pre-processed data.
+        The dataframes are hashed from their values, and the data files from their path, size and
+        modification time, see `graphium.utils.hashing.get_structured_hash`.
         """
         hash_dict = {
             "smiles_transformer": self.smiles_transformer,
             "task_specific_args": self.task_specific_args,
         }
-        data_hash = get_md5_hash(hash_dict)
+        if self.conformer_generator is not None:
+            hash_dict["conformers"] = self._get_conformer_signature()
+        data_hash = get_structured_hash(hash_dict, hash_files=True)
         return data_hash
 
     def get_data_cache_fullname(self, compress: bool = False) -> str:
@@ -1889,12 +2130,14 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
         Parameters:
             compress: Whether to compress the data
         Returns:
-            full path to the data cache file
+            full path to the data cache file, or to the data cache folder for the "chunked" format
         """
         if self.cache_data_path is None:
             return
         ext = ".datacache"
-        if compress:
+        if self.cache_data_format == "chunked":
+            ext += ".chunks"
+        elif compress:
             ext += ".gz"
         data_cache_fullname = fs.join(self.cache_data_path, self.data_hash + ext)
         return data_cache_fullname
@@ -1906,7 +2149,8 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
 
         Parameters:
             verbose: Whether to print the progress
-            compress: Whether to compress the data
+            compress: Whether to compress the data. Only used by the "torch" format,
+                the "chunked" format is compressed with `self.cache_data_codec`.
 
         """
         full_cache_data_path = self.get_data_cache_fullname(compress=compress)
@@ -1914,6 +2158,10 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             logger.info("No cache data path specified. Skipping saving the data to cache.")
             return
 
+        if self.cache_data_format == "chunked":
+            self._save_data_to_chunks(full_cache_data_path, verbose=verbose)
+            return
+
         save_params = {
             "single_task_datasets": self.single_task_datasets,
             "task_train_indices": self.task_train_indices,
@@ -1941,6 +2189,46 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
 
         self.get_label_statistics(self.cache_data_path, self.data_hash, temp_train_dataset, train=True)
 
+    def _save_data_to_chunks(self, full_cache_data_path: str, verbose: bool = True) -> None:
+        """
+        Save the datasets in the "chunked" format, and compute the label statistics from the
+        train labels returned by the same pass, instead of building a train `MultitaskDataset`.
+        """
+        if verbose:
+            logger.info(f"Saving the data to chunked cache at path:\n`{full_cache_data_path}`")
+        now = time.time()
+        split_labels = save_datasets_to_chunks(
+            full_cache_data_path,
+            datasets=self.single_task_datasets,
+            split_indices={
+                "train": self.task_train_indices,
+                "val": self.task_val_indices,
+                "test": self.task_test_indices,
+            },
+            codec=self.cache_data_codec,
+            n_jobs=self.cache_data_n_jobs,
+        )
+        if verbose:
+            logger.info(
+                f"Successfully saved the data to cache in {round(time.time() - now)}s at path: `{full_cache_data_path}`"
+            )
+
+        path_with_hash = os.path.join(self.cache_data_path, self.data_hash)
+        filename = os.path.join(path_with_hash, "task_norms.pkl")
+        if self.task_norms and not os.path.isfile(filename):
+            for task, splits in split_labels.items():
+                labels = list(splits["train"])
+                # Like the `MultitaskDataset`, keep the last label of the molecules appearing several times
+                unique_ids = self.single_task_datasets[task].unique_ids
+                if unique_ids is not None:
+                    train_ids = np.asarray([unique_ids[ii] for ii in self.task_train_indices[task]])
+                    _, last = np.unique(train_ids[::-1], return_index=True)
+                    labels = [labels[ii] for ii in np.sort(len(labels) - 1 - last)]
+                if len(labels) > 0:
+                    self._calculate_task_statistics(task, labels)
+            os.makedirs(path_with_hash, exist_ok=True)
+            torch.save(self.task_norms, filename, pickle_protocol=4)
+
     def load_data_from_cache(self, verbose: bool = True, compress: bool = False) -> bool:
         """
         Load the datasets from cache. First create a hash for the dataset, and verify if that
@@ -1959,25 +2247,31 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
             logger.info("No cache data path specified. Skipping loading the data from cache.")
             return False
 
-        cache_data_exists = fs.exists(full_cache_data_path)
+        if self.cache_data_format == "chunked":
+            cache_data_exists = fs.exists(fs.join(full_cache_data_path, "index.json"))
+        else:
+            cache_data_exists = fs.exists(full_cache_data_path)
 
         if cache_data_exists:
             try:
                 logger.info(f"Loading the data from cache at path `{full_cache_data_path}`")
                 now = time.time()
-                with fsspec.open(full_cache_data_path, mode="rb", compression="infer") as file:
-                    load_params = torch.load(file)
-                    self.__dict__.update(load_params)
-                    (
-                        self.train_singletask_datasets,
-                        self.val_singletask_datasets,
-                        self.test_singletask_datasets,
-                    ) = self.get_subsets_of_datasets(
-                        self.single_task_datasets,
-                        self.task_train_indices,
-                        self.task_val_indices,
-                        self.task_test_indices,
-                    )
+                if self.cache_data_format == "chunked":
+                    self._load_data_from_chunks(full_cache_data_path)
+                else:
+                    with fsspec.open(full_cache_data_path, mode="rb", compression="infer") as file:
+                        load_params = torch.load(file)
+                        self.__dict__.update(load_params)
+                (
+                    self.train_singletask_datasets,
+                    self.val_singletask_datasets,
+                    self.test_singletask_datasets,
+                ) = self.get_subsets_of_datasets(
+                    self.single_task_datasets,
+                    self.task_train_indices,
+                    self.task_val_indices,
+                    self.task_test_indices,
+                )
                 elapsed = round(time.time() - now)
                 logger.info(
                     f"Successfully loaded the data from cache in {elapsed}s at path: `{full_cache_data_path}`"
@@ -1997,6 +2291,18 @@ class MultitaskFromSmilesDataModule(BaseDataModule, IPUDataModuleModifier):
                 )
             return False
 
+    def _load_data_from_chunks(self, full_cache_data_path: str) -> None:
+        """Load the single-task datasets and their split indices from the "chunked" format"""
+        fields, split_indices = load_datasets_from_chunks(
+            full_cache_data_path, n_jobs=self.cache_data_n_jobs, use_mmap=True
+        )
+        self.single_task_datasets = {
+            task: Datasets.SingleTaskDataset(**task_fields) for task, task_fields in fields.items()
+        }
+        self.task_train_indices = {task: indices["train"] for task, indices in split_indices.items()}
+        self.task_val_indices = {task: indices["val"] for task, indices in split_indices.items()}
+        self.task_test_indices = {task: indices["test"] for task, indices in split_indices.items()}
+
     def get_subsets_of_datasets(
         self,
         single_task_datasets: Dict[str, Datasets.SingleTaskDataset],
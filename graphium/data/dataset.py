@@ -2,7 +2,6 @@ from typing import Type, List, Dict, Union, Any, Callable, Optional, Tuple, Iter
 
 from multiprocessing import Manager
 import numpy as np
-from functools import lru_cache
 from loguru import logger
 from copy import deepcopy
 import os
@@ -14,6 +13,7 @@ from torch_geometric.data import Data, Batch
 
 from graphium.data.smiles_transform import smiles_to_unique_mol_ids
 from graphium.features import GraphDict
+from graphium.data.sample_cache import SampleCache
 
 
 class SingleTaskDataset(Dataset):
@@ -148,6 +148,8 @@ class MultitaskDataset(Dataset):
         data_path: Optional[Union[str, os.PathLike]] = None,
         load_from_file: bool = False,
         files_ready: bool = False,
+        sample_cache_size_mb: float = 0.0,
+        sample_cache_policy: str = "lru",
     ):
         r"""
         This class holds the information for the multitask dataset.
@@ -172,6 +174,9 @@ class MultitaskDataset(Dataset):
             progress: Whether to display the progress bar
             about: A description of the dataset
             files_ready: Whether the files to load from were prepared ahead of time
+            sample_cache_size_mb: Size in MB of the cache of decoded samples, used only when `load_from_file=True`.
+                The cache is per dataloader worker. Set to `0` to disable the cache.
+            sample_cache_policy: Eviction policy of the sample cache, either "lru" or "fifo".
         """
         super().__init__()
         # self.datasets = datasets
@@ -182,6 +187,10 @@ class MultitaskDataset(Dataset):
         self.about = about
         self.data_path = data_path
         self.load_from_file = load_from_file
+        self.sample_cache = SampleCache(
+            max_size_mb=sample_cache_size_mb if load_from_file else 0.0,
+            eviction_policy=sample_cache_policy,
+        )
 
         if files_ready:
             assert load_from_file
@@ -354,7 +363,6 @@ class MultitaskDataset(Dataset):
             return
         return self.num_edges_total / self.num_graphs_total
 
-    @lru_cache(maxsize=16)
     def __getitem__(self, idx):
         r"""
         get the data for at the specified index
@@ -363,35 +371,47 @@ class MultitaskDataset(Dataset):
         Returns:
             A dictionary containing the data for the specified index with keys "mol_ids", "smiles", "labels", and "features"
         """
-        datum = {}
         if self.load_from_file:
-            data_dict = self.load_graph_from_index(idx)
-            datum["features"] = data_dict["graph_with_features"]
-            # these type changes are temporary for ipu dtype match
-            if hasattr(data_dict["labels"], "graph_pcba_1328"):
-                data_dict["labels"].graph_pcba_1328 = data_dict["labels"].graph_pcba_1328.astype(np.float32)
-            if hasattr(data_dict["labels"], "graph_pcqm4m_g25"):
-                data_dict["labels"].graph_pcqm4m_g25 = data_dict["labels"].graph_pcqm4m_g25.astype(np.float32)
-            if hasattr(data_dict["labels"], "node_pcqm4m_n4"):
-                data_dict["labels"].node_pcqm4m_n4 = data_dict["labels"].node_pcqm4m_n4.astype(np.float32)
-            datum["labels"] = data_dict["labels"]
-            if "smiles" in data_dict.keys():
-                datum["smiles"] = data_dict["smiles"]
-        else:
-            if self.mol_ids is not None:
-                datum["mol_ids"] = self.mol_ids[idx]
+            return self.sample_cache.get_or_load(idx, self._load_datum_from_file)
+
+        datum = {}
+        if self.mol_ids is not None:
+            datum["mol_ids"] = self.mol_ids[idx]
 
-            if self.smiles is not None:
-                datum["smiles"] = self.smiles[idx]
+        if self.smiles is not None:
+            datum["smiles"] = self.smiles[idx]
 
-            if self.labels is not None:
-                datum["labels"] = self.labels[idx]
+        if self.labels is not None:
+            datum["labels"] = self.labels[idx]
 
-            if self.features is not None:
-                datum["features"] = self.features[idx]
+        if self.features is not None:
+            datum["features"] = self.features[idx]
 
         return datum
 
+    def _load_datum_from_file(self, idx):
+        r"""
+        load and decode the data at the specified index from the disk
+        Parameters:
+            idx: The index of the data to retrieve
+        Returns:
+            A dictionary containing the data for the specified index with keys "labels", "features" and "smiles" (optional)
+        """
+        datum = {}
+        data_dict = self.load_graph_from_index(idx)
+        datum["features"] = data_dict["graph_with_features"]
+        # these type changes are temporary for ipu dtype match
+        if hasattr(data_dict["labels"], "graph_pcba_1328"):
+            data_dict["labels"].graph_pcba_1328 = data_dict["labels"].graph_pcba_1328.astype(np.float32)
+        if hasattr(data_dict["labels"], "graph_pcqm4m_g25"):
+            data_dict["labels"].graph_pcqm4m_g25 = data_dict["labels"].graph_pcqm4m_g25.astype(np.float32)
+        if hasattr(data_dict["labels"], "node_pcqm4m_n4"):
+            data_dict["labels"].node_pcqm4m_n4 = data_dict["labels"].node_pcqm4m_n4.astype(np.float32)
+        datum["labels"] = data_dict["labels"]
+        if "smiles" in data_dict.keys():
+            datum["smiles"] = data_dict["smiles"]
+        return datum
+
     def load_graph_from_index(self, data_idx):
         r"""
         load the graph (in pickle file) from the disk
@@ -0,0 +1,125 @@
+r"""
+Sharded data preparation across the ranks of a distributed run. Each rank processes a deterministic shard
+of the values, and writes it to a store on a shared filesystem. The shard files also act as the barrier:
+each rank waits for the shards of all the other ranks, then memory-maps all of them.
+"""
+
+from typing import Any, Callable, List, Sequence, Tuple
+
+import os
+import time
+
+import numpy as np
+import torch
+from loguru import logger
+
+from graphium.utils import fs
+from graphium.data.chunked_cache import write_chunk, read_chunk, ChainedSequence
+
+# Maximum time waiting for the shards of the other ranks, in seconds
+SHARD_TIMEOUT_S = 24 * 3600
+
+
+def get_rank_and_world_size() -> Tuple[int, int]:
+    r"""
+    Get the global rank and the world size from the initialized `torch.distributed` process group,
+    or from the `RANK` and `WORLD_SIZE` environment variables set by the launchers.
+    Defaults to a single process.
+    """
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        return torch.distributed.get_rank(), torch.distributed.get_world_size()
+    return int(os.environ.get("RANK", 0)), int(os.environ.get("WORLD_SIZE", 1))
+
+
+def get_shard_bounds(num_values: int, rank: int, world_size: int) -> Tuple[int, int]:
+    r"""
+    Get the start and stop of the contiguous shard of a rank, with the values spread evenly
+    such that the shards differ by at most one value.
+    """
+    bounds = np.linspace(0, num_values, world_size + 1).round().astype(int)
+    return int(bounds[rank]), int(bounds[rank + 1])
+
+
+def get_shard_path(path: str, name: str, rank: int, world_size: int) -> str:
+    """Get the path of the file of the shard of a rank"""
+    return fs.join(path, f"{name}-{rank:05d}-of-{world_size:05d}.chunk")
+
+
+def wait_for_files(
+    paths: Sequence[str], timeout: float = SHARD_TIMEOUT_S, poll_interval: float = 0.5
+) -> None:
+    r"""
+    Wait until all the files exist, such as the shards written by the other ranks.
+
+    Parameters:
+        paths: The paths of the files
+        timeout: Maximum time to wait, in seconds
+        poll_interval: Time between two checks, in seconds
+
+    Raises:
+        TimeoutError: If some files still do not exist after `timeout`
+    """
+    start = time.time()
+    missing = list(paths)
+    while True:
+        missing = [path for path in missing if not fs.exists(path)]
+        if len(missing) == 0:
+            return
+        if time.time() - start > timeout:
+            raise TimeoutError(f"{len(missing)} files still missing after {timeout}s, such as `{missing[0]}`")
+        time.sleep(poll_interval)
+
+
+def map_sharded(
+    fn: Callable[[List[Any]], Sequence[Any]],
+    values: Sequence[Any],
+    path: str,
+    name: str,
+    rank: int = 0,
+    world_size: int = 1,
+    timeout: float = SHARD_TIMEOUT_S,
+) -> Sequence[Any]:
+    r"""
+    Apply a function to the values, with each rank processing only its shard, and gather the outputs
+    of all the ranks through files. Every rank must call this function with the same values.
+
+    The shards are written uncompressed, and renamed once complete, such that an existing shard is always
+    valid. A shard written by a previous run with the same `path`, `name` and `world_size` is reused.
+
+    Parameters:
+        fn: The function applied to a list of values, and returning one output per value
+        values: The values, the same on all the ranks
+        path: The folder storing the shards, on a filesystem shared by all the ranks
+        name: The name of the shards, unique within `path`
+        rank: The rank of the current process
+        world_size: The number of processes
+        timeout: Maximum time waiting for the shards of the other ranks, in seconds
+
+    Returns:
+        outputs: The outputs of all the values, in order. The arrays are memory-mapped from the shards,
+            and the records such as the `GraphDict` are rebuilt on access.
+    """
+    paths = [get_shard_path(path, name, ii, world_size) for ii in range(world_size)]
+    if not fs.exists(paths[rank]):
+        start, stop = get_shard_bounds(len(values), rank, world_size)
+        logger.info(f"Rank {rank}/{world_size}: processing the shard `{name}` of {stop - start} values")
+        outputs = fn(list(values[start:stop]))
+        if len(outputs) != stop - start:
+            raise ValueError(f"Got {len(outputs)} outputs for {stop - start} values")
+        if (len(outputs) > 0) and all(isinstance(output, str) for output in outputs):
+            outputs = np.asarray(outputs)
+
+        fs.mkdir(path)
+        temp_path = f"{paths[rank]}.tmp"
+        write_chunk(temp_path, {"values": outputs}, codec="none")
+        fs.get_mapper(temp_path).fs.mv(temp_path, paths[rank])
+
+    logger.info(f"Rank {rank}/{world_size}: waiting for the shards `{name}` of the other ranks")
+    wait_for_files(paths, timeout=timeout)
+    shards = [read_chunk(shard_path, use_mmap=True)["values"] for shard_path in paths]
+    shards = [shard for shard in shards if len(shard) > 0]
+    if len(shards) == 0:
+        return []
+    if all(isinstance(shard, np.ndarray) for shard in shards):
+        return np.concatenate(shards, axis=0)
+    return ChainedSequence(shards)
@@ -0,0 +1,206 @@
+r"""
+Persistent quarantine of the molecules that failed featurization, such that they are not featurized again by
+the next data preparation, and a cheap pre-filter of the SMILES run before the featurization.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import os
+import re
+import json
+import time
+from collections import Counter, defaultdict
+
+from rdkit import Chem
+
+from graphium.data.smiles_transform import did_featurization_fail
+
+QUARANTINE_STAGES = ["prefilter", "featurizer", "quarantine"]
+
+
+class FeaturizationError(str):
+    def __new__(cls, error: str, elapsed_s: float = 0.0, stage: str = "featurizer"):
+        r"""
+        Error message of a failed featurization, as returned by the featurizers with `on_error="ignore"`,
+        such that `did_featurization_fail` is `True`, with the time spent and the stage that failed.
+
+        Parameters:
+            error: The error message
+            elapsed_s: The time spent before failing, in seconds
+            stage: The stage that failed, among `QUARANTINE_STAGES`
+        """
+        obj = super().__new__(cls, error)
+        obj.elapsed_s = elapsed_s
+        obj.stage = stage
+        return obj
+
+    def __reduce__(self):
+        return (FeaturizationError, (str(self), self.elapsed_s, self.stage))
+
+
+def get_failure_reason(error: str) -> str:
+    r"""
+    Get the reason of a failure from its error message, to count the failures with the same cause.
+    The reason is the first line of the message, with the numbers replaced by `#`.
+    """
+    lines = str(error).strip().splitlines()
+    reason = lines[0] if len(lines) > 0 else "Unknown error"
+    return re.sub(r"\d+", "#", reason)[:200]
+
+
+def prefilter_smiles(smiles: str, max_num_atoms: Optional[int] = None) -> Optional[str]:
+    r"""
+    Cheap checks of a SMILES before the featurization, without any sanitization of the molecule:
+    the SMILES must not be empty, must be parsed by RDKit, and must not have more heavy atoms than
+    `max_num_atoms`. The molecules passing the checks can still fail the featurization.
+
+    Parameters:
+        smiles: The SMILES
+        max_num_atoms: The maximum number of atoms of the featurization, if any
+
+    Returns:
+        error: The error message, or `None` if the SMILES passes the checks
+    """
+    if (not isinstance(smiles, str)) or (len(smiles.strip()) == 0):
+        return "Empty SMILES"
+    params = Chem.SmilesParserParams()
+    params.sanitize = False
+    params.removeHs = False
+    mol = Chem.MolFromSmiles(smiles, params)
+    if mol is None:
+        return "Unparseable SMILES"
+    if max_num_atoms is not None:
+        # The heavy atoms are kept by `RemoveHs` and `AddHs`, so they are a lower bound of the number of atoms
+        num_atoms = mol.GetNumHeavyAtoms()
+        if num_atoms > max_num_atoms:
+            return f"Maximum number of atoms greater than permitted {num_atoms}>{max_num_atoms}"
+    return None
+
+
+class PrefilteredTransform:
+    def __init__(self, transform: Callable, max_num_atoms: Optional[int] = None):
+        r"""
+        Featurizer running `prefilter_smiles` before `transform`, and returning the failures as
+        `FeaturizationError` with the time spent.
+
+        Parameters:
+            transform: The featurizer of a single SMILES, such as `mol_to_graph_dict`
+            max_num_atoms: The maximum number of atoms of the featurization, if any
+        """
+        self.transform = transform
+        self.max_num_atoms = max_num_atoms
+
+    def __call__(self, smiles: str, **kwargs) -> Any:
+        """Featurize a SMILES, with the keyword arguments, such as the `profiler`, passed to the featurizer"""
+        start = time.perf_counter()
+        if isinstance(smiles, str):
+            error = prefilter_smiles(smiles, max_num_atoms=self.max_num_atoms)
+            if error is not None:
+                profiler = kwargs.get("profiler", None)
+                if profiler is not None:
+                    profiler.start_molecule()
+                    profiler.end_molecule(success=False)
+                return FeaturizationError(error, time.perf_counter() - start, stage="prefilter")
+        features = self.transform(smiles, **kwargs)
+        if did_featurization_fail(features):
+            return FeaturizationError(str(features), time.perf_counter() - start, stage="featurizer")
+        return features
+
+
+class FeaturizationQuarantine:
+    def __init__(self, path: Union[str, os.PathLike], signature: str):
+        r"""
+        Persistent quarantine of the molecules that failed featurization. The entries are keyed by molecule id
+        and featurizer signature, such that a molecule is featurized again when the featurization changes.
+        They are appended to a JSON lines file, which can be shared by several featurizers.
+
+        The failures added and the quarantined molecules skipped are counted per reason, with the time spent
+        on the failures, and the time saved by skipping them, see `report`.
+
+        Parameters:
+            path: The JSON lines file of the quarantine
+            signature: The signature of the featurizer, such as the hash of its parameters
+        """
+        self.path = str(path)
+        self.signature = signature
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self.added = Counter()
+        self.skipped = Counter()
+        self.time_spent_s = defaultdict(float)
+        self.time_saved_s = defaultdict(float)
+
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line truncated by an interrupted write
+                    if entry.get("signature") == signature:
+                        self.entries[entry["mol_id"]] = entry
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, mol_id: str) -> bool:
+        return mol_id in self.entries
+
+    def skip(self, mol_id: str) -> FeaturizationError:
+        r"""
+        Skip the featurization of a quarantined molecule.
+
+        Returns:
+            error: The stored error of the molecule
+        """
+        entry = self.entries[mol_id]
+        self.skipped[entry["reason"]] += 1
+        self.time_saved_s[entry["reason"]] += entry["elapsed_s"]
+        return FeaturizationError(entry["error"], elapsed_s=0.0, stage="quarantine")
+
+    def add(self, mol_id: str, error: str) -> None:
+        r"""
+        Quarantine a molecule that failed featurization.
+
+        Parameters:
+            mol_id: The unique id of the molecule
+            error: The error message, with the time spent and the stage if it is a `FeaturizationError`
+        """
+        if mol_id in self.entries:
+            return
+        entry = {
+            "mol_id": mol_id,
+            "signature": self.signature,
+            "reason": get_failure_reason(error),
+            "error": str(error),
+            "stage": getattr(error, "stage", "featurizer"),
+            "elapsed_s": getattr(error, "elapsed_s", 0.0),
+        }
+        self.entries[mol_id] = entry
+        self._pending.append(entry)
+        self.added[entry["reason"]] += 1
+        self.time_spent_s[entry["reason"]] += entry["elapsed_s"]
+
+    def flush(self) -> None:
+        """Append the new entries to the file"""
+        if len(self._pending) == 0:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry in self._pending))
+        self._pending = []
+
+    def report(self) -> str:
+        """Report of the failures added and the quarantined molecules skipped, per reason"""
+        reasons = sorted(set(self.added) | set(self.skipped), key=lambda reason: -self.added[reason])
+        lines = [
+            f"Featurization quarantine `{self.path}`: {sum(self.added.values())} new failures, "
+            f"{sum(self.skipped.values())} quarantined molecules skipped, "
+            f"{sum(self.time_saved_s.values()):.3f}s saved"
+        ]
+        for reason in reasons:
+            lines.append(
+                f"    {self.added[reason]:>7} new ({self.time_spent_s[reason]:.3f}s), "
+                f"{self.skipped[reason]:>7} skipped ({self.time_saved_s[reason]:.3f}s saved): {reason}"
+            )
+        return "\n".join(lines)
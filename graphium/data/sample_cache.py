@@ -0,0 +1,210 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import os
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+
+import numpy as np
+import torch
+from scipy.sparse import issparse
+from torch_geometric.data import Data
+
+SAMPLE_CACHE_EVICTION_POLICIES = ["lru", "fifo"]
+
+
+def get_sample_nbytes(obj: Any) -> int:
+    r"""
+    Estimate the memory footprint of a decoded sample, in bytes.
+    Only the array payloads (numpy, scipy sparse, torch) are counted exactly,
+    other python objects are approximated with `sys.getsizeof`.
+
+    Parameters:
+        obj: The sample to measure. Can be nested dictionaries, lists, tuples,
+            `GraphDict`, pyg `Data`, arrays or tensors.
+
+    Returns:
+        nbytes: The estimated number of bytes
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement()
+    elif issparse(obj):
+        attrs = [attr for attr in ["data", "row", "col", "indices", "indptr"] if hasattr(obj, attr)]
+        return sum(get_sample_nbytes(getattr(obj, attr)) for attr in attrs)
+    elif isinstance(obj, Data):
+        return sum(get_sample_nbytes(val) for val in obj.to_dict().values())
+    elif isinstance(obj, dict):
+        return sum(get_sample_nbytes(val) for val in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(get_sample_nbytes(val) for val in obj)
+    return sys.getsizeof(obj)
+
+
+class SampleCache:
+    def __init__(self, max_size_mb: float = 0.0, eviction_policy: str = "lru"):
+        r"""
+        Bounded in-memory cache of decoded samples, used as a read-through
+        layer in front of the feature store when loading the samples from files.
+
+        The cache is local to a process: when the dataset is pickled to be sent
+        to a dataloader worker, the cached samples and counters are dropped, so
+        that each worker holds its own cache of at most `max_size_mb`.
+
+        The samples returned by the cache are deep copies, so that modifying them
+        in-place (e.g. label normalization or collating) does not alter the cache.
+
+        Parameters:
+            max_size_mb: Maximum size of the cache, in MB. Set to `0` to disable the cache.
+            eviction_policy: Which sample to remove when the cache is full.
+
+                - "lru": Remove the least recently used sample
+                - "fifo": Remove the oldest inserted sample
+        """
+        if eviction_policy not in SAMPLE_CACHE_EVICTION_POLICIES:
+            raise ValueError(
+                f"`eviction_policy` must be in {SAMPLE_CACHE_EVICTION_POLICIES}, provided `{eviction_policy}`"
+            )
+        if max_size_mb < 0:
+            raise ValueError(f"`max_size_mb` must be positive, provided `{max_size_mb}`")
+
+        self.max_size_mb = max_size_mb
+        self.eviction_policy = eviction_policy
+        self.max_size_bytes = int(max_size_mb * 1024**2)
+        self.clear()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache can hold any sample"""
+        return self.max_size_bytes > 0
+
+    def clear(self) -> None:
+        """Remove all the samples from the cache and reset the counters"""
+        self._samples: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._nbytes: Dict[Hashable, int] = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pid = os.getpid()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._samples
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        r"""
+        Get a copy of a cached sample, and update the hit/miss counters.
+
+        Parameters:
+            key: The key of the sample, usually its index in the dataset
+
+        Returns:
+            sample: A deep copy of the cached sample, or `None` if the sample is not in the cache
+        """
+        self._check_process()
+        if key not in self._samples:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self.eviction_policy == "lru":
+            self._samples.move_to_end(key)
+        return deepcopy(self._samples[key])
+
+    def put(self, key: Hashable, sample: Any) -> None:
+        r"""
+        Add a sample to the cache, evicting other samples if the cache is full.
+        Samples larger than the cache are not added.
+
+        Parameters:
+            key: The key of the sample, usually its index in the dataset
+            sample: The decoded sample. It must not be modified after being added.
+        """
+        self._check_process()
+        if not self.enabled:
+            return
+        if key in self._samples:
+            self._remove(key)
+
+        nbytes = get_sample_nbytes(sample)
+        if nbytes > self.max_size_bytes:
+            return
+
+        while self.size_bytes + nbytes > self.max_size_bytes:
+            oldest_key = next(iter(self._samples))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+        self._samples[key] = sample
+        self._nbytes[key] = nbytes
+        self.size_bytes += nbytes
+
+    def get_or_load(self, key: Hashable, load_fn: Callable[[Hashable], Any]) -> Any:
+        r"""
+        Read-through access to a sample. If the sample is not cached, it is loaded
+        with `load_fn(key)` and added to the cache.
+
+        Parameters:
+            key: The key of the sample, usually its index in the dataset
+            load_fn: Function loading the sample from its key
+
+        Returns:
+            sample: The sample, safe to be modified in-place
+        """
+        if not self.enabled:
+            self.misses += 1
+            return load_fn(key)
+
+        sample = self.get(key)
+        if sample is None:
+            sample = load_fn(key)
+            self.put(key, sample)
+            sample = deepcopy(sample)
+        return sample
+
+    def stats(self) -> Dict[str, Any]:
+        r"""
+        Get the counters of the cache.
+
+        Returns:
+            stats: Dictionary with the number of hits, misses, evictions, cached samples,
+                the size of the cache in MB, and the hit rate
+        """
+        num_accesses = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "num_samples": len(self),
+            "size_mb": self.size_bytes / 1024**2,
+            "max_size_mb": self.max_size_mb,
+            "hit_rate": self.hits / num_accesses if num_accesses > 0 else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        self._samples.pop(key)
+        self.size_bytes -= self._nbytes.pop(key)
+
+    def _check_process(self) -> None:
+        # Forked dataloader workers inherit a copy of the parent's cache.
+        # Start from an empty cache so that the memory budget and counters are per worker
+        if self._pid != os.getpid():
+            self.clear()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Serialize the cache parameters only, without the cached samples."""
+        return {"max_size_mb": self.max_size_mb, "eviction_policy": self.eviction_policy}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Reload an empty cache from pickling."""
+        self.__init__(**state)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_size_mb={self.max_size_mb}, "
+            f"eviction_policy='{self.eviction_policy}', num_samples={len(self)})"
+        )
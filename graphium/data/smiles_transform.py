@@ -3,6 +3,8 @@ from typing import Type, List, Dict, Union, Any, Callable, Optional, Tuple, Iter
 import os
 import datamol as dm
 
+from graphium.features.profiling import FeaturizationProfiler
+
 
 def smiles_to_unique_mol_id(smiles: str) -> Optional[str]:
     """
@@ -73,6 +75,29 @@ class BatchingSmilesTransform:
         return batch_size
 
 
+class ProfilingBatchingSmilesTransform(BatchingSmilesTransform):
+    """
+    Class to transform a list of smiles using a transform function, while
+    recording the time spent in each featurization stage.
+    The transform function must accept a `profiler` keyword argument, such as `mol_to_graph_dict`.
+    """
+
+    def __call__(self, smiles_list: Iterable[str]) -> List[Tuple[Any, Dict[str, Any]]]:
+        """
+        Function to transform a list of smiles
+
+        Returns:
+            A list of tuples `(features, record)`, with `record` the profiling record of the molecule.
+            The records can be merged with `FeaturizationProfiler(records)`.
+        """
+        profiler = FeaturizationProfiler()
+        outputs = []
+        for smiles in smiles_list:
+            features = self.transform(smiles, profiler=profiler)
+            outputs.append((features, profiler.records[-1]))
+        return outputs
+
+
 def smiles_to_unique_mol_ids(
     smiles: Iterable[str],
     n_jobs=-1,
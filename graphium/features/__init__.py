@@ -1,9 +1,19 @@
-from .featurizer import get_mol_atomic_features_onehot
-from .featurizer import get_mol_atomic_features_float
-from .featurizer import get_mol_edge_features
-from .featurizer import mol_to_adj_and_features
-from .featurizer import mol_to_graph_dict
-from .featurizer import mol_to_graph_signature
-from .featurizer import GraphDict
-from .featurizer import mol_to_pyggraph
-from .featurizer import to_dense_array
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "get_mol_atomic_features_onehot": "featurizer",
+        "get_mol_atomic_features_float": "featurizer",
+        "get_mol_edge_features": "featurizer",
+        "mol_to_adj_and_features": "featurizer",
+        "mol_to_graph_dict": "featurizer",
+        "mol_to_graph_signature": "featurizer",
+        "GraphDict": "featurizer",
+        "mol_to_pyggraph": "featurizer",
+        "to_dense_array": "featurizer",
+        "FeaturizationProfiler": "profiling",
+        "ConformerGenerator": "conformers",
+        "ConformerStore": "conformers",
+    },
+)
@@ -0,0 +1,368 @@
+r"""
+Dedicated conformer stage of the featurization. The 3D coordinates are embedded with ETKDG once per molecule,
+in a process pool, and persisted in a compact array store keyed by molecule id. The store is reused across
+featurizer configurations, and the featurizers receive molecules that already have a conformer, see
+`ConformerTransform`, instead of embedding them again with `get_simple_mol_conformer`.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import os
+import json
+import time
+from glob import glob
+
+import numpy as np
+import datamol as dm
+from rdkit import Chem
+from rdkit.Chem import rdDistGeom
+from rdkit.Geometry import Point3D
+from loguru import logger
+
+from graphium.utils.hashing import get_structured_hash
+
+# Molecule property marking a molecule whose conformer generation failed, such that the featurizers
+# do not try to embed it again, see `get_simple_mol_conformer`
+CONFORMER_FAILED_PROP = "_GraphiumConformerFailed"
+
+
+class ConformerGenerator:
+    def __init__(
+        self,
+        random_seed: int = 42,
+        timeout_s: int = 10,
+        large_num_atoms: Optional[int] = None,
+        num_confs_large: int = 4,
+        num_threads_large: int = 0,
+    ):
+        r"""
+        Generate one conformer per molecule with ETKDGv3, on the molecule with explicit hydrogens.
+        When the embedding fails, it is retried with random coordinates and relaxed constraints,
+        as in `get_simple_mol_conformer`.
+
+        The large molecules, which are the slowest and the most likely to fail, are embedded with
+        `EmbedMultipleConfs` on several threads, and the first conformer is kept.
+
+        Parameters:
+            random_seed: The random seed of the embedding, for reproducible coordinates
+            timeout_s: The maximum time spent embedding a single molecule, in seconds,
+                after which the embedding fails. `0` for no timeout.
+            large_num_atoms: The number of atoms, including the hydrogens, from which a molecule
+                is considered large. `None` to embed all the molecules with `EmbedMolecule`.
+            num_confs_large: The number of conformers embedded for the large molecules
+            num_threads_large: The number of threads embedding the large molecules. `0` for all the cores.
+        """
+        self.random_seed = random_seed
+        self.timeout_s = timeout_s
+        self.large_num_atoms = large_num_atoms
+        self.num_confs_large = num_confs_large
+        self.num_threads_large = num_threads_large
+
+    def get_signature(self) -> str:
+        r"""
+        Get the hash of the parameters changing the coordinates, such that different generators
+        do not share the same store. The number of threads is not part of it.
+        """
+        return get_structured_hash(
+            {
+                "method": "ETKDGv3",
+                "random_seed": self.random_seed,
+                "timeout_s": self.timeout_s,
+                "large_num_atoms": self.large_num_atoms,
+                "num_confs_large": self.num_confs_large,
+            }
+        )
+
+    def is_large(self, num_atoms: int) -> bool:
+        """Whether a molecule with `num_atoms` atoms, including the hydrogens, is embedded as a large molecule"""
+        return (self.large_num_atoms is not None) and (num_atoms >= self.large_num_atoms)
+
+    def _get_params(self, num_threads: int = 1, relaxed: bool = False) -> rdDistGeom.EmbedParameters:
+        params = rdDistGeom.ETKDGv3()
+        params.randomSeed = self.random_seed
+        params.numThreads = num_threads
+        if hasattr(params, "timeout"):
+            params.timeout = self.timeout_s
+        if relaxed:
+            params.useRandomCoords = True
+            params.enforceChirality = False
+            params.ignoreSmoothingFailures = True
+            params.optimizerForceTol = 0.1
+        return params
+
+    def embed(self, smiles: str, large: Optional[bool] = None) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        r"""
+        Embed a single molecule.
+
+        Parameters:
+            smiles: The SMILES of the molecule
+            large: Whether to embed it as a large molecule. `None` to decide from its number of atoms.
+
+        Returns:
+            positions: The float32 positions of the atoms of the molecule with explicit hydrogens,
+                of shape `(num_atoms, 3)`, or `None` if the embedding failed
+            error: The error message if the embedding failed, otherwise `None`
+        """
+        mol = dm.to_mol(smiles)
+        if mol is None:
+            return None, "Unparseable SMILES"
+        mol = Chem.AddHs(mol)
+        if large is None:
+            large = self.is_large(mol.GetNumAtoms())
+
+        try:
+            for relaxed in [False, True]:
+                if large:
+                    params = self._get_params(num_threads=self.num_threads_large, relaxed=relaxed)
+                    conf_ids = list(rdDistGeom.EmbedMultipleConfs(mol, self.num_confs_large, params))
+                    conf_id = conf_ids[0] if len(conf_ids) > 0 else -1
+                else:
+                    conf_id = rdDistGeom.EmbedMolecule(mol, self._get_params(relaxed=relaxed))
+                if conf_id >= 0:
+                    return mol.GetConformer(conf_id).GetPositions().astype(np.float32), None
+        except Exception as e:
+            return None, str(e)
+        return None, "Embedding failed"
+
+    def embed_batch(self, smiles: List[str]) -> List[Tuple[Optional[np.ndarray], Optional[str]]]:
+        """Embed a batch of molecules, as small molecules, see `embed`"""
+        return [self.embed(this_smiles, large=False) for this_smiles in smiles]
+
+
+class ConformerStore:
+    def __init__(self, path: Union[str, os.PathLike], dtype: str = "float32", writer: str = "0"):
+        r"""
+        Append-only store of the conformer positions, keyed by molecule id. The positions of all the molecules
+        are concatenated in a raw array file, and indexed by a JSON lines file with the offset and the number
+        of atoms of each molecule, or the error of the failed molecules.
+
+        Each writer, such as each rank of a distributed run, appends to its own pair of files, and reads
+        the files of all the writers. The positions are memory-mapped.
+
+        Parameters:
+            path: The folder of the store
+            dtype: The dtype of the stored positions, `"float32"` or `"float16"`.
+                `"float16"` halves the size, with an error of ~0.01 Angstrom on the positions.
+            writer: The name of the files written by this store
+        """
+        if dtype not in ["float32", "float16"]:
+            raise ValueError(f"`dtype` must be 'float32' or 'float16', provided `{dtype}`")
+        self.path = str(path)
+        self.dtype = np.dtype(dtype)
+        self.writer = str(writer)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: List[Tuple[Dict[str, Any], Optional[np.ndarray]]] = []
+        self._memmaps: Dict[str, np.ndarray] = {}
+
+        for index_path in sorted(glob(os.path.join(self.path, f"*.{self.dtype.name}.index.jsonl"))):
+            writer_name = os.path.basename(index_path)[: -len(f".{self.dtype.name}.index.jsonl")]
+            with open(index_path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line truncated by an interrupted write
+                    entry["writer"] = writer_name
+                    self.entries[entry["mol_id"]] = entry
+
+    def _get_file(self, writer: str, suffix: str) -> str:
+        return os.path.join(self.path, f"{writer}.{self.dtype.name}.{suffix}")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, mol_id: str) -> bool:
+        return mol_id in self.entries
+
+    def get(self, mol_id: str) -> Optional[np.ndarray]:
+        r"""
+        Get the positions of a molecule.
+
+        Returns:
+            positions: The positions of shape `(num_atoms, 3)`, or `None` if the embedding failed
+        """
+        entry = self.entries[mol_id]
+        if entry.get("error") is not None:
+            return None
+        if "positions" in entry:  # Not flushed yet
+            return entry["positions"]
+        writer = entry["writer"]
+        if writer not in self._memmaps:
+            self._memmaps[writer] = np.memmap(self._get_file(writer, "coords"), dtype=self.dtype, mode="r")
+        start = entry["offset"] * 3
+        return np.array(self._memmaps[writer][start : start + entry["num_atoms"] * 3].reshape(-1, 3))
+
+    def add(self, mol_id: str, positions: Optional[np.ndarray], error: Optional[str] = None) -> None:
+        r"""
+        Add the positions of a molecule, or its failure.
+
+        Parameters:
+            mol_id: The unique id of the molecule
+            positions: The positions of shape `(num_atoms, 3)`, or `None` if the embedding failed
+            error: The error message of the failure
+        """
+        if mol_id in self.entries:
+            return
+        entry = {"mol_id": mol_id}
+        if positions is None:
+            entry["error"] = "Embedding failed" if error is None else str(error)
+        else:
+            positions = np.asarray(positions, dtype=self.dtype).reshape(-1, 3)
+            entry["num_atoms"] = len(positions)
+        self._pending.append((entry, positions))
+        self.entries[mol_id] = dict(entry, writer=self.writer, positions=positions)
+
+    def flush(self) -> None:
+        r"""
+        Append the new positions to the files. The positions are written before their index,
+        such that an interrupted write leaves only unindexed positions.
+        """
+        if len(self._pending) == 0:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        coords_path = self._get_file(self.writer, "coords")
+        offset = (
+            os.path.getsize(coords_path) // (3 * self.dtype.itemsize) if os.path.exists(coords_path) else 0
+        )
+        with open(coords_path, "ab") as file:
+            for entry, positions in self._pending:
+                if positions is not None:
+                    entry["offset"] = offset
+                    offset += len(positions)
+                    file.write(positions.tobytes())
+        with open(self._get_file(self.writer, "index.jsonl"), "a") as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry, _ in self._pending))
+        for entry, _ in self._pending:
+            self.entries[entry["mol_id"]] = dict(entry, writer=self.writer)
+        self._memmaps.pop(self.writer, None)
+        self._pending = []
+
+
+def generate_conformers(
+    generator: ConformerGenerator,
+    smiles: Sequence[str],
+    mol_ids: Sequence[str],
+    store: ConformerStore,
+    n_jobs: Optional[int] = -1,
+    batch_size: int = 16,
+    backend: str = "loky",
+    progress: bool = True,
+) -> Dict[str, float]:
+    r"""
+    Embed the molecules missing from the store, and add them to the store. The small molecules are
+    embedded in a process pool, then the large molecules are embedded one at a time with several threads.
+
+    Parameters:
+        generator: The conformer generator
+        smiles: The SMILES of the molecules
+        mol_ids: The unique ids of the molecules, the keys of the store
+        store: The store of the positions
+        n_jobs: The number of processes embedding the small molecules, see `datamol.parallelized_with_batches`
+        batch_size: The number of molecules per batch of the process pool
+        backend: The parallelization backend, see `datamol.parallelized_with_batches`
+        progress: Whether to show a progress bar
+
+    Returns:
+        stats: The number of molecules, of molecules found in the store, of molecules embedded,
+            of failures and of large molecules, the success rate of the embedded molecules,
+            the time spent and the throughput in molecules per second
+    """
+    start = time.perf_counter()
+    todo = {}
+    for this_smiles, mol_id in zip(smiles, mol_ids):
+        if (mol_id not in store) and (mol_id not in todo):
+            todo[mol_id] = this_smiles
+
+    # Count the atoms with hydrogens without sanitizing, to send the large molecules to the threads
+    large_ids, small_ids = [], []
+    for mol_id, this_smiles in todo.items():
+        mol = dm.to_mol(this_smiles, sanitize=False)
+        num_atoms = 0
+        if mol is not None:
+            mol.UpdatePropertyCache(strict=False)
+            num_atoms = mol.GetNumAtoms() + sum(atom.GetTotalNumHs() for atom in mol.GetAtoms())
+        (large_ids if generator.is_large(num_atoms) else small_ids).append(mol_id)
+
+    if len(small_ids) > 0:
+        outputs = dm.parallelized_with_batches(
+            generator.embed_batch,
+            [todo[mol_id] for mol_id in small_ids],
+            batch_size=batch_size,
+            n_jobs=n_jobs,
+            backend=backend,
+            progress=progress,
+            tqdm_kwargs={"desc": f"embedding conformers, batch={batch_size}"},
+        )
+        for mol_id, (positions, error) in zip(small_ids, outputs):
+            store.add(mol_id, positions, error)
+    for mol_id in large_ids:
+        positions, error = generator.embed(todo[mol_id], large=True)
+        store.add(mol_id, positions, error)
+    store.flush()
+
+    elapsed_s = time.perf_counter() - start
+    num_failed = sum(store.get(mol_id) is None for mol_id in todo.keys())
+    stats = {
+        "num_molecules": len(set(mol_ids)),
+        "num_cached": len(set(mol_ids)) - len(todo),
+        "num_embedded": len(todo),
+        "num_failed": num_failed,
+        "num_large": len(large_ids),
+        "success_rate": 1.0 - num_failed / max(len(todo), 1),
+        "elapsed_s": elapsed_s,
+        "molecules_per_s": len(todo) / max(elapsed_s, 1e-9),
+    }
+    logger.info(
+        f"Conformers `{store.path}`: {stats['num_embedded']} molecules embedded ({stats['num_large']} large), "
+        f"{stats['num_cached']} found in the store, success rate {100 * stats['success_rate']:.1f}%, "
+        f"{stats['molecules_per_s']:.1f} molecules/s"
+    )
+    return stats
+
+
+def set_mol_conformer(smiles: str, positions: Optional[np.ndarray]) -> Optional[dm.Mol]:
+    r"""
+    Build the molecule with explicit hydrogens from its SMILES, with its conformer from the positions
+    of `ConformerGenerator.embed`. When the positions are missing or do not match the molecule, it is marked
+    with `CONFORMER_FAILED_PROP`, such that the featurizers do not embed it again.
+
+    Returns:
+        mol: The molecule with explicit hydrogens, or `None` if the SMILES cannot be parsed
+    """
+    mol = dm.to_mol(smiles)
+    if mol is None:
+        return None
+    mol = Chem.AddHs(mol)
+    if (positions is None) or (len(positions) != mol.GetNumAtoms()):
+        mol.SetBoolProp(CONFORMER_FAILED_PROP, True)
+        return mol
+    conf = Chem.Conformer(mol.GetNumAtoms())
+    positions = np.asarray(positions, dtype=np.float64)
+    if hasattr(conf, "SetPositions"):
+        conf.SetPositions(positions)
+    else:  # Older versions of RDKit
+        for ii, pos in enumerate(positions):
+            conf.SetAtomPosition(ii, Point3D(*pos))
+    conf.Set3D(True)
+    mol.AddConformer(conf, assignId=True)
+    return mol
+
+
+class ConformerTransform:
+    def __init__(self, transform: Callable):
+        r"""
+        Featurizer of the `(smiles, positions)` pairs of the conformer stage. The molecule is passed to
+        `transform` with its conformer, see `set_mol_conformer`. The featurizers such as `mol_to_graph_dict`
+        keep the conformer when removing the hydrogens.
+
+        Parameters:
+            transform: The featurizer of a single molecule, such as `mol_to_graph_dict`
+        """
+        self.transform = transform
+
+    def __call__(self, item: Tuple[str, Optional[np.ndarray]], **kwargs) -> Any:
+        """Featurize a `(smiles, positions)` pair, with the keyword arguments passed to the featurizer"""
+        smiles, positions = item
+        mol = set_mol_conformer(smiles, positions)
+        # The unparseable SMILES are passed as is, to get the error message of the featurizer
+        return self.transform(smiles if mol is None else mol, **kwargs)
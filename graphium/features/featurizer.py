@@ -15,6 +15,8 @@ import datamol as dm
 from graphium.features import nmp
 from graphium.utils.tensor import one_of_k_encoding
 from graphium.features.positional_encoding import get_all_positional_encodings
+from graphium.features.profiling import FeaturizationProfiler, profile_stage
+from graphium.features.conformers import CONFORMER_FAILED_PROP
 
 
 def to_dense_array(array: np.ndarray, dtype: str = None) -> np.ndarray:
@@ -231,6 +233,74 @@ def get_mol_conformer_features(
     return prop_dict
 
 
+def get_radius_graph_and_triplets(
+    positions: np.ndarray, cutoff: float = 5.0, max_num_neighbors: int = 32
+) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    Compute the radius graph of a conformer, and the triplets of its edges used by the DimeNet-style
+    3D encoders, such that they are not recomputed at every forward pass.
+    The edges are the same as `torch_geometric.nn.radius_graph`, keeping the `max_num_neighbors` closest
+    neighbours, and the triplets are in the order of `graphium.nn.pyg_layers.utils.triplets`.
+
+    Parameters:
+        positions: The 3D positions of the atoms, of shape `(num_atoms, 3)`
+        cutoff: The cutoff distance of the radius graph
+        max_num_neighbors: The maximum number of neighbours of each atom
+
+    Returns:
+        radius_edge_index: The `(source, target)` atoms of the edges, of shape `(2, num_edges)`,
+            sorted by target then source
+        triplet_index: The edges `(k->j, j->i)` of each triplet `k->j->i` with `k != i`,
+            of shape `(2, num_triplets)`
+    """
+    pos = np.asarray(positions, dtype=np.float32)
+    num_nodes = len(pos)
+    dist = np.linalg.norm(pos[:, None, :] - pos[None, :, :], axis=-1)
+    np.fill_diagonal(dist, np.inf)
+
+    # The closest source atoms of each target atom, within the cutoff
+    neighbors = np.argsort(dist, axis=1, kind="stable")[:, :max_num_neighbors]
+    target = np.repeat(np.arange(num_nodes), neighbors.shape[1])
+    source = neighbors.reshape(-1)
+    keep = dist[target, source] <= cutoff
+    perm = np.lexsort((source[keep], target[keep]))
+    row, col = source[keep][perm], target[keep][perm]
+
+    # For each edge j->i, the edges k->j, which are contiguous since the edges are sorted by target
+    ptr = np.concatenate([[0], np.cumsum(np.bincount(col, minlength=num_nodes))])
+    num_in = ptr[row + 1] - ptr[row]
+    idx_ji = np.repeat(np.arange(len(row)), num_in)
+    offsets = np.arange(len(idx_ji)) - np.repeat(np.cumsum(num_in) - num_in, num_in)
+    idx_kj = np.repeat(ptr[row], num_in) + offsets
+    keep = row[idx_kj] != col[idx_ji]
+
+    radius_edge_index = np.stack([row, col]).astype(np.int64)
+    triplet_index = np.stack([idx_kj[keep], idx_ji[keep]]).astype(np.int64)
+    return radius_edge_index, triplet_index
+
+
+def get_radius_graph_features(
+    conf_dict: Dict[str, np.ndarray], radius_graph: Dict[str, Any]
+) -> Dict[str, np.ndarray]:
+    r"""
+    Get the radius graph and the triplets of the `"positions_3d"` conformer property,
+    see `get_radius_graph_and_triplets`.
+
+    Parameters:
+        conf_dict: The conformer features, from `get_mol_conformer_features`
+        radius_graph: The keyword arguments of `get_radius_graph_and_triplets`
+
+    Returns:
+        radius_dict: The `"precomputed_radius_edge_index"` and `"precomputed_triplet_index"`
+    """
+    if "positions_3d" not in conf_dict:
+        raise ValueError("`radius_graph` requires `positions_3d` in the `conformer_property_list`")
+    radius_edge_index, triplet_index = get_radius_graph_and_triplets(
+        conf_dict["positions_3d"], **radius_graph
+    )
+    return {"precomputed_radius_edge_index": radius_edge_index, "precomputed_triplet_index": triplet_index}
+
+
 def get_mol_atomic_features_float(
     mol: dm.Mol,
     property_list: Union[List[str], List[Callable]],
@@ -435,6 +505,9 @@ def get_simple_mol_conformer(mol: dm.Mol) -> Union[Chem.rdchem.Conformer, None]:
     and returns it. This is meant to be used in simple functions like `GetBondLength`,
     not in functions requiring complex 3D structure.
 
+    A molecule whose embedding already failed, here or in the conformer stage, is marked with
+    `CONFORMER_FAILED_PROP` and is not embedded again.
+
     Parameters:
 
         mol: Rdkit Molecule
@@ -443,6 +516,9 @@ def get_simple_mol_conformer(mol: dm.Mol) -> Union[Chem.rdchem.Conformer, None]:
         conf: A conformer of the molecule, or `None` if it fails
     """
 
+    if mol.HasProp(CONFORMER_FAILED_PROP):
+        return None
+
     val = 0
     if mol.GetNumConformers() == 0:
         val = Chem.rdDistGeom.EmbedMolecule(mol)
@@ -458,6 +534,7 @@ def get_simple_mol_conformer(mol: dm.Mol) -> Union[Chem.rdchem.Conformer, None]:
 
     if val == -1:
         conf = None
+        mol.SetBoolProp(CONFORMER_FAILED_PROP, True)
         logger.warn("Couldn't compute conformer for molecule `{}`".format(Chem.MolToSmiles(mol)))
     else:
         conf = mol.GetConformer(0)
@@ -630,6 +707,7 @@ def mol_to_adj_and_features(
     pos_encoding_as_features: Dict[str, Any] = None,
     dtype: np.dtype = np.float16,
     mask_nan: Union[str, float, type(None)] = "raise",
+    profiler: Optional[FeaturizationProfiler] = None,
 ) -> Union[
     coo_matrix,
     Union[Tensor, None],
@@ -692,6 +770,10 @@ def mol_to_adj_and_features(
             - "warn": Raise a warning when there is a nan or inf in the featurization
             - "None": DEFAULT. Don't do anything
             - "Floating value": Replace nans or inf by the specified value
+
+        profiler:
+            If provided, the time spent in each stage of the featurization is recorded
+            for the current molecule. See `graphium.features.profiling.FeaturizationProfiler`.
     Returns:
 
         adj:
@@ -729,24 +811,30 @@ def mol_to_adj_and_features(
     """
 
     if isinstance(mol, str):
-        mol = dm.to_mol(mol)
+        with profile_stage(profiler, "parse"):
+            mol = dm.to_mol(mol)
 
     # Add or remove explicit hydrogens
-    if explicit_H:
-        mol = Chem.AddHs(mol)
-    else:
-        mol = Chem.RemoveHs(mol)
+    with profile_stage(profiler, "hydrogens"):
+        if explicit_H:
+            mol = Chem.AddHs(mol)
+        else:
+            mol = Chem.RemoveHs(mol)
 
     num_nodes = mol.GetNumAtoms()
 
-    adj = mol_to_adjacency_matrix(
-        mol, use_bonds_weights=use_bonds_weights, add_self_loop=add_self_loop, dtype=dtype
-    )
+    with profile_stage(profiler, "adjacency"):
+        adj = mol_to_adjacency_matrix(
+            mol, use_bonds_weights=use_bonds_weights, add_self_loop=add_self_loop, dtype=dtype
+        )
 
     # Get the node features
-    atom_features_onehot = get_mol_atomic_features_onehot(mol, atom_property_list_onehot)
-    atom_features_float = get_mol_atomic_features_float(mol, atom_property_list_float, mask_nan=mask_nan)
-    conf_dict = get_mol_conformer_features(mol, conformer_property_list, mask_nan=mask_nan)
+    with profile_stage(profiler, "atom_onehot"):
+        atom_features_onehot = get_mol_atomic_features_onehot(mol, atom_property_list_onehot)
+    with profile_stage(profiler, "atom_float"):
+        atom_features_float = get_mol_atomic_features_float(mol, atom_property_list_float, mask_nan=mask_nan)
+    with profile_stage(profiler, "conformer"):
+        conf_dict = get_mol_conformer_features(mol, conformer_property_list, mask_nan=mask_nan)
     ndata = list(atom_features_float.values()) + list(atom_features_onehot.values())
     ndata = [d[:, np.newaxis] if d.ndim == 1 else d for d in ndata]
 
@@ -756,7 +844,8 @@ def mol_to_adj_and_features(
         ndata = None
 
     # Get the edge features
-    edge_features = get_mol_edge_features(mol, edge_property_list, mask_nan=mask_nan)
+    with profile_stage(profiler, "edge_features"):
+        edge_features = get_mol_edge_features(mol, edge_property_list, mask_nan=mask_nan)
     edata = list(edge_features.values())
     edata = [np.expand_dims(d, axis=1) if d.ndim == 1 else d for d in edata]
     if len(edata) > 0:
@@ -765,7 +854,7 @@ def mol_to_adj_and_features(
         edata = None
 
     # Get all positional encodings
-    pe_dict = get_all_positional_encodings(adj, num_nodes, pos_encoding_as_features)
+    pe_dict = get_all_positional_encodings(adj, num_nodes, pos_encoding_as_features, profiler=profiler)
 
     # Mask the NaNs
     for pe_key, pe_val in pe_dict.items():
@@ -840,6 +929,19 @@ def mol_to_adjacency_matrix(
     return adj
 
 
+class RadiusGraphData(Data):
+    r"""
+    PyG graph with the radius graph and the triplets precomputed by the featurization,
+    see `get_radius_graph_and_triplets`. The `precomputed_triplet_index` are edge indices,
+    so they are offset by the number of radius edges of the previous graphs of a batch.
+    """
+
+    def __inc__(self, key: str, value: Any, *args, **kwargs) -> Any:
+        if key == "precomputed_triplet_index":
+            return self.precomputed_radius_edge_index.size(1)
+        return super().__inc__(key, value, *args, **kwargs)
+
+
 class GraphDict(dict):
     def __init__(
         self,
@@ -902,6 +1004,9 @@ class GraphDict(dict):
         for key, val in self.items():
             if key in ["adj", "dtype", "mask_nan"]:  # Skip the parameters
                 continue
+            elif isinstance(val, np.ndarray) and key.startswith("precomputed_") and key.endswith("_index"):
+                # Keep the integer indices
+                data_dict[key] = torch.as_tensor(val)
             elif isinstance(val, np.ndarray):
                 # Convert the data to the specified dtype in torch format
                 val = val.astype(self.dtype)
@@ -919,7 +1024,8 @@ class GraphDict(dict):
         # Create the PyG graph object `Data`
         edge_index = torch.as_tensor(np.vstack((self.adj.row, self.adj.col)))
         edge_weight = torch.as_tensor(self.adj.data)
-        data = Data(edge_index=edge_index, edge_weight=edge_weight, num_nodes=num_nodes, **data_dict)
+        data_cls = RadiusGraphData if "precomputed_triplet_index" in data_dict else Data
+        data = data_cls(edge_index=edge_index, edge_weight=edge_weight, num_nodes=num_nodes, **data_dict)
         return data
 
     @property
@@ -960,6 +1066,8 @@ def mol_to_graph_dict(
     on_error: str = "ignore",
     mask_nan: Union[str, float, type(None)] = "raise",
     max_num_atoms: Optional[int] = None,
+    radius_graph: Optional[Dict[str, Any]] = None,
+    profiler: Optional[FeaturizationProfiler] = None,
 ) -> Union[GraphDict, str]:
     r"""
     Transforms a molecule into an adjacency matrix representing the molecular graph
@@ -1031,6 +1139,19 @@ def mol_to_graph_dict(
             is give, an error is raised, but catpured according to the rules of
             `on_error`.
 
+        radius_graph:
+            If provided, the radius graph and the triplets used by the DimeNet-style 3D encoders,
+            such as `BesselSphericalPosEncoder`, are precomputed from the `"positions_3d"` conformer property,
+            with the keyword arguments `cutoff` and `max_num_neighbors` of `get_radius_graph_and_triplets`,
+            which must match the ones of the encoder. They are stored as `"precomputed_radius_edge_index"`
+            and `"precomputed_triplet_index"`.
+
+        profiler:
+            If provided, a record of the time spent in each stage of the featurization
+            (parse, hydrogens, adjacency, atom features, conformer, edge features and each
+            positional encoding) is added to the profiler for this molecule.
+            See `graphium.features.profiling.FeaturizationProfiler`.
+
     Returns:
 
         graph_dict:
@@ -1047,15 +1168,21 @@ def mol_to_graph_dict(
     """
 
     input_mol = mol
+    if profiler is not None:
+        profiler.start_molecule()
     try:
         if isinstance(mol, str):
-            mol = dm.to_mol(mol)
-        if explicit_H:
-            mol = Chem.AddHs(mol)
-        else:
-            mol = Chem.RemoveHs(mol)
+            with profile_stage(profiler, "parse"):
+                mol = dm.to_mol(mol)
+        with profile_stage(profiler, "hydrogens"):
+            if explicit_H:
+                mol = Chem.AddHs(mol)
+            else:
+                mol = Chem.RemoveHs(mol)
 
         num_atoms = mol.GetNumAtoms()
+        if profiler is not None:
+            profiler.set_num_atoms(num_atoms)
         if (max_num_atoms is not None) and (num_atoms > max_num_atoms):
             raise ValueError(f"Maximum number of atoms greater than permitted {num_atoms}>{max_num_atoms}")
 
@@ -1076,8 +1203,14 @@ def mol_to_graph_dict(
             use_bonds_weights=use_bonds_weights,
             pos_encoding_as_features=pos_encoding_as_features,
             mask_nan=mask_nan,
+            profiler=profiler,
         )
+        if radius_graph is not None:
+            with profile_stage(profiler, "radius_graph"):
+                radius_dict = get_radius_graph_features(conf_dict, radius_graph)
     except Exception as e:
+        if profiler is not None:
+            profiler.end_molecule(success=False)
         if on_error.lower() == "raise":
             raise e
         elif on_error.lower() == "warn":
@@ -1112,7 +1245,14 @@ def mol_to_graph_dict(
     for key, val in conf_dict.items():
         graph_dict["data"][key] = val
 
+    # put the precomputed radius graph here
+    if radius_graph is not None:
+        for key, val in radius_dict.items():
+            graph_dict["data"][key] = val
+
     graph_dict = GraphDict(graph_dict)
+    if profiler is not None:
+        profiler.end_molecule(success=True)
     return graph_dict
 
 
@@ -1130,6 +1270,8 @@ def mol_to_pyggraph(
     on_error: str = "ignore",
     mask_nan: Union[str, float, type(None)] = "raise",
     max_num_atoms: Optional[int] = None,
+    radius_graph: Optional[Dict[str, Any]] = None,
+    profiler: Optional[FeaturizationProfiler] = None,
 ) -> Union[Data, str]:
     r"""
     Transforms a molecule into an adjacency matrix representing the molecular graph
@@ -1199,6 +1341,19 @@ def mol_to_pyggraph(
             Maximum number of atoms for a given molecule. If a molecule with more atoms
             is give, an error is raised, but catpured according to the rules of
             `on_error`.
+
+        radius_graph:
+            If provided, the radius graph and the triplets used by the DimeNet-style 3D encoders,
+            such as `BesselSphericalPosEncoder`, are precomputed from the `"positions_3d"` conformer property,
+            with the keyword arguments `cutoff` and `max_num_neighbors` of `get_radius_graph_and_triplets`,
+            which must match the ones of the encoder. They are stored as `"precomputed_radius_edge_index"`
+            and `"precomputed_triplet_index"`.
+
+        profiler:
+            If provided, a record of the time spent in each stage of the featurization
+            (parse, hydrogens, adjacency, atom features, conformer, edge features and each
+            positional encoding) is added to the profiler for this molecule.
+            See `graphium.features.profiling.FeaturizationProfiler`.
     Returns:
 
         graph:
@@ -1222,6 +1377,8 @@ def mol_to_pyggraph(
         on_error=on_error,
         mask_nan=mask_nan,
         max_num_atoms=max_num_atoms,
+        radius_graph=radius_graph,
+        profiler=profiler,
     )
 
     if (graph_dict is not None) and not isinstance(graph_dict, str):
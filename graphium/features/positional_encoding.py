@@ -11,12 +11,14 @@ from graphium.features.electrostatic import compute_electrostatic_interactions
 from graphium.features.commute import compute_commute_distances
 from graphium.features.graphormer import compute_graphormer_distances
 from graphium.features.transfer_pos_level import transfer_pos_level
+from graphium.features.profiling import FeaturizationProfiler, profile_stage
 
 
 def get_all_positional_encodings(
     adj: Union[np.ndarray, spmatrix],
     num_nodes: int,
     pos_kwargs: Optional[Dict] = None,
+    profiler: Optional[FeaturizationProfiler] = None,
 ) -> Tuple["OrderedDict[str, np.ndarray]"]:
     r"""
     Get features positional encoding.
@@ -26,6 +28,8 @@ def get_all_positional_encodings(
         num_nodes: Number of nodes in the graph
         pos_encoding_as_features: keyword arguments for function `graph_positional_encoder`
             to generate positional encoding for node features.
+        profiler: If provided, the time spent computing each positional encoding
+            is recorded under the stage `"pe:<pos_name>"`.
 
     Returns:
         pe_dict: Dictionary of positional and structural encodings
@@ -44,14 +48,15 @@ def get_all_positional_encodings(
             this_pos_kwargs = deepcopy(this_pos_kwargs)
             pos_type = this_pos_kwargs.pop("pos_type", None)
             pos_level = this_pos_kwargs.pop("pos_level", None)
-            this_pe, cache = graph_positional_encoder(
-                deepcopy(adj),
-                num_nodes,
-                pos_type=pos_type,
-                pos_level=pos_level,
-                pos_kwargs=this_pos_kwargs,
-                cache=cache,
-            )
+            with profile_stage(profiler, f"pe:{pos_name}"):
+                this_pe, cache = graph_positional_encoder(
+                    deepcopy(adj),
+                    num_nodes,
+                    pos_type=pos_type,
+                    pos_level=pos_level,
+                    pos_kwargs=this_pos_kwargs,
+                    cache=cache,
+                )
             if pos_level == "node":
                 pe_dict.update({f"{pos_type}": this_pe})
             else:
@@ -0,0 +1,165 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZE_BUCKETS = (10, 20, 30, 50, 100)
+
+
+class FeaturizationProfiler:
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        r"""
+        Record the time spent in each stage of the featurization of molecules,
+        such as the parsing, the adjacency matrix, the atom and edge features,
+        or each positional encoding.
+
+        A profiler is passed to `mol_to_graph_dict(..., profiler=profiler)`, which
+        records one entry per molecule. Profilers from different workers can be
+        merged with `FeaturizationProfiler.merge`.
+
+        Parameters:
+            records: Previously recorded molecules, for example from another profiler.
+                Each record is a dictionary with the keys `"num_atoms"`, `"success"`, `"total"`,
+                and the time in seconds spent in each stage.
+        """
+        self.records = [] if records is None else list(records)
+        self._current = None
+        self._start = None
+
+    def start_molecule(self) -> None:
+        """Start recording the featurization of a new molecule"""
+        self._current = {"num_atoms": -1, "success": False}
+        self._start = time.perf_counter()
+
+    def end_molecule(self, success: bool) -> None:
+        """End the recording of the current molecule, and store it in the records"""
+        if self._current is None:
+            return
+        self._current["success"] = success
+        self._current["total"] = time.perf_counter() - self._start
+        self.records.append(self._current)
+        self._current = None
+
+    def set_num_atoms(self, num_atoms: int) -> None:
+        """Set the number of atoms of the current molecule, used to bucket the molecules by size"""
+        if self._current is not None:
+            self._current["num_atoms"] = num_atoms
+
+    @contextmanager
+    def stage(self, name: str):
+        r"""
+        Context manager timing a stage of the featurization of the current molecule.
+        The time of a stage called multiple times is accumulated.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._current is not None:
+                self._current[name] = self._current.get(name, 0.0) + time.perf_counter() - start
+
+    @staticmethod
+    def merge(profilers: Iterable["FeaturizationProfiler"]) -> "FeaturizationProfiler":
+        """Merge the records of multiple profilers, for example from multiple workers"""
+        records = []
+        for profiler in profilers:
+            records.extend(profiler.records)
+        return FeaturizationProfiler(records)
+
+    @property
+    def stage_names(self) -> List[str]:
+        """The name of all recorded stages, in the order they were first recorded"""
+        names = {}
+        for record in self.records:
+            for key in record.keys():
+                if key not in ["num_atoms", "success", "total"]:
+                    names[key] = None
+        return list(names.keys())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """All the records as a dataframe with one row per molecule, and the stage times in seconds"""
+        df = pd.DataFrame(self.records, columns=["num_atoms", "success", "total"] + self.stage_names)
+        return df.fillna({name: 0.0 for name in self.stage_names})
+
+    def summary(self) -> pd.DataFrame:
+        r"""
+        Summary of the time spent in each stage, across all molecules.
+
+        Returns:
+            summary: Dataframe indexed by the stage, with the total time in seconds,
+                the mean time per molecule in milliseconds, and the fraction of the
+                total featurization time.
+        """
+        df = self.to_dataframe()
+        total_time = df["total"].sum()
+        rows = {}
+        for name in self.stage_names + ["total"]:
+            rows[name] = {
+                "total_s": df[name].sum(),
+                "mean_ms": 1000 * df[name].mean(),
+                "fraction": df[name].sum() / total_time if total_time > 0 else 0.0,
+            }
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def latency_percentiles(
+        self,
+        percentiles: Sequence[float] = (50, 90, 99),
+        size_buckets: Sequence[int] = DEFAULT_SIZE_BUCKETS,
+    ) -> pd.DataFrame:
+        r"""
+        Percentiles of the featurization latency per molecule, for buckets of molecule sizes.
+
+        Parameters:
+            percentiles: The percentiles to compute, between 0 and 100
+            size_buckets: The upper bounds (inclusive) of the number of atoms of each bucket.
+                Molecules larger than the last bound are in a last bucket, and molecules that
+                failed before counting the atoms are in the bucket "unknown".
+
+        Returns:
+            latencies: Dataframe indexed by the size bucket, with the number of molecules,
+                the number of failures, and the latency percentiles in milliseconds.
+        """
+        df = self.to_dataframe()
+        bounds = [0] + list(size_buckets)
+        labels = [f"{low + 1}-{high}" for low, high in zip(bounds[:-1], bounds[1:])]
+        buckets = pd.cut(df["num_atoms"], bins=bounds + [np.inf], labels=labels + [f">{bounds[-1]}"])
+        buckets = buckets.cat.add_categories(["unknown"]).fillna("unknown")
+
+        rows = {}
+        for bucket in buckets.cat.categories:
+            this_df = df[buckets == bucket]
+            if len(this_df) == 0:
+                continue
+            row = {"num_mols": len(this_df), "num_failed": int((~this_df["success"].astype(bool)).sum())}
+            for p in percentiles:
+                row[f"p{p:g}_ms"] = 1000 * np.percentile(this_df["total"], p)
+            rows[bucket] = row
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def report(self) -> str:
+        """Human readable report with the per-stage summary and the latency percentiles"""
+        return (
+            f"Featurization profile of {len(self.records)} molecules\n"
+            + self.summary().to_string(float_format="{:.4g}".format)
+            + "\n\nLatency per molecule size (number of atoms)\n"
+            + self.latency_percentiles().to_string(float_format="{:.4g}".format)
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def profile_stage(profiler: Optional[FeaturizationProfiler], name: str):
+    r"""
+    Time a featurization stage if a profiler is provided, otherwise do nothing.
+
+    Parameters:
+        profiler: The profiler, or `None` to disable the profiling
+        name: Name of the stage
+    """
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name)
@@ -0,0 +1,21 @@
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "BatchPredictor": "predict",
+        "predict_to_parquet": "predict",
+        "read_smiles_chunks": "predict",
+        "load_featurization_from_checkpoint": "predict",
+        "MicroBatcher": "server",
+        "PredictionServer": "server",
+        "make_server": "server",
+        "PredictionCache": "cache",
+        "EmbeddingStore": "cache",
+        "make_inference_model": "export",
+        "export_inference_model": "export",
+        "load_inference_model": "export",
+        "quantize_model": "quantization",
+        "quantization_report": "quantization",
+    },
+)
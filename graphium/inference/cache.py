@@ -0,0 +1,307 @@
+r"""
+Persistent cache of the predictions and fingerprints, keyed by the content hash of the model and by molecule id.
+Each output is stored in a memory-mapped matrix with one row per molecule, and a JSON index of the rows.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import torch
+
+from graphium.utils.hashing import get_md5_hash
+
+_VALUES_FILE = "values.dat"
+_INDEX_FILE = "index.json"
+
+
+def checkpoint_content_hash(checkpoint_path: Union[str, os.PathLike], chunk_size: int = 2**20) -> str:
+    r"""
+    SHA256 hash of the content of a checkpoint file, such that a retrained or modified model at the
+    same path does not reuse the cached outputs of the previous one.
+
+    Parameters:
+        checkpoint_path: Path of the checkpoint
+        chunk_size: Number of bytes read at once
+
+    Returns:
+        hash: The hexadecimal hash
+    """
+    dhash = hashlib.sha256()
+    with open(checkpoint_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            dhash.update(chunk)
+    return dhash.hexdigest()
+
+
+def state_dict_content_hash(model: torch.nn.Module) -> str:
+    r"""
+    SHA256 hash of the parameters and buffers of a model, for the models that are not loaded from a checkpoint.
+    """
+    dhash = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        dhash.update(name.encode())
+        dhash.update(tensor.detach().to("cpu").contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+    return dhash.hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        dim: Optional[int] = None,
+        dtype: str = "float16",
+        max_size_mb: float = 1024.0,
+    ):
+        r"""
+        Memory-mapped matrix of float vectors keyed by molecule id, persisted in a folder with the
+        files `values.dat` and `index.json`. The matrix grows on demand up to `max_size_mb`, after
+        which the least recently used rows are evicted.
+
+        Parameters:
+            path: The folder of the store. An existing store is reopened with its own `dim` and `dtype`.
+            dim: The size of the vectors. Can be `None` for a store that is reopened.
+            dtype: The storage type, `"float16"` or `"float32"`. The vectors are always returned as float32.
+            max_size_mb: Maximum size of the matrix, in MB
+        """
+        self.path = str(path)
+        self.max_size_mb = max_size_mb
+        self.hits = 0
+        self.misses = 0
+        self._values = None
+
+        index_path = os.path.join(self.path, _INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as file:
+                index = json.load(file)
+            self.dim = index["dim"]
+            self.dtype = np.dtype(index["dtype"])
+            self._slot_ids: List[Optional[str]] = index["mol_ids"]
+            self._last_used = np.asarray(index["last_used"], dtype=np.int64)
+            self._clock = index["clock"]
+            if (dim is not None) and (dim != self.dim):
+                raise ValueError(f"The store `{self.path}` has dimension {self.dim}, not {dim}")
+        else:
+            if dim is None:
+                raise ValueError(f"`dim` must be provided to create the store `{self.path}`")
+            self.dim = int(dim)
+            self.dtype = np.dtype(dtype)
+            self._slot_ids = []
+            self._last_used = np.zeros(0, dtype=np.int64)
+            self._clock = 0
+        if self.dtype not in (np.float16, np.float32):
+            raise ValueError(f"Unsupported dtype `{self.dtype}`, choose from `float16` or `float32`")
+
+        self.capacity = max(int(max_size_mb * 1024**2 // (self.dim * self.dtype.itemsize)), 1)
+        self._index = {mol_id: slot for slot, mol_id in enumerate(self._slot_ids) if mol_id is not None}
+        self._free_slots = [slot for slot, mol_id in enumerate(self._slot_ids) if mol_id is None]
+        if len(self._slot_ids) > 0:
+            self._open(len(self._slot_ids))
+
+    def _open(self, num_slots: int) -> None:
+        """(Re)open the memory map with `num_slots` rows, growing the file if needed"""
+        os.makedirs(self.path, exist_ok=True)
+        values_path = os.path.join(self.path, _VALUES_FILE)
+        if self._values is not None:
+            self._values.flush()
+            self._values = None
+        with open(values_path, "ab") as file:
+            file.truncate(num_slots * self.dim * self.dtype.itemsize)
+        self._values = np.memmap(values_path, dtype=self.dtype, mode="r+", shape=(num_slots, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, mol_id: str) -> bool:
+        return mol_id in self._index
+
+    def lookup(self, mol_ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        r"""
+        Get the vectors of a batch of molecules.
+
+        Parameters:
+            mol_ids: The molecule ids
+
+        Returns:
+            values: Array of shape `(len(mol_ids), dim)`, with NaN rows for the missing molecules
+            found: Boolean array of the molecules found in the store
+        """
+        slots = np.array([self._index.get(mol_id, -1) for mol_id in mol_ids], dtype=np.int64)
+        found = slots >= 0
+        values = np.full((len(mol_ids), self.dim), np.nan, dtype=np.float32)
+        if found.any():
+            values[found] = self._values[slots[found]]
+            self._clock += 1
+            self._last_used[slots[found]] = self._clock
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return values, found
+
+    def insert(self, mol_ids: Sequence[str], values: np.ndarray) -> None:
+        r"""
+        Insert or overwrite the vectors of a batch of molecules, evicting the least recently used
+        molecules when the store is full.
+
+        Parameters:
+            mol_ids: The molecule ids
+            values: Array of shape `(len(mol_ids), dim)`
+        """
+        values = np.asarray(values).reshape(len(mol_ids), -1)
+        if values.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {values.shape[1]}")
+
+        # Keep the last occurrence of each molecule, and at most `capacity` molecules
+        rows = {mol_id: ii for ii, mol_id in enumerate(mol_ids)}
+        mol_ids, rows = list(rows.keys())[-self.capacity :], list(rows.values())[-self.capacity :]
+        slots = np.array([self._index.get(mol_id, -1) for mol_id in mol_ids], dtype=np.int64)
+        new = np.flatnonzero(slots < 0)
+
+        # Use the free slots, then grow the matrix, then evict the least recently used molecules
+        new_slots = self._free_slots[: len(new)]
+        self._free_slots = self._free_slots[len(new) :]
+        num_grow = min(len(new) - len(new_slots), self.capacity - len(self._slot_ids))
+        if num_grow > 0:
+            num_slots = min(max(len(self._slot_ids) + num_grow, 2 * len(self._slot_ids)), self.capacity)
+            new_slots += list(range(len(self._slot_ids), len(self._slot_ids) + num_grow))
+            self._free_slots += list(range(len(self._slot_ids) + num_grow, num_slots))
+            self._slot_ids += [None] * (num_slots - len(self._slot_ids))
+            self._last_used = np.concatenate(
+                [self._last_used, np.zeros(num_slots - len(self._last_used), dtype=np.int64)]
+            )
+            self._open(num_slots)
+        num_evict = len(new) - len(new_slots)
+        if num_evict > 0:
+            # The slots of the molecules being inserted or updated are protected from the eviction
+            last_used = self._last_used.copy()
+            last_used[slots[slots >= 0]] = np.iinfo(np.int64).max
+            last_used[new_slots] = np.iinfo(np.int64).max
+            evicted = np.argpartition(last_used, num_evict - 1)[:num_evict]
+            for slot in evicted:
+                del self._index[self._slot_ids[slot]]
+            new_slots += evicted.tolist()
+
+        slots[new] = new_slots
+        for ii in new:
+            self._slot_ids[slots[ii]] = mol_ids[ii]
+            self._index[mol_ids[ii]] = int(slots[ii])
+        self._values[slots] = values[rows].astype(self.dtype)
+        self._clock += 1
+        self._last_used[slots] = self._clock
+
+    def flush(self) -> None:
+        """Write the matrix and the index to disk"""
+        if self._values is None:
+            return
+        self._values.flush()
+        index = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "clock": self._clock,
+            "mol_ids": self._slot_ids,
+            "last_used": self._last_used.tolist(),
+        }
+        # Write the index atomically, such that an interrupted flush does not corrupt the store
+        index_path = os.path.join(self.path, _INDEX_FILE)
+        with open(index_path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(index_path + ".tmp", index_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of molecules, the capacity, the size in MB, and the hits and misses of the store"""
+        return {
+            "num_molecules": len(self),
+            "capacity": self.capacity,
+            "size_mb": len(self._slot_ids) * self.dim * self.dtype.itemsize / 1024**2,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PredictionCache:
+    def __init__(
+        self,
+        cache_dir: Union[str, os.PathLike],
+        model_hash: str,
+        dtype: str = "float16",
+        max_size_mb: float = 1024.0,
+    ):
+        r"""
+        Persistent cache of the outputs of a model, with one `EmbeddingStore` per output.
+        The stores are kept in the folder `{cache_dir}/{model_hash}`, such that several models can share
+        the same cache directory.
+
+        Parameters:
+            cache_dir: The root folder of the cache
+            model_hash: The content hash of the model, see `checkpoint_content_hash`. It must also
+                identify the featurization and any option changing the outputs.
+            dtype: The storage type of the new stores, `"float16"` or `"float32"`
+            max_size_mb: Maximum size of each output matrix, in MB
+        """
+        self.path = os.path.join(str(cache_dir), model_hash)
+        self.dtype = dtype
+        self.max_size_mb = max_size_mb
+        self.stores: Dict[str, EmbeddingStore] = {}
+
+    @staticmethod
+    def make_model_hash(model_hash: str, **options) -> str:
+        """Combine the content hash of the model with the options changing its outputs, such as the featurization"""
+        return get_md5_hash({"model_hash": model_hash, **options})
+
+    def _get_store(self, key: str, dim: Optional[int] = None) -> Optional[EmbeddingStore]:
+        """Get the store of an output, loading it from disk if needed, or creating it if `dim` is provided"""
+        if key not in self.stores:
+            path = os.path.join(self.path, key)
+            if (dim is None) and not os.path.exists(os.path.join(path, _INDEX_FILE)):
+                return None
+            self.stores[key] = EmbeddingStore(path, dim=dim, dtype=self.dtype, max_size_mb=self.max_size_mb)
+        return self.stores[key]
+
+    def lookup(self, mol_ids: Sequence[str], keys: Sequence[str]) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        r"""
+        Get the cached outputs of a batch of molecules.
+
+        Parameters:
+            mol_ids: The molecule ids
+            keys: The outputs to get
+
+        Returns:
+            values: The array of shape `(len(mol_ids), dim)` of each output, for the outputs with a store
+            found: Boolean array of the molecules found for all the outputs
+        """
+        values = {}
+        found = np.ones(len(mol_ids), dtype=bool)
+        for key in keys:
+            store = self._get_store(key)
+            if store is None:
+                found[:] = False
+                continue
+            values[key], key_found = store.lookup(mol_ids)
+            found &= key_found
+        return values, found
+
+    def insert(self, mol_ids: Sequence[str], values: Dict[str, np.ndarray]) -> None:
+        r"""
+        Insert the outputs of a batch of molecules, and write them to disk.
+
+        Parameters:
+            mol_ids: The molecule ids
+            values: The array of shape `(len(mol_ids), dim)` of each output
+        """
+        if len(mol_ids) == 0:
+            return
+        for key, key_values in values.items():
+            store = self._get_store(key, dim=key_values.shape[1])
+            store.insert(mol_ids, key_values)
+            store.flush()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the statistics of the store of each output, see `EmbeddingStore.stats`"""
+        return {key: store.stats() for key, store in self.stores.items()}
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(path={self.path}, dtype={self.dtype}, max_size_mb={self.max_size_mb})"
+        )
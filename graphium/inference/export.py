@@ -0,0 +1,319 @@
+r"""
+Export of a trained model for inference only. The task heads and the task levels that are not needed are pruned,
+the batch normalizations are folded into the preceding linear layers, and the dropout and DropPath layers are
+removed. The exported model is verified against the original model before it is saved.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import os
+import json
+import zipfile
+from copy import deepcopy
+from functools import partial
+
+import numpy as np
+import torch
+from torch import Tensor, nn
+from torch_geometric.data import Batch
+from loguru import logger
+
+from graphium.data.collate import graphium_collate_fn
+from graphium.data.smiles_transform import did_featurization_fail
+from graphium.data.utils import load_micro_zinc
+from graphium.features.featurizer import mol_to_graph_dict
+from graphium.nn.base_graph_layer import BaseGraphStructure
+from graphium.nn.base_layers import DropPath, FCLayer
+from graphium.nn.architectures import FullGraphMultiTaskNetwork
+from graphium.nn.architectures.compiled_network import TupleForward, lower_batch
+from graphium.inference.predict import load_featurization_from_checkpoint
+from graphium.trainer.predictor import PredictorModule
+
+_METADATA_FILE = "metadata.json"
+
+# Number of the bundled micro ZINC molecules used to verify the exported model
+NUM_VERIFICATION_MOLECULES = 128
+
+
+def prune_task_heads(model: FullGraphMultiTaskNetwork, tasks: Sequence[str]) -> FullGraphMultiTaskNetwork:
+    r"""
+    Remove the task heads that are not in `tasks`, and the graph output networks of the task levels
+    that are no longer used. The model is modified in place.
+
+    Parameters:
+        model: The network with its task heads
+        tasks: The names of the task heads to keep
+
+    Returns:
+        model: The pruned model
+    """
+    task_heads = model.task_heads
+    if task_heads is None:
+        raise ValueError("The model has no task heads to prune")
+    unknown = [task for task in tasks if task not in task_heads.task_heads]
+    if (len(unknown) > 0) or (len(tasks) == 0):
+        raise ValueError(
+            f"Unknown tasks {unknown}, choose at least one from {list(task_heads.task_heads.keys())}"
+        )
+
+    for task in list(task_heads.task_heads.keys()):
+        if task not in tasks:
+            del task_heads.task_heads[task]
+            del task_heads.task_heads_kwargs[task]
+            model._task_heads_kwargs = {
+                name: kwargs for name, kwargs in model._task_heads_kwargs.items() if name != task
+            }
+
+    task_heads.task_levels = {kwargs["task_level"] for kwargs in task_heads.task_heads_kwargs.values()}
+    for task_level in list(task_heads.graph_output_nn.keys()):
+        if task_level not in task_heads.task_levels:
+            del task_heads.graph_output_nn[task_level]
+    return model
+
+
+@torch.no_grad()
+def fold_batch_norm(module: nn.Module) -> int:
+    r"""
+    Fold the batch normalization of the `FCLayer` into their linear layer, using the running statistics.
+    The layers are modified in place, and must be in evaluation mode to give the same outputs.
+    The normalizations without running statistics, and the layer normalizations, are kept.
+
+    Parameters:
+        module: The module containing the `FCLayer`
+
+    Returns:
+        num_folded: The number of folded normalizations
+    """
+    num_folded = 0
+    for layer in module.modules():
+        norm = getattr(layer, "normalization", None)
+        if (not isinstance(layer, FCLayer)) or (not isinstance(norm, nn.BatchNorm1d)):
+            continue
+        if norm.running_mean is None:
+            continue
+
+        # y = ((W x + b) - mean) * weight / std + bias = (scale * W) x + (b - mean) * scale + bias
+        linear = layer.linear
+        scale = torch.rsqrt(norm.running_var + norm.eps)
+        shift = -norm.running_mean * scale
+        if norm.affine:
+            scale = scale * norm.weight
+            shift = shift * norm.weight + norm.bias
+        linear.weight.mul_(scale.unsqueeze(-1).to(linear.weight.dtype))
+        if linear.bias is None:
+            linear.bias = nn.Parameter(torch.zeros_like(shift, dtype=linear.weight.dtype))
+        else:
+            shift = shift + linear.bias * scale
+        linear.bias.copy_(shift)
+        layer.normalization = None
+        num_folded += 1
+    return num_folded
+
+
+def strip_dropout(module: nn.Module) -> int:
+    r"""
+    Remove the dropout and DropPath layers, which do nothing in evaluation mode. The layers that skip them when
+    they are `None`, such as `FCLayer` and the graph layers, no longer call them, and the other dropout layers are
+    replaced by `nn.Identity`. The module is modified in place.
+
+    Parameters:
+        module: The module containing the dropout layers
+
+    Returns:
+        num_stripped: The number of removed layers
+    """
+    num_stripped = 0
+    for layer in list(module.modules()):
+        if isinstance(layer, FCLayer):
+            names = ["dropout", "drop_path"]
+        elif isinstance(layer, BaseGraphStructure):
+            names = ["dropout_layer", "droppath_layer"]
+        else:
+            names = []
+        for name in names:
+            if getattr(layer, name, None) is not None:
+                setattr(layer, name, None)
+                num_stripped += 1
+
+    for layer in list(module.modules()):
+        for name, child in list(layer.named_children()):
+            if isinstance(child, nn.modules.dropout._DropoutNd):
+                setattr(layer, name, nn.Identity())
+                num_stripped += 1
+            elif isinstance(child, DropPath):
+                logger.warning(
+                    f"DropPath `{name}` of `{layer.__class__.__name__}` is kept, since it is not optional"
+                )
+    return num_stripped
+
+
+def make_inference_model(model: nn.Module, tasks: Optional[Sequence[str]] = None) -> nn.Module:
+    r"""
+    Make a slim copy of a network for inference: the unused task heads are pruned, the batch normalizations
+    are folded, the dropout layers are removed, and the parameters do not require gradients.
+
+    Parameters:
+        model: The trained network, such as a `FullGraphMultiTaskNetwork`. It is not modified.
+        tasks: The names of the task heads to keep. Defaults to all the tasks.
+
+    Returns:
+        model: The inference model, in evaluation mode
+    """
+    model = deepcopy(model).eval()
+    if tasks is not None:
+        prune_task_heads(model, tasks)
+    num_folded = fold_batch_norm(model)
+    num_stripped = strip_dropout(model)
+    model.requires_grad_(False)
+    logger.info(
+        f"Inference model: {num_folded} batch normalizations folded, {num_stripped} dropout layers removed"
+    )
+    return model
+
+
+def make_verification_batch(
+    featurization: Dict[str, Any],
+    smiles: Optional[Sequence[str]] = None,
+    dtype: torch.dtype = torch.float32,
+) -> Batch:
+    r"""
+    Featurize and collate the molecules used to verify an exported model.
+
+    Parameters:
+        featurization: The arguments of `mol_to_graph_dict`
+        smiles: The molecules. Defaults to the first `NUM_VERIFICATION_MOLECULES` of the bundled micro ZINC.
+        dtype: The type of the floating point features
+
+    Returns:
+        batch: The batch of the successfully featurized molecules
+    """
+    if smiles is None:
+        smiles = load_micro_zinc()["SMILES"].iloc[:NUM_VERIFICATION_MOLECULES].tolist()
+    transform = partial(mol_to_graph_dict, **featurization)
+    features = [feat for feat in map(transform, smiles) if not did_featurization_fail(feat)]
+    if len(features) == 0:
+        raise ValueError("None of the verification molecules could be featurized")
+    batch = graphium_collate_fn([{"features": feat} for feat in features], mask_nan=0)["features"]
+    for key, value in batch.items():
+        if isinstance(value, Tensor) and value.is_floating_point():
+            batch[key] = value.to(dtype)
+    return batch
+
+
+def _run(model: nn.Module, batch: Batch) -> Dict[str, Tensor]:
+    """Run a network on a copy of the batch, since the forward overwrites the features"""
+    with torch.no_grad():
+        return model(batch.clone())
+
+
+def export_inference_model(
+    checkpoint_path: Union[str, os.PathLike],
+    output_path: Union[str, os.PathLike],
+    tasks: Optional[Sequence[str]] = None,
+    trace: bool = False,
+    featurization: Optional[Dict[str, Any]] = None,
+    smiles: Optional[Sequence[str]] = None,
+    rtol: float = 1e-5,
+    atol: float = 1e-5,
+) -> Dict[str, float]:
+    r"""
+    Export the network of a checkpoint for inference with `make_inference_model`, verify its outputs against
+    the original network, and save it with its metadata. Load it back with `load_inference_model`.
+
+    - `trace=False`: The model is saved with `torch.save`, and takes a pyg `Batch` like the original network.
+    - `trace=True`: The model is traced with `torch.jit.trace` on the verification batch, and saved with
+      `torch.jit.save`. It takes the tensors of the batch in the order of the `"input_keys"` of the metadata,
+      see `lower_batch`, and returns the predictions in the order of the `"output_keys"`. As for
+      `CompiledGraphNetwork`, the trace is specialized to the shapes of the verification batch, such as the
+      number of graphs, so it is meant for batches padded to a fixed size.
+
+    Parameters:
+        checkpoint_path: Path of the checkpoint of a `PredictorModule`
+        output_path: Path of the exported model
+        tasks: The names of the task heads to keep. Defaults to all the tasks.
+        trace: Whether to save a TorchScript trace of the model
+        featurization: The arguments of the featurizer. By default, they are loaded from the checkpoint.
+        smiles: The molecules of the verification. Defaults to the bundled micro ZINC molecules,
+            see `make_verification_batch`.
+        rtol: The relative tolerance of the verification
+        atol: The absolute tolerance of the verification
+
+    Returns:
+        max_abs_diff: The maximum absolute difference with the original network, for each task
+
+    Raises:
+        AssertionError: If the outputs of the exported model differ from the original ones
+    """
+    if featurization is None:
+        featurization = load_featurization_from_checkpoint(checkpoint_path)
+    if featurization is None:
+        raise ValueError(
+            f"The checkpoint `{checkpoint_path}` does not contain the featurization, it must be provided"
+        )
+    predictor = PredictorModule.load_from_checkpoint(checkpoint_path, map_location="cpu")
+    original = predictor.model.eval()
+    model = make_inference_model(original, tasks)
+    tasks = list(model.task_heads.task_heads.keys())
+
+    batch = make_verification_batch(featurization, smiles=smiles, dtype=predictor.dtype)
+    expected = _run(original, batch)
+    # The type of the features is saved by name, such that the metadata can be saved as JSON with the trace
+    featurization = dict(featurization)
+    if featurization.get("dtype", None) is not None:
+        featurization["dtype"] = np.dtype(featurization["dtype"]).name
+    metadata = {
+        "tasks": tasks,
+        "task_levels": {task: model.task_heads.task_heads_kwargs[task]["task_level"] for task in tasks},
+        "featurization": featurization,
+        "traced": trace,
+    }
+    if trace:
+        input_keys, tensors = lower_batch(batch)
+        tuple_forward = TupleForward(model, input_keys)
+        with torch.no_grad():
+            exported = torch.jit.trace(tuple_forward, tensors, check_trace=False, strict=False)
+            outputs = tuple_forward.unpack_outputs(exported(*tensors))
+        metadata.update(input_keys=list(input_keys), output_keys=list(tuple_forward.output_keys))
+    else:
+        outputs = _run(model, batch)
+
+    max_abs_diff = {}
+    for task in tasks:
+        torch.testing.assert_close(outputs[task], expected[task], rtol=rtol, atol=atol, equal_nan=True)
+        max_abs_diff[task] = float((outputs[task] - expected[task]).abs().nan_to_num().max())
+    logger.info(
+        f"Inference model of tasks {tasks} verified on {batch.num_graphs} molecules, "
+        f"max absolute differences: {max_abs_diff}"
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if trace:
+        torch.jit.save(exported, str(output_path), _extra_files={_METADATA_FILE: json.dumps(metadata)})
+    else:
+        torch.save({"model": model, "metadata": metadata}, str(output_path))
+    logger.info(f"Inference model saved to `{output_path}`")
+    return max_abs_diff
+
+
+def load_inference_model(
+    path: Union[str, os.PathLike], map_location: Union[str, torch.device] = "cpu"
+) -> Tuple[nn.Module, Dict[str, Any]]:
+    r"""
+    Load a model saved by `export_inference_model`.
+
+    Parameters:
+        path: Path of the exported model
+        map_location: The device of the model
+
+    Returns:
+        model: The inference model, or its TorchScript trace
+        metadata: The tasks, their level, the featurization, and the input and output keys of a trace
+    """
+    with zipfile.ZipFile(path) as file:
+        traced = any(name.endswith(f"extra/{_METADATA_FILE}") for name in file.namelist())
+    if traced:
+        extra_files = {_METADATA_FILE: ""}
+        model = torch.jit.load(str(path), map_location=map_location, _extra_files=extra_files)
+        return model, json.loads(extra_files[_METADATA_FILE])
+    exported = torch.load(path, map_location=map_location)
+    return exported["model"], exported["metadata"]
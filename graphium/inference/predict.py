@@ -0,0 +1,444 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import os
+import sys
+import itertools
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import torch
+import datamol as dm
+import fastparquet
+from loguru import logger
+from torch import Tensor
+from pytorch_lightning.utilities.cloud_io import load as pl_load
+
+from graphium.data.collate import graphium_collate_fn
+from graphium.data.smiles_transform import (
+    BatchingSmilesTransform,
+    did_featurization_fail,
+    smiles_to_unique_mol_id,
+)
+from graphium.features.featurizer import mol_to_graph_dict
+from graphium.inference.quantization import quantize_model
+from graphium.inference.cache import PredictionCache, checkpoint_content_hash, state_dict_content_hash
+from graphium.trainer.predictor import PredictorModule
+
+PREDICTION_OUTPUTS = ["preds", "fingerprints"]
+
+
+def read_smiles_chunks(
+    input_path: Union[str, os.PathLike],
+    smiles_col: str = "smiles",
+    id_col: Optional[str] = None,
+    chunk_size: int = 10_000,
+) -> Iterator[pd.DataFrame]:
+    r"""
+    Read the SMILES of a file in chunks, such that the memory stays bounded regardless of the file size.
+
+    Parameters:
+        input_path: Path of a CSV, TSV or parquet file, compressed or not, or of a text file with one SMILES
+            per line (`.smi` or `.txt`). Use `"-"` to read one SMILES per line from the standard input.
+        smiles_col: Column of the SMILES. Ignored for the text files.
+        id_col: Optional column of the molecule identifiers, which is kept in the outputs
+        chunk_size: Maximum number of molecules of each chunk
+
+    Returns:
+        chunks: Iterator of dataframes with the column `smiles_col`, and `id_col` if provided
+    """
+    input_path = str(input_path)
+    columns = [smiles_col] if id_col is None else [id_col, smiles_col]
+
+    if input_path == "-":
+        yield from _read_lines_chunks(sys.stdin, smiles_col=smiles_col, chunk_size=chunk_size)
+        return
+
+    path = input_path.lower()
+    if path.endswith((".smi", ".txt")):
+        with open(input_path, "r") as file:
+            yield from _read_lines_chunks(file, smiles_col=smiles_col, chunk_size=chunk_size)
+    elif path.endswith(".parquet"):
+        # Row groups are read one at a time, then split or merged into chunks
+        row_groups = fastparquet.ParquetFile(input_path).iter_row_groups(columns=columns)
+        yield from _rechunk(row_groups, chunk_size=chunk_size)
+    elif path.endswith((".csv", ".csv.gz", ".tsv", ".tsv.gz")):
+        sep = "\t" if ".tsv" in path else ","
+        yield from pd.read_csv(input_path, usecols=columns, sep=sep, chunksize=chunk_size)
+    else:
+        raise ValueError(f"Unsupported file extension for `{input_path}`")
+
+
+def _read_lines_chunks(file, smiles_col: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read a file with one SMILES per line, optionally followed by other whitespace-separated fields"""
+    lines = (line.split() for line in file)
+    smiles = (fields[0] for fields in lines if len(fields) > 0)
+    while True:
+        chunk = list(itertools.islice(smiles, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield pd.DataFrame({smiles_col: chunk})
+
+
+def _rechunk(dataframes: Iterable[pd.DataFrame], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Split or merge the dataframes into chunks of `chunk_size` rows"""
+    buffer, buffer_size = [], 0
+    for df in dataframes:
+        buffer.append(df)
+        buffer_size += len(df)
+        while buffer_size >= chunk_size:
+            df = pd.concat(buffer, ignore_index=True)
+            yield df.iloc[:chunk_size].reset_index(drop=True)
+            buffer, buffer_size = [df.iloc[chunk_size:]], len(df) - chunk_size
+    if buffer_size > 0:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def load_featurization_from_checkpoint(checkpoint_path: Union[str, os.PathLike]) -> Optional[Dict[str, Any]]:
+    r"""
+    Load the arguments of the featurizer saved with a checkpoint by `PredictorModule.on_save_checkpoint`.
+
+    Returns:
+        featurization: The arguments of `mol_to_graph_dict`, or `None` if the checkpoint does not contain them
+    """
+    checkpoint = pl_load(checkpoint_path, map_location="cpu")
+    return checkpoint.get("featurization", None)
+
+
+class BatchPredictor:
+    def __init__(
+        self,
+        predictor: PredictorModule,
+        featurization: Dict[str, Any],
+        batch_size: int = 256,
+        n_jobs: int = 0,
+        device: Union[str, torch.device] = "cpu",
+        concat_last_layers: Optional[Union[int, Sequence[int]]] = None,
+        fingerprint_task_level: str = "graph",
+        cache_dir: Optional[Union[str, os.PathLike]] = None,
+        cache_dtype: str = "float16",
+        cache_max_size_mb: float = 1024.0,
+        model_hash: Optional[str] = None,
+        quantization: Optional[str] = None,
+    ):
+        r"""
+        Predict the properties and the fingerprints of molecules from their SMILES, with batched forward passes.
+
+        Parameters:
+            predictor: The trained predictor. Only the graph-level tasks are predicted.
+            featurization: The arguments of `mol_to_graph_dict`, which must be identical to the ones used
+                for the training. See `load_featurization_from_checkpoint`.
+            batch_size: Number of molecules in each forward pass
+            n_jobs: Number of workers for the featurization. `0` featurizes in the main process.
+            device: The device of the model
+            concat_last_layers: The layers of the graph output network to concatenate as fingerprints,
+                in reverse order (`0` is the last layer). See `GraphOutputNN.concat_last_layers`.
+                Defaults to the last layer.
+            fingerprint_task_level: The task level of the graph output network used for the fingerprints
+            cache_dir: Optional folder of a persistent `PredictionCache`. The molecules found in the cache
+                are neither featurized nor predicted again.
+            cache_dtype: The storage type of the cache, `"float16"` or `"float32"`
+            cache_max_size_mb: Maximum size of the cache of each output, in MB
+            model_hash: The content hash of the model for the cache. Given by `from_checkpoint`,
+                and computed from the parameters of the model when `None`.
+            quantization: Optional quantization mode of the model, among `QUANTIZATION_MODES`,
+                see `quantize_model`. The int8 modes are only available on CPU.
+        """
+        if (
+            (quantization is not None)
+            and quantization.startswith("int8")
+            and (torch.device(device).type != "cpu")
+        ):
+            raise ValueError(f"The quantization `{quantization}` is only available on CPU")
+        self.predictor = predictor.to(device).eval()
+        self.featurization = dict(featurization)
+        self.smiles_transformer = partial(mol_to_graph_dict, **self.featurization)
+        self.collate_fn = partial(graphium_collate_fn, mask_nan=0)
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.device = torch.device(device)
+        if (concat_last_layers is not None) and not isinstance(concat_last_layers, Iterable):
+            concat_last_layers = [concat_last_layers]
+        self.concat_last_layers = [0] if concat_last_layers is None else list(concat_last_layers)
+        self.fingerprint_task_level = fingerprint_task_level
+
+        # Only the graph-level tasks have one prediction per molecule
+        task_heads_kwargs = self.predictor.model_kwargs["task_heads_kwargs"]
+        self.task_keys = {}
+        for task, kwargs in task_heads_kwargs.items():
+            task_key = self.predictor._get_task_key(task_level=kwargs["task_level"], task=task)
+            if kwargs["task_level"] == "graph":
+                self.task_keys[task] = task_key
+            else:
+                logger.warning(f"Task `{task_key}` is not predicted, since it is not a graph-level task")
+
+        self.cache = None
+        if cache_dir is not None:
+            if model_hash is None:
+                model_hash = state_dict_content_hash(self.predictor)
+            # The quantized models have different outputs, so they have their own entries
+            options = {} if quantization is None else {"quantization": quantization}
+            model_hash = PredictionCache.make_model_hash(
+                model_hash, featurization=self.featurization, **options
+            )
+            self.cache = PredictionCache(
+                cache_dir, model_hash=model_hash, dtype=cache_dtype, max_size_mb=cache_max_size_mb
+            )
+
+        self.quantization = quantization
+        if quantization is not None:
+            self.predictor.model = quantize_model(self.predictor.model, quantization)
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        checkpoint_path: Union[str, os.PathLike],
+        featurization: Optional[Dict[str, Any]] = None,
+        device: Union[str, torch.device] = "cpu",
+        **kwargs,
+    ) -> "BatchPredictor":
+        r"""
+        Load a predictor from a checkpoint.
+
+        Parameters:
+            checkpoint_path: Path of the checkpoint
+            featurization: The arguments of the featurizer. By default, they are loaded from the checkpoint.
+            device: The device of the model
+            kwargs: Other arguments of `BatchPredictor`
+        """
+        if featurization is None:
+            featurization = load_featurization_from_checkpoint(checkpoint_path)
+        if featurization is None:
+            raise ValueError(
+                f"The checkpoint `{checkpoint_path}` does not contain the featurization, it must be provided"
+            )
+        predictor = PredictorModule.load_from_checkpoint(checkpoint_path, map_location=device)
+        if kwargs.get("cache_dir", None) is not None:
+            kwargs.setdefault("model_hash", checkpoint_content_hash(checkpoint_path))
+        return cls(predictor=predictor, featurization=featurization, device=device, **kwargs)
+
+    def featurize(self, smiles: Sequence[str]) -> List[Any]:
+        r"""
+        Featurize the molecules, with the failed featurizations given as `None` or as an error message.
+        """
+        batch_size = BatchingSmilesTransform.parse_batch_size(
+            numel=len(smiles), desired_batch_size=1000, n_jobs=self.n_jobs
+        )
+        return dm.parallelized_with_batches(
+            BatchingSmilesTransform(self.smiles_transformer),
+            smiles,
+            batch_size=batch_size,
+            n_jobs=self.n_jobs,
+        )
+
+    @torch.inference_mode()
+    def _forward(self, features: List[Any], outputs: Sequence[str]) -> Dict[str, Tensor]:
+        """Forward pass on a batch of featurized molecules"""
+        batch = self.collate_fn([{"features": feat} for feat in features])
+        batch["features"] = batch["features"].to(self.device)
+        model = self.predictor.model
+
+        # The graph entering the graph output network is captured to compute the fingerprints.
+        # The hook is on the graph output network, since the task heads are called with `forward` directly.
+        captured = {}
+        handle = None
+        graph_output_nn = model.task_heads.graph_output_nn[self.fingerprint_task_level]
+        if "fingerprints" in outputs:
+            handle = graph_output_nn.register_forward_hook(
+                lambda module, args, output: captured.update(graph=args[0])
+            )
+        try:
+            preds = self.predictor.forward(batch)["preds"]
+        finally:
+            if handle is not None:
+                handle.remove()
+
+        results = {}
+        if "preds" in outputs:
+            for task, task_key in self.task_keys.items():
+                pred = preds[task]
+                if (self.predictor.task_norms is not None) and (task_key in self.predictor.task_norms):
+                    pred = self.predictor.task_norms[task_key].denormalize(pred)
+                results[task_key] = pred
+
+        if "fingerprints" in outputs:
+            previous_layers = graph_output_nn.concat_last_layers
+            graph_output_nn.concat_last_layers = self.concat_last_layers
+            try:
+                results["fingerprints"] = graph_output_nn.forward(captured["graph"])
+            finally:
+                graph_output_nn.concat_last_layers = previous_layers
+
+        return results
+
+    def predict(self, smiles: Sequence[str], outputs: Sequence[str] = ("preds",)) -> Dict[str, np.ndarray]:
+        r"""
+        Predict a list of molecules.
+
+        Parameters:
+            smiles: The SMILES of the molecules
+            outputs: The outputs to compute, among `"preds"` and `"fingerprints"`
+
+        Returns:
+            results: Dictionary with the key `"valid"`, a boolean array of the molecules that were
+                featurized successfully, and an array of shape `(len(smiles), dim)` per graph-level
+                task and for the key `"fingerprints"`. The rows of the invalid molecules are NaN.
+        """
+        smiles = list(smiles)
+        if self.cache is None:
+            return self.predict_features(self.featurize(smiles), outputs=outputs)
+
+        # Only the molecules missing from the cache are featurized and predicted
+        mol_ids = [smiles_to_unique_mol_id(s) for s in smiles]
+        cache_keys = self._cache_keys(outputs)
+        cached, found = self.cache.lookup(mol_ids, keys=list(cache_keys.values()))
+        missing = np.flatnonzero(~found)
+        predicted = self.predict_features(self.featurize([smiles[ii] for ii in missing]), outputs=outputs)
+
+        results = {}
+        for key, cache_key in cache_keys.items():
+            values = cached.get(cache_key, None)
+            if values is None:
+                values = np.full((len(smiles), predicted[key].shape[1]), np.nan, dtype=np.float32)
+            values[missing] = predicted[key]
+            results[key] = values
+        results["valid"] = found.copy()
+        results["valid"][missing] = predicted["valid"]
+
+        # Invalid molecules are never cached
+        insert = missing[predicted["valid"] & (np.array(mol_ids, dtype=object)[missing] != "")]
+        if len(insert) > 0:
+            self.cache.insert(
+                [mol_ids[ii] for ii in insert],
+                {cache_key: results[key][insert] for key, cache_key in cache_keys.items()},
+            )
+        return results
+
+    def _cache_keys(self, outputs: Sequence[str]) -> Dict[str, str]:
+        """The name in the cache of each output, with the options of the fingerprints in their name"""
+        cache_keys = {}
+        if "preds" in outputs:
+            cache_keys.update({task_key: task_key for task_key in self.task_keys.values()})
+        if "fingerprints" in outputs:
+            layers = "-".join(str(layer) for layer in self.concat_last_layers)
+            cache_keys["fingerprints"] = f"fingerprints_{self.fingerprint_task_level}_{layers}"
+        return cache_keys
+
+    def output_dims(self, outputs: Sequence[str] = ("preds",)) -> Dict[str, int]:
+        r"""
+        The dimension of each output, with one key per graph-level task and the key `"fingerprints"`.
+        See `BatchPredictor.predict` for the parameters.
+        """
+        task_heads = self.predictor.model.task_heads
+        dims = {}
+        if "preds" in outputs:
+            for task, task_key in self.task_keys.items():
+                dims[task_key] = task_heads.task_heads[task].out_dim
+        if "fingerprints" in outputs:
+            # Same order as `GraphOutputNN.concat_last_layers`, with `0` the output of the last layer
+            graph_output_nn = task_heads.graph_output_nn[self.fingerprint_task_level].graph_output_nn
+            layer_dims = [layer.out_dim for layer in reversed(graph_output_nn.layers)] + [
+                graph_output_nn.in_dim
+            ]
+            dims["fingerprints"] = sum(layer_dims[ii] for ii in self.concat_last_layers)
+        return dims
+
+    def predict_features(
+        self, features: List[Any], outputs: Sequence[str] = ("preds",)
+    ) -> Dict[str, np.ndarray]:
+        r"""
+        Predict a list of molecules that are already featurized with `BatchPredictor.featurize`.
+        See `BatchPredictor.predict` for the parameters and the returned results.
+        """
+        for output in outputs:
+            if output not in PREDICTION_OUTPUTS:
+                raise ValueError(f"Unknown output `{output}`, choose from {PREDICTION_OUTPUTS}")
+
+        valid = np.array([not did_featurization_fail(feat) for feat in features], dtype=bool)
+        valid_idx = np.flatnonzero(valid)
+
+        # All the outputs are returned, even when no molecule is valid
+        results = {
+            key: np.full((len(features), dim), np.nan, dtype=np.float32)
+            for key, dim in self.output_dims(outputs).items()
+        }
+        for start in range(0, len(valid_idx), self.batch_size):
+            batch_idx = valid_idx[start : start + self.batch_size]
+            batch_results = self._forward([features[ii] for ii in batch_idx], outputs=outputs)
+            for key, values in batch_results.items():
+                values = values.detach().to(device="cpu", dtype=torch.float32).numpy()
+                results[key][batch_idx] = values.reshape(values.shape[0], -1)
+
+        results["valid"] = valid
+        return results
+
+    def predict_dataframe(self, df: pd.DataFrame, smiles_col: str = "smiles", **kwargs) -> pd.DataFrame:
+        r"""
+        Predict the molecules of a dataframe.
+
+        Parameters:
+            df: The dataframe with the SMILES
+            smiles_col: The column of the SMILES
+            kwargs: Other arguments of `BatchPredictor.predict`
+
+        Returns:
+            df: A copy of the dataframe with the column `"valid"`, one column `{task}` per graph-level task,
+                or `{task}_{ii}` for the tasks with multiple outputs, and the columns `fingerprint_{ii}`
+        """
+        results = self.predict(df[smiles_col].tolist(), **kwargs)
+        columns = {"valid": results.pop("valid")}
+        for key, values in results.items():
+            prefix = "fingerprint" if key == "fingerprints" else key
+            if (values.shape[1] == 1) and (key != "fingerprints"):
+                columns[prefix] = values[:, 0]
+            else:
+                for ii in range(values.shape[1]):
+                    columns[f"{prefix}_{ii}"] = values[:, ii]
+        return pd.concat([df.reset_index(drop=True), pd.DataFrame(columns)], axis=1)
+
+
+def predict_to_parquet(
+    checkpoint_path: Union[str, os.PathLike],
+    input_path: Union[str, os.PathLike],
+    output_path: Union[str, os.PathLike],
+    outputs: Sequence[str] = ("preds",),
+    smiles_col: str = "smiles",
+    id_col: Optional[str] = None,
+    chunk_size: int = 10_000,
+    featurization: Optional[Dict[str, Any]] = None,
+    **predictor_kwargs,
+) -> Dict[str, int]:
+    r"""
+    Predict the molecules of a file with a checkpoint, and write the results incrementally to a parquet file.
+    The input is read and predicted in chunks, such that the memory stays bounded regardless of its size.
+    All the chunks have the same columns, with NaN outputs for the invalid molecules, even when
+    all the molecules of a chunk are invalid.
+
+    Parameters:
+        checkpoint_path: Path of the checkpoint
+        input_path: The input file, see `read_smiles_chunks`
+        output_path: The output parquet file, which is overwritten
+        outputs: The outputs to compute, among `"preds"` and `"fingerprints"`
+        smiles_col: Column of the SMILES
+        id_col: Optional column of the molecule identifiers
+        chunk_size: Number of molecules read, featurized and written at once
+        featurization: The arguments of the featurizer. By default, they are loaded from the checkpoint.
+        predictor_kwargs: Other arguments of `BatchPredictor`, such as `batch_size`, `n_jobs` or `device`
+
+    Returns:
+        counts: The number of molecules `"num_molecules"`, and the number of failed featurizations `"num_failed"`
+    """
+    predictor = BatchPredictor.from_checkpoint(
+        checkpoint_path, featurization=featurization, **predictor_kwargs
+    )
+
+    counts = {"num_molecules": 0, "num_failed": 0}
+    chunks = read_smiles_chunks(input_path, smiles_col=smiles_col, id_col=id_col, chunk_size=chunk_size)
+    for chunk in chunks:
+        df = predictor.predict_dataframe(chunk, smiles_col=smiles_col, outputs=outputs)
+        fastparquet.write(str(output_path), df, write_index=False, append=counts["num_molecules"] > 0)
+        counts["num_molecules"] += len(df)
+        counts["num_failed"] += int((~df["valid"]).sum())
+        logger.info(f"Predicted {counts['num_molecules']} molecules, {counts['num_failed']} failed")
+
+    return counts
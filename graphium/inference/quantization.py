@@ -0,0 +1,154 @@
+r"""
+Quantized inference on CPU: dynamic int8 quantization of the linear layers, and bfloat16 autocast of the message
+passing. The accuracy of a quantized model is reported per task against the original model on a validation split.
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+from copy import copy, deepcopy
+
+import torch
+from torch import Tensor, nn
+from torch_geometric.data import Batch
+from loguru import logger
+
+from graphium.trainer.predictor import PredictorModule
+
+QUANTIZATION_MODES = ["int8", "bf16", "int8-bf16"]
+
+
+class BFloat16Autocast(nn.Module):
+    def __init__(self, module: nn.Module):
+        r"""
+        Run a graph module, such as the `FeedForwardGraph` of the message passing, with the `bfloat16` autocast.
+        The floating point tensors of the output batch are cast back to `float32`, such that the following
+        layers, and the int8 linear layers in particular, receive `float32` inputs.
+
+        Parameters:
+            module: The module taking and returning a pyg `Batch`
+        """
+        super().__init__()
+        self.module = module
+
+    def forward(self, g: Batch) -> Batch:
+        device = next(self.module.parameters()).device
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+            g = self.module(g)
+        for key in g.keys:
+            value = g[key]
+            if isinstance(value, Tensor) and (value.dtype == torch.bfloat16):
+                g[key] = value.float()
+        return g
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose the attributes of the wrapped module, such as the `out_dim` of the GNN
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(super().__getattr__("module"), name)
+
+
+def quantize_model(model: nn.Module, mode: str, quantize_graph_level: bool = False) -> nn.Module:
+    r"""
+    Make a quantized copy of a `FullGraphMultiTaskNetwork` for inference on CPU.
+
+    - `"int8"`: The `nn.Linear` layers are quantized to int8 with `torch.ao.quantization.quantize_dynamic`.
+      The weights are quantized once, and the activations are quantized at each call from their range,
+      so no calibration data is needed. The layers of the positional encoders are kept in `float32`,
+      as are the subclasses of `nn.Linear`, such as the `MuReadout` of the last layers.
+      The layers after the graph pooling are also kept in `float32` unless `quantize_graph_level`,
+      since they run once per graph, and the range of the pooled features is wide.
+    - `"bf16"`: The message passing, `model.gnn`, runs with the `bfloat16` autocast, see `BFloat16Autocast`.
+    - `"int8-bf16"`: Both. The linear layers of the message passing are left to the autocast.
+
+    Parameters:
+        model: The trained network. It is not modified.
+        mode: The quantization mode, among `QUANTIZATION_MODES`
+        quantize_graph_level: Whether to quantize the graph output network and the task heads of the
+            graph-level tasks
+
+    Returns:
+        model: The quantized model, in evaluation mode
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode `{mode}`, choose from {QUANTIZATION_MODES}")
+    model = deepcopy(model).eval()
+
+    if mode in ["int8", "int8-bf16"]:
+        excluded = ["encoder_manager."] + (["gnn."] if mode == "int8-bf16" else [])
+        if (not quantize_graph_level) and (model.task_heads is not None):
+            excluded.append("task_heads.graph_output_nn.graph.")
+            for task, kwargs in model.task_heads.task_heads_kwargs.items():
+                if kwargs["task_level"] == "graph":
+                    excluded.append(f"task_heads.task_heads.{task}.")
+        names = [
+            name
+            for name, module in model.named_modules()
+            if (type(module) is nn.Linear) and not any(name.startswith(prefix) for prefix in excluded)
+        ]
+        model = torch.ao.quantization.quantize_dynamic(
+            model, qconfig_spec={name: torch.ao.quantization.default_dynamic_qconfig for name in names}
+        )
+        logger.info(f"Quantized {len(names)} linear layers to int8")
+
+    if mode in ["bf16", "int8-bf16"]:
+        model.gnn = BFloat16Autocast(model.gnn)
+    return model
+
+
+@torch.no_grad()
+def quantization_report(
+    predictor: PredictorModule,
+    quantized_model: nn.Module,
+    batches: Iterable[Dict[str, Any]],
+) -> Dict[str, Dict[str, float]]:
+    r"""
+    Compare the predictions of a quantized model with the ones of the original model of a predictor,
+    on the batches of a validation split, for each task.
+
+    Parameters:
+        predictor: The predictor with the original model
+        quantized_model: The quantized model, see `quantize_model`
+        batches: The batches of the validation dataloader, with their features and labels
+
+    Returns:
+        report: For each task key, the number of labels, the mean absolute error of the original and of the
+            quantized predictions on the labels without NaN, and the mean and maximum absolute difference
+            between the original and the quantized predictions. The errors are on the normalized labels.
+    """
+    model = predictor.model.eval()
+    task_levels = {task: kwargs["task_level"] for task, kwargs in model.task_heads.task_heads_kwargs.items()}
+    sums = {}
+    for batch in batches:
+        features = predictor._convert_features_dtype(batch["features"])
+        # The forward overwrites the features of the batch
+        preds = model(copy(features))
+        quantized_preds = quantized_model(copy(features))
+        for task, level in task_levels.items():
+            task_key = predictor._get_task_key(task_level=level, task=task)
+            pred, quantized_pred = preds[task].float(), quantized_preds[task].float()
+            labels = batch["labels"][task_key].to(pred.dtype).reshape(pred.shape)
+            is_labelled = ~torch.isnan(labels)
+            diff = (quantized_pred - pred).abs()
+            task_sums = sums.setdefault(task_key, {"n": 0, "n_preds": 0, "ae": 0.0, "ae_q": 0.0, "diff": 0.0})
+            task_sums["n"] += int(is_labelled.sum())
+            task_sums["n_preds"] += pred.numel()
+            task_sums["ae"] += float((pred - labels).abs()[is_labelled].sum())
+            task_sums["ae_q"] += float((quantized_pred - labels).abs()[is_labelled].sum())
+            task_sums["diff"] += float(diff.sum())
+            task_sums["max_diff"] = max(
+                task_sums.get("max_diff", 0.0), float(diff.max()) if diff.numel() else 0.0
+            )
+
+    report = {}
+    for task_key, task_sums in sums.items():
+        num_labels = max(task_sums["n"], 1)
+        report[task_key] = {
+            "num_labels": task_sums["n"],
+            "mae": task_sums["ae"] / num_labels,
+            "mae_quantized": task_sums["ae_q"] / num_labels,
+            "mean_abs_diff": task_sums["diff"] / max(task_sums["n_preds"], 1),
+            "max_abs_diff": task_sums.get("max_diff", 0.0),
+        }
+        logger.info(f"Quantization of `{task_key}`: {report[task_key]}")
+    return report
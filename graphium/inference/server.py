@@ -0,0 +1,363 @@
+r"""
+Local inference server collecting the concurrent requests into micro-batches, with a cache of the featurizations
+and predictions. The server uses the standard library only, and listens on HTTP with JSON requests.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import json
+import time
+import queue
+import threading
+from collections import deque
+from copy import deepcopy
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from loguru import logger
+
+from graphium.data.sample_cache import SampleCache
+from graphium.data.smiles_transform import smiles_to_unique_mol_id
+from graphium.inference.predict import BatchPredictor
+
+DEFAULT_LATENCY_WINDOW = 10_000
+
+
+class _Request:
+    def __init__(self, smiles: List[str]):
+        self.smiles = smiles
+        self.future = Future()
+        self.submit_time = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        predictor: BatchPredictor,
+        max_batch_size: int = 64,
+        max_latency_ms: float = 5.0,
+        outputs: Sequence[str] = ("preds",),
+        feature_cache_mb: float = 64.0,
+        prediction_cache_mb: float = 64.0,
+    ):
+        r"""
+        Collect the concurrent prediction requests into dynamic micro-batches.
+        A batch is run as soon as it holds `max_batch_size` molecules, or when the oldest request
+        waited `max_latency_ms`. The featurizations and predictions are cached by molecule id in
+        LRU caches, such that repeated molecules are neither featurized nor predicted again.
+
+        Parameters:
+            predictor: The predictor running the featurization and the forward passes
+            max_batch_size: Maximum number of molecules in a micro-batch. A single request with
+                more molecules is run as its own batch.
+            max_latency_ms: Maximum time to wait for other requests after the first request of a batch
+            outputs: The outputs to compute, among `"preds"` and `"fingerprints"`
+            feature_cache_mb: Size of the cache of featurized molecules, in MB. `0` disables the cache.
+            prediction_cache_mb: Size of the cache of predictions, in MB. `0` disables the cache.
+        """
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.outputs = list(outputs)
+        self.feature_cache = SampleCache(max_size_mb=feature_cache_mb, eviction_policy="lru")
+        self.prediction_cache = SampleCache(max_size_mb=prediction_cache_mb, eviction_policy="lru")
+
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def start(self) -> "MicroBatcher":
+        """Start the thread running the micro-batches"""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="graphium-micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the thread after the current micro-batch"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "MicroBatcher":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def submit(self, smiles: Sequence[str]) -> Future:
+        r"""
+        Submit a request without waiting for its results.
+
+        Parameters:
+            smiles: The SMILES of the molecules to predict
+
+        Returns:
+            future: A future holding the results, see `MicroBatcher.predict`
+        """
+        if self._thread is None:
+            raise RuntimeError("The micro-batcher must be started before submitting requests")
+        request = _Request(list(smiles))
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, smiles: Sequence[str], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        r"""
+        Predict molecules, and wait for the results.
+
+        Parameters:
+            smiles: The SMILES of the molecules to predict
+            timeout: Maximum time to wait for the results, in seconds
+
+        Returns:
+            results: One dictionary per molecule, with the keys `"smiles"`, `"mol_id"`, `"valid"`, and a list of
+                floats per graph-level task and for `"fingerprints"`. The outputs are `None` for invalid molecules.
+        """
+        return self.submit(smiles).result(timeout=timeout)
+
+    def _collect_requests(self) -> List[_Request]:
+        """Wait for a first request, then gather the requests arriving before its deadline"""
+        try:
+            requests = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        num_molecules = len(requests[0].smiles)
+        deadline = requests[0].submit_time + self.max_latency_ms / 1000
+        while num_molecules < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            num_molecules += len(request.smiles)
+        return requests
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            requests = self._collect_requests()
+            if len(requests) == 0:
+                continue
+            try:
+                self._process(requests)
+            except Exception as e:
+                logger.exception("Micro-batch failed")
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _process(self, requests: List[_Request]) -> None:
+        """Run a micro-batch, using the cached predictions and featurizations when available"""
+        smiles = [s for request in requests for s in request.smiles]
+        mol_ids = [smiles_to_unique_mol_id(s) for s in smiles]
+
+        # Unique molecules without cached predictions. Invalid SMILES have an empty id, and are never cached
+        results_per_id = {}
+        to_predict = {}
+        for s, mol_id in zip(smiles, mol_ids):
+            if (mol_id in results_per_id) or (mol_id in to_predict):
+                continue
+            cached = self.prediction_cache.get(mol_id) if mol_id != "" else None
+            if cached is not None:
+                results_per_id[mol_id] = cached
+            else:
+                to_predict[mol_id] = s
+
+        if len(to_predict) > 0:
+            # Featurize the molecules that are not in the cache
+            features = {
+                mol_id: self.feature_cache.get(mol_id) for mol_id in to_predict.keys() if mol_id != ""
+            }
+            missing = [mol_id for mol_id in to_predict.keys() if features.get(mol_id, None) is None]
+            for mol_id, feat in zip(missing, self.predictor.featurize([to_predict[ii] for ii in missing])):
+                features[mol_id] = feat
+                if mol_id != "":
+                    self.feature_cache.put(mol_id, feat)
+
+            ids = list(to_predict.keys())
+            predictions = self.predictor.predict_features([features[ii] for ii in ids], outputs=self.outputs)
+            for ii, mol_id in enumerate(ids):
+                result = {"valid": bool(predictions["valid"][ii])}
+                for key, values in predictions.items():
+                    if key != "valid":
+                        result[key] = values[ii].tolist() if result["valid"] else None
+                results_per_id[mol_id] = result
+                if mol_id != "":
+                    self.prediction_cache.put(mol_id, deepcopy(result))
+
+        # Split the results between the requests
+        end_time = time.perf_counter()
+        offset = 0
+        for request in requests:
+            request_results = []
+            for s, mol_id in zip(request.smiles, mol_ids[offset : offset + len(request.smiles)]):
+                request_results.append({"smiles": s, "mol_id": mol_id, **results_per_id[mol_id]})
+            offset += len(request.smiles)
+            request.future.set_result(request_results)
+
+        with self._stats_lock:
+            self.num_batches += 1
+            self.num_requests += len(requests)
+            self.num_molecules += len(smiles)
+            self.num_predicted += len(to_predict)
+            self.latencies.extend(end_time - request.submit_time for request in requests)
+
+    def reset_stats(self) -> None:
+        """Reset the latency and throughput counters"""
+        with self._stats_lock:
+            self.start_time = time.perf_counter()
+            self.num_batches = 0
+            self.num_requests = 0
+            self.num_molecules = 0
+            self.num_predicted = 0
+            self.latencies = deque(maxlen=DEFAULT_LATENCY_WINDOW)
+
+    def stats(self) -> Dict[str, Any]:
+        r"""
+        Get the counters of the server.
+
+        Returns:
+            stats: Dictionary with the number of requests, micro-batches, molecules and molecules predicted
+                by the model, the mean batch size, the throughput in molecules per second since the last reset,
+                the latency percentiles of the recent requests in milliseconds, and the statistics of the caches
+        """
+        with self._stats_lock:
+            elapsed = time.perf_counter() - self.start_time
+            latencies = 1000 * np.array(self.latencies, dtype=float)
+            stats = {
+                "num_requests": self.num_requests,
+                "num_batches": self.num_batches,
+                "num_molecules": self.num_molecules,
+                "num_predicted": self.num_predicted,
+                "mean_batch_size": self.num_molecules / self.num_batches if self.num_batches > 0 else 0.0,
+                "molecules_per_s": self.num_molecules / elapsed if elapsed > 0 else 0.0,
+            }
+        for p in [50, 90, 99]:
+            stats[f"latency_p{p}_ms"] = float(np.percentile(latencies, p)) if len(latencies) > 0 else None
+        stats["feature_cache"] = self.feature_cache.stats()
+        stats["prediction_cache"] = self.prediction_cache.stats()
+        return stats
+
+
+class _PredictionRequestHandler(BaseHTTPRequestHandler):
+    server: "PredictionServer"
+
+    def _send_json(self, status: int, content: Any) -> None:
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.batcher.stats())
+        else:
+            self._send_json(404, {"error": f"Unknown path `{self.path}`"})
+
+    def do_POST(self) -> None:
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Unknown path `{self.path}`"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            smiles = json.loads(self.rfile.read(length))["smiles"]
+            if isinstance(smiles, str):
+                smiles = [smiles]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Expected a JSON body with the key `smiles`: {e}"})
+            return
+        try:
+            results = self.server.batcher.predict(smiles, timeout=self.server.request_timeout)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"results": results})
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8000, request_timeout: float = 60.0
+    ):
+        r"""
+        HTTP server answering the prediction requests with a `MicroBatcher`.
+        Each connection is handled in its own thread, such that the concurrent requests are batched together.
+
+        Endpoints:
+            - `POST /predict` with the JSON body `{"smiles": [...]}` returns `{"results": [...]}`,
+              see `MicroBatcher.predict`
+            - `GET /stats` returns the counters, see `MicroBatcher.stats`
+            - `GET /health` returns `{"status": "ok"}`
+
+        Parameters:
+            batcher: The micro-batcher. It is started with the server.
+            host: The host to listen to
+            port: The port to listen to. Use `0` to pick a free port, available as `server.server_address`.
+            request_timeout: Maximum time to wait for the results of a request, in seconds
+        """
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+        super().__init__((host, port), _PredictionRequestHandler)
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        self.batcher.start()
+        try:
+            super().serve_forever(poll_interval=poll_interval)
+        finally:
+            self.batcher.stop()
+
+
+def make_server(
+    checkpoint_path: str,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_batch_size: int = 64,
+    max_latency_ms: float = 5.0,
+    outputs: Sequence[str] = ("preds",),
+    feature_cache_mb: float = 64.0,
+    prediction_cache_mb: float = 64.0,
+    **predictor_kwargs,
+) -> PredictionServer:
+    r"""
+    Create a prediction server from a checkpoint. Call `server.serve_forever()` to run it.
+
+    Parameters:
+        checkpoint_path: Path of the checkpoint
+        host: The host to listen to
+        port: The port to listen to
+        max_batch_size: See `MicroBatcher`
+        max_latency_ms: See `MicroBatcher`
+        outputs: See `MicroBatcher`
+        feature_cache_mb: See `MicroBatcher`
+        prediction_cache_mb: See `MicroBatcher`
+        predictor_kwargs: Other arguments of `BatchPredictor.from_checkpoint`
+
+    Returns:
+        server: The prediction server
+    """
+    predictor_kwargs.setdefault("batch_size", max_batch_size)
+    predictor = BatchPredictor.from_checkpoint(checkpoint_path, **predictor_kwargs)
+    batcher = MicroBatcher(
+        predictor,
+        max_batch_size=max_batch_size,
+        max_latency_ms=max_latency_ms,
+        outputs=outputs,
+        feature_cache_mb=feature_cache_mb,
+        prediction_cache_mb=prediction_cache_mb,
+    )
+    return PredictionServer(batcher, host=host, port=port)
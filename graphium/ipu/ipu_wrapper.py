@@ -110,6 +110,9 @@ class PredictorModuleIPU(PredictorModule):
         )
 
     def on_train_batch_end(self, outputs, batch, batch_idx):
+        # The outputs are always kept by the compiled training step, so the logging steps are selected here
+        if not self.telemetry_options.is_logging_step(self.global_step):
+            return
         outputs = self.convert_from_fp16(outputs)
         outputs["loss"] = outputs["loss"].mean()
         super().on_train_batch_end(outputs, batch, batch_idx)
@@ -117,7 +120,7 @@ class PredictorModuleIPU(PredictorModule):
     def training_step(self, features, labels) -> Dict[str, Any]:
         features, labels = self.squeeze_input_dims(features, labels)
         dict_input = {"features": features, "labels": labels}
-        step_dict = super().training_step(dict_input, to_cpu=False)
+        step_dict = super().training_step(dict_input, to_cpu=False, keep_outputs=True)
 
         loss = step_dict.pop("loss")
         step_dict["loss"] = self.poptorch.identity_loss(loss, reduction="mean")
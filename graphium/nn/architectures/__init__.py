@@ -1,5 +1,13 @@
-from .global_architectures import FeedForwardNN
-from .global_architectures import FullGraphMultiTaskNetwork
-from .global_architectures import TaskHeads
-from .global_architectures import GraphOutputNN
-from .pyg_architectures import FeedForwardPyg
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "FeedForwardNN": "global_architectures",
+        "FullGraphMultiTaskNetwork": "global_architectures",
+        "TaskHeads": "global_architectures",
+        "GraphOutputNN": "global_architectures",
+        "FeedForwardPyg": "pyg_architectures",
+        "CompiledGraphNetwork": "compiled_network",
+    },
+)
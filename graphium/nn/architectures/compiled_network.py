@@ -0,0 +1,219 @@
+r"""
+Compile-friendly execution of the graph networks. The pyg `Batch` is lowered to a fixed tuple of tensors,
+and the network is wrapped in a functional forward taking and returning tuples of tensors, which can be
+traced with TorchScript or compiled with `torch.compile`.
+"""
+
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import sys
+from collections import OrderedDict
+
+import torch
+from torch import Tensor, nn
+from torch_geometric.data import Batch
+from loguru import logger
+
+COMPILE_MODES = ["trace", "compile"]
+
+
+def lower_batch(g: Batch, keys: Optional[Sequence[str]] = None) -> Tuple[Tuple[str, ...], Tuple[Tensor, ...]]:
+    r"""
+    Lower a pyg `Batch` to a fixed tuple of tensors.
+
+    Parameters:
+        g: The batch of graphs
+        keys: The keys to keep. Defaults to all the tensors of the batch, sorted by key.
+
+    Returns:
+        keys: The keys of the tensors
+        tensors: The tensors, in the order of `keys`
+    """
+    if keys is None:
+        keys = sorted(key for key in g.keys if isinstance(g[key], Tensor))
+    keys = tuple(keys)
+    return keys, tuple(g[key] for key in keys)
+
+
+def is_torch_compile_available() -> bool:
+    r"""
+    Whether `torch.compile` is provided by the installed torch, and supported by the running Python version.
+    """
+    if not hasattr(torch, "compile"):
+        return False
+    try:
+        from torch._dynamo.eval_frame import check_if_dynamo_supported
+
+        check_if_dynamo_supported()
+    except ImportError:
+        return sys.version_info < (3, 11)
+    except RuntimeError:
+        return False
+    return True
+
+
+class TupleForward(nn.Module):
+    def __init__(self, network: nn.Module, keys: Sequence[str]):
+        r"""
+        Functional forward of a graph network, taking the tensors of a batch in the order of `keys`,
+        and returning the outputs as a tuple of tensors.
+        The batch is rebuilt inside the forward, such that the tensors passed by the caller are not modified.
+
+        Parameters:
+            network: The graph network, such as `FullGraphMultiTaskNetwork`
+            keys: The keys of the tensors of the batch, see `lower_batch`
+        """
+        super().__init__()
+        self.network = network
+        self.keys = tuple(keys)
+        self.output_keys: Optional[Tuple[str, ...]] = None
+
+    def forward(self, *tensors: Tensor) -> Tuple[Tensor, ...]:
+        g = Batch(**dict(zip(self.keys, tensors)))
+        out = self.network(g)
+        if isinstance(out, Tensor):
+            self.output_keys = None
+            return (out,)
+        self.output_keys = tuple(out.keys())
+        return tuple(out[key] for key in self.output_keys)
+
+    def unpack_outputs(self, outputs: Tuple[Tensor, ...]) -> Union[Tensor, Dict[str, Tensor]]:
+        """Convert the tuple of outputs back to the output of the network"""
+        if self.output_keys is None:
+            return outputs[0]
+        return dict(zip(self.output_keys, outputs))
+
+
+class CompiledGraphNetwork(nn.Module):
+    def __init__(
+        self,
+        network: nn.Module,
+        mode: str = "trace",
+        specialize_on_graph_sizes: bool = True,
+        max_cache_size: int = 64,
+    ):
+        r"""
+        Compile-friendly execution mode of a graph network, such as `FullGraphMultiTaskNetwork`, to lower the
+        Python overhead of each step. Each batch is lowered to a fixed tuple of tensors with `lower_batch`,
+        and run through a `TupleForward` of the network.
+
+        - `"trace"`: The `TupleForward` is traced with `torch.jit.trace`, and the traces are cached by
+          signature of the batch: the keys, shapes, dtypes and devices of the tensors, the training mode,
+          whether the gradients are enabled, and the number of nodes of each graph if
+          `specialize_on_graph_sizes`. The control flow of the network, such as the branches on
+          `is_running_on_ipu()`, is static within a trace.
+        - `"compile"`: The `TupleForward` is compiled with `torch.compile(dynamic=True)`, which handles the
+          specialization itself. Only available if `is_torch_compile_available()`.
+
+        The parameters are shared with `network`, such that the compiled network can be trained, and
+        `validate` compares its outputs with the eager ones.
+
+        Parameters:
+            network: The graph network
+            mode: The execution mode, among `COMPILE_MODES`
+            specialize_on_graph_sizes: Whether the traces are specialized on the number of nodes of each
+                graph. This is required by the layers converting the graph sizes to Python values, such as the
+                dense attention of the GPS layer, and can be disabled for the message-passing networks.
+                It requires the `ptr` of the batch.
+            max_cache_size: Maximum number of traces kept, with the least recently used evicted first
+        """
+        super().__init__()
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"Unknown mode `{mode}`, choose from {COMPILE_MODES}")
+        if (mode == "compile") and not is_torch_compile_available():
+            raise RuntimeError(
+                f"`torch.compile` is not available for torch {torch.__version__} and Python "
+                f"{sys.version_info.major}.{sys.version_info.minor}, use `mode='trace'`"
+            )
+        self.network = network
+        self.mode = mode
+        self.specialize_on_graph_sizes = specialize_on_graph_sizes
+        self.max_cache_size = max_cache_size
+        self._traces: "OrderedDict[Hashable, Tuple[TupleForward, Any]]" = OrderedDict()
+        self._compiled: Dict[Tuple[str, ...], Tuple[TupleForward, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def signature(self, keys: Tuple[str, ...], tensors: Tuple[Tensor, ...]) -> Hashable:
+        r"""
+        The signature of a lowered batch, such that the batches with the same signature use the same trace.
+        """
+        signature = [self.network.training, torch.is_grad_enabled(), keys]
+        signature += [(tuple(tensor.shape), tensor.dtype, tensor.device) for tensor in tensors]
+        if self.specialize_on_graph_sizes:
+            if "ptr" not in keys:
+                raise ValueError("`specialize_on_graph_sizes` requires the key `ptr` in the batch")
+            signature.append(tuple(tensors[keys.index("ptr")].tolist()))
+        return tuple(signature)
+
+    def _get_forward(self, keys: Tuple[str, ...], tensors: Tuple[Tensor, ...]) -> Tuple[TupleForward, Any]:
+        """Get the `TupleForward` and its traced or compiled version for a lowered batch"""
+        if self.mode == "compile":
+            if keys not in self._compiled:
+                tuple_forward = TupleForward(self.network, keys)
+                self._compiled[keys] = (tuple_forward, torch.compile(tuple_forward, dynamic=True))
+            return self._compiled[keys]
+
+        signature = self.signature(keys, tensors)
+        if signature in self._traces:
+            self.hits += 1
+            self._traces.move_to_end(signature)
+            return self._traces[signature]
+
+        self.misses += 1
+        tuple_forward = TupleForward(self.network, keys)
+        traced = torch.jit.trace(tuple_forward, tensors, check_trace=False, strict=False)
+        self._traces[signature] = (tuple_forward, traced)
+        while len(self._traces) > self.max_cache_size:
+            self._traces.popitem(last=False)
+        return tuple_forward, traced
+
+    def forward(self, g: Batch) -> Union[Tensor, Dict[str, Tensor]]:
+        r"""
+        Run the compiled network on a batch. Unlike the eager forward, the batch is not modified.
+
+        Parameters:
+            g: The batch of graphs
+
+        Returns:
+            The outputs of the network, with the same structure as the eager outputs
+        """
+        keys, tensors = lower_batch(g)
+        tuple_forward, forward = self._get_forward(keys, tensors)
+        return tuple_forward.unpack_outputs(forward(*tensors))
+
+    @torch.no_grad()
+    def validate(self, g: Batch, rtol: float = 1e-5, atol: float = 1e-6) -> Dict[str, float]:
+        r"""
+        Compare the outputs of the compiled network with the eager outputs on a batch.
+
+        Parameters:
+            g: The batch of graphs
+            rtol: The relative tolerance
+            atol: The absolute tolerance
+
+        Returns:
+            max_abs_diff: The maximum absolute difference of each output
+
+        Raises:
+            AssertionError: If the outputs differ by more than the tolerances
+        """
+        keys, tensors = lower_batch(g)
+        eager = TupleForward(self.network, keys)
+        expected = eager.unpack_outputs(eager(*tensors))
+        outputs = self.forward(g)
+        if isinstance(expected, Tensor):
+            expected, outputs = {"output": expected}, {"output": outputs}
+
+        max_abs_diff = {}
+        for key, value in expected.items():
+            torch.testing.assert_close(outputs[key], value, rtol=rtol, atol=atol, equal_nan=True)
+            max_abs_diff[key] = (
+                float((outputs[key] - value).abs().nan_to_num().max()) if value.numel() else 0.0
+            )
+        logger.info(f"Compiled network validated against eager, max absolute differences: {max_abs_diff}")
+        return max_abs_diff
+
+    def cache_info(self) -> Dict[str, int]:
+        """Get the number of hits, misses and cached traces"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._traces)}
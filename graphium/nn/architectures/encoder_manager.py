@@ -247,8 +247,8 @@ class EncoderManager(nn.Module):
             pe_kw: the model kwargs where the dimensions are divided by the factor
         """
         # For the pe-encoders, don't factor the in_dim and in_dim_edges
+        pe_kw = deepcopy(self.pe_encoders_kwargs)
         if self.pe_encoders is not None:
-            pe_kw = deepcopy(self.pe_encoders_kwargs)
             new_pe_kw = {
                 key: encoder.make_mup_base_kwargs(divide_factor=divide_factor, factor_in_dim=False)
                 for key, encoder in self.pe_encoders.items()
@@ -272,7 +272,7 @@ class EncoderManager(nn.Module):
         if self.pe_encoders is not None:
             return self.pe_encoders_kwargs["input_keys"]
         else:
-            raise ValueError("pe_encoders is not initialized, so there are no input keys.")
+            raise AttributeError("pe_encoders is not initialized, so there are no input keys.")
 
     @property
     def in_dims(self) -> Iterable[int]:
@@ -285,7 +285,7 @@ class EncoderManager(nn.Module):
         if self.pe_encoders is not None:
             return self.pe_encoders_kwargs["in_dims"]
         else:
-            raise ValueError("pe_encoders is not initialized, so there are no input dimensions.")
+            raise AttributeError("pe_encoders is not initialized, so there are no input dimensions.")
 
     @property
     def out_dim(self) -> int:
@@ -298,4 +298,4 @@ class EncoderManager(nn.Module):
         if self.pe_encoders is not None:
             return self.pe_encoders_kwargs["out_dim"]
         else:
-            raise ValueError("pe_encoders is not initialized, so there is no output dimension.")
+            raise AttributeError("pe_encoders is not initialized, so there is no output dimension.")
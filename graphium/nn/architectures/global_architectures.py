@@ -1207,7 +1207,9 @@ class FullGraphMultiTaskNetwork(nn.Module, MupMixin):
             kwargs["pre_nn_kwargs"] = self.pre_nn.make_mup_base_kwargs(
                 divide_factor=divide_factor, factor_in_dim=False
             )
-            pe_enc_outdim = 0 if self.encoder_manager is None else self.pe_encoders_kwargs.get("out_dim", 0)
+            pe_enc_outdim = (
+                0 if self.pe_encoders_kwargs is None else self.pe_encoders_kwargs.get("out_dim", 0)
+            )
             pre_nn_indim = kwargs["pre_nn_kwargs"]["in_dim"] - pe_enc_outdim
             kwargs["pre_nn_kwargs"]["in_dim"] = round(pre_nn_indim + (pe_enc_outdim / divide_factor))
 
@@ -1217,7 +1219,7 @@ class FullGraphMultiTaskNetwork(nn.Module, MupMixin):
                 divide_factor=divide_factor, factor_in_dim=False
             )
             pe_enc_edge_outdim = (
-                0 if self.encoder_manager is None else self.pe_encoders_kwargs.get("edge_out_dim", 0)
+                0 if self.pe_encoders_kwargs is None else self.pe_encoders_kwargs.get("edge_out_dim", 0)
             )
             pre_nn_edge_indim = kwargs["pre_nn_edges_kwargs"]["in_dim"] - pe_enc_edge_outdim
             kwargs["pre_nn_edges_kwargs"]["in_dim"] = round(
@@ -1348,6 +1350,8 @@ class GraphOutputNN(nn.Module, MupMixin):
             graph_output_nn_kwargs:
                 key-word arguments to use for the initialization of the post-processing
                 MLP network after the GNN, using the class `FeedForwardNN`.
+                For the nodepair level, the keys `sparse_nodepairs` and `nodepair_chunk_size`
+                are passed to `compute_nodepairs` as `sparse` and `chunk_size`.
         """
         super().__init__()
         self.task_level = task_level
@@ -1364,8 +1368,14 @@ class GraphOutputNN(nn.Module, MupMixin):
             "edge": "edge_feat",
         }
 
+        self.sparse_nodepairs = False
+        self.nodepair_chunk_size = None
         if self.task_level == "nodepair":
             level_in_dim = 2 * self.in_dim
+            self.sparse_nodepairs = graph_output_nn_kwargs[self.task_level].pop("sparse_nodepairs", False)
+            self.nodepair_chunk_size = graph_output_nn_kwargs[self.task_level].pop(
+                "nodepair_chunk_size", None
+            )
         elif self.task_level == "edge":
             level_in_dim = self.in_dim_edges
         elif self.task_level == "graph":
@@ -1401,6 +1411,8 @@ class GraphOutputNN(nn.Module, MupMixin):
                 batch=g.batch,
                 max_num_nodes=self.max_num_nodes_per_graph,
                 drop_nodes_last_graph=is_running_on_ipu(),
+                sparse=self.sparse_nodepairs,
+                chunk_size=self.nodepair_chunk_size,
             )
         # Check if at least one graph-level task is present
         if self.task_level == "graph":
@@ -1417,6 +1429,7 @@ class GraphOutputNN(nn.Module, MupMixin):
             h = [h]
             for ii in range(len(self.graph_output_nn.layers)):
                 h.insert(0, self.graph_output_nn.layers[ii].forward(h[0]))  # Append in reverse
+            h = torch.cat([h[ii] for ii in self.concat_last_layers], dim=-1)
         return h
 
     def _parse_pooling_layer(
@@ -1491,9 +1504,14 @@ class GraphOutputNN(nn.Module, MupMixin):
         fill_value: float = float("nan"),
         batch_size: int = None,
         drop_nodes_last_graph: bool = False,
+        sparse: bool = False,
+        chunk_size: Optional[int] = None,
     ) -> torch.Tensor:
         r"""
-        Vectorized implementation of nodepair-level task:
+        Vectorized implementation of nodepair-level task.
+        The features of the pairs `(i, j)` with `i < j` are `[h_i + h_j, |h_i - h_j|]`. They are gathered
+        directly from the sparse node features, such that only the pairs of each graph are computed,
+        without materializing the `B * max_num_nodes * max_num_nodes * h` tensors of all the pairs.
         Parameters:
             node_feats: Node features
             batch: Batch vector
@@ -1503,9 +1521,87 @@ class GraphOutputNN(nn.Module, MupMixin):
             batch_size: The batch size. (default: :obj:`None`)
             drop_nodes_last_graph: Whether to drop the nodes of the last graphs that exceed
                 the `max_num_nodes_per_graph`. Useful when the last graph is a padding.
+            sparse: Whether to return only the pairs of each graph, concatenated, instead of a
+                tensor padded to the pairs of `max_num_nodes`. Ignored on IPU, which needs static shapes.
+            chunk_size: Maximum number of pairs computed at once, to bound the memory of the
+                intermediate tensors for very large graphs. `None` computes all the pairs at once.
         Returns:
-            result: concatenated node features of shape B * max_num_nodes * 2*h,
-            where B is number of graphs, max_num_nodes is the chosen maximum number nodes, and h is the feature dim
+            result: concatenated node features of shape B * (max_num_nodes * (max_num_nodes - 1) / 2) * 2*h,
+            where B is number of graphs, max_num_nodes is the chosen maximum number nodes, and h is the feature dim.
+            If `sparse`, the shape is (sum of n_i * (n_i - 1) / 2) * 2*h, where n_i is the number of nodes of
+            each graph, with the pairs of each graph ordered as in the dense output.
+        """
+        if drop_nodes_last_graph or node_feats.device.type == "ipu":
+            return self._compute_nodepairs_dense(
+                node_feats,
+                batch=batch,
+                max_num_nodes=max_num_nodes,
+                fill_value=fill_value,
+                batch_size=batch_size,
+                drop_nodes_last_graph=drop_nodes_last_graph,
+            )
+
+        if batch_size is None:
+            batch_size = int(batch.max()) + 1 if batch.numel() > 0 else 0
+        num_nodes = torch.bincount(batch, minlength=batch_size)
+        cum_nodes = torch.cumsum(num_nodes, dim=0) - num_nodes
+        if max_num_nodes is None:
+            max_num_nodes = int(num_nodes.max()) if batch_size > 0 else 0
+        assert (
+            num_nodes <= max_num_nodes
+        ).all(), (
+            f"Encountered graphs with {num_nodes.max()} nodes, greater than `max_num_nodes = {max_num_nodes}`"
+        )
+
+        # Pairs `(i, j)` with `i < j` of each graph, in row-major order, generated from the number of nodes
+        # of each graph. The row of node `i` has one pair for each of the following nodes of its graph.
+        local_idx = torch.arange(batch.shape[0], device=batch.device) - cum_nodes[batch]
+        row_counts = num_nodes[batch] - 1 - local_idx
+        num_total_pairs = int(row_counts.sum())
+        idx_i = torch.repeat_interleave(
+            torch.arange(batch.shape[0], device=batch.device), row_counts, output_size=num_total_pairs
+        )
+        row_start = torch.cumsum(row_counts, dim=0) - row_counts
+        idx_j = idx_i + 1 + (torch.arange(num_total_pairs, device=batch.device) - row_start[idx_i])
+
+        out_dim = 2 * node_feats.shape[-1]
+        if sparse:
+            result = node_feats.new_empty(num_total_pairs, out_dim)
+        else:
+            # Position of each pair among the upper-triangular pairs of a graph with `max_num_nodes` nodes
+            num_pairs = max_num_nodes * (max_num_nodes - 1) // 2
+            local_i, local_j = local_idx[idx_i], local_idx[idx_j]
+            pair_idx = local_i * max_num_nodes - (local_i * (local_i + 1)) // 2 + (local_j - local_i - 1)
+            out_idx = batch[idx_i] * num_pairs + pair_idx
+            result = node_feats.new_full((batch_size * num_pairs, out_dim), fill_value)
+
+        chunk_size = num_total_pairs if chunk_size is None else chunk_size
+        for start in range(0, num_total_pairs, max(chunk_size, 1)):
+            chunk = slice(start, start + chunk_size)
+            h_X = node_feats[idx_i[chunk]]
+            h_Y = node_feats[idx_j[chunk]]
+            nodepair_h = torch.cat((h_X + h_Y, torch.abs(h_X - h_Y)), dim=-1)
+            if sparse:
+                result[chunk] = nodepair_h
+            else:
+                result[out_idx[chunk]] = nodepair_h
+
+        if not sparse:
+            result = result.view(batch_size, num_pairs, out_dim)
+        return result
+
+    def _compute_nodepairs_dense(
+        self,
+        node_feats: torch.Tensor,
+        batch: torch.Tensor,
+        max_num_nodes: int = None,
+        fill_value: float = float("nan"),
+        batch_size: int = None,
+        drop_nodes_last_graph: bool = False,
+    ) -> torch.Tensor:
+        r"""
+        Implementation of `compute_nodepairs` with static shapes, through a dense batch of all the pairs.
+        Used on IPU.
         """
         dense_feat, mask, _ = to_dense_batch(
             node_feats,
@@ -748,7 +748,8 @@ class DropPath(nn.Module):
         """
         on_ipu = is_running_on_ipu()
 
-        if self.drop_rate > 0:
+        # Like the dropout, the paths are only dropped during training
+        if self.training and (self.drop_rate > 0):
             keep_prob = 1 - self.drop_rate
 
             # Parse the batch size
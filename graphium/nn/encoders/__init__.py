@@ -1,6 +1,14 @@
-from .base_encoder import BaseEncoder
-from .laplace_pos_encoder import LapPENodeEncoder
-from .mlp_encoder import MLPEncoder, CatMLPEncoder
-from .signnet_pos_encoder import SignNetNodeEncoder
-from .gaussian_kernel_pos_encoder import GaussianKernelPosEncoder
-from .bessel_pos_encoder import BesselSphericalPosEncoder
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "BaseEncoder": "base_encoder",
+        "LapPENodeEncoder": "laplace_pos_encoder",
+        "MLPEncoder": "mlp_encoder",
+        "CatMLPEncoder": "mlp_encoder",
+        "SignNetNodeEncoder": "signnet_pos_encoder",
+        "GaussianKernelPosEncoder": "gaussian_kernel_pos_encoder",
+        "BesselSphericalPosEncoder": "bessel_pos_encoder",
+    },
+)
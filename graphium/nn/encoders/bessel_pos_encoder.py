@@ -8,7 +8,7 @@ from torch_geometric.nn.models.dimenet import BesselBasisLayer, SphericalBasisLa
 from torch_geometric.nn import radius_graph
 
 from graphium.nn.encoders.base_encoder import BaseEncoder
-from graphium.nn.pyg_layers.utils import triplets
+from graphium.nn.pyg_layers.utils import get_batch_triplets
 from graphium.nn.pyg_layers.dimenet_pyg import OutputBlock
 from graphium.nn.base_layers import FCLayer
 
@@ -98,13 +98,21 @@ class BesselSphericalPosEncoder(BaseEncoder):
         positions_3d_key = self.parse_input_keys_with_prefix(key_prefix)[0]
         # be in shape [num_nodes, 3]
         pos = batch[positions_3d_key]
-        # Create radius graph in encoder (not use chemical topology of molecules)
-        radius_edge_index = radius_graph(
-            pos, r=self.cutoff, batch=batch.batch, max_num_neighbors=self.max_num_neighbors
-        )
+        # Create radius graph in encoder (not use chemical topology of molecules),
+        # unless it is precomputed by the featurization with the `radius_graph` option
+        triplet_index = None
+        if "precomputed_radius_edge_index" in batch:
+            radius_edge_index = batch["precomputed_radius_edge_index"]
+            triplet_index = batch["precomputed_triplet_index"]
+        else:
+            radius_edge_index = radius_graph(
+                pos, r=self.cutoff, batch=batch.batch, max_num_neighbors=self.max_num_neighbors
+            )
 
-        # Process edges and triplets.
-        i, j, idx_i, idx_j, idx_k, idx_kj, idx_ji = triplets(radius_edge_index, num_nodes=pos.size(0))
+        # Process edges and triplets, shared with the DimeNet layers
+        i, j, idx_i, idx_j, idx_k, idx_kj, idx_ji = get_batch_triplets(
+            batch, radius_edge_index, num_nodes=pos.size(0), triplet_index=triplet_index
+        )
 
         # Calculate distances.
         dist = (pos[i] - pos[j]).pow(2).sum(dim=-1).sqrt()
@@ -20,6 +20,7 @@ class GaussianKernelPosEncoder(BaseEncoder):
         first_normalization="none",
         use_input_keys_prefix: bool = True,
         num_heads: int = 1,
+        chunk_size: Optional[int] = None,
     ):
         r"""
         Configurable gaussian kernel-based Positional Encoding node and edge encoder.
@@ -37,6 +38,10 @@ class GaussianKernelPosEncoder(BaseEncoder):
             first_normalization: The normalization to use before the first layer
             use_input_keys_prefix: Whether to use the `key_prefix` argument in the `forward` method.
             num_heads: The number of heads to use for the multi-head attention
+            chunk_size: The maximum number of node pairs of which the gaussian kernels are computed at once.
+                If `None`, the kernels of all the pairs of the padded `[batch, nodes, nodes]` layout are
+                computed at once. Otherwise, only the pairs within each graph are computed, by chunks,
+                which reduces the memory of the large batches. Not used on IPU.
         """
         super().__init__(
             input_keys=input_keys,
@@ -52,6 +57,7 @@ class GaussianKernelPosEncoder(BaseEncoder):
         self.embed_dim = embed_dim
         self.num_heads = num_heads
         self.max_num_nodes_per_graph = max_num_nodes_per_graph
+        self.chunk_size = chunk_size
 
         # parameters for preprocessing 3d positions
         self.preprocess_3d_positions = PreprocessPositions(
@@ -61,6 +67,7 @@ class GaussianKernelPosEncoder(BaseEncoder):
             num_layers=self.num_layers,
             activation=self.activation,
             first_normalization=self.first_normalization,
+            chunk_size=self.chunk_size,
         )
 
     def parse_input_keys(
@@ -160,6 +167,7 @@ class GaussianKernelPosEncoder(BaseEncoder):
                 num_heads=self.num_heads,
                 embed_dim=round(self.embed_dim / divide_factor),
                 max_num_nodes_per_graph=self.max_num_nodes_per_graph,
+                chunk_size=self.chunk_size,
             )
         )
         return base_kwargs
@@ -1,12 +1,19 @@
-from .gcn_pyg import GCNConvPyg
-from .gated_gcn_pyg import GatedGCNPyg
-from .gin_pyg import GINConvPyg
-from .gin_pyg import GINEConvPyg
-from .pna_pyg import PNAMessagePassingPyg
-from .mpnn_pyg import MPNNPlusPyg
-from .gps_pyg import GPSLayerPyg
-from .pooling_pyg import scatter_logsum_pool
-from .pooling_pyg import scatter_std_pool
-from .pooling_pyg import parse_pooling_layer_pyg
-from .pooling_pyg import VirtualNodePyg
-from .dimenet_pyg import DimeNetPyg
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    attributes={
+        "GCNConvPyg": "gcn_pyg",
+        "GatedGCNPyg": "gated_gcn_pyg",
+        "GINConvPyg": "gin_pyg",
+        "GINEConvPyg": "gin_pyg",
+        "PNAMessagePassingPyg": "pna_pyg",
+        "MPNNPlusPyg": "mpnn_pyg",
+        "GPSLayerPyg": "gps_pyg",
+        "scatter_logsum_pool": "pooling_pyg",
+        "scatter_std_pool": "pooling_pyg",
+        "parse_pooling_layer_pyg": "pooling_pyg",
+        "VirtualNodePyg": "pooling_pyg",
+        "DimeNetPyg": "dimenet_pyg",
+    },
+)
@@ -10,7 +10,7 @@ from torch_geometric.utils import scatter
 
 from graphium.nn.base_graph_layer import BaseGraphModule
 from graphium.utils.decorators import classproperty
-from graphium.nn.pyg_layers.utils import triplets
+from graphium.nn.pyg_layers.utils import get_batch_triplets
 from graphium.nn.base_layers import MLP, FCLayer
 
 
@@ -250,9 +250,9 @@ class DimeNetPyg(BaseGraphModule):
         assert (
             "radius_edge_index" in batch
         ), "radius_edge_index not in batch, make sure to use 3D encoder firstly"
-        # (j, i) = edge_index
-        i, j, idx_i, idx_j, idx_k, idx_kj, idx_ji = triplets(
-            batch.radius_edge_index, num_nodes=batch.feat.size(0)
+        # (j, i) = edge_index, with the triplets computed once per batch
+        i, j, idx_i, idx_j, idx_k, idx_kj, idx_ji = get_batch_triplets(
+            batch, batch.radius_edge_index, num_nodes=batch.feat.size(0)
         )
         x, P = batch.edge_feat, batch.feat
         rbf, sbf = batch.edge_rbf, batch.triplet_sbf
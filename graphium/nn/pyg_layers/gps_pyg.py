@@ -32,6 +32,7 @@ PYG_LAYERS_DICT = {
 
 ATTENTION_LAYERS_DICT = {
     "full-attention": MultiheadAttentionMup,
+    "varlen-attention": MultiheadAttentionMup,
     "none": None,
 }
 
@@ -56,6 +57,7 @@ class GPSLayerPyg(BaseGraphModule):
         droppath_rate_attn: float = 0.0,
         droppath_rate_ffn: float = 0.0,
         hidden_dim_scaling: float = 4.0,
+        varlen_bucket_multiple: int = 8,
         **kwargs,
     ):
         r"""
@@ -113,7 +115,10 @@ class GPSLayerPyg(BaseGraphModule):
                 kwargs for mpnn layer
 
             attn_type:
-                type of attention used, choose from "full-attention" and "none"
+                type of attention used, choose from "full-attention", "varlen-attention" and "none".
+                "varlen-attention" has the same parameters and outputs as "full-attention", but the graphs
+                are grouped in buckets of similar sizes, such that the cost scales with the sum of the squared
+                number of nodes of each graph, instead of the batch size times the squared largest graph.
 
             attn_kwargs:
                 kwargs for attention layer
@@ -140,6 +145,11 @@ class GPSLayerPyg(BaseGraphModule):
             attn_kwargs:
                 Keyword arguments to pass to the attention layer
 
+            varlen_bucket_multiple:
+                For `attn_type="varlen-attention"`, the number of nodes of the graphs are rounded up to
+                a multiple of `varlen_bucket_multiple`, and the graphs with the same rounded size are
+                processed together. Larger values mean fewer, but more padded, attention calls.
+
         """
 
         super().__init__(
@@ -185,6 +195,8 @@ class GPSLayerPyg(BaseGraphModule):
         self.norm_layer_ff = self._parse_norm(self.normalization)
 
         self.biased_attention_key = biased_attention_key
+        self.attn_type = attn_type
+        self.varlen_bucket_multiple = varlen_bucket_multiple
         # Initialize the MPNN and Attention layers
         self.mpnn = self._parse_mpnn_layer(mpnn_type, mpnn_kwargs)
         self.attn_layer = self._parse_attn_layer(attn_type, self.biased_attention_key, attn_kwargs)
@@ -341,6 +353,12 @@ class GPSLayerPyg(BaseGraphModule):
             )
         return h
 
+    def _use_varlen(self, batch: Batch, on_ipu: bool) -> bool:
+        """
+        Check if the variable-length attention can be used, since the IPU and the packing need static shapes.
+        """
+        return (self.attn_type == "varlen-attention") and (not on_ipu) and (not self._use_packing(batch))
+
     def _self_attention_block(self, feat: Tensor, feat_in: Tensor, batch: Batch) -> Tensor:
         """
         Applying the multi-head self-attention to the batch of graphs.
@@ -358,26 +376,30 @@ class GPSLayerPyg(BaseGraphModule):
         # Convert the tensor to a dense batch, then back to a sparse batch
         batch_size = None if feat.device.type != "ipu" else batch.graph_is_true.shape[0]
 
-        # h[num_nodes, hidden_dim] -> h_dense[num_graphs, max_num_nodes, hidden_dim]
-        feat_dense, attn_mask, key_padding_mask, idx = self._to_dense_batch(
-            feat,
-            batch=batch,  # The batch index as a vector that indicates for nodes of which graph it belongs to
-            batch_size=batch_size,
-            max_num_nodes_per_graph=max_num_nodes_per_graph,
-            on_ipu=on_ipu,
-        )
-
         attn_bias = None
         if self.biased_attention_key is not None:
             attn_bias = batch[self.biased_attention_key]
 
-        # h_dense[num_graphs, max_num_nodes, hidden_dim] -> feat_attn[num_graphs, max_num_nodes, hidden_dim]
-        feat_attn = self._sa_block(
-            feat_dense, attn_bias=attn_bias, attn_mask=attn_mask, key_padding_mask=key_padding_mask
-        )
+        if self._use_varlen(batch, on_ipu=on_ipu):
+            # h[num_nodes, hidden_dim] -> feat_attn[num_nodes, hidden_dim], one size bucket at a time
+            feat_attn = self._varlen_sa_block(feat, batch_idx=batch.batch, attn_bias=attn_bias)
+        else:
+            # h[num_nodes, hidden_dim] -> h_dense[num_graphs, max_num_nodes, hidden_dim]
+            feat_dense, attn_mask, key_padding_mask, idx = self._to_dense_batch(
+                feat,
+                batch=batch,  # The batch index as a vector that indicates for nodes of which graph it belongs to
+                batch_size=batch_size,
+                max_num_nodes_per_graph=max_num_nodes_per_graph,
+                on_ipu=on_ipu,
+            )
 
-        # feat_attn[num_graphs, max_num_nodes, hidden_dim] -> feat_attn[num_nodes, hidden_dim]
-        feat_attn = self._to_sparse_batch(batch, feat_attn, idx)
+            # h_dense[num_graphs, max_num_nodes, hidden_dim] -> feat_attn[num_graphs, max_num_nodes, hidden_dim]
+            feat_attn = self._sa_block(
+                feat_dense, attn_bias=attn_bias, attn_mask=attn_mask, key_padding_mask=key_padding_mask
+            )
+
+            # feat_attn[num_graphs, max_num_nodes, hidden_dim] -> feat_attn[num_nodes, hidden_dim]
+            feat_attn = self._to_sparse_batch(batch, feat_attn, idx)
 
         # Dropout, residual, norm
         if self.dropout_attn is not None:
@@ -391,6 +413,54 @@ class GPSLayerPyg(BaseGraphModule):
         # Combine local and global outputs.
         return feat + feat_attn
 
+    def _varlen_sa_block(self, feat: Tensor, batch_idx: Tensor, attn_bias: Optional[Tensor] = None) -> Tensor:
+        """
+        Self-attention block without padding all the graphs to the largest one.
+        The graphs are grouped by their number of nodes, rounded up to a multiple of `varlen_bucket_multiple`,
+        and each group is padded to its own size. The padded keys are masked, such that the outputs are the
+        same as the dense path, while the cost scales with the sum of the squared sizes of the graphs.
+        Parameters:
+            feat: node features [num_nodes, hidden_dim]
+            batch_idx: the graph of each node [num_nodes], sorted as in a pyg `Batch`
+            attn_bias: attention bias tensor [num_graphs, num_heads, max_num_nodes, max_num_nodes]
+        Returns:
+            feat_attn: output tensor [num_nodes, hidden_dim]
+        """
+        num_graphs = int(batch_idx.max()) + 1 if batch_idx.numel() > 0 else 0
+        num_nodes = torch.bincount(batch_idx, minlength=num_graphs)
+        ptr = torch.cumsum(num_nodes, dim=0) - num_nodes
+        node_pos = torch.arange(batch_idx.shape[0], device=feat.device) - ptr[batch_idx]
+        multiple = self.varlen_bucket_multiple
+        bucket_sizes = torch.div(num_nodes + multiple - 1, multiple, rounding_mode="floor") * multiple
+
+        feat_attn = feat.new_zeros(feat.shape[0], self.attn_layer.embed_dim)
+        graph_rank = torch.zeros_like(num_nodes)
+        for size in torch.unique(bucket_sizes).tolist():
+            if size == 0:
+                continue
+            graph_ids = torch.nonzero(bucket_sizes == size).squeeze(-1)
+            graph_rank[graph_ids] = torch.arange(graph_ids.shape[0], device=feat.device)
+            nodes = torch.nonzero((bucket_sizes == size)[batch_idx]).squeeze(-1)
+            rows, cols = graph_rank[batch_idx[nodes]], node_pos[nodes]
+
+            # h[nodes_in_bucket, hidden_dim] -> h_dense[graphs_in_bucket, size, hidden_dim]
+            feat_dense = feat.new_zeros(graph_ids.shape[0], size, feat.shape[-1])
+            feat_dense[rows, cols] = feat[nodes]
+            arange = torch.arange(size, device=feat.device)
+            key_padding_mask = arange.unsqueeze(0) >= num_nodes[graph_ids].unsqueeze(1)
+
+            # The bias is padded to the largest graph of the batch, which may be smaller than the bucket size
+            bucket_bias = None
+            if attn_bias is not None:
+                bucket_bias = attn_bias[graph_ids, :, :size, :size]
+                pad = size - bucket_bias.shape[-1]
+                if pad > 0:
+                    bucket_bias = torch.nn.functional.pad(bucket_bias, (0, pad, 0, pad))
+
+            feat_dense = self._sa_block(feat_dense, attn_bias=bucket_bias, key_padding_mask=key_padding_mask)
+            feat_attn[nodes] = feat_dense[rows, cols]
+        return feat_attn
+
     def _sa_block(
         self, x: torch.Tensor, attn_bias: torch.Tensor, attn_mask=None, key_padding_mask=None
     ) -> torch.Tensor:
@@ -3,16 +3,15 @@ from functools import partial
 
 import torch
 from torch import Tensor
-from torch_scatter import scatter
 
 from torch_geometric.nn.conv import MessagePassing
 from torch_geometric.typing import OptTensor
-from torch_geometric.utils import degree
 from torch_geometric.data import Data, Batch
 
 from graphium.utils.decorators import classproperty
 from graphium.nn.base_layers import MLP, FCLayer, get_activation
 from graphium.nn.base_graph_layer import BaseGraphStructure, check_intpus_allow_int
+from graphium.nn.pyg_layers.segment_reduce import segment_aggregate
 
 
 class PNAMessagePassingPyg(MessagePassing, BaseGraphStructure):
@@ -205,47 +204,33 @@ class PNAMessagePassingPyg(MessagePassing, BaseGraphStructure):
         Returns:
             out: aggregated features
         """
-        outs = []
-
+        # All the aggregators are computed from a single fused segment reduction, which also gives the degree
         for aggregator in self.aggregators:
-            if aggregator == "sum":
-                out = scatter(inputs, index, 0, None, dim_size, reduce="sum")
-            elif aggregator == "mean":
-                out = scatter(inputs, index, 0, None, dim_size, reduce="mean")
-            elif aggregator == "min":
-                out = scatter(inputs, index, 0, None, dim_size, reduce="min")
-            elif aggregator == "max":
-                out = scatter(inputs, index, 0, None, dim_size, reduce="max")
-            elif aggregator in ["var", "std"]:
-                mean = scatter(inputs, index, 0, None, dim_size, reduce="mean")
-                mean_squares = scatter(inputs * inputs, index, 0, None, dim_size, reduce="mean")
-                out = mean_squares - mean * mean
-                if aggregator == "std":
-                    out = torch.sqrt(torch.relu(out) + 1e-5)
-            else:
+            if aggregator not in ["sum", "mean", "min", "max", "var", "std"]:
                 raise ValueError(f'Unknown aggregator "{aggregator}".')
-            outs.append(out)
-        out = torch.cat(outs, dim=-1)
-
-        deg = degree(index, dim_size, dtype=inputs.dtype)
-        deg = deg.clamp_(1).view(-1, 1)
+        out, deg = segment_aggregate(inputs, index, aggregators=self.aggregators, dim_size=dim_size)
+        deg = deg.to(dtype=inputs.dtype).clamp_(1).view(-1, 1)
 
-        outs = []
+        # Apply all the scalers with a single broadcasted product, in the order of `self.scalers`
+        factors = []
         for scaler in self.scalers:
             if scaler == "identity":
-                out_scaler = out
+                factor = torch.ones_like(deg)
             elif scaler == "amplification":
-                out_scaler = out * (torch.log(deg + 1) / self.avg_d["log"])
+                factor = torch.log(deg + 1) / self.avg_d["log"]
             elif scaler == "attenuation":
-                out_scaler = out * (self.avg_d["log"] / torch.log(deg + 1))
+                factor = self.avg_d["log"] / torch.log(deg + 1)
             elif scaler == "linear":
-                out_scaler = out * (deg / self.avg_d["lin"])
+                factor = deg / self.avg_d["lin"]
             elif scaler == "inverse_linear":
-                out_scaler = out * (self.avg_d["lin"] / deg)
+                factor = self.avg_d["lin"] / deg
             else:
                 raise ValueError(f'Unknown scaler "{scaler}".')
-            outs.append(out_scaler)
-        return torch.cat(outs, dim=-1)
+            factors.append(factor)
+        if (len(factors) == 1) and (self.scalers[0] == "identity"):
+            return out
+        factors = torch.cat(factors, dim=-1)
+        return (out.unsqueeze(1) * factors.unsqueeze(-1)).reshape(out.shape[0], -1)
 
     @property
     def layer_outputs_edges(self) -> bool:
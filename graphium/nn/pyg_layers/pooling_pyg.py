@@ -4,12 +4,12 @@ from torch import Tensor, LongTensor
 from typing import List, Union, Callable, Tuple, Optional, Dict
 from copy import deepcopy
 
-from torch_scatter import scatter
 from torch_geometric.data import Data, Batch
 
 from graphium.nn.base_layers import MLP, FCLayer
 from graphium.utils.tensor import ModuleListConcat, ModuleWrap
 from graphium.nn.base_layers import MuReadoutGraphium
+from graphium.nn.pyg_layers.segment_reduce import segment_aggregate
 
 EPS = 1e-6
 
@@ -33,17 +33,8 @@ def scatter_logsum_pool(x: Tensor, batch: LongTensor, dim: int = 0, dim_size: Op
     Returns:
         the pooled features tensor
     """
-    dim_size = int(batch.max().item() + 1) if dim_size is None else dim_size
-    mean_pool = scatter(x, batch, dim=dim, dim_size=dim_size, reduce="mean")
-    num_nodes = scatter(
-        torch.ones(x.shape[:-1], dtype=x.dtype, device=x.device),
-        batch,
-        dim=dim,
-        dim_size=dim_size,
-        reduce="sum",
-    )
-    lognum = torch.log(num_nodes)
-    return mean_pool * lognum.unsqueeze(-1)
+    assert dim == 0, "Only the pooling over the first dimension is supported"
+    return segment_aggregate(x, batch, aggregators=["logsum"], dim_size=dim_size)[0]
 
 
 def scatter_std_pool(x: Tensor, batch: LongTensor, dim: int = 0, dim_size: Optional[int] = None):
@@ -65,11 +56,8 @@ def scatter_std_pool(x: Tensor, batch: LongTensor, dim: int = 0, dim_size: Optio
     Returns:
         the pooled features tensor
     """
-    dim_size = int(batch.max().item() + 1) if dim_size is None else dim_size
-    mean = scatter(x, batch, dim=dim, out=None, dim_size=dim_size, reduce="mean")
-    mean_squares = scatter(x * x, batch, dim=dim, out=None, dim_size=dim_size, reduce="mean")
-    out = mean_squares - mean * mean
-    return torch.sqrt(torch.relu(out) + 1e-5)
+    assert dim == 0, "Only the pooling over the first dimension is supported"
+    return segment_aggregate(x, batch, aggregators=["std"], dim_size=dim_size)[0]
 
 
 class PoolingWrapperPyg(ModuleWrap):
@@ -96,10 +84,50 @@ class PoolingWrapperPyg(ModuleWrap):
         return self.func(feature, index, dim_size=dim_size, *args, **kwargs, **self.kwargs)
 
 
+class SegmentPoolingPyg(torch.nn.Module):
+    def __init__(self, poolings: List[str], feat_type: str = "node") -> None:
+        r"""
+        Apply several graph poolings at once, and concatenate their outputs. All the poolings are
+        computed from a single fused segment reduction, see `graphium.nn.pyg_layers.segment_reduce`.
+
+        Parameters:
+            poolings: The poolings, among `"sum"`, `"mean"`, `"logsum"`, `"max"`, `"min"` and `"std"`
+            feat_type: The type of the pooled features, `"node"`, `"edge"` or `"global"`
+        """
+        super().__init__()
+        self.poolings = list(poolings)
+        self.feat_type = feat_type
+
+    def forward(self, g: Batch, feature: Tensor) -> Tensor:
+        """
+        forward function
+        Parameters:
+            g: the pyg batch graph
+            feature: the node features
+        Returns:
+            the pooled features, concatenated in the order of `self.poolings`
+        """
+        if self.feat_type == "edge":
+            index = g.batch[g.edge_index][0]
+        else:
+            index = g.batch
+
+        # The nodes and edges of a batch built by `Batch.from_data_list` are sorted by graph
+        is_sorted = getattr(g, "ptr", None) is not None
+        out, _ = segment_aggregate(
+            feature, index, aggregators=self.poolings, dim_size=g.num_graphs, is_sorted=is_sorted
+        )
+        return out
+
+    def extra_repr(self) -> str:
+        return f"poolings={self.poolings}, feat_type={self.feat_type}"
+
+
 def parse_pooling_layer_pyg(in_dim: int, pooling: Union[str, List[str]], feat_type: str = "node", **kwargs):
     r"""
     Select the pooling layers from a list of strings, and put them
-    in a Module that concatenates their outputs.
+    in a Module that concatenates their outputs. All the poolings are
+    computed together by a single `SegmentPoolingPyg`.
 
     Parameters:
 
@@ -125,25 +153,18 @@ def parse_pooling_layer_pyg(in_dim: int, pooling: Union[str, List[str]], feat_ty
     if isinstance(pooling, str):
         pooling = [pooling]
     assert feat_type in ["node", "edge", "global"]
+    poolings = []
     for this_pool in pooling:
         this_pool = None if this_pool is None else this_pool.lower()
         out_pool_dim += in_dim
-        if this_pool == "sum":
-            pool_layer.append(PoolingWrapperPyg(scatter, dim=0, reduce="add", feat_type=feat_type, **kwargs))
-        elif this_pool == "mean":
-            pool_layer.append(PoolingWrapperPyg(scatter, dim=0, reduce="mean", feat_type=feat_type, **kwargs))
-        elif this_pool == "logsum":
-            pool_layer.append(PoolingWrapperPyg(scatter_logsum_pool, dim=0, feat_type=feat_type, **kwargs))
-        elif this_pool == "max":
-            pool_layer.append(PoolingWrapperPyg(scatter, dim=0, reduce="max", feat_type=feat_type, **kwargs))
-        elif this_pool == "min":
-            pool_layer.append(PoolingWrapperPyg(scatter, dim=0, reduce="min", feat_type=feat_type, **kwargs))
-        elif this_pool == "std":
-            pool_layer.append(PoolingWrapperPyg(scatter_std_pool, dim=0, feat_type=feat_type, **kwargs))
+        if this_pool in ["sum", "mean", "logsum", "max", "min", "std"]:
+            poolings.append(this_pool)
         elif (this_pool == "none") or (this_pool is None):
             pass
         else:
             raise NotImplementedError(f"Undefined pooling `{this_pool}`")
+    if len(poolings) > 0:
+        pool_layer.append(SegmentPoolingPyg(poolings, feat_type=feat_type))
 
     return pool_layer, out_pool_dim
 
@@ -0,0 +1,158 @@
+r"""
+Fused segment reductions, computing once all the statistics needed by several aggregators,
+for the multi-aggregator layers and the graph pooling, with CSR segment reductions for the extremes.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import torch
+from torch import Tensor, LongTensor
+from torch_scatter import scatter, segment_csr
+
+from graphium.ipu.ipu_utils import is_running_on_ipu
+
+SEGMENT_STATISTICS = ["sum", "sum_squares", "min", "max", "count"]
+
+# The statistics required by each aggregator
+SEGMENT_AGGREGATORS = {
+    "sum": ["sum"],
+    "mean": ["sum", "count"],
+    "logsum": ["sum", "count"],
+    "min": ["min"],
+    "max": ["max"],
+    "var": ["sum", "sum_squares", "count"],
+    "std": ["sum", "sum_squares", "count"],
+}
+
+
+def segment_statistics(
+    x: Tensor,
+    index: LongTensor,
+    dim_size: Optional[int] = None,
+    statistics: Sequence[str] = ("sum", "sum_squares", "min", "max", "count"),
+    is_sorted: bool = False,
+) -> Dict[str, Tensor]:
+    r"""
+    Compute the statistics of the rows of `x` grouped by `index`, with a single reduction per statistic,
+    such that the statistics shared by several aggregators are only computed once.
+
+    - The counts are computed with `torch.bincount`, and give the CSR pointers of the segments
+    - The sums and sums of squares are computed with a `scatter` sum, which does not require a sorted `index`
+    - The minima and maxima are computed with a CSR segment reduction over the sorted rows, which
+      is much faster than a `scatter` min or max. If `index` is not sorted, the rows are sorted once
+      with a stable `argsort`.
+
+    On IPU, the statistics are computed with separate `scatter` calls, since the segment reductions are not supported.
+
+    Parameters:
+        x: The features, of shape `(N, F)`
+        index: The segment of each row, of shape `(N,)`
+        dim_size: The number of segments. Defaults to `index.max() + 1`.
+        statistics: The statistics to compute, among `SEGMENT_STATISTICS`
+        is_sorted: Whether `index` is already sorted, such as the `batch` vector of a PyG batch
+
+    Returns:
+        stats: The tensor of shape `(dim_size, F)` of each statistic, or `(dim_size,)` for the `"count"`.
+            The empty segments have zero statistics.
+    """
+    for stat in statistics:
+        if stat not in SEGMENT_STATISTICS:
+            raise ValueError(f"Unknown statistic `{stat}`, choose from {SEGMENT_STATISTICS}")
+    dim_size = int(index.max()) + 1 if dim_size is None else dim_size
+
+    if is_running_on_ipu():
+        return _scatter_statistics(x, index, dim_size=dim_size, statistics=statistics)
+
+    stats = {}
+    count = torch.bincount(index, minlength=dim_size)
+    if "count" in statistics:
+        stats["count"] = count
+    if "sum" in statistics:
+        stats["sum"] = scatter(x, index, dim=0, dim_size=dim_size, reduce="sum")
+    if "sum_squares" in statistics:
+        stats["sum_squares"] = scatter(x * x, index, dim=0, dim_size=dim_size, reduce="sum")
+
+    if ("min" in statistics) or ("max" in statistics):
+        ptr = torch.cat([count.new_zeros(1), torch.cumsum(count, dim=0)])
+        if not is_sorted:
+            x = x[torch.argsort(index, stable=True)]
+        for stat in ["min", "max"]:
+            if stat in statistics:
+                stats[stat] = segment_csr(x, ptr, reduce=stat)
+
+    return stats
+
+
+def _scatter_statistics(
+    x: Tensor, index: LongTensor, dim_size: int, statistics: Sequence[str]
+) -> Dict[str, Tensor]:
+    """Implementation of `segment_statistics` with one `scatter` per statistic"""
+    stats = {}
+    if "count" in statistics:
+        ones = torch.ones(x.shape[:-1], dtype=x.dtype, device=x.device)
+        stats["count"] = scatter(ones, index, dim=0, dim_size=dim_size, reduce="sum")
+    if "sum" in statistics:
+        stats["sum"] = scatter(x, index, dim=0, dim_size=dim_size, reduce="sum")
+    if "sum_squares" in statistics:
+        stats["sum_squares"] = scatter(x * x, index, dim=0, dim_size=dim_size, reduce="sum")
+    if "min" in statistics:
+        stats["min"] = scatter(x, index, dim=0, dim_size=dim_size, reduce="min")
+    if "max" in statistics:
+        stats["max"] = scatter(x, index, dim=0, dim_size=dim_size, reduce="max")
+    return stats
+
+
+def segment_aggregate(
+    x: Tensor,
+    index: LongTensor,
+    aggregators: Sequence[str],
+    dim_size: Optional[int] = None,
+    is_sorted: bool = False,
+) -> Tuple[Tensor, Tensor]:
+    r"""
+    Apply several aggregators on the rows of `x` grouped by `index`, from a single call to `segment_statistics`.
+
+    Parameters:
+        x: The features, of shape `(N, F)`
+        index: The segment of each row, of shape `(N,)`
+        aggregators: The aggregators, among the keys of `SEGMENT_AGGREGATORS`. The `"var"` and `"std"`
+            are the biased variance and standard deviation, with `std = sqrt(relu(var) + 1e-5)`, and
+            `"logsum"` is the mean multiplied by the log of the number of rows.
+        dim_size: The number of segments. Defaults to `index.max() + 1`.
+        is_sorted: Whether `index` is already sorted
+
+    Returns:
+        out: The concatenated aggregations, of shape `(dim_size, len(aggregators) * F)`
+        count: The number of rows of each segment, of shape `(dim_size,)`
+    """
+    statistics = {"count"}
+    for aggregator in aggregators:
+        if aggregator not in SEGMENT_AGGREGATORS:
+            raise ValueError(f'Unknown aggregator "{aggregator}".')
+        statistics.update(SEGMENT_AGGREGATORS[aggregator])
+    stats = segment_statistics(
+        x, index, dim_size=dim_size, statistics=sorted(statistics), is_sorted=is_sorted
+    )
+
+    count = stats["count"].to(dtype=x.dtype).unsqueeze(-1)
+    inv_count = 1 / count.clamp(min=1)
+    mean = stats["sum"] * inv_count if "sum" in stats else None
+    var = None
+    if "sum_squares" in stats:
+        var = stats["sum_squares"] * inv_count - mean * mean
+
+    outs = []
+    for aggregator in aggregators:
+        if aggregator in ["sum", "min", "max"]:
+            out = stats[aggregator]
+        elif aggregator == "mean":
+            out = mean
+        elif aggregator == "logsum":
+            out = mean * torch.log(count)
+        elif aggregator == "var":
+            out = var
+        elif aggregator == "std":
+            out = torch.sqrt(torch.relu(var) + 1e-5)
+        outs.append(out)
+    out = outs[0] if len(outs) == 1 else torch.cat(outs, dim=-1)
+    return out, stats["count"]
@@ -2,7 +2,9 @@ import math
 import torch
 import torch.nn as nn
 from torch_geometric.data import Batch
-from typing import Tuple
+from typing import Optional, Tuple
+from bisect import bisect_right
+from torch.utils.checkpoint import checkpoint
 from torch import Tensor
 
 from torch_geometric.typing import SparseTensor
@@ -25,6 +27,7 @@ class PreprocessPositions(nn.Module):
         num_layers=2,
         activation="gelu",
         first_normalization="none",
+        chunk_size: Optional[int] = None,
     ):
         r"""
         Parameters:
@@ -37,10 +40,16 @@ class PreprocessPositions(nn.Module):
             num_layers: The number of layers in the MLP.
             activation: The activation function used in the MLP.
             first_normalization: The normalization function used before the gaussian kernel.
+            chunk_size:
+                If provided, the gaussian kernels are only computed on the node pairs of the same graph,
+                by chunks of at most `chunk_size` pairs, instead of the dense `[batch, nodes, nodes, num_kernel]`
+                tensor of the graphs padded to the largest one. The chunks are recomputed during the backward
+                pass. Only the attention bias is dense. Not used on IPU.
 
         """
         super().__init__()
         self.num_heads = num_heads
+        self.chunk_size = chunk_size
         self.num_kernel = num_kernel
         self.embed_dim = embed_dim
         self.first_normalization = get_norm(first_normalization, dim=in_dim)
@@ -75,6 +84,9 @@ class PreprocessPositions(nn.Module):
 
         """
 
+        if (self.chunk_size is not None) and (not on_ipu):
+            return self.forward_chunked(batch, max_num_nodes_per_graph, positions_3d_key)
+
         pos = batch[positions_3d_key]
         if self.first_normalization is not None:
             pos = self.first_normalization(pos)
@@ -128,7 +140,10 @@ class PreprocessPositions(nn.Module):
         )
         # apply padding_mask on distance_feature
         # unsqueezed mask size: [batch, 1, nodes, 1] apply on tensor [batch, nodes, nodes, num_kernel]
-        distance_feature.masked_fill_(padding_mask.unsqueeze(1).unsqueeze(-1).to(torch.bool), 0.0)
+        # out-of-place, since `distance_feature` is needed by the backward of `gaussian_proj`
+        distance_feature = distance_feature.masked_fill(
+            padding_mask.unsqueeze(1).unsqueeze(-1).to(torch.bool), 0.0
+        )
         # [batch, nodes, num_kernel]
         distance_feature_sum = distance_feature.sum(dim=-2)
         # Output of GaussianLayer is FP32, cast to dtype of self.node_proj here
@@ -143,6 +158,112 @@ class PreprocessPositions(nn.Module):
 
         return attn_bias, node_feature
 
+    def forward_chunked(
+        self, batch: Batch, max_num_nodes_per_graph: Optional[int], positions_3d_key: str
+    ) -> Tuple[Tensor, Tensor]:
+        r"""
+        Memory-efficient version of `forward`, computing the gaussian kernels only on the node pairs of the
+        same graph, by chunks of `self.chunk_size` pairs, and summing them per node without the dense
+        `[batch, nodes, nodes, num_kernel]` tensor. The outputs are the same as `forward`, except for
+        the attention bias of the padding nodes towards the real nodes, which is 0.
+
+        Inputs:
+            batch:
+                Batch object.
+            max_num_nodes_per_graph:
+                Maximum number of nodes per graph.
+            positions_3d_key:
+                The key of the pyg graph object that contains the 3D positions.
+
+        """
+        pos = batch[positions_3d_key]
+        if self.first_normalization is not None:
+            pos = self.first_normalization(pos)
+        # mask: [batch, nodes], the same dense layout as `forward`
+        _, mask, _ = to_dense_batch(pos, batch=batch.batch, max_num_nodes_per_graph=max_num_nodes_per_graph)
+        batch_size, n_node = mask.shape
+        padding_mask = ~mask
+
+        # The molecules without 3D positions, based on their first node
+        # [total_nodes]
+        num_nodes = torch.bincount(batch.batch, minlength=batch_size)
+        ptr = torch.cat([num_nodes.new_zeros(1), num_nodes.cumsum(0)])
+        nan_mask = torch.zeros(batch_size, dtype=torch.bool, device=pos.device)
+        nan_mask[num_nodes > 0] = torch.isnan(pos[ptr[:-1][num_nodes > 0], 0])
+        pos = pos.masked_fill(nan_mask[batch.batch].unsqueeze(-1), 0.0)
+
+        # All the pairs (i, j) of nodes of the same graph, sorted by i
+        # [total_nodes]
+        pairs_per_node = num_nodes[batch.batch]
+        node_start = ptr[batch.batch]
+        # [total_pairs]
+        idx_i = torch.repeat_interleave(torch.arange(pos.shape[0], device=pos.device), pairs_per_node)
+        pair_start = torch.cumsum(pairs_per_node, 0) - pairs_per_node
+        offset = torch.arange(idx_i.shape[0], device=pos.device) - pair_start[idx_i]
+        idx_j = node_start[idx_i] + offset
+        graph = batch.batch[idx_i]
+        # Index of the pairs in the dense `[batch, nodes, nodes]` layout
+        dense_idx = (graph * n_node + (idx_i - node_start[idx_i])) * n_node + offset
+
+        # Chunks of consecutive nodes i, with at most `chunk_size` pairs unless a single node has more
+        node_bounds = [0]
+        pairs_cumsum = torch.cumsum(pairs_per_node, 0).tolist()
+        while node_bounds[-1] < len(pairs_cumsum):
+            start = node_bounds[-1]
+            limit = (pairs_cumsum[start - 1] if start > 0 else 0) + self.chunk_size
+            stop = max(start + 1, bisect_right(pairs_cumsum, limit, lo=start))
+            node_bounds.append(stop)
+
+        attn_bias, distance_feature_sum = [], []
+        for start, stop in zip(node_bounds[:-1], node_bounds[1:]):
+            pair_slice = slice(pairs_cumsum[start - 1] if start > 0 else 0, pairs_cumsum[stop - 1])
+            args = (pos, idx_i[pair_slice], idx_j[pair_slice], start, stop - start)
+            if torch.is_grad_enabled():
+                chunk_bias, chunk_sum = checkpoint(self._forward_pairs, *args, use_reentrant=False)
+            else:
+                chunk_bias, chunk_sum = self._forward_pairs(*args)
+            attn_bias.append(chunk_bias)
+            distance_feature_sum.append(chunk_sum)
+
+        # [batch, num_heads, nodes, nodes]
+        attn_bias = torch.cat(attn_bias, dim=0) if len(attn_bias) > 0 else pos.new_zeros(0, self.num_heads)
+        dense_bias = attn_bias.new_zeros(batch_size * n_node * n_node, self.num_heads)
+        dense_bias = dense_bias.index_put((dense_idx,), attn_bias)
+        attn_bias = (
+            dense_bias.view(batch_size, n_node, n_node, self.num_heads).permute(0, 3, 1, 2).contiguous()
+        )
+        attn_bias = attn_bias.masked_fill(padding_mask.unsqueeze(1).unsqueeze(2), float("-1000"))
+        attn_bias = attn_bias.masked_fill(nan_mask.unsqueeze(-1).unsqueeze(-1).unsqueeze(-1), 0.0)
+
+        # [total_nodes, embed_dim]
+        distance_feature_sum = (
+            torch.cat(distance_feature_sum, dim=0)
+            if len(distance_feature_sum) > 0
+            else pos.new_zeros(0, self.num_kernel)
+        )
+        node_feature = self.node_proj(distance_feature_sum.to(self.node_proj.weight.dtype))
+        node_feature = node_feature.masked_fill(nan_mask[batch.batch].unsqueeze(-1), 0.0)
+
+        return attn_bias, node_feature
+
+    def _forward_pairs(
+        self, pos: Tensor, idx_i: Tensor, idx_j: Tensor, first_node: int, num_nodes: int
+    ) -> Tuple[Tensor, Tensor]:
+        r"""
+        Compute the attention bias of a chunk of node pairs `(i, j)`, sorted by `i`, and the sum of their
+        gaussian kernels over `j` for the nodes `first_node` to `first_node + num_nodes`.
+        """
+        # [1, 1, pairs]
+        distance = (pos[idx_j] - pos[idx_i]).norm(dim=-1).view(1, 1, -1)
+        # [pairs, num_kernel]
+        distance_feature = self.gaussian(distance).view(-1, self.num_kernel)
+        # [pairs, num_heads]
+        attn_bias = self.gaussian_proj(distance_feature)
+        # [nodes, num_kernel]
+        distance_feature_sum = distance_feature.new_zeros(num_nodes, self.num_kernel)
+        distance_feature_sum = distance_feature_sum.index_add(0, idx_i - first_node, distance_feature)
+        return attn_bias, distance_feature_sum
+
 
 class GaussianLayer(nn.Module):
     def __init__(self, num_kernels=128, in_dim=3):
@@ -216,3 +337,59 @@ def triplets(
     idx_kj = adj_t_row.storage.value()[mask]
     idx_ji = adj_t_row.storage.row()[mask]
     return col, row, idx_i, idx_j, idx_k, idx_kj, idx_ji
+
+
+def triplets_from_index(
+    edge_index: Tensor,
+    triplet_index: Tensor,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    r"""Gets the triplets from the edge indices `(k->j, j->i)` of each triplet,
+        as precomputed by `graphium.features.featurizer.get_radius_graph_and_triplets`.
+        The outputs are the same as `triplets`.
+
+    Parameters:
+        edge_index (LongTensor): The edge indices.
+        triplet_index (LongTensor): The indices of the edges `(k->j, j->i)` of the triplets.
+
+    Returns:
+        See `triplets`.
+    """
+    row, col = edge_index  # j->i
+    idx_kj, idx_ji = triplet_index
+    return col, row, col[idx_ji], row[idx_ji], row[idx_kj], idx_kj, idx_ji
+
+
+def get_batch_triplets(
+    batch: Batch,
+    edge_index: Tensor,
+    num_nodes: int,
+    triplet_index: Optional[Tensor] = None,
+) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    r"""Gets the triplets of the radius graph of a batch, computed once and cached on the batch,
+        such that the 3D encoder and all the DimeNet layers share them during a forward pass.
+
+    Parameters:
+        batch (Batch): The batch, caching the triplets.
+        edge_index (LongTensor): The edge indices of the radius graph.
+        num_nodes (int): The number of nodes.
+        triplet_index (LongTensor, optional): The precomputed triplets, see `triplets_from_index`.
+            If `None`, they are computed with `triplets`.
+
+    Returns:
+        See `triplets`.
+    """
+    # The encoder outputs are pooled before being added to the batch, so the cached
+    # edge indices are not the same tensor as `batch.radius_edge_index`
+    cached = getattr(batch, "_radius_triplets", None)
+    if (
+        (cached is not None)
+        and (cached[0].shape == edge_index.shape)
+        and (cached[0].device == edge_index.device)
+    ):
+        return cached[1]
+    if triplet_index is not None:
+        out = triplets_from_index(edge_index, triplet_index)
+    else:
+        out = triplets(edge_index, num_nodes=num_nodes)
+    batch._radius_triplets = (edge_index, out)
+    return out
@@ -1,4 +1,7 @@
-from . import predictor
-from . import metrics
+from graphium._lazy import lazy_import
 
-from .predictor import PredictorModule
+__getattr__, __dir__, __all__ = lazy_import(
+    __name__,
+    submodules=["predictor", "metrics"],
+    attributes={"PredictorModule": "predictor"},
+)
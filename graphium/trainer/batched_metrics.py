@@ -0,0 +1,173 @@
+r"""
+Metrics computed on all the label columns at once, used by `MetricWrapper` with `multitask_handling="mean-per-label"`.
+The NaN targets are masked, instead of looping the columns and filtering the NaNs of each one of them.
+"""
+
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import torch
+from torch import Tensor
+
+
+def _masked_mean(values: Tensor, valid: Tensor) -> Tensor:
+    """Mean of each column over the valid elements, NaN for the columns without valid elements"""
+    values = torch.where(valid, values, torch.zeros_like(values))
+    return values.sum(dim=0) / valid.sum(dim=0)
+
+
+def batched_mean_squared_error(preds: Tensor, target: Tensor, valid: Tensor, squared: bool = True) -> Tensor:
+    mse = _masked_mean((preds - target) ** 2, valid)
+    return mse if squared else torch.sqrt(mse)
+
+
+def batched_mean_absolute_error(preds: Tensor, target: Tensor, valid: Tensor) -> Tensor:
+    return _masked_mean(torch.abs(preds - target), valid)
+
+
+def batched_pearson(preds: Tensor, target: Tensor, valid: Tensor) -> Tensor:
+    zeros = torch.zeros_like(preds)
+    preds_centered = torch.where(valid, preds - _masked_mean(preds, valid), zeros)
+    target_centered = torch.where(valid, target - _masked_mean(target, valid), zeros)
+    cov = (preds_centered * target_centered).sum(dim=0)
+    var_preds = (preds_centered**2).sum(dim=0)
+    var_target = (target_centered**2).sum(dim=0)
+    return torch.clamp(cov / torch.sqrt(var_preds * var_target), -1.0, 1.0)
+
+
+def batched_r2_score(preds: Tensor, target: Tensor, valid: Tensor) -> Tensor:
+    zeros = torch.zeros_like(preds)
+    target_centered = torch.where(valid, target - _masked_mean(target, valid), zeros)
+    rss = torch.where(valid, (preds - target) ** 2, zeros).sum(dim=0)
+    tss = (target_centered**2).sum(dim=0)
+    r2 = 1 - rss / tss
+
+    # `torchmetrics.functional.r2_score` requires at least two samples
+    return torch.where(valid.sum(dim=0) >= 2, r2, torch.full_like(r2, float("nan")))
+
+
+def _average_ranks(values: Tensor, valid: Tensor) -> Tensor:
+    r"""
+    Rank of each element within its column, starting from 1. The ties are given the average of their ranks,
+    and the invalid elements are ranked after all the valid ones.
+    """
+    values = torch.where(valid, values, torch.full_like(values, float("inf"))).T.contiguous()
+    sorted_values = torch.sort(values, dim=-1).values
+    first = torch.searchsorted(sorted_values, values, right=False)
+    last = torch.searchsorted(sorted_values, values, right=True)
+    return ((first + last + 1).to(dtype=torch.float64) / 2).T
+
+
+def batched_auroc(preds: Tensor, target: Tensor, valid: Tensor) -> Tensor:
+    r"""
+    Area under the ROC curve of each column, computed from the ranks of the predictions
+    with the Mann-Whitney U statistic, which is equal to the trapezoidal area under the ROC curve.
+    """
+    is_pos = valid & (target == 1)
+    num_pos = is_pos.sum(dim=0).to(dtype=torch.float64)
+    num_neg = valid.sum(dim=0).to(dtype=torch.float64) - num_pos
+    ranks = _average_ranks(preds, valid)
+    rank_sum = torch.where(is_pos, ranks, torch.zeros_like(ranks)).sum(dim=0)
+    auroc = (rank_sum - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg)
+
+    # `torchmetrics.functional.auroc` returns 0 when a single class is present, and fails with empty columns
+    auroc = torch.where((num_pos == 0) | (num_neg == 0), torch.zeros_like(auroc), auroc)
+    auroc = torch.where(valid.any(dim=0), auroc, torch.full_like(auroc, float("nan")))
+    return auroc.to(dtype=preds.dtype)
+
+
+def batched_average_precision(preds: Tensor, target: Tensor, valid: Tensor) -> Tensor:
+    r"""
+    Average precision of each column, as the mean over the positive elements of the precision
+    at the threshold given by their prediction. NaN for the columns without positive elements.
+    """
+    is_pos = valid & (target == 1)
+
+    # Sort the predictions in descending order, with the invalid elements last
+    neg_preds = torch.where(valid, -preds, torch.full_like(preds, float("inf")))
+    neg_preds_sorted, order = torch.sort(neg_preds, dim=0)
+    cum_tp = torch.cumsum(torch.gather(is_pos, 0, order).to(dtype=torch.float64), dim=0)
+
+    # Number of predictions greater or equal to each prediction, and the true positives among them
+    num_above = torch.searchsorted(neg_preds_sorted.T.contiguous(), neg_preds.T.contiguous(), right=True).T
+    tp_above = torch.gather(cum_tp, 0, (num_above - 1).clamp(min=0))
+    precision = tp_above / num_above.clamp(min=1)
+
+    num_pos = is_pos.sum(dim=0)
+    ap = torch.where(is_pos, precision, torch.zeros_like(precision)).sum(dim=0) / num_pos
+    return ap.to(dtype=preds.dtype)
+
+
+def batched_accuracy(preds: Tensor, target: Tensor, valid: Tensor, threshold: float = 0.5) -> Tensor:
+    correct = ((preds >= threshold).to(dtype=target.dtype) == target).to(dtype=preds.dtype)
+    accuracy = _masked_mean(correct, valid)
+
+    # `torchmetrics.functional.accuracy` fails with empty columns
+    return torch.where(valid.any(dim=0), accuracy, torch.full_like(accuracy, float("nan")))
+
+
+# The batched metrics, whether they are binary classification metrics, and the accepted kwargs with
+# the values that are supported. A `None` value means that all values of the kwarg are supported.
+BATCHED_METRICS: Dict[str, Tuple[Callable, bool, Dict[str, Optional[Set[Any]]]]] = {
+    "mse": (batched_mean_squared_error, False, {"squared": None}),
+    "mae": (batched_mean_absolute_error, False, {}),
+    "pearsonr": (batched_pearson, False, {}),
+    "r2": (batched_r2_score, False, {}),
+    "auroc": (batched_auroc, True, {"task": {None, "binary"}, "pos_label": {None, 1}}),
+    "averageprecision": (batched_average_precision, True, {"task": {None, "binary"}, "pos_label": {None, 1}}),
+    "accuracy": (batched_accuracy, True, {"task": {None, "binary"}, "threshold": None}),
+}
+
+
+def compute_batched_metric(
+    metric_name: Optional[str],
+    preds: Tensor,
+    target: Tensor,
+    target_to_int: bool = False,
+    **kwargs,
+) -> Optional[Tensor]:
+    r"""
+    Compute a metric independently on each label column, while ignoring the NaN targets.
+
+    Parameters:
+        metric_name: The name of the metric in `METRICS_DICT`
+        preds: The predictions, of shape `(N, L)`
+        target: The targets, of shape `(N, L)`, with NaNs for the missing labels
+        target_to_int: Whether the targets are converted to integers before computing the metric
+        kwargs: Other arguments of the metric
+
+    Returns:
+        metric_val: The metric of each of the `L` columns, with NaNs for the columns where the metric
+            is undefined. `None` if the metric or its arguments are not supported by a batched
+            implementation, in which case the columns must be computed one by one.
+    """
+    if metric_name not in BATCHED_METRICS:
+        return None
+    metric, is_binary, accepted_kwargs = BATCHED_METRICS[metric_name]
+    for key, value in kwargs.items():
+        if (key not in accepted_kwargs) or (
+            (accepted_kwargs[key] is not None) and (value not in accepted_kwargs[key])
+        ):
+            return None
+    kwargs = {key: value for key, value in kwargs.items() if key not in ["task", "pos_label"]}
+
+    if (preds.ndim != 2) or (preds.shape != target.shape) or (not preds.is_floating_point()):
+        return None
+
+    valid = ~torch.isnan(target)
+    target = torch.where(valid, target, torch.zeros_like(target))
+    if target_to_int:
+        target = target.to(int)
+
+    if is_binary:
+        # `torchmetrics` requires integer targets for the AUROC and the accuracy
+        if (metric_name != "averageprecision") and target.is_floating_point():
+            return None
+        if not torch.all((target == 0) | (target == 1)):
+            return None
+        # The predictions are thresholded as probabilities, and the logits are not supported
+        if (metric_name == "accuracy") and not torch.all(~valid | ((preds >= 0) & (preds <= 1))):
+            return None
+    else:
+        target = target.to(dtype=preds.dtype)
+
+    return metric(preds, target, valid, **kwargs)
@@ -10,6 +10,7 @@ from torchmetrics.utilities.distributed import reduce
 import torchmetrics.functional.regression.mae
 
 from graphium.utils.tensor import nan_mean
+from graphium.trainer.batched_metrics import compute_batched_metric
 
 # NOTE(hadim): the below is a fix to be able to import previously saved Graphium model that are incompatible
 # with the current version of torchmetrics.
@@ -129,6 +130,9 @@ class MetricWrapper:
         multitask_handling: Optional[str] = None,
         squeeze_targets: bool = False,
         target_to_int: bool = False,
+        streaming: bool = False,
+        streaming_max_samples: int = 100_000,
+        log_every_n_steps: int = 1,
         **kwargs,
     ):
         r"""
@@ -159,8 +163,9 @@ class MetricWrapper:
                 - 'flatten': Flatten the tensor to produce the equivalent of a single task
 
                 - 'mean-per-label': Loop all the labels columns, process them as a single task,
-                    and average the results over each task
-                  *This option might slow down the computation if there are too many labels*
+                    and average the results over each task.
+                  The metrics of `graphium.trainer.batched_metrics.BATCHED_METRICS` are computed on all
+                  the columns at once. *Other metrics might slow down the computation if there are too many labels*
 
             squeeze_targets:
                 If true, targets will be squeezed prior to computing the metric.
@@ -169,6 +174,20 @@ class MetricWrapper:
             target_to_int:
                 If true, targets will be converted to integers prior to computing the metric.
 
+            streaming:
+                If true, the metric is computed at the end of the validation and test epochs from a
+                state updated at every step, instead of the concatenated predictions of the epoch.
+                MAE and MSE are exact, while other metrics are computed on a random sample.
+                See `graphium.trainer.streaming_metrics.StreamingMetric`.
+
+            streaming_max_samples:
+                Maximum number of elements of the predictions and targets kept on CPU to compute
+                the metric in streaming mode, when the metric is not additive.
+
+            log_every_n_steps:
+                On the training set, the metric is only computed and logged every `log_every_n_steps`
+                steps, since computing it requires a synchronization with the device.
+
             kwargs:
                 Other arguments to call with the metric
         """
@@ -182,6 +201,9 @@ class MetricWrapper:
         self.multitask_handling = self._parse_multitask_handling(multitask_handling, self.target_nan_mask)
         self.squeeze_targets = squeeze_targets
         self.target_to_int = target_to_int
+        self.streaming = streaming
+        self.streaming_max_samples = streaming_max_samples
+        self.log_every_n_steps = log_every_n_steps
         self.kwargs = kwargs
 
     @staticmethod
@@ -301,6 +323,15 @@ class MetricWrapper:
                 target = target.to(int)
             metric_val = self.metric(preds, target, **self.kwargs)
         elif self.multitask_handling == "mean-per-label":
+            # Compute the common metrics on all the columns at once, with the nans masked
+            metric_val = None
+            if not classifigression:
+                metric_val = compute_batched_metric(
+                    self.metric_name, preds, target, target_to_int=self.target_to_int, **self.kwargs
+                )
+            if metric_val is not None:
+                return nan_mean(metric_val)
+
             # Loop the columns (last dim) of the tensors, apply the nan filtering, compute the metrics per column, then average the metrics
             target_list = [target[..., ii][~target_nans[..., ii]] for ii in range(target.shape[-1])]
             # TODO: make this more flexible to the target shape in the future
@@ -368,6 +399,9 @@ class MetricWrapper:
             self.multitask_handling == obj.multitask_handling,
             self.squeeze_targets == obj.squeeze_targets,
             self.target_to_int == obj.target_to_int,
+            self.streaming == obj.streaming,
+            self.streaming_max_samples == obj.streaming_max_samples,
+            self.log_every_n_steps == obj.log_every_n_steps,
             self.kwargs == obj.kwargs,
         ]
         return all(is_eq)
@@ -383,6 +417,9 @@ class MetricWrapper:
         state["multitask_handling"] = self.multitask_handling
         state["squeeze_targets"] = self.squeeze_targets
         state["target_to_int"] = self.target_to_int
+        state["streaming"] = self.streaming
+        state["streaming_max_samples"] = self.streaming_max_samples
+        state["log_every_n_steps"] = self.log_every_n_steps
         state["kwargs"] = self.kwargs
         state["threshold_kwargs"] = None
         if self.thresholder is not None:
@@ -396,5 +433,8 @@ class MetricWrapper:
         if thresholder is not None:
             thresholder = Thresholder(**thresholder)
         state["thresholder"] = thresholder
+        state.setdefault("streaming", False)
+        state.setdefault("streaming_max_samples", 100_000)
+        state.setdefault("log_every_n_steps", 1)
 
         self.__dict__.update(state)
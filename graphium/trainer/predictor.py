@@ -1,26 +1,44 @@
 from graphium.trainer.metrics import MetricWrapper
 from typing import Dict, List, Any, Union, Any, Callable, Tuple, Type, Optional
 import numpy as np
-from copy import deepcopy
+from copy import copy, deepcopy
+from functools import partial
 import time
 from loguru import logger
 
 import torch
 from torch import nn, Tensor
+import torch.nn.functional as F
 import pytorch_lightning as pl
 from torch_geometric.data import Data, Batch
 from mup.optim import MuAdam
 
 from graphium.config.config_convert import recursive_config_reformating
-from graphium.trainer.predictor_options import EvalOptions, FlagOptions, ModelOptions, OptimOptions
+from graphium.trainer.predictor_options import (
+    EvalOptions,
+    FlagOptions,
+    ModelOptions,
+    OptimOptions,
+    TelemetryOptions,
+)
 from graphium.trainer.predictor_summaries import TaskSummaries
+from graphium.trainer.telemetry import StepTimer, compute_gradient_norm
 from graphium.data.datamodule import BaseDataModule
+from graphium.features.featurizer import mol_to_graph_signature
 from graphium.utils.moving_average_tracker import MovingAverageTracker
 
 GRAPHIUM_PRETRAINED_MODELS = {
     "graphium-zinc-micro-dummy-test": "gcs://graphium-public/pretrained-models/graphium-zinc-micro-dummy-test/model.ckpt"
 }
 
+# Element-wise losses that can be computed for all the tasks at once.
+# Only the exact classes are used, since subclasses (e.g. the IPU losses) can change the reduction.
+VECTORIZABLE_LOSSES = {
+    torch.nn.MSELoss: F.mse_loss,
+    torch.nn.L1Loss: F.l1_loss,
+    torch.nn.BCELoss: F.binary_cross_entropy,
+}
+
 
 class PredictorModule(pl.LightningModule):
     def __init__(
@@ -39,6 +57,7 @@ class PredictorModule(pl.LightningModule):
         metrics_on_training_set: Optional[Dict[str, List[str]]] = None,
         flag_kwargs: Dict[str, Any] = None,
         task_norms: Optional[Dict[Callable, Any]] = None,
+        telemetry_kwargs: Optional[Dict[str, Any]] = None,
     ):
         """
         The Lightning module responsible for handling the predictions, losses, metrics, optimization, etc.
@@ -58,6 +77,7 @@ class PredictorModule(pl.LightningModule):
             metrics_on_training_set: A `dict[str, list[str2]`, where `str` is the task name and `str2` the metrics to include on the training set
             flag_kwargs: Arguments related to using the FLAG adversarial augmentation
             task_norms: the normalization for each task
+            telemetry_kwargs: Arguments controlling how often the training telemetry is logged. See class `TelemetryOptions`
         """
         self.save_hyperparameters()
 
@@ -102,6 +122,9 @@ class PredictorModule(pl.LightningModule):
         }
         # Setting the flag options
         self._flag_options = FlagOptions(flag_kwargs=flag_kwargs)
+        # Setting the telemetry options
+        self.telemetry_options = TelemetryOptions(telemetry_kwargs=telemetry_kwargs)
+        self.telemetry_options.set_kwargs()
 
         self.model = self._model_options.model_class(**self._model_options.model_kwargs)
         loss_fun = {
@@ -130,6 +153,11 @@ class PredictorModule(pl.LightningModule):
                 if self._eval_options_dict[task].metrics_on_training_set is None
                 else self._eval_options_dict[task].metrics_on_training_set
             )
+
+        # The wrapped losses are built once, and re-used at every step
+        self.wrapped_loss_fun = self.wrap_loss_fun(
+            self.loss_fun, target_nan_mask=self.target_nan_mask, multitask_handling=self.multitask_handling
+        )
         self.n_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
 
         # Set the parameters and default values for the FLAG adversarial augmentation, and check values
@@ -156,6 +184,7 @@ class PredictorModule(pl.LightningModule):
         self._set_hparams(recursive_config_reformating(self.hparams))
 
         # throughput estimation
+        self.train_step_timer = StepTimer()
         self.mean_val_time_tracker = MovingAverageTracker()
         self.mean_val_tput_tracker = MovingAverageTracker()
         self.epoch_start_time = None
@@ -215,6 +244,113 @@ class PredictorModule(pl.LightningModule):
         }
         return [optimiser], [scheduler]
 
+    @staticmethod
+    def wrap_loss_fun(
+        loss_fun: Dict[str, Callable],
+        target_nan_mask: Optional[Union[str, int]] = None,
+        multitask_handling: Optional[str] = None,
+    ) -> Dict[str, MetricWrapper]:
+        r"""
+        Wrap the loss function of each task into a `MetricWrapper` handling the NaNs
+        and the multi-task handling. Loss functions that are already a `MetricWrapper` are kept as is.
+
+        Parameters:
+            loss_fun: A `dict[str, fun]`, where `str` is the task name and `fun` the loss function
+            target_nan_mask: How to handle the NaNs. See `MetricWrapper` for options
+            multitask_handling: How to handle the multiple labels of a task. See `MetricWrapper` for options
+
+        Returns:
+            wrapped_loss_fun: A `dict[str, MetricWrapper]` with the wrapped loss of each task
+        """
+        return {
+            task: (
+                loss
+                if isinstance(loss, MetricWrapper)
+                else MetricWrapper(
+                    metric=loss,
+                    threshold_kwargs=None,
+                    target_nan_mask=target_nan_mask,
+                    multitask_handling=multitask_handling,
+                )
+            )
+            for task, loss in loss_fun.items()
+        }
+
+    @staticmethod
+    def _compute_vectorized_task_losses(
+        preds: Dict[str, Tensor],
+        targets: Dict[str, Tensor],
+        wrapped_loss_fun: Dict[str, MetricWrapper],
+    ) -> Optional[Tensor]:
+        r"""
+        Compute the masked loss of all tasks in a single operation, by stacking the
+        predictions and targets of all the tasks. This is only possible when all tasks use the same
+        element-wise loss from `VECTORIZABLE_LOSSES` with the same options, and when all the
+        predictions and targets have the same shape, dtype and device.
+
+        Returns:
+            task_losses: The loss of each task, in the order of `wrapped_loss_fun`,
+                or `None` if the losses cannot be vectorized.
+        """
+        tasks = list(wrapped_loss_fun.keys())
+        if len(tasks) < 2:
+            return None
+
+        # Check that all the tasks use the same element-wise loss with the same options
+        first = wrapped_loss_fun[tasks[0]]
+        loss_cls = type(first.metric)
+        if loss_cls not in VECTORIZABLE_LOSSES:
+            return None
+        if first.multitask_handling not in [None, "flatten"]:
+            return None
+        for task in tasks:
+            wrapped = wrapped_loss_fun[task]
+            if (
+                (type(wrapped.metric) != loss_cls)
+                or (wrapped.metric.reduction != "mean")
+                or (getattr(wrapped.metric, "weight", None) is not None)
+                or (wrapped.thresholder is not None)
+                or wrapped.squeeze_targets
+                or wrapped.target_to_int
+                or (len(wrapped.kwargs) > 0)
+                or (wrapped.target_nan_mask != first.target_nan_mask)
+                or (wrapped.multitask_handling != first.multitask_handling)
+            ):
+                return None
+
+        # Check that all the tensors can be stacked
+        first_pred = preds[tasks[0]]
+        for task in tasks:
+            pred, target = preds[task], targets[task]
+            if (
+                (pred.shape != first_pred.shape)
+                or (target.shape != first_pred.shape)
+                or (pred.dtype != first_pred.dtype)
+                or (target.dtype != first_pred.dtype)
+                or (pred.device != first_pred.device)
+                or (target.device != first_pred.device)
+            ):
+                return None
+
+        # Compute the element-wise loss of all the tasks at once, shape [num_tasks, num_elements]
+        all_preds = torch.stack([preds[task] for task in tasks], dim=0).flatten(start_dim=1)
+        all_targets = torch.stack([targets[task] for task in tasks], dim=0).flatten(start_dim=1)
+        target_nan_mask = first.target_nan_mask
+        if target_nan_mask == "ignore":
+            is_valid = ~torch.isnan(all_targets)
+            all_targets = torch.where(is_valid, all_targets, torch.zeros_like(all_targets))
+        elif isinstance(target_nan_mask, (int, float)):
+            all_targets = torch.nan_to_num(all_targets, nan=float(target_nan_mask))
+        loss = VECTORIZABLE_LOSSES[loss_cls](all_preds, all_targets, reduction="none")
+
+        # Average the loss over the elements of each task, ignoring the NaNs if required
+        if target_nan_mask == "ignore":
+            loss = torch.where(is_valid, loss, torch.zeros_like(loss))
+            task_losses = loss.sum(dim=1) / is_valid.sum(dim=1)
+        else:
+            task_losses = loss.mean(dim=1)
+        return task_losses
+
     @staticmethod
     def compute_loss(
         preds: Dict[str, Tensor],
@@ -260,7 +396,9 @@ class PredictorModule(pl.LightningModule):
                   *This option might slowdown the computation if there are too many labels*
 
             loss_fun:
-                Loss function to use
+                Loss function to use for each task. Loss functions that are already wrapped
+                in a `MetricWrapper` (see `wrap_loss_fun`) are used as is, and the
+                `target_nan_mask` and `multitask_handling` are ignored for them.
 
         Returns:
             Tensor:
@@ -268,18 +406,20 @@ class PredictorModule(pl.LightningModule):
                 all_task_losses: Loss per task
         """
 
-        wrapped_loss_fun_dict = {
-            task: MetricWrapper(
-                metric=loss,
-                threshold_kwargs=None,
-                target_nan_mask=target_nan_mask,
-                multitask_handling=multitask_handling,
-            )
-            for task, loss in loss_fun.items()
-        }
+        wrapped_loss_fun_dict = PredictorModule.wrap_loss_fun(
+            loss_fun, target_nan_mask=target_nan_mask, multitask_handling=multitask_handling
+        )
 
         if weights is not None:
             raise NotImplementedError("Weights are no longer supported in the loss")
+
+        # Try to compute the loss of all tasks at once, otherwise loop the tasks
+        task_losses = PredictorModule._compute_vectorized_task_losses(preds, targets, wrapped_loss_fun_dict)
+        if task_losses is not None:
+            all_task_losses = dict(zip(wrapped_loss_fun_dict.keys(), task_losses.unbind(0)))
+            weighted_loss = task_losses.mean()
+            return weighted_loss, all_task_losses
+
         all_task_losses = {
             task: wrapped(preds=preds[task], target=targets[task])
             for task, wrapped in wrapped_loss_fun_dict.items()
@@ -289,8 +429,19 @@ class PredictorModule(pl.LightningModule):
         weighted_loss = total_loss / num_tasks
         return weighted_loss, all_task_losses
 
-    def _general_step(self, batch: Dict[str, Tensor], step_name: str, to_cpu: bool) -> Dict[str, Any]:
-        r"""Common code for training_step, validation_step and testing_step"""
+    def _general_step(
+        self, batch: Dict[str, Tensor], step_name: str, to_cpu: bool, keep_outputs: bool = True
+    ) -> Dict[str, Any]:
+        r"""
+        Common code for training_step, validation_step and testing_step
+
+        Parameters:
+            batch: The batch, with the features and labels
+            step_name: The name of the step, `"train"`, `"val"` or `"test"`
+            to_cpu: Whether to move the predictions and targets to CPU
+            keep_outputs: Whether to return the predictions and targets. Otherwise, they are `None`,
+                and are neither denormalized nor moved to CPU, to avoid synchronizing with the device.
+        """
         preds = self.forward(batch)  # The dictionary of predictions
 
         # * check for nan in model output
@@ -323,25 +474,38 @@ class PredictorModule(pl.LightningModule):
             preds=preds,
             targets=targets_dict,
             weights=weights,
-            loss_fun=self.loss_fun,
+            loss_fun=self.wrapped_loss_fun,
             target_nan_mask=self.target_nan_mask,
             multitask_handling=self.multitask_handling,
         )
 
-        device = "cpu" if to_cpu else None
-        for task in preds:
-            task_specific_norm = self.task_norms[task] if self.task_norms is not None else None
-            if step_name == "train":
-                # apply denormalization for targets and predictions for the evaluation of metrics (excluding loss)
-                # train loss will stay as the normalized version
-                preds[task] = task_specific_norm.denormalize(preds[task])
-                targets_dict[task] = task_specific_norm.denormalize(targets_dict[task])
-            preds[task] = preds[task].detach().to(device=device)
-            targets_dict[task] = targets_dict[task].detach().to(device=device)
-        if weights is not None:
-            weights = weights.detach().to(device=device)
+        if keep_outputs:
+            device = "cpu" if to_cpu else None
+            for task in preds:
+                task_specific_norm = self.task_norms[task] if self.task_norms is not None else None
+                if step_name == "train":
+                    # apply denormalization for targets and predictions for the evaluation of metrics (excluding loss)
+                    # train loss will stay as the normalized version
+                    preds[task] = task_specific_norm.denormalize(preds[task])
+                    targets_dict[task] = task_specific_norm.denormalize(targets_dict[task])
+                preds[task] = preds[task].detach().to(device=device)
+                targets_dict[task] = targets_dict[task].detach().to(device=device)
+            if weights is not None:
+                weights = weights.detach().to(device=device)
+        else:
+            preds, targets_dict, weights = None, None, None
 
         step_dict = {"preds": preds, "targets": targets_dict, "weights": weights}
+
+        # Update the states of the streaming metrics. If all metrics are streaming,
+        # the predictions are not kept until the end of the epoch
+        if (step_name != "train") and self.task_epoch_summary.has_streaming_metrics:
+            self.task_epoch_summary.update_streaming_state(
+                targets=targets_dict, predictions=preds, task_losses=task_losses
+            )
+            if self.task_epoch_summary.is_fully_streaming:
+                step_dict["preds"], step_dict["targets"], step_dict["weights"] = None, None, None
+
         # step_dict[f"{self.loss_fun._get_name()}/{step_name}"] = loss.detach().cpu()            original
 
         # step_dict[f"weighted_loss/{step_name}"] = loss.detach().cpu()
@@ -354,71 +518,77 @@ class PredictorModule(pl.LightningModule):
         step_dict["loss"] = loss
         # print("loss ", self.global_step, self.current_epoch, loss)
         step_dict["task_losses"] = task_losses
-        step_dict["gradient_norm"] = self.get_gradient_norm()
         return step_dict
 
-    def flag_step(self, batch: Dict[str, Tensor], step_name: str, to_cpu: bool) -> Dict[str, Any]:
+    def flag_step(
+        self, batch: Dict[str, Tensor], step_name: str, to_cpu: bool, keep_outputs: bool = True
+    ) -> Dict[str, Any]:
         r"""
         Perform adversarial data agumentation during one training step using FLAG.
         Paper: https://arxiv.org/abs/2010.09891
         Github: https://github.com/devnkong/FLAG
+
+        Only the node features `feat` are perturbed, through a fresh shallow copy of the features
+        at every ascent step, since the forward pass overwrites the features of its input.
+        The other tensors of the batch are neither copied nor modified.
+        The perturbation is allocated directly on the device of the features.
+        The predictions and targets are only returned if `keep_outputs`, see `_general_step`.
         """
 
         alpha, n_steps = self.flag_kwargs["alpha"], self.flag_kwargs["n_steps"]
 
         X = self._convert_features_dtype(batch["features"])
-        X_shape = X["feat"].shape
-
-        pert = torch.FloatTensor(X_shape).uniform_(-alpha, alpha).to(device=X["feat"].device)
-        pert.requires_grad = True
+        feat = X["feat"]
 
-        # Perturb the features
-        pert_batch = deepcopy(batch)
-        features = pert_batch["features"]
-        features["feat"] = features["feat"] + pert
+        # The perturbation is a leaf tensor re-used by all the ascent steps
+        pert = torch.empty_like(feat).uniform_(-alpha, alpha)
+        pert.requires_grad_(True)
 
-        preds = self.forward(pert_batch)["preds"]
         targets = batch.pop("labels")
-        for key in targets.keys():
-            targets[key] = targets[key].to(dtype=preds[key].dtype)
         weights = batch.pop("weights", None)
-        loss, task_losses = self.compute_loss(
-            preds=preds,
-            targets=targets,
-            weights=weights,
-            target_nan_mask=self.target_nan_mask,
-            multitask_handling=self.multitask_handling,
-            loss_fun=self.loss_fun,
-        )
-
-        loss = loss / n_steps
 
         # Iteratively augment data by applying perturbations
         # Accumulate the gradients to be applied to the weights of the network later on
-        for _ in range(n_steps - 1):
-            loss.backward()
-            pert_data = pert.detach() + alpha * torch.sign(pert.grad.detach())
-            pert.data = pert_data.data
-            pert.grad[:] = 0
-            features["feat"] = features["feat"] + pert
-            pert_batch["features"] = features
-            preds = self.forward(pert_batch)["preds"]
-            loss, _ = self.compute_loss(
+        for step in range(n_steps):
+            # Perturb the features of a shallow copy of the batch
+            pert_features = copy(X)
+            pert_features["feat"] = feat + pert
+            preds = self.forward({**batch, "features": pert_features})["preds"]
+            preds = {
+                self._get_task_key(
+                    task_level=self.model_kwargs["task_heads_kwargs"][key]["task_level"], task=key
+                ): value
+                for key, value in preds.items()
+            }
+            if step == 0:
+                for key in preds.keys():
+                    targets[key] = targets[key].to(dtype=preds[key].dtype)
+            loss, task_losses = self.compute_loss(
                 preds=preds,
                 targets=targets,
                 weights=weights,
                 target_nan_mask=self.target_nan_mask,
                 multitask_handling=self.multitask_handling,
-                loss_fun=self.loss_fun,
+                loss_fun=self.wrapped_loss_fun,
             )
             loss = loss / n_steps
 
-        device = "cpu" if to_cpu else None
-        for key in preds.keys():
-            preds[key] = preds[key].detach().to(device=device)
-            targets[key] = targets[key].detach().to(device=device)
-        if weights is not None:
-            weights = weights.detach().to(device=device)
+            # The gradients of the last step are computed by the trainer
+            if step < n_steps - 1:
+                loss.backward()
+                with torch.no_grad():
+                    pert.add_(alpha * torch.sign(pert.grad))
+                pert.grad.zero_()
+
+        if keep_outputs:
+            device = "cpu" if to_cpu else None
+            for key in preds.keys():
+                preds[key] = preds[key].detach().to(device=device)
+                targets[key] = targets[key].detach().to(device=device)
+            if weights is not None:
+                weights = weights.detach().to(device=device)
+        else:
+            preds, targets, weights = None, None, None
 
         step_dict = {"preds": preds, "targets": targets, "weights": weights}
         step_dict[f"loss/{step_name}"] = loss.detach().cpu()
@@ -427,13 +597,16 @@ class PredictorModule(pl.LightningModule):
         return step_dict
 
     def on_train_batch_start(self, batch: Any, batch_idx: int) -> Optional[int]:
-        self.train_batch_start_time = time.time()
+        self.train_step_timer.start()
         return super().on_train_batch_start(batch, batch_idx)
 
     def on_train_batch_end(self, outputs, batch: Any, batch_idx: int) -> None:
-        train_batch_time = time.time() - self.train_batch_start_time
-        num_graphs = self.get_num_graphs(batch["features"])
-        tput = num_graphs / train_batch_time
+        self.train_step_timer.stop(num_samples=self.get_num_graphs(batch["features"]))
+
+        # Computing the telemetry requires a synchronization with the device, so it is only done every n steps.
+        # The predictions are only kept by `training_step` on these steps.
+        if outputs["preds"] is None:
+            return
 
         # this code is likely repeated for validation and testing, this should be moved to a function
         self.task_epoch_summary.update_predictor_state(
@@ -444,44 +617,54 @@ class PredictorModule(pl.LightningModule):
             task_losses=outputs["task_losses"],
             n_epochs=self.current_epoch,
         )
-        metrics_logs = self.task_epoch_summary.get_metrics_logs()  # Dict[task, metric_logs]
-        metrics_logs["_global"]["grad_norm"] = self.get_gradient_norm()
+        metrics_logs = self.task_epoch_summary.get_metrics_logs(
+            global_step=self.global_step
+        )  # Dict[task, metric_logs]
+        grad_norm = self.get_gradient_norm()
+        metrics_logs["_global"]["grad_norm"] = grad_norm
         outputs.update(metrics_logs)  # Dict[task, metric_logs]. Concatenate them?
 
         concatenated_metrics_logs = self.task_epoch_summary.concatenate_metrics_logs(metrics_logs)
         concatenated_metrics_logs["loss"] = outputs["loss"]
-        outputs["grad_norm"] = self.get_gradient_norm()
-        concatenated_metrics_logs["train/grad_norm"] = outputs["grad_norm"]
-        concatenated_metrics_logs["train/batch_time"] = train_batch_time
-        concatenated_metrics_logs["train/batch_tput"] = tput
+        outputs["grad_norm"] = grad_norm
+        concatenated_metrics_logs["train/grad_norm"] = grad_norm
+        train_batch_time, tput = self.train_step_timer.pop_completed()
+        if train_batch_time is not None:
+            concatenated_metrics_logs["train/batch_time"] = train_batch_time
+        if tput is not None:
+            concatenated_metrics_logs["train/batch_tput"] = tput
 
         if self.logger is not None:
             self.logger.log_metrics(
                 concatenated_metrics_logs, step=self.global_step
             )  # This is a pytorch lightning function call
 
-    def training_step(self, batch: Dict[str, Tensor], to_cpu: bool = True) -> Dict[str, Any]:
+    def training_step(
+        self, batch: Dict[str, Tensor], to_cpu: bool = True, keep_outputs: Optional[bool] = None
+    ) -> Dict[str, Any]:
         step_dict = None
 
+        # By default, the predictions are only denormalized and moved to CPU on the steps where the metrics are logged
+        if keep_outputs is None:
+            keep_outputs = self.telemetry_options.is_logging_step(self.global_step)
+
         # Train using FLAG
         if self.flag_kwargs["n_steps"] > 0:
-            step_dict = self.flag_step(batch=batch, step_name="train", to_cpu=to_cpu)
+            step_dict = self.flag_step(
+                batch=batch, step_name="train", to_cpu=to_cpu, keep_outputs=keep_outputs
+            )
         # Train normally, without using FLAG
         elif self.flag_kwargs["n_steps"] == 0:
             # step_dict = self._general_step(batch=batch, step_name="train", to_cpu=True)
-            step_dict = self._general_step(batch=batch, step_name="train", to_cpu=to_cpu)
+            step_dict = self._general_step(
+                batch=batch, step_name="train", to_cpu=to_cpu, keep_outputs=keep_outputs
+            )
 
         return step_dict  # Returning the metrics_logs with the loss
 
     def get_gradient_norm(self):
-        # compute the norm
-        total_norm = torch.tensor(0.0)
-        for p in self.parameters():
-            if p.grad is not None:
-                param_norm = p.grad.detach().data.norm(2)
-                total_norm += param_norm.item() ** 2
-        total_norm = total_norm**0.5
-        return total_norm
+        # compute the norm with a fused reduction, without synchronizing with the device
+        return compute_gradient_norm(self.parameters(), norm_type=2.0)
 
     def validation_step(self, batch: Dict[str, Tensor], to_cpu: bool = True) -> Dict[str, Any]:
         return self._general_step(batch=batch, step_name="val", to_cpu=to_cpu)
@@ -491,26 +674,32 @@ class PredictorModule(pl.LightningModule):
 
     def _general_epoch_end(self, outputs: Dict[str, Any], step_name: str) -> None:
         r"""Common code for training_epoch_end, validation_epoch_end and testing_epoch_end"""
-        # Transform the list of dict of dict, into a dict of list of dict
-        preds = {}
-        targets = {}
-        device = device = outputs[0]["preds"][self.tasks[0]].device  # should be better way to do this
-        # device = 0
-        for task in self.tasks:
-            preds[task] = torch.cat([out["preds"][task].to(device=device) for out in outputs], dim=0)
-            targets[task] = torch.cat([out["targets"][task].to(device=device) for out in outputs], dim=0)
-        if ("weights" in outputs[0].keys()) and (outputs[0]["weights"] is not None):
-            weights = torch.cat([out["weights"] for out in outputs], dim=0)
+        use_streaming = (step_name != "train") and self.task_epoch_summary.has_streaming_metrics
+        if use_streaming and self.task_epoch_summary.is_fully_streaming:
+            # The predictions were not kept, so the loss is computed from the streaming states
+            preds, targets = None, None
+            loss, task_losses = self.task_epoch_summary.compute_streaming_loss()
         else:
-            weights = None
-        loss, task_losses = self.compute_loss(
-            preds=preds,
-            targets=targets,
-            weights=weights,
-            target_nan_mask=self.target_nan_mask,
-            multitask_handling=self.multitask_handling,
-            loss_fun=self.loss_fun,
-        )
+            # Transform the list of dict of dict, into a dict of list of dict
+            preds = {}
+            targets = {}
+            device = device = outputs[0]["preds"][self.tasks[0]].device  # should be better way to do this
+            # device = 0
+            for task in self.tasks:
+                preds[task] = torch.cat([out["preds"][task].to(device=device) for out in outputs], dim=0)
+                targets[task] = torch.cat([out["targets"][task].to(device=device) for out in outputs], dim=0)
+            if ("weights" in outputs[0].keys()) and (outputs[0]["weights"] is not None):
+                weights = torch.cat([out["weights"] for out in outputs], dim=0)
+            else:
+                weights = None
+            loss, task_losses = self.compute_loss(
+                preds=preds,
+                targets=targets,
+                weights=weights,
+                target_nan_mask=self.target_nan_mask,
+                multitask_handling=self.multitask_handling,
+                loss_fun=self.wrapped_loss_fun,
+            )
 
         self.task_epoch_summary.update_predictor_state(
             step_name=step_name,
@@ -519,6 +708,7 @@ class PredictorModule(pl.LightningModule):
             loss=loss,
             task_losses=task_losses,
             n_epochs=self.current_epoch,
+            use_streaming=use_streaming,
         )
         metrics_logs = self.task_epoch_summary.get_metrics_logs()
         self.task_epoch_summary.set_results(task_metrics=metrics_logs)
@@ -547,8 +737,13 @@ class PredictorModule(pl.LightningModule):
     def on_validation_epoch_start(self) -> None:
         self.mean_val_time_tracker.reset()
         self.mean_val_tput_tracker.reset()
+        self.task_epoch_summary.reset_streaming_state()
         return super().on_validation_epoch_start()
 
+    def on_test_epoch_start(self) -> None:
+        self.task_epoch_summary.reset_streaming_state()
+        return super().on_test_epoch_start()
+
     def on_validation_batch_start(self, batch: Any, batch_idx: int, dataloader_idx: int) -> None:
         self.validation_batch_start_time = time.time()
         return super().on_validation_batch_start(batch, batch_idx, dataloader_idx)
@@ -591,6 +786,17 @@ class PredictorModule(pl.LightningModule):
         if self.logger is not None:
             self.logger.log_hyperparams(hparams_log)
 
+    def on_save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        r"""
+        Save the arguments of the featurizer with the checkpoint, such that the inference
+        featurizes the molecules like the training did. See `graphium.inference`.
+        """
+        datamodule = getattr(self._trainer, "datamodule", None)
+        smiles_transformer = getattr(datamodule, "smiles_transformer", None)
+        if isinstance(smiles_transformer, partial):
+            featurization = recursive_config_reformating(deepcopy(smiles_transformer.keywords))
+            checkpoint["featurization"] = mol_to_graph_signature(featurization)
+
     def get_progress_bar_dict(self) -> Dict[str, float]:
         prog_dict = {}
         prog_dict["loss"] = self.task_epoch_summary.weighted_loss.item()
@@ -645,4 +851,7 @@ class PredictorModule(pl.LightningModule):
         Method to compute number of graphs in a Batch.
         Essential to estimate throughput in graphs/s.
         """
+        # The number of graphs is known on the host for collated batches, which avoids a synchronization
+        if isinstance(data, Batch):
+            return data.num_graphs
         return torch.max(data.batch) + 1
@@ -231,3 +231,33 @@ class FlagOptions:
         self.flag_kwargs.setdefault("n_steps", 0)
         assert isinstance(self.flag_kwargs["n_steps"], int) and (self.flag_kwargs["n_steps"] >= 0)
         assert self.flag_kwargs["alpha"] >= 0
+
+
+@dataclass
+class TelemetryOptions:
+    r"""
+    This data class stores the arguments controlling how often the training telemetry is logged.
+
+    Parameters:
+        telemetry_kwargs:
+            Keyword arguments for the per-step telemetry of the training.
+
+            - log_every_n_steps: An integer that specifies how often the training metrics, the statistics of the
+                predictions and targets, the gradient norm, and the batch time and throughput are logged.
+                Computing them requires a synchronization with the device, so logging less often reduces
+                the overhead of the training loop. Metrics can be logged even less often with their own
+                `log_every_n_steps`, see `MetricWrapper`. Default=1
+    """
+    telemetry_kwargs: Dict[str, Any] = None
+
+    # Set the parameters and default values for the telemetry, and check values
+    def set_kwargs(self):
+        if self.telemetry_kwargs is None:
+            self.telemetry_kwargs = {}
+        self.telemetry_kwargs.setdefault("log_every_n_steps", 1)
+        assert isinstance(self.telemetry_kwargs["log_every_n_steps"], int)
+        assert self.telemetry_kwargs["log_every_n_steps"] >= 1
+
+    def is_logging_step(self, global_step: int) -> bool:
+        """Whether the telemetry should be logged at this step"""
+        return (global_step % self.telemetry_kwargs["log_every_n_steps"]) == 0
@@ -1,7 +1,7 @@
 r"""Classes to store information about resulting evaluation metrics when using a Predictor Module."""
 
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 from mordred import Result
 from loguru import logger
 
@@ -10,6 +10,7 @@ import torch
 from torch import Tensor
 
 from graphium.utils.tensor import nan_mean, nan_std, nan_median
+from graphium.trainer.streaming_metrics import StreamingTaskState, split_streaming_metrics
 
 
 class SummaryInterface(object):
@@ -67,9 +68,20 @@ class Summary(SummaryInterface):
             task_name:
             name of the task (Default=`None`)
 
+        Note:
+            The metrics with `streaming=True` are computed, for the validation and test sets,
+            from a state updated at every step with `update_streaming_state`. If all the metrics
+            are streaming, the loss and the statistics of the predictions and targets are also
+            streamed, such that the predictions of the epoch do not need to be kept in memory.
         """
         self.loss_fun = loss_fun
         self.metrics = metrics
+        self.full_metrics, self.streaming_metrics = split_streaming_metrics(metrics)
+        self.streaming_state = None
+        if len(self.full_metrics) == 0:
+            # Also for the tasks without metrics, such that they do not prevent the other tasks from streaming
+            self.streaming_state = StreamingTaskState(self.streaming_metrics)
+        self.use_streaming = False
         self.metrics_on_training_set = metrics_on_training_set
         self.metrics_on_progress_bar = metrics_on_progress_bar
         self.monitor = monitor
@@ -89,23 +101,52 @@ class Summary(SummaryInterface):
         self.task_name = task_name
         self.logged_metrics_exceptions = []  # Track which metric exceptions have been logged
 
+    @property
+    def is_fully_streaming(self) -> bool:
+        """Whether all the metrics are computed in streaming mode, which is also the case without metrics"""
+        return len(self.full_metrics) == 0
+
     def update_predictor_state(
-        self, step_name: str, targets: Tensor, predictions: Tensor, loss: Tensor, n_epochs: int
+        self,
+        step_name: str,
+        targets: Optional[Tensor],
+        predictions: Optional[Tensor],
+        loss: Tensor,
+        n_epochs: int,
+        use_streaming: bool = False,
     ):
         r"""
         update the state of the predictor
         Parameters:
             step_name: which stage you are in, e.g. "train"
-            targets: the targets tensor
-            predictions: the predictions tensor
+            targets: the targets tensor. Can be `None` if all the metrics are streaming.
+            predictions: the predictions tensor. Can be `None` if all the metrics are streaming.
             loss: the loss tensor
             n_epochs: the number of epochs
+            use_streaming: Whether to compute the streaming metrics from the streaming state
         """
         self.step_name = step_name
         self.targets = targets
         self.predictions = predictions
         self.loss = loss
         self.n_epochs = n_epochs
+        self.use_streaming = use_streaming and (self.streaming_state is not None)
+
+    def reset_streaming_state(self):
+        """Reset the streaming state, at the start of an epoch"""
+        if self.streaming_state is not None:
+            self.streaming_state.reset()
+
+    def update_streaming_state(self, targets: Tensor, predictions: Tensor, loss: Optional[Tensor] = None):
+        r"""
+        Update the streaming state with the targets, predictions and loss of a step
+        Parameters:
+            targets: the targets tensor
+            predictions: the predictions tensor
+            loss: the loss tensor of the step
+        """
+        if self.streaming_state is not None:
+            self.streaming_state.update(preds=predictions.detach(), targets=targets.detach(), loss=loss)
 
     def set_results(
         self,
@@ -227,30 +268,41 @@ class Summary(SummaryInterface):
 
         return full_dict
 
-    def get_metrics_logs(self) -> Dict[str, Any]:
+    def get_metrics_logs(self, global_step: Optional[int] = None) -> Dict[str, Any]:
         r"""
         Get the data about metrics to log.
         Note: This function requires that self.update_predictor_state() be called before it.
+        Parameters:
+            global_step: The current training step. If provided, the training metrics are only
+                computed on the steps that are a multiple of their `log_every_n_steps`.
         Returns:
             A dictionary of metrics to log.
         """
-        targets = self.targets.to(dtype=self.predictions.dtype, device=self.predictions.device)
         # Compute the metrics always used in regression tasks
         metric_logs = {}
-        metric_logs[self.metric_log_name(self.task_name, "mean_pred", self.step_name)] = nan_mean(
-            self.predictions
-        )
-        metric_logs[self.metric_log_name(self.task_name, "std_pred", self.step_name)] = nan_std(
-            self.predictions
-        )
-        metric_logs[self.metric_log_name(self.task_name, "median_pred", self.step_name)] = nan_median(
-            self.predictions
-        )
-        metric_logs[self.metric_log_name(self.task_name, "mean_target", self.step_name)] = nan_mean(targets)
-        metric_logs[self.metric_log_name(self.task_name, "std_target", self.step_name)] = nan_std(targets)
-        metric_logs[self.metric_log_name(self.task_name, "median_target", self.step_name)] = nan_median(
-            targets
-        )
+        if self.predictions is None:
+            # The predictions are not kept when all the metrics are streaming
+            targets = None
+            for key, value in self.streaming_state.compute_statistics().items():
+                metric_logs[self.metric_log_name(self.task_name, key, self.step_name)] = value
+        else:
+            targets = self.targets.to(dtype=self.predictions.dtype, device=self.predictions.device)
+            metric_logs[self.metric_log_name(self.task_name, "mean_pred", self.step_name)] = nan_mean(
+                self.predictions
+            )
+            metric_logs[self.metric_log_name(self.task_name, "std_pred", self.step_name)] = nan_std(
+                self.predictions
+            )
+            metric_logs[self.metric_log_name(self.task_name, "median_pred", self.step_name)] = nan_median(
+                self.predictions
+            )
+            metric_logs[self.metric_log_name(self.task_name, "mean_target", self.step_name)] = nan_mean(
+                targets
+            )
+            metric_logs[self.metric_log_name(self.task_name, "std_target", self.step_name)] = nan_std(targets)
+            metric_logs[self.metric_log_name(self.task_name, "median_target", self.step_name)] = nan_median(
+                targets
+            )
         if torch.cuda.is_available():
             metric_logs[f"gpu_allocated_GB"] = torch.tensor(torch.cuda.memory_allocated() / (2**30))
 
@@ -260,13 +312,22 @@ class Summary(SummaryInterface):
             metrics_to_use = {
                 key: metric for key, metric in metrics_to_use.items() if key in self.metrics_on_training_set
             }
+            if global_step is not None:
+                metrics_to_use = {
+                    key: metric
+                    for key, metric in metrics_to_use.items()
+                    if global_step % getattr(metric, "log_every_n_steps", 1) == 0
+                }
         # Compute the additional metrics
         for key, metric in metrics_to_use.items():
             metric_name = self.metric_log_name(
                 self.task_name, key, self.step_name
             )  # f"{key}/{self.step_name}"
             try:
-                metric_logs[metric_name] = metric(self.predictions, targets)
+                if self.use_streaming and (key in self.streaming_metrics):
+                    metric_logs[metric_name] = self.streaming_state.metrics[key].compute()
+                else:
+                    metric_logs[metric_name] = metric(self.predictions, targets)
             except Exception as e:
                 metric_logs[metric_name] = torch.as_tensor(float("nan"))
                 # Warn only if it's the first warning for that metric
@@ -310,8 +371,8 @@ class Summary(SummaryInterface):
                 monitored_metric: the monitored metric
                 n_epochs: the number of epochs
             """
-            self.targets = targets.detach().cpu()
-            self.predictions = predictions.detach().cpu()
+            self.targets = targets.detach().cpu() if targets is not None else None
+            self.predictions = predictions.detach().cpu() if predictions is not None else None
             self.loss = loss.item() if isinstance(loss, Tensor) else loss
             self.monitored_metric = monitored_metric
             if monitored_metric in metrics.keys():
@@ -377,28 +438,77 @@ class TaskSummaries(SummaryInterface):
         loss: Tensor,
         task_losses: Dict[str, Tensor],
         n_epochs: int,
+        use_streaming: bool = False,
     ):
         r"""
         update the state for all predictors
         Parameters:
             step_name: the name of the step
-            targets: the target tensors
-            predictions: the prediction tensors
+            targets: the target tensors. Can be `None` if all the metrics are streaming.
+            predictions: the prediction tensors. Can be `None` if all the metrics are streaming.
             loss: the loss tensor
             task_losses: the task losses
             n_epochs: the number of epochs
+            use_streaming: Whether to compute the streaming metrics from the streaming states
         """
         self.weighted_loss = loss
         self.step_name = step_name
         for task in self.tasks:
             self.task_summaries[task].update_predictor_state(
                 step_name,
-                targets[task],
-                predictions[task].detach(),
+                targets[task] if targets is not None else None,
+                predictions[task].detach() if predictions is not None else None,
                 task_losses[task].detach(),
                 n_epochs,
+                use_streaming=use_streaming,
             )
 
+    @property
+    def has_streaming_metrics(self) -> bool:
+        """Whether any task has a metric computed in streaming mode"""
+        return any(len(summary.streaming_metrics) > 0 for summary in self.task_summaries.values())
+
+    @property
+    def is_fully_streaming(self) -> bool:
+        """Whether all the metrics of all the tasks are computed in streaming mode, with at least one streaming metric"""
+        return self.has_streaming_metrics and all(
+            summary.is_fully_streaming for summary in self.task_summaries.values()
+        )
+
+    def reset_streaming_state(self):
+        """Reset the streaming state of all tasks, at the start of an epoch"""
+        for task in self.tasks:
+            self.task_summaries[task].reset_streaming_state()
+
+    def update_streaming_state(
+        self,
+        targets: Dict[str, Tensor],
+        predictions: Dict[str, Tensor],
+        task_losses: Dict[str, Tensor],
+    ):
+        r"""
+        update the streaming state of all tasks with the outputs of a step
+        Parameters:
+            targets: the target tensors
+            predictions: the prediction tensors
+            task_losses: the task losses
+        """
+        for task in self.tasks:
+            self.task_summaries[task].update_streaming_state(
+                targets=targets[task], predictions=predictions[task], loss=task_losses[task]
+            )
+
+    def compute_streaming_loss(self) -> Tuple[Tensor, Dict[str, Tensor]]:
+        r"""
+        compute the loss of the epoch from the streaming states, when all the tasks are fully streaming
+        Returns:
+            weighted_loss: the loss averaged over the tasks
+            task_losses: the loss of each task
+        """
+        task_losses = {task: self.task_summaries[task].streaming_state.compute_loss() for task in self.tasks}
+        weighted_loss = torch.stack(list(task_losses.values())).mean()
+        return weighted_loss, task_losses
+
     def set_results(self, task_metrics: Dict[str, Dict[str, Tensor]]):
         """
         set the results for all tasks
@@ -479,15 +589,19 @@ class TaskSummaries(SummaryInterface):
 
     def get_metrics_logs(
         self,
+        global_step: Optional[int] = None,
     ) -> Dict[str, Dict[str, Tensor]]:
         r"""
         get the logs for the metrics
+        Parameters:
+            global_step: the current training step, to only compute the training metrics
+                on the steps that are a multiple of their `log_every_n_steps`
         Returns:
             the task logs for the metrics
         """
         task_metrics_logs = {}
         for task in self.tasks:
-            task_metrics_logs[task] = self.task_summaries[task].get_metrics_logs()
+            task_metrics_logs[task] = self.task_summaries[task].get_metrics_logs(global_step=global_step)
 
         # Include global (weighted loss)
         task_metrics_logs["_global"] = {}
@@ -0,0 +1,333 @@
+r"""Bounded-memory states to compute the epoch-level metrics step by step, without keeping all the predictions."""
+
+from typing import Dict, List, Optional, Tuple
+
+import math
+
+import torch
+from torch import Tensor
+
+from graphium.trainer.metrics import MetricWrapper
+from graphium.utils.tensor import nan_mean
+
+# Metrics computed exactly from running sums, and the element-wise error they accumulate
+ADDITIVE_METRICS = {
+    "mae": "abs",
+    "mae_ipu": "abs",
+    "mse": "square",
+    "mse_ipu": "square",
+}
+
+DEFAULT_MAX_ELEMENTS = 100_000
+
+
+class StreamingMeanStd:
+    def __init__(self):
+        r"""
+        Running mean and standard deviation of all the elements of the tensors
+        passed to `update`, while ignoring the NaNs. The sums are stored in double precision.
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = torch.zeros((), dtype=torch.float64)
+        self.sum = torch.zeros((), dtype=torch.float64)
+        self.sum_sq = torch.zeros((), dtype=torch.float64)
+
+    def update(self, values: Tensor, weights: Optional[Tensor] = None) -> None:
+        r"""
+        Add the values to the running statistics.
+
+        Parameters:
+            values: Tensor of any shape. The NaNs are ignored.
+            weights: Optional weights of each value, with the same shape as `values`.
+        """
+        values = values.detach().flatten().to(dtype=torch.float64)
+        weights = (
+            torch.ones_like(values)
+            if weights is None
+            else weights.detach().flatten().to(dtype=torch.float64, device=values.device)
+        )
+        is_valid = ~torch.isnan(values)
+        values, weights = values[is_valid], weights[is_valid]
+        self.count = self.count.to(values.device) + weights.sum()
+        self.sum = self.sum.to(values.device) + (weights * values).sum()
+        self.sum_sq = self.sum_sq.to(values.device) + (weights * values * values).sum()
+
+    def mean(self) -> Tensor:
+        return (self.sum / self.count).to(torch.float32)
+
+    def std(self, unbiased: bool = True) -> Tensor:
+        r"""Standard deviation, with the same Bessel's correction as `graphium.utils.tensor.nan_std`"""
+        mean = self.sum / self.count
+        var = (self.sum_sq / self.count) - (mean * mean)
+        var = torch.clamp(var, min=0)
+        if unbiased:
+            var = var * self.count / (self.count - 1)
+        return torch.sqrt(var).to(torch.float32)
+
+
+class ReservoirSampler:
+    def __init__(self, max_elements: int = DEFAULT_MAX_ELEMENTS, seed: int = 42):
+        r"""
+        Keep a uniform random sample, without replacement, of the rows of the tensors passed
+        to `update`, with at most `max_elements` elements summed over all the tensors.
+        Each row is given a random priority, and the rows with the lowest priorities are kept.
+
+        The sample is kept on CPU. The rows whose priority is above the current threshold
+        cannot be part of the sample, and are discarded on their device before being transferred.
+        The kept rows are buffered, and only compacted once the buffer holds twice the maximum
+        number of rows, such that the cost of a step does not grow with `max_elements`.
+
+        Parameters:
+            max_elements: The maximum number of elements to keep, over all the tensors
+            seed: The seed of the random priorities
+        """
+        self.max_elements = max_elements
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        self.generator = torch.Generator().manual_seed(self.seed)
+        self.max_rows = None
+        self.threshold = float("inf")
+        self._priorities: List[Tensor] = []
+        self._chunks: List[List[Tensor]] = []
+        self._num_buffered = 0
+        self.num_seen = 0
+
+    def update(self, *tensors: Tensor) -> None:
+        r"""
+        Add the rows of the tensors to the sample. All tensors must have the same number of rows,
+        and the same rows are sampled across the tensors.
+        """
+        tensors = [tensor.detach() for tensor in tensors]
+        num_rows = tensors[0].shape[0]
+        self.num_seen += num_rows
+        if self.max_rows is None:
+            row_numel = sum(math.prod(tensor.shape[1:]) for tensor in tensors)
+            self.max_rows = max(1, self.max_elements // max(row_numel, 1))
+
+        # Discard the rows that can no longer enter the sample, before moving them to CPU
+        priorities = torch.rand(num_rows, generator=self.generator)
+        is_kept = priorities < self.threshold
+        if not bool(is_kept.all()):
+            idx = torch.nonzero(is_kept).squeeze(-1)
+            priorities = priorities[idx]
+            tensors = [tensor[idx.to(tensor.device)] for tensor in tensors]
+        if (priorities.shape[0] == 0) and (len(self._chunks) > 0):
+            return
+        self._priorities.append(priorities)
+        self._chunks.append([tensor.to("cpu") for tensor in tensors])
+        self._num_buffered += priorities.shape[0]
+        if self._num_buffered > 2 * self.max_rows:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Keep only the `max_rows` rows with the lowest priorities, and update the threshold"""
+        priorities = torch.cat(self._priorities, dim=0)
+        tensors = [torch.cat(chunk, dim=0) for chunk in zip(*self._chunks)]
+        if priorities.shape[0] > self.max_rows:
+            priorities, idx = torch.topk(priorities, k=self.max_rows, largest=False)
+            tensors = [tensor[idx] for tensor in tensors]
+            self.threshold = priorities.max().item()
+        self._priorities = [priorities]
+        self._chunks = [tensors]
+        self._num_buffered = priorities.shape[0]
+
+    def get_samples(self) -> Optional[List[Tensor]]:
+        """The sampled rows of each tensor, on CPU, or `None` if nothing was added"""
+        if len(self._chunks) == 0:
+            return None
+        self._compact()
+        return self._chunks[0]
+
+
+class StreamingMetric:
+    def __init__(self, metric: MetricWrapper):
+        r"""
+        Compute a `MetricWrapper` over an epoch from successive steps, with bounded memory.
+
+        - Additive metrics from `ADDITIVE_METRICS` (MAE, MSE) accumulate the sum of the errors
+          and the number of elements of each label, and are exact. The `target_nan_mask` and
+          `multitask_handling` of the metric are respected.
+        - All other metrics (AUROC, average precision, Spearman, etc.) are computed on a
+          uniform random sample of the predictions, kept on CPU. With `multitask_handling="flatten"`,
+          the individual elements are sampled. Otherwise, the molecules are sampled with all their labels.
+          At most `metric.streaming_max_samples` elements of the predictions and targets are kept.
+
+        Parameters:
+            metric: The metric to compute
+        """
+        self.metric = metric
+        self.is_additive = (
+            (metric.metric_name in ADDITIVE_METRICS)
+            and (metric.thresholder is None)
+            and (len(metric.kwargs) == 0)
+        )
+        self.reservoir = None
+        if not self.is_additive:
+            self.reservoir = ReservoirSampler(max_elements=metric.streaming_max_samples)
+        self.reset()
+
+    def reset(self) -> None:
+        self.error_sum = None
+        self.error_count = None
+        self.classifigression = False
+        if self.reservoir is not None:
+            self.reservoir.reset()
+
+    def update(self, preds: Tensor, target: Tensor) -> None:
+        r"""
+        Update the state of the metric with the predictions and targets of a step.
+        """
+        if preds.ndim == 1:
+            preds = preds.unsqueeze(-1)
+        if target.ndim == 1:
+            target = target.unsqueeze(-1)
+        preds, target = preds.detach(), target.detach()
+
+        # Classifigression predictions have a different shape than the targets, and are always sampled
+        if preds.shape != target.shape:
+            self.classifigression = True
+            if self.is_additive:
+                self.is_additive = False
+                self.reservoir = ReservoirSampler(max_elements=self.metric.streaming_max_samples)
+
+        if not self.is_additive:
+            if (self.metric.multitask_handling == "flatten") and not self.classifigression:
+                # Sample the individual elements, since the labels are flattened anyway.
+                # The NaN targets are handled by the metric, to avoid a synchronization here.
+                preds, target = preds.flatten(), target.flatten()
+            self.reservoir.update(preds, target)
+            return
+
+        target_nan_mask = self.metric.target_nan_mask
+        if isinstance(target_nan_mask, (int, float)):
+            target = torch.nan_to_num(target, nan=float(target_nan_mask))
+        error = (preds - target).to(dtype=torch.float64)
+        error = torch.abs(error) if ADDITIVE_METRICS[self.metric.metric_name] == "abs" else error * error
+        if target_nan_mask == "ignore":
+            is_valid = ~torch.isnan(error)
+            error = torch.where(is_valid, error, torch.zeros_like(error))
+            count = is_valid.sum(dim=0)
+        else:
+            count = torch.full(error.shape[1:], error.shape[0], device=error.device)
+
+        # Sum over the molecules, and keep the labels separated for the `mean-per-label` handling
+        error_sum = error.sum(dim=0)
+        if self.error_sum is None:
+            self.error_sum, self.error_count = error_sum, count
+        else:
+            self.error_sum = self.error_sum + error_sum
+            self.error_count = self.error_count + count
+
+    def compute(self) -> Tensor:
+        r"""
+        Compute the metric over all the steps since the last `reset`.
+        """
+        if not self.is_additive:
+            samples = self.reservoir.get_samples()
+            if samples is None:
+                return torch.as_tensor(float("nan"))
+            return self.metric(*samples)
+
+        if self.error_sum is None:
+            return torch.as_tensor(float("nan"))
+        if self.metric.multitask_handling == "mean-per-label":
+            return nan_mean(self.error_sum / self.error_count).to(torch.float32)
+        return (self.error_sum.sum() / self.error_count.sum()).to(torch.float32)
+
+
+class StreamingTaskState:
+    def __init__(self, metrics: Dict[str, MetricWrapper], max_elements: int = DEFAULT_MAX_ELEMENTS):
+        r"""
+        Streaming state of a single task, with the running loss, the running statistics of
+        the predictions and targets, and the state of each streaming metric.
+
+        Parameters:
+            metrics: The streaming metrics of the task
+            max_elements: The maximum number of elements kept to compute each of the medians
+        """
+        self.metrics = {name: StreamingMetric(metric) for name, metric in metrics.items()}
+        self.preds_stats = StreamingMeanStd()
+        self.targets_stats = StreamingMeanStd()
+        self.loss_stats = StreamingMeanStd()
+        self.preds_reservoir = ReservoirSampler(max_elements=max_elements)
+        self.targets_reservoir = ReservoirSampler(max_elements=max_elements)
+
+    def reset(self) -> None:
+        states = [
+            self.preds_stats,
+            self.targets_stats,
+            self.loss_stats,
+            self.preds_reservoir,
+            self.targets_reservoir,
+        ]
+        for state in states:
+            state.reset()
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def update(self, preds: Tensor, targets: Tensor, loss: Optional[Tensor] = None) -> None:
+        r"""
+        Update the state with the predictions, targets and loss of a step.
+        The loss of the epoch is the average of the step losses, weighted by the number
+        of non-NaN targets of each step. It is exact for the element-wise losses with
+        `target_nan_mask="ignore"` or `multitask_handling="flatten"`.
+        """
+        targets = targets.to(dtype=preds.dtype, device=preds.device)
+        self.preds_stats.update(preds)
+        self.targets_stats.update(targets)
+        self.preds_reservoir.update(preds.flatten())
+        self.targets_reservoir.update(targets.flatten())
+        if loss is not None:
+            num_valid = (~torch.isnan(targets)).sum()
+            self.loss_stats.update(loss.detach(), weights=num_valid)
+        for metric in self.metrics.values():
+            metric.update(preds, targets)
+
+    def compute_statistics(self) -> Dict[str, Tensor]:
+        r"""
+        Compute the statistics of the predictions and targets that are logged for all tasks,
+        with the same keys as in `Summary.get_metrics_logs`.
+        """
+        stats = {
+            "mean_pred": self.preds_stats.mean(),
+            "std_pred": self.preds_stats.std(),
+            "mean_target": self.targets_stats.mean(),
+            "std_target": self.targets_stats.std(),
+        }
+        for key, reservoir in [
+            ("median_pred", self.preds_reservoir),
+            ("median_target", self.targets_reservoir),
+        ]:
+            # The NaNs are sampled like the other elements, and ignored by the median
+            samples = reservoir.get_samples()
+            if (samples is None) or (samples[0].numel() == 0):
+                stats[key] = torch.as_tensor(float("nan"))
+            else:
+                stats[key] = torch.nanmedian(samples[0])
+        return stats
+
+    def compute_loss(self) -> Tensor:
+        return self.loss_stats.mean()
+
+
+def split_streaming_metrics(
+    metrics: Dict[str, MetricWrapper]
+) -> Tuple[Dict[str, MetricWrapper], Dict[str, MetricWrapper]]:
+    r"""
+    Split the metrics between the ones computed on the full epoch, and the ones computed in streaming mode.
+
+    Returns:
+        full_metrics: The metrics with `streaming=False`
+        streaming_metrics: The metrics with `streaming=True`
+    """
+    full_metrics, streaming_metrics = {}, {}
+    for name, metric in metrics.items():
+        if getattr(metric, "streaming", False):
+            streaming_metrics[name] = metric
+        else:
+            full_metrics[name] = metric
+    return full_metrics, streaming_metrics
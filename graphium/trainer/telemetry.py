@@ -0,0 +1,120 @@
+r"""Helpers to log the training telemetry without forcing a synchronization between the host and the device."""
+
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+import time
+
+import torch
+from torch import Tensor, nn
+
+
+def compute_gradient_norm(parameters: Iterable[nn.Parameter], norm_type: float = 2.0) -> Tensor:
+    r"""
+    Compute the norm of the gradients of all parameters, as if they were concatenated into a single vector.
+    The norms are computed with a single fused `torch._foreach_norm` per device when available, and the
+    result stays on the device, such that no synchronization with the host is required.
+
+    Parameters:
+        parameters: The parameters, usually `module.parameters()`. Parameters without gradients are ignored.
+        norm_type: The order of the norm
+
+    Returns:
+        total_norm: The norm of the gradients, as a 0-dim tensor on the device of the gradients,
+            or a 0-dim CPU tensor equal to 0 if no parameter has a gradient.
+    """
+    grads_per_device = {}
+    for p in parameters:
+        if p.grad is not None:
+            grads_per_device.setdefault(p.grad.device, []).append(p.grad.detach())
+    if len(grads_per_device) == 0:
+        return torch.tensor(0.0)
+
+    device_norms = []
+    for grads in grads_per_device.values():
+        if hasattr(torch, "_foreach_norm"):
+            norms = torch._foreach_norm(grads, norm_type)
+        else:
+            norms = [torch.linalg.vector_norm(g, norm_type) for g in grads]
+        device_norms.append(torch.linalg.vector_norm(torch.stack(norms), norm_type))
+
+    # Gather the norms of all devices on the first one
+    first_device = device_norms[0].device
+    total_norm = torch.linalg.vector_norm(torch.stack([n.to(first_device) for n in device_norms]), norm_type)
+    return total_norm
+
+
+class StepTimer:
+    def __init__(self):
+        r"""
+        Measure the duration and throughput of successive steps without forcing a synchronization.
+
+        On CUDA, events are recorded on the current stream at the start and end of each step,
+        and their elapsed time is only read once the end event has completed.
+        Otherwise, the wall-clock time is measured with `time.perf_counter`.
+        """
+        self._start = None
+        self._pending: List[Tuple[Any, Any, Union[int, Tensor]]] = []
+
+    @staticmethod
+    def _use_cuda_events() -> bool:
+        return torch.cuda.is_available() and torch.cuda.is_initialized()
+
+    def start(self) -> None:
+        """Mark the start of a step"""
+        if self._use_cuda_events():
+            self._start = torch.cuda.Event(enable_timing=True)
+            self._start.record()
+        else:
+            self._start = time.perf_counter()
+
+    def stop(self, num_samples: int = 0) -> None:
+        r"""
+        Mark the end of a step.
+
+        Parameters:
+            num_samples: The number of samples (e.g. graphs) processed during the step, to compute the throughput
+        """
+        if self._start is None:
+            return
+        if isinstance(self._start, float):
+            end = time.perf_counter()
+        else:
+            end = torch.cuda.Event(enable_timing=True)
+            end.record()
+        # The number of samples is kept as is, since converting a device tensor would synchronize
+        self._pending.append((self._start, end, num_samples))
+        self._start = None
+
+    def pop_completed(self) -> Tuple[Optional[float], Optional[float]]:
+        r"""
+        Get the mean duration and the throughput of the steps that completed since the last call.
+        Steps still running on the device are kept for the next call.
+
+        Returns:
+            mean_time: The mean duration of a step in seconds, or `None` if no step completed
+            throughput: The number of samples per second, or `None` if no step completed
+        """
+        total_time, total_samples, num_steps = 0.0, 0, 0
+        still_pending = []
+        for start, end, num_samples in self._pending:
+            if isinstance(start, float):
+                elapsed = end - start
+            elif end.query():
+                elapsed = start.elapsed_time(end) / 1000
+            else:
+                still_pending.append((start, end, num_samples))
+                continue
+            total_time += elapsed
+            total_samples += int(num_samples)
+            num_steps += 1
+        self._pending = still_pending
+
+        if num_steps == 0:
+            return None, None
+        mean_time = total_time / num_steps
+        throughput = total_samples / total_time if total_time > 0 else None
+        return mean_time, throughput
+
+    def reset(self) -> None:
+        self._start = None
+        self._pending = []
@@ -1,3 +1,3 @@
-from . import fs
-from . import tensor
-from . import dict_tensor
+from graphium._lazy import lazy_import
+
+__getattr__, __dir__, __all__ = lazy_import(__name__, submodules=["fs", "tensor", "dict_tensor"])
@@ -1,6 +1,24 @@
-from typing import Any
+from typing import Any, Callable, Dict, Tuple, Union
+
+import os
+import enum
 import hashlib
+import weakref
+import functools
+
 import yaml
+import numpy as np
+import pandas as pd
+import torch
+from omegaconf import DictConfig, ListConfig, OmegaConf
+
+FILE_HASH_MODES = ["stat", "content"]
+
+# Digests of the large objects, keyed by `id`, with a weak reference to check that the object is still alive
+_OBJECT_DIGESTS: Dict[int, Tuple[weakref.ref, bytes]] = {}
+
+# Digests of the file contents, keyed by path, size and modification time
+_FILE_DIGESTS: Dict[Tuple[str, int, int], bytes] = {}
 
 
 def get_md5_hash(object: Any) -> str:
@@ -13,3 +31,183 @@ def get_md5_hash(object: Any) -> str:
     encoded = yaml.dump(object, sort_keys=True).encode()
     dhash.update(encoded)
     return dhash.hexdigest()
+
+
+def _blake2b(*parts: bytes) -> bytes:
+    dhash = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        dhash.update(part)
+    return dhash.digest()
+
+
+def _memoized_digest(obj: Any, compute: Callable[[Any], bytes]) -> bytes:
+    """Digest of a large object, computed once per object as long as it is alive"""
+    key = id(obj)
+    if key in _OBJECT_DIGESTS:
+        ref, digest = _OBJECT_DIGESTS[key]
+        if ref() is obj:
+            return digest
+    digest = compute(obj)
+    try:
+        ref = weakref.ref(obj, lambda _, key=key: _OBJECT_DIGESTS.pop(key, None))
+    except TypeError:
+        return digest  # Not weakly referenceable
+    _OBJECT_DIGESTS[key] = (ref, digest)
+    return digest
+
+
+def hash_dataframe(df: Union[pd.DataFrame, pd.Series]) -> bytes:
+    r"""
+    Digest of a DataFrame or Series, from the vectorized row hashes of `pd.util.hash_pandas_object`,
+    the index, the column names and the dtypes. The values are never converted to text.
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    columns = list(df.columns) if isinstance(df, pd.DataFrame) else [df.name]
+    dtypes = list(df.dtypes) if isinstance(df, pd.DataFrame) else [df.dtype]
+    meta = repr((type(df).__name__, columns, [str(dtype) for dtype in dtypes], df.shape))
+    return _blake2b(meta.encode(), row_hashes.tobytes())
+
+
+def hash_array(array: Union[np.ndarray, torch.Tensor]) -> bytes:
+    r"""
+    Digest of a numpy array or torch tensor, from its raw buffer, dtype and shape.
+    The arrays of Python objects are hashed with `hash_pandas_object`.
+    """
+    if isinstance(array, torch.Tensor):
+        array = array.detach().cpu()
+        if array.dtype == torch.bfloat16:
+            array = array.view(torch.int16)
+        array = array.numpy()
+    meta = repr((str(array.dtype), array.shape)).encode()
+    if array.dtype == object:
+        return _blake2b(meta, hash_dataframe(pd.Series(array.reshape(-1))))
+    return _blake2b(meta, np.ascontiguousarray(array).view(np.uint8).tobytes())
+
+
+def hash_file(path: Union[str, os.PathLike], mode: str = "stat", chunk_size: int = 2**20) -> bytes:
+    r"""
+    Digest of a local file.
+
+    Parameters:
+        path: The path of the file
+        mode: `"stat"` to hash the absolute path, size and modification time, which is fast but
+            changes when the file is copied or touched, or `"content"` to hash the content of the file,
+            read in chunks. The content digests are memoized by path, size and modification time.
+        chunk_size: Number of bytes read at once for the `"content"` mode
+
+    Returns:
+        digest: The digest of the file
+    """
+    if mode not in FILE_HASH_MODES:
+        raise ValueError(f"Unknown file hash mode `{mode}`, choose from {FILE_HASH_MODES}")
+    path = os.path.abspath(os.fspath(path))
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if mode == "stat":
+        return _blake2b(repr(key).encode())
+
+    if key not in _FILE_DIGESTS:
+        dhash = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                dhash.update(chunk)
+        _FILE_DIGESTS[key] = dhash.digest()
+    return _FILE_DIGESTS[key]
+
+
+class StructuredHasher:
+    def __init__(self, hash_files: bool = False, file_mode: str = "stat", memoize: bool = True):
+        r"""
+        Stable hash of nested structures, to be used as a cache key. Unlike `get_md5_hash`, the objects
+        are never serialized to text: each object is hashed according to its type, and the nested
+        digests are combined.
+
+        - The dictionaries and sets are independent of their ordering
+        - The DataFrames, Series, arrays and tensors are hashed from their buffers, see `hash_dataframe`
+          and `hash_array`. Their digests are memoized per object, so they must not be modified
+          in-place after being hashed.
+        - The functions and classes are hashed by qualified name, and the `functools.partial` by
+          function, arguments and keywords
+        - The `DictConfig` and `ListConfig` of omegaconf are hashed as dictionaries and lists
+        - The other objects are hashed by class and attributes
+
+        Parameters:
+            hash_files: Whether the strings and paths pointing to an existing local file are also
+                hashed with `hash_file`, such that a modified file changes the hash
+            file_mode: The mode of `hash_file`, `"stat"` or `"content"`
+            memoize: Whether to memoize the digests of the large objects
+        """
+        if file_mode not in FILE_HASH_MODES:
+            raise ValueError(f"Unknown file hash mode `{file_mode}`, choose from {FILE_HASH_MODES}")
+        self.hash_files = hash_files
+        self.file_mode = file_mode
+        self.memoize = memoize
+
+    def hash(self, obj: Any) -> str:
+        """Get the hexadecimal hash of an object"""
+        return self.digest(obj).hex()
+
+    def _large_object_digest(self, obj: Any, compute: Callable[[Any], bytes]) -> bytes:
+        if self.memoize:
+            return _memoized_digest(obj, compute)
+        return compute(obj)
+
+    def digest(self, obj: Any) -> bytes:
+        """Get the binary digest of an object"""
+        tag = type(obj).__name__.encode()
+
+        if (obj is None) or isinstance(obj, (bool, int, float, complex, enum.Enum)):
+            return _blake2b(tag, repr(obj).encode())
+        if isinstance(obj, (str, os.PathLike)):
+            if self.hash_files and os.path.isfile(obj):
+                return _blake2b(b"file", hash_file(obj, mode=self.file_mode))
+            return _blake2b(tag, os.fspath(obj).encode())
+        if isinstance(obj, bytes):
+            return _blake2b(tag, obj)
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            return self._large_object_digest(obj, hash_dataframe)
+        if isinstance(obj, (np.ndarray, torch.Tensor)):
+            return self._large_object_digest(obj, hash_array)
+        if isinstance(obj, (np.generic, torch.dtype, np.dtype)):
+            return _blake2b(tag, repr(obj).encode())
+
+        if isinstance(obj, (DictConfig, ListConfig)):
+            return self.digest(OmegaConf.to_container(obj, resolve=True))
+        if isinstance(obj, dict):
+            items = sorted(self.digest(key) + self.digest(value) for key, value in obj.items())
+            return _blake2b(b"dict", *items)
+        if isinstance(obj, (set, frozenset)):
+            return _blake2b(b"set", *sorted(self.digest(value) for value in obj))
+        if isinstance(obj, (list, tuple)):
+            return _blake2b(tag, *[self.digest(value) for value in obj])
+
+        if isinstance(obj, functools.partial):
+            return _blake2b(
+                b"partial", self.digest(obj.func), self.digest(obj.args), self.digest(obj.keywords)
+            )
+        if isinstance(obj, type) or (callable(obj) and hasattr(obj, "__qualname__")):
+            return _blake2b(b"callable", f"{obj.__module__}.{obj.__qualname__}".encode())
+
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is None:
+            raise TypeError(f"Cannot hash an object of type `{type(obj).__name__}`")
+        name = f"{type(obj).__module__}.{type(obj).__qualname__}".encode()
+        return _blake2b(b"object", name, self.digest(attributes))
+
+
+def get_structured_hash(obj: Any, hash_files: bool = False, file_mode: str = "stat") -> str:
+    r"""
+    Stable hash of a nested structure of dictionaries, lists, DataFrames, arrays, files and objects,
+    without serializing them to text. See `StructuredHasher`.
+
+    Parameters:
+        obj: The object to hash
+        hash_files: Whether the strings and paths pointing to an existing local file are also hashed
+            by their size and modification time, or content
+        file_mode: `"stat"` to hash the files by path, size and modification time, or `"content"`
+            to hash their content
+
+    Returns:
+        hash: The hexadecimal hash
+    """
+    return StructuredHasher(hash_files=hash_files, file_mode=file_mode).hash(obj)
@@ -1,14 +1,11 @@
 import os
 import numpy as np
 import pandas as pd
-from matplotlib import pyplot as plt
 from typing import Iterable, List, Union, Any, Callable
 from inspect import getfullargspec
 from copy import copy, deepcopy
 from loguru import logger
 
-from rdkit.Chem import AllChem
-
 import torch
 from torch import Tensor
 
@@ -22,6 +19,9 @@ def save_im(im_dir, im_name: str, ext: List[str] = ["svg", "png"], dpi: int = 60
     if isinstance(ext, str):
         ext = [ext]
 
+    # Imported here, since matplotlib is slow to import and only needed to save the figures
+    from matplotlib import pyplot as plt
+
     full_name = os.path.join(im_dir, im_name)
     for this_ext in ext:
         plt.savefig(f"{full_name}.{this_ext}", dpi=dpi, bbox_inches="tight", pad_inches=0)
@@ -4,6 +4,7 @@ import pickle
 
 from graphium.data.utils import load_micro_zinc
 from graphium.features.featurizer import mol_to_pyggraph, mol_to_adj_and_features, mol_to_graph_dict
+from graphium.features.profiling import FeaturizationProfiler
 
 # Check out this profiling tool: https://kirillstrelkov.medium.com/python-profiling-with-vscode-3a17c0407833
 
@@ -52,12 +53,14 @@ def main():
         # "on_error": "raise",
     }
 
+    # Parsing is done inside `mol_to_graph_dict`, such that it is part of the profile
+    profiler = FeaturizationProfiler()
     graphs = []
     for s in tqdm(smiles):
-        mol = dm.to_mol(s)
-        graphs.append(mol_to_graph_dict(mol, **featurizer))
+        graphs.append(mol_to_graph_dict(s, profiler=profiler, **featurizer))
 
     print(graphs[0])
+    print(profiler.report())
 
 
 if __name__ == "__main__":
@@ -48,6 +48,11 @@ class test_Base_Layers(ut.TestCase):
         h_out = layer.forward(feat_in, bg.batch)
         self.assertTrue(torch.allclose(zero_tesor, h_out.detach()))
 
+        # No path is dropped in evaluation mode
+        layer.eval()
+        h_out = layer.forward(feat_in, bg.batch)
+        self.assertTrue(torch.allclose(feat_in.detach(), h_out.detach()))
+
     # for drop_rate=0.0, test if the output matches the original output
     def test_droppath_layer_0p0(self):
         bg = deepcopy(self.bg)
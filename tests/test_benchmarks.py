@@ -0,0 +1,92 @@
+import unittest as ut
+import json
+import os
+import tempfile
+
+from graphium.benchmarks.dataloader import run_dataloader_benchmark, benchmark_report_to_dataframe
+from graphium.benchmarks.flag import run_flag_benchmark, flag_report_to_dataframe
+from graphium.benchmarks.quantization import run_quantization_benchmark, quantization_report_to_dataframe
+
+
+class Test_DataloaderBenchmark(ut.TestCase):
+    def test_run_dataloader_benchmark(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "benchmark.json")
+            report = run_dataloader_benchmark(
+                dataset_names=["tiny_ZINC"],
+                num_workers=[0],
+                batch_sizes=[8, 32],
+                load_from_file=[False, True],
+                persistent_workers=[False, True],
+                n_epochs=2,
+                output_path=output_path,
+            )
+
+            # The results must be machine-readable
+            with open(output_path, "r") as file:
+                reloaded = json.load(file)
+        self.assertEqual(reloaded, json.loads(json.dumps(report)))
+
+        # `persistent_workers=True` is skipped with `num_workers=0`
+        results = report["results"]
+        self.assertEqual(len(results), 4)
+        self.assertSetEqual({res["load_from_file"] for res in results}, {False, True})
+        self.assertSetEqual({res["persistent_workers"] for res in results}, {False})
+
+        for res in results:
+            self.assertEqual(len(res["epochs"]), 2)
+            for epoch in res["epochs"]:
+                self.assertEqual(epoch["num_graphs"], 60)  # 60% of the 100 molecules are in the training set
+                self.assertGreater(epoch["num_nodes"], epoch["num_graphs"])
+            self.assertGreater(res["graphs_per_s"], 0)
+            self.assertGreater(res["nodes_per_s"], res["graphs_per_s"])
+            self.assertGreater(res["getitem_s"], 0)
+            self.assertGreater(res["collate_s"], 0)
+            self.assertEqual(res["worker_idle_fraction"], 0)
+            self.assertGreater(res["peak_rss_main_mb"], 0)
+            self.assertGreaterEqual(res["rss_main_increase_mb"], 0)
+            self.assertEqual(res["peak_rss_workers_mb"], 0)  # No worker process without `num_workers`
+
+        df = benchmark_report_to_dataframe(report)
+        self.assertEqual(len(df), 4)
+        self.assertNotIn("epochs", df.columns)
+
+
+class Test_FlagBenchmark(ut.TestCase):
+    def test_run_flag_benchmark(self):
+        report = run_flag_benchmark(
+            dataset_name="tiny_ZINC", n_flag_steps=[1, 2], batch_size=16, n_batches=2, n_warmup=1
+        )
+
+        # The plain training step is always benchmarked first, as the reference
+        results = report["results"]
+        self.assertListEqual([res["n_flag_steps"] for res in results], [0, 1, 2])
+        self.assertEqual(results[0]["relative_step_time"], 1.0)
+        for res in results:
+            self.assertGreater(res["step_s"], 0)
+
+        df = flag_report_to_dataframe(report)
+        self.assertEqual(len(df), 3)
+
+
+class Test_QuantizationBenchmark(ut.TestCase):
+    def test_run_quantization_benchmark(self):
+        report = run_quantization_benchmark(
+            dataset_name="tiny_ZINC", hidden_dim=32, batch_size=16, n_batches=2, n_train_steps=2
+        )
+
+        # The float32 model is always benchmarked first, as the reference
+        results = report["results"]
+        self.assertListEqual([res["mode"] for res in results], ["fp32", "int8", "bf16", "int8-bf16"])
+        self.assertEqual(results[0]["speedup"], 1.0)
+        for res in results[1:]:
+            self.assertGreater(res["molecules_per_s"], 0)
+            self.assertSetEqual(set(res["tasks"].keys()), {"graph_SA", "graph_logp", "graph_score"})
+            self.assertEqual(res["tasks"]["graph_SA"]["num_labels"], 20)
+
+        df = quantization_report_to_dataframe(report)
+        self.assertEqual(len(df), 1 + 3 * 3)
+
+
+if __name__ == "__main__":
+    ut.main()
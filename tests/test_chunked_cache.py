@@ -0,0 +1,218 @@
+"""
+Unit tests for the file graphium/data/chunked_cache.py
+"""
+
+import os
+import tempfile
+import unittest as ut
+
+import numpy as np
+import torch
+from scipy.sparse import coo_matrix
+from torch_geometric.data import Data
+
+import graphium
+from graphium.features import mol_to_graph_dict
+from graphium.data.chunked_cache import (
+    ColumnarRecords,
+    ChainedSequence,
+    PatchedSequence,
+    write_chunk,
+    read_chunk,
+    available_codecs,
+    default_codec,
+)
+
+
+def assert_records_equal(test: ut.TestCase, record, expected):
+    test.assertIs(type(record), type(expected))
+    if isinstance(expected, dict):
+        test.assertListEqual(list(record.keys()), list(expected.keys()))
+        for key in expected.keys():
+            assert_records_equal(test, record[key], expected[key])
+    elif isinstance(expected, Data):
+        assert_records_equal(test, record.to_dict(), expected.to_dict())
+    elif isinstance(expected, coo_matrix):
+        test.assertTupleEqual(record.shape, expected.shape)
+        for key in ["data", "row", "col"]:
+            assert_records_equal(test, getattr(record, key), getattr(expected, key))
+    elif isinstance(expected, (list, tuple)):
+        test.assertEqual(len(record), len(expected))
+        for value, other in zip(record, expected):
+            assert_records_equal(test, value, other)
+    elif isinstance(expected, torch.Tensor):
+        torch.testing.assert_close(record, expected, rtol=0, atol=0)
+    elif isinstance(expected, np.ndarray):
+        test.assertEqual(record.dtype, expected.dtype)
+        np.testing.assert_array_equal(record, expected)
+    else:
+        test.assertEqual(record, expected)
+
+
+class test_ColumnarRecords(ut.TestCase):
+    smiles = ["CCO", "c1ccccc1O", "CC(=O)NC", "C"]
+
+    def test_graph_dicts(self):
+        records = [
+            mol_to_graph_dict(
+                smiles,
+                atom_property_list_onehot=["atomic-number", "degree"],
+                edge_property_list=["bond-type-onehot"],
+            )
+            for smiles in self.smiles
+        ]
+        columns = ColumnarRecords.from_records(records)
+        self.assertEqual(len(columns), len(records))
+        for ii, record in enumerate(records):
+            assert_records_equal(self, columns[ii], record)
+        assert_records_equal(self, columns[-1], records[-1])
+        self.assertEqual(len(columns[1:3]), 2)
+        with self.assertRaises(IndexError):
+            columns[len(records)]
+
+    def test_mixed_leaves(self):
+        records = [
+            {
+                "data": Data(x=torch.randn(n, 3), edge_index=torch.zeros(2, n - 1, dtype=torch.long)),
+                "label": np.float32(n),
+                "scalar": torch.tensor(float(n)),
+                "const": "same",
+                "object": "C" * n,
+                "pair": (np.arange(n), coo_matrix(np.eye(n))),
+            }
+            for n in [2, 5, 3]
+        ]
+        columns = ColumnarRecords.from_records(records)
+        self.assertIsNotNone(columns)
+        for ii, record in enumerate(records):
+            assert_records_equal(self, columns[ii], record)
+
+    def test_mismatch(self):
+        self.assertIsNone(ColumnarRecords.from_records([]))
+        self.assertIsNone(ColumnarRecords.from_records([{"a": 1}, {"b": 1}]))
+        self.assertIsNone(ColumnarRecords.from_records([{"a": 1}, {"a": [1]}]))
+
+    def test_chained_sequence(self):
+        chained = ChainedSequence([[0, 1], [2], [3, 4, 5]])
+        self.assertEqual(len(chained), 6)
+        self.assertListEqual([chained[ii] for ii in range(6)], list(range(6)))
+        self.assertEqual(chained[-1], 5)
+        self.assertListEqual(chained[1:4], [1, 2, 3])
+        with self.assertRaises(IndexError):
+            chained[6]
+
+
+class test_Chunks(ut.TestCase):
+    def test_write_read(self):
+        fields = {
+            "labels": [np.array([float(ii), np.nan], dtype=np.float32) for ii in range(5)],
+            "features": [{"feat": torch.randn(ii + 1, 4), "num_nodes": ii + 1} for ii in range(5)],
+            "smiles": ["C" * (ii + 1) for ii in range(5)],
+            "indices": np.arange(5),
+            "weights": None,
+            "unique_ids": [["a"], "b", "c", "d", "e"],  # Not the same structure, pickled
+        }
+        self.assertIn(default_codec(), available_codecs())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for codec in ["none", "zlib"]:
+                path = os.path.join(tmpdir, f"{codec}.chunk")
+                nbytes = write_chunk(path, fields, codec=codec)
+                self.assertEqual(nbytes, os.path.getsize(path))
+                loaded = read_chunk(path)
+                self.assertIsNone(loaded["weights"])
+                for field in ["labels", "features", "smiles", "indices", "unique_ids"]:
+                    self.assertEqual(len(loaded[field]), 5)
+                    for value, expected in zip(loaded[field], fields[field]):
+                        assert_records_equal(self, value, expected)
+
+                # The tensors are writable views of the buffers
+                loaded["features"][0]["feat"] += 1
+
+            with self.assertRaises(ValueError):
+                write_chunk(os.path.join(tmpdir, "unknown.chunk"), fields, codec="unknown")
+
+    def test_mixed_types_and_mmap(self):
+        # The features of the molecules that failed featurization are strings
+        features = [{"feat": np.full((ii, 2), ii)} if ii % 3 else f"failed {ii}" for ii in range(7)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "mixed.chunk")
+            write_chunk(path, {"features": features}, codec="none")
+            for use_mmap in [False, True]:
+                loaded = read_chunk(path, use_mmap=use_mmap)["features"]
+                self.assertIsInstance(loaded, PatchedSequence)
+                self.assertEqual(len(loaded), len(features))
+                for value, expected in zip(loaded, features):
+                    assert_records_equal(self, value, expected)
+
+            # The memory-mapped arrays are copy-on-write
+            loaded[1]["feat"] += 1
+            assert_records_equal(self, read_chunk(path, use_mmap=True)["features"][1], features[1])
+
+
+class test_ChunkedDataCache(ut.TestCase):
+    def get_datamodule(self, cache_data_path, cache_data_format):
+        df = graphium.data.load_tiny_zinc()
+        task_args = {
+            "task_level": "graph",
+            "smiles_col": "SMILES",
+            "split_val": 0.2,
+            "split_test": 0.2,
+            "seed": 19,
+        }
+        return graphium.data.MultitaskFromSmilesDataModule(
+            task_specific_args={
+                "SA": {"df": df[["SMILES", "SA"]], "label_cols": ["SA"], **task_args},
+                "logp": {
+                    "df": df[["SMILES", "logp"]],
+                    "label_cols": ["logp"],
+                    "label_normalization": {"method": "normal"},
+                    **task_args,
+                },
+            },
+            featurization={
+                "atom_property_list_onehot": ["atomic-number", "degree"],
+                "edge_property_list": ["bond-type-onehot"],
+            },
+            featurization_n_jobs=0,
+            cache_data_path=cache_data_path,
+            cache_data_format=cache_data_format,
+            cache_data_codec="zlib",
+            cache_data_n_jobs=2,
+        )
+
+    def test_same_as_torch_cache(self):
+        with self.assertRaises(ValueError):
+            self.get_datamodule(None, "unknown")
+
+        with tempfile.TemporaryDirectory() as cache_data_path:
+            datamodules = {}
+            for cache_data_format in ["torch", "chunked"]:
+                # The first datamodule saves the cache, and the second loads it
+                self.get_datamodule(cache_data_path, cache_data_format).prepare_data()
+                dm = self.get_datamodule(cache_data_path, cache_data_format)
+                self.assertTrue(dm.load_data_from_cache())
+                dm.prepare_data()
+                dm.setup()
+                datamodules[cache_data_format] = dm
+            self.assertTrue(
+                os.path.isfile(os.path.join(datamodules["chunked"].get_data_cache_fullname(), "index.json"))
+            )
+
+            expected, chunked = datamodules["torch"], datamodules["chunked"]
+            for split in ["train_ds", "val_ds", "test_ds"]:
+                expected_ds, chunked_ds = getattr(expected, split), getattr(chunked, split)
+                self.assertEqual(len(chunked_ds), len(expected_ds))
+                for ii in range(len(expected_ds)):
+                    # The node features of the labels are uninitialized placeholders, so only the labels are compared
+                    labels, expected_labels = chunked_ds[ii]["labels"], expected_ds[ii]["labels"]
+                    for task in ["graph_SA", "graph_logp"]:
+                        assert_records_equal(self, labels[task], expected_labels[task])
+                    assert_records_equal(self, chunked_ds[ii]["features"], expected_ds[ii]["features"])
+
+            norm, expected_norm = chunked.task_norms["graph_logp"], expected.task_norms["graph_logp"]
+            np.testing.assert_allclose(norm.data_mean, expected_norm.data_mean)
+            np.testing.assert_allclose(norm.data_std, expected_norm.data_std)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,96 @@
+"""
+Unit tests for the file graphium/nn/architectures/compiled_network.py
+"""
+
+from copy import copy
+
+import torch
+import unittest as ut
+
+from pytorch_lightning.trainer.states import RunningStage
+
+from graphium.benchmarks.dataloader import make_benchmark_datamodule
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.nn.architectures import CompiledGraphNetwork
+from graphium.nn.architectures.compiled_network import lower_batch, is_torch_compile_available
+
+
+class test_CompiledGraphNetwork(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        datamodule = make_benchmark_datamodule("tiny_ZINC", load_from_file=False, batch_size_training=16)
+        predictor = make_benchmark_predictor(datamodule, n_flag_steps=0)
+        cls.network = predictor.model
+        dataloader = datamodule.get_dataloader(
+            datamodule.train_ds, shuffle=False, stage=RunningStage.TRAINING
+        )
+        cls.batches = [
+            predictor._convert_features_dtype(batch["features"]) for _, batch in zip(range(2), dataloader)
+        ]
+
+    def test_lower_batch(self):
+        g = self.batches[0]
+        keys, tensors = lower_batch(g)
+        self.assertListEqual(list(keys), sorted(keys))
+        self.assertIn("ptr", keys)
+        for key, tensor in zip(keys, tensors):
+            self.assertIs(tensor, g[key])
+
+        keys, tensors = lower_batch(g, keys=["feat", "batch"])
+        self.assertTupleEqual(keys, ("feat", "batch"))
+        self.assertIs(tensors[1], g["batch"])
+
+    def test_trace_matches_eager(self):
+        compiled = CompiledGraphNetwork(self.network, mode="trace")
+        self.network.eval()
+        g = self.batches[0]
+        feat = g["feat"]
+        max_abs_diff = compiled.validate(g)
+        self.assertSetEqual(set(max_abs_diff.keys()), {"SA", "logp", "score"})
+        self.assertIs(g["feat"], feat)  # The batch is not modified
+
+        # The trace is reused for the same batch, and a new one is made for a different batch
+        for g in [self.batches[0], self.batches[0], self.batches[1]]:
+            with torch.no_grad():
+                compiled(g)
+        self.assertDictEqual(compiled.cache_info(), {"hits": 2, "misses": 2, "size": 2})
+
+        # The least recently used traces are evicted
+        compiled.max_cache_size = 1
+        compiled(self.batches[0])  # New trace with the gradients enabled
+        self.assertEqual(compiled.cache_info()["size"], 1)
+
+    def test_trace_gradients(self):
+        compiled = CompiledGraphNetwork(self.network, mode="trace")
+        self.network.train()
+        g = self.batches[1]
+        grads = []
+        for forward in [compiled, lambda g: self.network(copy(g))]:
+            self.network.zero_grad()
+            torch.manual_seed(42)
+            outputs = forward(g)
+            sum(output.sum() for output in outputs.values()).backward()
+            grads.append([param.grad.clone() for param in self.network.parameters()])
+        for grad, expected in zip(*grads):
+            torch.testing.assert_close(grad, expected)
+        self.network.zero_grad()
+
+        # The training mode is part of the signature
+        self.assertTrue(compiled.signature(*lower_batch(g))[0])
+        self.network.eval()
+        self.assertFalse(compiled.signature(*lower_batch(g))[0])
+
+    def test_compile_mode(self):
+        with self.assertRaises(ValueError):
+            CompiledGraphNetwork(self.network, mode="script")
+        if not is_torch_compile_available():
+            with self.assertRaises(RuntimeError):
+                CompiledGraphNetwork(self.network, mode="compile")
+            return
+        compiled = CompiledGraphNetwork(self.network, mode="compile")
+        self.network.eval()
+        compiled.validate(self.batches[0], rtol=1e-4, atol=1e-5)
+
+
+if __name__ == "__main__":
+    ut.main()
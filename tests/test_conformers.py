@@ -0,0 +1,161 @@
+"""
+Unit tests for the file graphium/features/conformers.py
+"""
+
+import os
+import tempfile
+import unittest as ut
+from functools import partial
+
+import numpy as np
+import datamol as dm
+from rdkit import Chem
+
+import graphium
+from graphium.features import mol_to_graph_dict
+from graphium.features.featurizer import get_simple_mol_conformer
+from graphium.features.conformers import (
+    CONFORMER_FAILED_PROP,
+    ConformerGenerator,
+    ConformerStore,
+    ConformerTransform,
+    generate_conformers,
+    set_mol_conformer,
+)
+
+SMILES = ["CCO", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1", "C1CC(("]
+
+
+class test_Conformers(ut.TestCase):
+    def test_generator(self):
+        generator = ConformerGenerator(large_num_atoms=15, num_confs_large=2, num_threads_large=1)
+        positions, error = generator.embed("CCO")
+        self.assertIsNone(error)
+        self.assertEqual(positions.shape, (9, 3))
+        self.assertEqual(positions.dtype, np.float32)
+
+        # Reproducible with the same seed, for the small and the large molecules
+        np.testing.assert_array_equal(positions, generator.embed("CCO")[0])
+        large = generator.embed(SMILES[2])[0]
+        np.testing.assert_array_equal(large, generator.embed(SMILES[2], large=True)[0])
+        self.assertEqual(large.shape, (20, 3))
+
+        self.assertEqual(generator.embed("C1CC((")[1], "Unparseable SMILES")
+        self.assertEqual(
+            generator.get_signature(),
+            ConformerGenerator(large_num_atoms=15, num_confs_large=2).get_signature(),
+        )
+        self.assertNotEqual(generator.get_signature(), ConformerGenerator(random_seed=0).get_signature())
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            positions = [np.random.rand(num_atoms, 3).astype(np.float32) for num_atoms in [3, 5]]
+            for dtype in ["float32", "float16"]:
+                store = ConformerStore(tmpdir, dtype=dtype, writer="a")
+                store.add("id0", positions[0])
+                store.add("failed", None, "Embedding failed")
+                # Available before the flush
+                np.testing.assert_array_equal(store.get("id0"), positions[0].astype(dtype))
+                store.flush()
+                other = ConformerStore(tmpdir, dtype=dtype, writer="b")
+                other.add("id1", positions[1])
+                other.flush()
+                with open(os.path.join(tmpdir, f"b.{dtype}.index.jsonl"), "a") as file:
+                    file.write('{"mol_id": "trunc')  # Interrupted write
+
+                # All the writers are read back, with the failures
+                store = ConformerStore(tmpdir, dtype=dtype, writer="a")
+                self.assertEqual(len(store), 3)
+                self.assertIsNone(store.get("failed"))
+                for mol_id, expected in zip(["id0", "id1"], positions):
+                    np.testing.assert_allclose(store.get(mol_id), expected, atol=1e-3)
+                    self.assertEqual(store.get(mol_id).dtype, np.dtype(dtype))
+
+            with self.assertRaises(ValueError):
+                ConformerStore(tmpdir, dtype="float64")
+
+    def test_generate_and_featurize(self):
+        generator = ConformerGenerator(large_num_atoms=15, num_threads_large=1)
+        mol_ids = [dm.unique_id(dm.to_mol(smiles)) or "" for smiles in SMILES]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = ConformerStore(tmpdir)
+            stats = generate_conformers(generator, SMILES, mol_ids, store, n_jobs=0, progress=False)
+            self.assertEqual(stats["num_embedded"], 4)
+            self.assertEqual(stats["num_failed"], 1)
+            self.assertEqual(stats["num_large"], 1)
+            self.assertAlmostEqual(stats["success_rate"], 0.75)
+
+            # The second run only reads the store
+            store = ConformerStore(tmpdir)
+            stats = generate_conformers(generator, SMILES, mol_ids, store, n_jobs=0, progress=False)
+            self.assertEqual(stats["num_embedded"], 0)
+            self.assertEqual(stats["num_cached"], 4)
+
+            featurizer = partial(
+                mol_to_graph_dict,
+                atom_property_list_onehot=["atomic-number"],
+                conformer_property_list=["positions_3d"],
+                edge_property_list=["conformer-bond-length"],
+            )
+            transform = ConformerTransform(featurizer)
+            for smiles, mol_id in zip(SMILES[:3], mol_ids[:3]):
+                positions = store.get(mol_id)
+                graph = transform((smiles, positions))
+                num_atoms = dm.to_mol(smiles).GetNumAtoms()
+                np.testing.assert_allclose(
+                    graph["positions_3d"], positions[:num_atoms].astype(np.float16), atol=1e-2
+                )
+                self.assertGreater(graph["edge_feat"].min(), 1.0)  # Bond lengths in Angstrom
+            self.assertIsInstance(transform((SMILES[3], None)), str)
+
+    def test_failed_conformer(self):
+        mol = set_mol_conformer("CCO", None)
+        self.assertTrue(mol.HasProp(CONFORMER_FAILED_PROP))
+        self.assertEqual(mol.GetNumConformers(), 0)
+        self.assertIsNone(get_simple_mol_conformer(Chem.RemoveHs(mol)))  # Not embedded again
+        self.assertTrue(set_mol_conformer("CCO", np.zeros((3, 3))).HasProp(CONFORMER_FAILED_PROP))
+        self.assertIsNone(set_mol_conformer("C1CC((", None))
+
+    def test_datamodule(self):
+        df = graphium.data.load_tiny_zinc().iloc[:20]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            datamodules = []
+            for edge_property_list in [[], ["conformer-bond-length"]]:
+                datamodule = graphium.data.MultitaskFromSmilesDataModule(
+                    task_specific_args={
+                        "SA": {
+                            "df": df,
+                            "task_level": "graph",
+                            "smiles_col": "SMILES",
+                            "label_cols": ["SA"],
+                            "split_val": 0.2,
+                            "split_test": 0.2,
+                        }
+                    },
+                    featurization={
+                        "atom_property_list_onehot": ["atomic-number"],
+                        "conformer_property_list": ["positions_3d"],
+                        "edge_property_list": edge_property_list,
+                    },
+                    featurization_n_jobs=0,
+                    featurization_progress=False,
+                    conformer_cache_dir=tmpdir,
+                    conformer_generation={"timeout_s": 60},
+                )
+                datamodule.prepare_data()
+                datamodules.append(datamodule)
+
+            # The conformers are embedded once, and reused by the second featurization
+            first, second = [datamodule.conformer_stats for datamodule in datamodules]
+            self.assertEqual(first["num_embedded"], 20)
+            self.assertEqual(first["success_rate"], 1.0)
+            self.assertEqual(second["num_embedded"], 0)
+            self.assertEqual(second["num_cached"], 20)
+            for datamodule in datamodules:
+                positions = datamodule.single_task_datasets["graph_SA"].features[0]["positions_3d"]
+                self.assertFalse(positions.isnan().any())
+                self.assertGreater(positions.abs().sum(), 0)
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -1,7 +1,15 @@
 import unittest as ut
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import torch
 
 from graphium.data import load_micro_zinc
 from graphium.data.dataset import SingleTaskDataset, MultitaskDataset
+from graphium.data.sample_cache import SampleCache, get_sample_nbytes
+from graphium.features import mol_to_pyggraph
 from graphium.data.smiles_transform import smiles_to_unique_mol_ids
 
 
@@ -194,5 +202,108 @@ class Test_Multitask_Dataset(ut.TestCase):
         self.assertEqual(total_data_points, multitask_microzinc.__len__())
 
 
+class Test_SampleCache(ut.TestCase):
+    def test_sample_cache_eviction(self):
+        sample = {"labels": np.zeros(1024, dtype=np.float32)}  # 4kB
+        nbytes = get_sample_nbytes(sample)
+        self.assertEqual(nbytes, 4096)
+
+        for policy in ["lru", "fifo"]:
+            cache = SampleCache(max_size_mb=2.5 * nbytes / 1024**2, eviction_policy=policy)
+            cache.put(0, sample)
+            cache.put(1, sample)
+            cache.get(0)  # Most recently used with "lru"
+            cache.put(2, sample)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.evictions, 1)
+            if policy == "lru":
+                self.assertIn(0, cache)
+                self.assertNotIn(1, cache)
+            else:
+                self.assertNotIn(0, cache)
+                self.assertIn(1, cache)
+            self.assertLessEqual(cache.size_bytes, cache.max_size_bytes)
+
+        # Samples larger than the cache are never added
+        cache = SampleCache(max_size_mb=0.5 * nbytes / 1024**2)
+        cache.put(0, sample)
+        self.assertEqual(len(cache), 0)
+
+        with self.assertRaises(ValueError):
+            SampleCache(max_size_mb=1, eviction_policy="random")
+
+    def test_sample_cache_read_through(self):
+        num_loads = []
+
+        def load_fn(key):
+            num_loads.append(key)
+            return {"labels": np.full(4, key, dtype=np.float32)}
+
+        cache = SampleCache(max_size_mb=1)
+        for _ in range(3):
+            sample = cache.get_or_load(5, load_fn)
+            np.testing.assert_array_equal(sample["labels"], 5)
+
+            # Mutating the returned sample must not modify the cache
+            sample["labels"] += 1
+            sample["extra"] = 1
+
+        self.assertEqual(num_loads, [5])
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+        # The cached samples are not pickled, so that each dataloader worker starts with an empty cache
+        cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.max_size_mb, 1)
+
+        # A disabled cache always reads from the loader
+        cache = SampleCache(max_size_mb=0)
+        cache.get_or_load(5, load_fn)
+        cache.get_or_load(5, load_fn)
+        self.assertEqual(num_loads, [5, 5, 5])
+        self.assertEqual(len(cache), 0)
+
+    def test_multitask_dataset_load_from_file_cache(self):
+        df = load_micro_zinc().iloc[0:6]
+        smiles = df["SMILES"].tolist()
+        features = [
+            mol_to_pyggraph(
+                s, atom_property_list_onehot=["atomic-number", "degree"], atom_property_list_float=["mass"]
+            )
+            for s in smiles
+        ]
+        ds = SingleTaskDataset(smiles=smiles, labels=df["SA"].tolist(), features=features)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Save the samples in the same format as `MultitaskFromSmilesDataModule.save_featurized_data`
+            temp_dataset = MultitaskDataset({"graph_SA": ds}, progress=False)
+            os.makedirs(os.path.join(tmpdir, "0000"))
+            for idx in range(len(temp_dataset)):
+                datum = temp_dataset[idx]
+                torch.save(
+                    {"graph_with_features": datum["features"], "labels": datum["labels"]},
+                    os.path.join(tmpdir, "0000", format(idx, "07d") + ".pkl"),
+                )
+            temp_dataset.save_metadata(tmpdir)
+
+            dataset = MultitaskDataset(
+                None, data_path=tmpdir, load_from_file=True, files_ready=True, sample_cache_size_mb=10
+            )
+            self.assertEqual(len(dataset), len(smiles))
+
+            for idx in range(len(dataset)):
+                datum = dataset[idx]
+                # Mutating the returned datum must not modify the next call to `__getitem__`
+                datum["labels"]["graph_SA"] = datum["labels"]["graph_SA"] + 1000
+                self.assertEqual(dataset[idx]["labels"]["graph_SA"], temp_dataset[idx]["labels"]["graph_SA"])
+                torch.testing.assert_close(dataset[idx]["features"].feat, temp_dataset[idx]["features"].feat)
+
+            stats = dataset.sample_cache.stats()
+            self.assertEqual(stats["misses"], len(dataset))
+            self.assertEqual(stats["hits"], 2 * len(dataset))
+            self.assertEqual(stats["num_samples"], len(dataset))
+
+
 if __name__ == "__main__":
     ut.main()
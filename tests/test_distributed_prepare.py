@@ -0,0 +1,132 @@
+"""
+Unit tests for the distributed data preparation, see graphium/data/distributed.py
+"""
+
+import os
+import tempfile
+import unittest as ut
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+import graphium
+from graphium.data.distributed import get_shard_bounds, map_sharded, wait_for_files
+
+WORLD_SIZE = 2
+
+
+def get_datamodule(cache_data_path, prepare_data_distributed=True):
+    df = graphium.data.load_tiny_zinc()
+    df.loc[3, "SMILES"] = "not a smiles"  # A molecule failing featurization
+    task_args = {
+        "task_level": "graph",
+        "smiles_col": "SMILES",
+        "split_val": 0.2,
+        "split_test": 0.2,
+        "seed": 19,
+    }
+    return graphium.data.MultitaskFromSmilesDataModule(
+        task_specific_args={
+            "SA": {"df": df[["SMILES", "SA"]], "label_cols": ["SA"], **task_args},
+            "logp": {"df": df[["SMILES", "logp"]].iloc[:60], "label_cols": ["logp"], **task_args},
+        },
+        featurization={
+            "atom_property_list_onehot": ["atomic-number", "degree"],
+            "edge_property_list": ["bond-type-onehot"],
+        },
+        featurization_n_jobs=0,
+        cache_data_path=cache_data_path,
+        cache_data_format="chunked",
+        cache_data_codec="none",
+        prepare_data_distributed=prepare_data_distributed,
+    )
+
+
+def get_features(dm):
+    """Get the node features of the training set, by smiles"""
+    dm.setup(save_smiles_and_ids=True)
+    return {dm.train_ds[ii]["smiles"][0]: dm.train_ds[ii]["features"].feat for ii in range(len(dm.train_ds))}
+
+
+def _run_rank(rank, cache_data_path, init_file, result_dir):
+    dist.init_process_group("gloo", init_method=f"file://{init_file}", rank=rank, world_size=WORLD_SIZE)
+    try:
+        dm = get_datamodule(cache_data_path)
+        dm.prepare_data()
+        assert dm.single_task_datasets is None  # Skipped with several ranks
+        torch.save(get_features(dm), os.path.join(result_dir, f"{rank}.pt"))
+        dist.barrier()
+    finally:
+        dist.destroy_process_group()
+
+
+class test_DistributedPrepare(ut.TestCase):
+    def test_shard_bounds(self):
+        bounds = [get_shard_bounds(10, rank, 3) for rank in range(3)]
+        self.assertListEqual(bounds, [(0, 3), (3, 7), (7, 10)])
+        self.assertListEqual([get_shard_bounds(1, rank, 2) for rank in range(2)], [(0, 0), (0, 1)])
+
+    def test_map_sharded(self):
+        values = [f"C{ii}" for ii in range(7)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Run the ranks one after the other: the last ranks write their shard, then time out waiting
+            for rank in [2, 1]:
+                with self.assertRaises(TimeoutError):
+                    map_sharded(
+                        lambda shard: [value.lower() for value in shard], values, tmpdir, "ids", rank, 3, 0
+                    )
+            outputs = map_sharded(
+                lambda shard: [value.lower() for value in shard], values, tmpdir, "ids", 0, 3
+            )
+            np.testing.assert_array_equal(outputs, [value.lower() for value in values])
+
+            # The existing shards are reused
+            outputs = map_sharded(None, values, tmpdir, "ids", 1, 3)
+            np.testing.assert_array_equal(outputs, [value.lower() for value in values])
+            with self.assertRaises(TimeoutError):
+                wait_for_files([os.path.join(tmpdir, "missing")], timeout=0.1, poll_interval=0.05)
+
+            # The records are gathered from the memory-mapped shards
+            outputs = map_sharded(
+                lambda shard: [{"x": np.arange(len(value))} for value in shard], values, tmpdir, "x"
+            )
+            self.assertEqual(len(outputs), 7)
+            np.testing.assert_array_equal(outputs[3]["x"], np.arange(2))
+
+    def test_prepare_with_gloo(self):
+        with self.assertRaises(ValueError):
+            get_datamodule(None)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_data_path = os.path.join(tmpdir, "cache")
+            mp.spawn(
+                _run_rank,
+                args=(cache_data_path, os.path.join(tmpdir, "init"), tmpdir),
+                nprocs=WORLD_SIZE,
+                join=True,
+            )
+            results = [torch.load(os.path.join(tmpdir, f"{rank}.pt")) for rank in range(WORLD_SIZE)]
+            shards = os.listdir(
+                os.path.join(cache_data_path, f"{get_datamodule(None, False).data_hash}.shards")
+            )
+            self.assertEqual(len([shard for shard in shards if shard.startswith("features-")]), WORLD_SIZE)
+
+            # Same features as the preparation on a single process
+            dm = get_datamodule(None, prepare_data_distributed=False)
+            dm.prepare_data()
+            expected = get_features(dm)
+            for features in results:
+                self.assertSetEqual(set(features.keys()), set(expected.keys()))
+                for smiles, feat in expected.items():
+                    np.testing.assert_array_equal(features[smiles], feat)
+
+            # The cache saved by the first rank is loaded with memory maps
+            dm = get_datamodule(cache_data_path)
+            dm.prepare_data()
+            self.assertSetEqual(set(get_features(dm).keys()), set(expected.keys()))
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,185 @@
+"""
+Unit tests for the file graphium/inference/export.py
+"""
+
+import os
+import tempfile
+import unittest as ut
+
+import torch
+import pytorch_lightning as pl
+from click.testing import CliRunner
+from torch import nn
+from torch_geometric.data import Data, Batch
+
+from graphium.benchmarks.dataloader import make_benchmark_datamodule
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.cli import main_cli
+from graphium.nn.architectures import FullGraphMultiTaskNetwork
+from graphium.nn.architectures.compiled_network import lower_batch
+from graphium.nn.base_layers import DropPath, FCLayer
+from graphium.inference import export_inference_model, load_inference_model, make_inference_model
+from graphium.inference.export import (
+    fold_batch_norm,
+    make_verification_batch,
+    prune_task_heads,
+    strip_dropout,
+)
+from graphium.inference.predict import load_featurization_from_checkpoint
+
+LAYER_KWARGS = {"normalization": "batch_norm", "dropout": 0.2, "activation": "relu"}
+
+
+def get_network():
+    mlp_kwargs = dict(hidden_dims=[16, 16], **LAYER_KWARGS)
+    return FullGraphMultiTaskNetwork(
+        pre_nn_kwargs=dict(in_dim=7, out_dim=16, **mlp_kwargs),
+        gnn_kwargs=dict(
+            in_dim=16,
+            out_dim=16,
+            hidden_dims=16,
+            depth=2,
+            layer_type="pyg:gin",
+            layer_kwargs={"droppath_rate": 0.1},
+            **LAYER_KWARGS,
+        ),
+        graph_output_nn_kwargs={
+            "graph": dict(pooling=["sum"], out_dim=8, **mlp_kwargs),
+            "node": dict(out_dim=8, **mlp_kwargs),
+        },
+        task_heads_kwargs={
+            "graph_a": dict(task_level="graph", out_dim=2, **mlp_kwargs),
+            "graph_b": dict(task_level="graph", out_dim=3, **mlp_kwargs),
+            "node_c": dict(task_level="node", out_dim=4, **mlp_kwargs),
+        },
+    )
+
+
+def get_batch():
+    torch.manual_seed(42)
+    graphs = []
+    for num_nodes in [4, 6, 3]:
+        edge_index = torch.randint(0, num_nodes, (2, 2 * num_nodes))
+        graphs.append(
+            Data(
+                feat=torch.randn(num_nodes, 7),
+                edge_index=edge_index,
+                edge_feat=torch.randn(2 * num_nodes, 3),
+                num_nodes=num_nodes,
+            )
+        )
+    return Batch.from_data_list(graphs)
+
+
+def setUpModule():
+    global TMPDIR, CHECKPOINT_PATH
+    TMPDIR = tempfile.TemporaryDirectory()
+    CHECKPOINT_PATH = os.path.join(TMPDIR.name, "model.ckpt")
+
+    # Train a tiny model for a few steps, and save its checkpoint with the featurization
+    datamodule = make_benchmark_datamodule("tiny_ZINC", load_from_file=False, batch_size_training=16)
+    predictor = make_benchmark_predictor(datamodule, n_flag_steps=0)
+    trainer = pl.Trainer(
+        max_steps=2,
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        limit_val_batches=0,
+        num_sanity_val_steps=0,
+    )
+    trainer.fit(predictor, datamodule=datamodule)
+    trainer.save_checkpoint(CHECKPOINT_PATH)
+
+
+def tearDownModule():
+    TMPDIR.cleanup()
+
+
+class test_Export(ut.TestCase):
+    def test_prune_task_heads(self):
+        network = prune_task_heads(get_network(), ["graph_b"])
+        self.assertListEqual(list(network.task_heads.task_heads.keys()), ["graph_b"])
+        self.assertListEqual(list(network.task_heads.graph_output_nn.keys()), ["graph"])
+        self.assertSetEqual(set(network.eval()(get_batch()).keys()), {"graph_b"})
+
+        with self.assertRaises(ValueError):
+            prune_task_heads(get_network(), ["graph_d"])
+        with self.assertRaises(ValueError):
+            prune_task_heads(get_network(), [])
+
+    def test_fold_and_strip(self):
+        network = get_network()
+        # Random running statistics and affine parameters of the batch normalizations
+        for module in network.modules():
+            if isinstance(module, nn.BatchNorm1d):
+                module.running_mean.uniform_(-1, 1)
+                module.running_var.uniform_(0.5, 2)
+                nn.init.uniform_(module.weight, 0.5, 2)
+                nn.init.uniform_(module.bias, -1, 1)
+        network.eval()
+        num_batch_norms = sum(
+            isinstance(layer, FCLayer) and isinstance(layer.normalization, nn.BatchNorm1d)
+            for layer in network.modules()
+        )
+        self.assertGreater(num_batch_norms, 0)
+
+        inference_model = make_inference_model(network, tasks=["graph_a", "node_c"])
+        self.assertIn("graph_b", network.task_heads.task_heads)  # The original network is not modified
+        # The normalizations of the graph layers are applied after the aggregation, so they are kept
+        for layer in inference_model.modules():
+            self.assertNotIsInstance(layer, (nn.Dropout, DropPath))
+            if isinstance(layer, FCLayer):
+                self.assertIsNone(layer.normalization)
+        self.assertFalse(any(param.requires_grad for param in inference_model.parameters()))
+
+        with torch.no_grad():
+            expected = network(get_batch())
+            outputs = inference_model(get_batch())
+        self.assertSetEqual(set(outputs.keys()), {"graph_a", "node_c"})
+        for task, output in outputs.items():
+            torch.testing.assert_close(output, expected[task], rtol=1e-5, atol=1e-5)
+
+        # Nothing left to fold or strip
+        self.assertEqual(fold_batch_norm(inference_model), 0)
+        self.assertEqual(strip_dropout(inference_model), 0)
+
+    def test_export(self):
+        featurization = load_featurization_from_checkpoint(CHECKPOINT_PATH)
+        batch = make_verification_batch(featurization, smiles=["CCO", "not a smiles", "c1ccccc1O"])
+        self.assertEqual(batch.num_graphs, 2)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "model.pt")
+            max_abs_diff = export_inference_model(CHECKPOINT_PATH, path, tasks=["SA", "logp"])
+            self.assertListEqual(list(max_abs_diff.keys()), ["SA", "logp"])
+            model, metadata = load_inference_model(path)
+            self.assertListEqual(metadata["tasks"], ["SA", "logp"])
+            self.assertDictEqual(metadata["featurization"], {**featurization, "dtype": "float16"})
+            self.assertFalse(metadata["traced"])
+            with torch.no_grad():
+                outputs = model(batch.clone())
+            self.assertEqual(outputs["SA"].shape, (2, 1))
+
+            # The trace takes and returns the tensors in the order of the keys of the metadata
+            traced_path = os.path.join(tmpdir, "model_traced.pt")
+            export_inference_model(CHECKPOINT_PATH, traced_path, tasks=["SA"], trace=True)
+            traced, metadata = load_inference_model(traced_path)
+            self.assertTrue(metadata["traced"])
+            self.assertListEqual(metadata["output_keys"], ["SA"])
+            verification_batch = make_verification_batch(featurization)
+            _, tensors = lower_batch(verification_batch, keys=metadata["input_keys"])
+            expected = model(verification_batch.clone())["SA"]
+            torch.testing.assert_close(traced(*tensors)[0], expected, rtol=1e-5, atol=1e-5)
+
+    def test_export_cli(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "model.pt")
+            result = CliRunner().invoke(
+                main_cli, ["export", "-c", CHECKPOINT_PATH, "-o", path, "-t", "score"]
+            )
+            self.assertEqual(result.exit_code, 0, msg=result.output)
+            self.assertListEqual(load_inference_model(path)[1]["tasks"], ["score"])
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -3,10 +3,12 @@ Unit tests for the different datasets of graphium/features/featurizer.py
 """
 
 import numpy as np
+import torch
 import unittest as ut
 from copy import deepcopy
 from rdkit import Chem
 import datamol as dm
+from torch_geometric.data import Batch
 
 from graphium.features.featurizer import (
     get_mol_atomic_features_onehot,
@@ -14,7 +16,11 @@ from graphium.features.featurizer import (
     get_mol_edge_features,
     mol_to_adj_and_features,
     mol_to_pyggraph,
+    mol_to_graph_dict,
+    get_radius_graph_and_triplets,
+    RadiusGraphData,
 )
+from graphium.features.profiling import FeaturizationProfiler
 
 
 class test_featurizer(ut.TestCase):
@@ -296,6 +302,117 @@ class test_featurizer(ut.TestCase):
                         self.assertGreaterEqual(ndata.shape[1], num_props, msg=err_msg2)
                         self.assertGreaterEqual(edata.shape[1], num_props, msg=err_msg2)
 
+    def test_mol_to_graph_dict_profiler(self):
+        profiler = FeaturizationProfiler()
+        pos_kwargs = {"pos_types": {"rw": {"pos_type": "rw_return_probs", "ksteps": 3, "pos_level": "node"}}}
+        smiles = self.smiles + ["This is not a smiles"]
+        for s in smiles:
+            mol_to_graph_dict(
+                s,
+                atom_property_list_onehot=["atomic-number"],
+                atom_property_list_float=["mass"],
+                edge_property_list=["bond-type-float"],
+                pos_encoding_as_features=pos_kwargs,
+                on_error="ignore",
+                profiler=profiler,
+            )
+
+        # One record per molecule, including the failure
+        self.assertEqual(len(profiler), len(smiles))
+        df = profiler.to_dataframe()
+        self.assertListEqual(df["success"].tolist(), [True] * len(self.smiles) + [False])
+        self.assertListEqual(df["num_atoms"].tolist()[:-1], [dm.to_mol(s).GetNumAtoms() for s in self.smiles])
+        for stage in [
+            "parse",
+            "hydrogens",
+            "adjacency",
+            "atom_onehot",
+            "atom_float",
+            "edge_features",
+            "pe:rw",
+        ]:
+            self.assertIn(stage, profiler.stage_names)
+
+        # The stages are included in the total time
+        stage_sum = df[profiler.stage_names].sum(axis=1)
+        self.assertTrue(((stage_sum <= df["total"] + 1e-9)).all())
+
+        summary = profiler.summary()
+        self.assertIn("total", summary.index)
+        self.assertAlmostEqual(summary.loc["total", "fraction"], 1.0)
+
+        # The failed molecule has an unknown size
+        latencies = profiler.latency_percentiles(size_buckets=[10, 20])
+        self.assertEqual(latencies["num_mols"].sum(), len(smiles))
+        self.assertEqual(latencies.loc["unknown", "num_failed"], 1)
+        self.assertIn("p90_ms", latencies.columns)
+
+        # Profilers from different workers can be merged
+        merged = FeaturizationProfiler.merge([profiler, profiler])
+        self.assertEqual(len(merged), 2 * len(smiles))
+
+    def test_radius_graph_and_triplets(self):
+        rng = np.random.default_rng(42)
+        pos = rng.random((12, 3)) * 6
+        radius_edge_index, triplet_index = get_radius_graph_and_triplets(pos, cutoff=4.0, max_num_neighbors=5)
+
+        # Each atom has its closest neighbours within the cutoff as sources
+        dist = np.linalg.norm(pos[:, None] - pos[None], axis=-1)
+        for target in range(len(pos)):
+            sources = radius_edge_index[0, radius_edge_index[1] == target]
+            others = np.delete(np.arange(len(pos)), target)
+            expected = others[np.argsort(dist[target, others])][:5]
+            expected = expected[dist[target, expected] <= 4.0]
+            self.assertSetEqual(set(sources), set(expected))
+
+        # All the paths k->j->i with k != i, once
+        row, col = radius_edge_index
+        expected = {
+            (kj, ji)
+            for ji in range(len(row))
+            for kj in range(len(row))
+            if (col[kj] == row[ji]) and (row[kj] != col[ji])
+        }
+        self.assertSetEqual(set(map(tuple, triplet_index.T)), expected)
+        self.assertEqual(triplet_index.shape[1], len(expected))
+
+    def test_mol_to_pyggraph_radius_graph(self):
+        graphs = []
+        for smiles in ["CCO", "CC=O"]:
+            mol = Chem.AddHs(dm.to_mol(smiles))
+            Chem.rdDistGeom.EmbedMolecule(mol, randomSeed=42)
+            graph = mol_to_pyggraph(
+                mol,
+                atom_property_list_float=["atomic-number"],
+                conformer_property_list=["positions_3d"],
+                radius_graph={"cutoff": 2.0},
+                on_error="raise",
+            )
+            self.assertIsInstance(graph, RadiusGraphData)
+            self.assertEqual(graph.precomputed_radius_edge_index.dtype, torch.int64)
+            graphs.append(graph)
+
+        # The triplets index the radius edges of their graph in the batch
+        batch = Batch.from_data_list(graphs)
+        num_edges = graphs[0].precomputed_radius_edge_index.shape[1]
+        num_triplets = graphs[0].precomputed_triplet_index.shape[1]
+        self.assertTrue(
+            torch.equal(
+                batch.precomputed_triplet_index[:, num_triplets:],
+                graphs[1].precomputed_triplet_index + num_edges,
+            )
+        )
+        self.assertTrue(
+            torch.equal(
+                batch.precomputed_radius_edge_index[:, num_edges:],
+                graphs[1].precomputed_radius_edge_index + graphs[0].num_nodes,
+            )
+        )
+
+        # The radius graph needs the positions
+        with self.assertRaises(ValueError):
+            mol_to_pyggraph("CCO", radius_graph={"cutoff": 2.0}, on_error="raise")
+
 
 if __name__ == "__main__":
     ut.main()
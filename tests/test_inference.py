@@ -0,0 +1,264 @@
+"""
+Unit tests for the batched inference of graphium/inference
+"""
+
+import os
+import json
+import tempfile
+import threading
+import unittest as ut
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pytorch_lightning as pl
+from click.testing import CliRunner
+
+from graphium.benchmarks.dataloader import make_benchmark_datamodule, DEFAULT_FEATURIZATION
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.cli import main_cli
+from graphium.features import mol_to_graph_signature
+from graphium.inference import BatchPredictor, load_featurization_from_checkpoint, predict_to_parquet
+from graphium.inference import MicroBatcher, PredictionServer
+from graphium.inference.cache import EmbeddingStore
+
+SMILES = ["CCO", "not a smiles", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1", "C1CCCCC1N", "CCN(CC)CC", "O=C=O"]
+
+
+def setUpModule():
+    global TMPDIR, CHECKPOINT_PATH
+    TMPDIR = tempfile.TemporaryDirectory()
+    CHECKPOINT_PATH = os.path.join(TMPDIR.name, "model.ckpt")
+
+    # Train a tiny model for a few steps, and save its checkpoint with the featurization
+    datamodule = make_benchmark_datamodule("micro_ZINC", load_from_file=False, batch_size_training=16)
+    predictor = make_benchmark_predictor(datamodule, n_flag_steps=0)
+    trainer = pl.Trainer(
+        max_steps=2,
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        limit_val_batches=0,
+        num_sanity_val_steps=0,
+    )
+    trainer.fit(predictor, datamodule=datamodule)
+    trainer.save_checkpoint(CHECKPOINT_PATH)
+
+
+def tearDownModule():
+    TMPDIR.cleanup()
+
+
+class test_BatchPredictor(ut.TestCase):
+    def setUp(self):
+        self.tmpdir = TMPDIR
+        self.checkpoint_path = CHECKPOINT_PATH
+
+    def test_featurization_in_checkpoint(self):
+        featurization = load_featurization_from_checkpoint(self.checkpoint_path)
+        self.assertDictEqual(featurization, mol_to_graph_signature(DEFAULT_FEATURIZATION))
+
+    def test_predict(self):
+        predictor = BatchPredictor.from_checkpoint(self.checkpoint_path, batch_size=3)
+        results = predictor.predict(SMILES, outputs=["preds", "fingerprints"])
+
+        np.testing.assert_array_equal(results["valid"], [True, False, True, True, True, True, True])
+        self.assertEqual(results["graph_zinc"].shape, (len(SMILES), 3))
+        self.assertEqual(results["fingerprints"].shape, (len(SMILES), 64))
+        self.assertTrue(np.all(np.isnan(results["graph_zinc"][1])))
+        self.assertFalse(np.any(np.isnan(results["graph_zinc"][results["valid"]])))
+
+        # The results must not depend on the batch size
+        predictor.batch_size = 64
+        results_one_batch = predictor.predict(SMILES, outputs=["preds", "fingerprints"])
+        for key in ["graph_zinc", "fingerprints"]:
+            np.testing.assert_allclose(results[key], results_one_batch[key], rtol=1e-5, atol=1e-5)
+
+        # Concatenating the last layers of the graph output network
+        predictor.concat_last_layers = [0, 1]
+        results_concat = predictor.predict(SMILES, outputs=["fingerprints"])
+        self.assertEqual(results_concat["fingerprints"].shape[0], len(SMILES))
+        self.assertGreater(results_concat["fingerprints"].shape[1], 64)
+        self.assertNotIn("graph_zinc", results_concat)
+
+    def test_predict_with_cache(self):
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        outputs = ["preds", "fingerprints"]
+        expected = BatchPredictor.from_checkpoint(self.checkpoint_path).predict(SMILES, outputs=outputs)
+
+        predictor = BatchPredictor.from_checkpoint(self.checkpoint_path, cache_dir=cache_dir)
+        results = predictor.predict(SMILES[:4], outputs=outputs)
+        np.testing.assert_allclose(results["graph_zinc"], expected["graph_zinc"][:4], rtol=1e-5)
+
+        # A new predictor of the same checkpoint reuses the cache from disk
+        predictor = BatchPredictor.from_checkpoint(self.checkpoint_path, cache_dir=cache_dir)
+        results = predictor.predict(SMILES, outputs=outputs)
+        np.testing.assert_array_equal(results["valid"], expected["valid"])
+        for key in ["graph_zinc", "fingerprints"]:
+            valid = expected["valid"]
+            np.testing.assert_allclose(results[key][valid], expected[key][valid], rtol=1e-2, atol=1e-2)
+            self.assertTrue(np.all(np.isnan(results[key][~valid])))
+        stats = predictor.cache.stats()
+        self.assertEqual(stats["graph_zinc"]["hits"], 3)
+        self.assertEqual(stats["graph_zinc"]["num_molecules"], int(expected["valid"].sum()))
+
+        # Other fingerprint layers are cached separately
+        predictor.concat_last_layers = [0, 1]
+        results = predictor.predict(SMILES, outputs=["fingerprints"])
+        self.assertGreater(results["fingerprints"].shape[1], 64)
+        self.assertEqual(len(predictor.cache.stats()), 3)
+
+    def test_embedding_store(self):
+        path = os.path.join(self.tmpdir.name, "store")
+        max_size_mb = 5 * 4 * 2 / 1024**2  # 5 vectors of dimension 4 in float16
+        store = EmbeddingStore(path, dim=4, dtype="float16", max_size_mb=max_size_mb)
+        self.assertEqual(store.capacity, 5)
+
+        store.insert(["a", "b", "c"], np.arange(12).reshape(3, 4))
+        values, found = store.lookup(["a", "x", "c"])
+        np.testing.assert_array_equal(found, [True, False, True])
+        np.testing.assert_array_equal(values[[0, 2]], [[0, 1, 2, 3], [8, 9, 10, 11]])
+        self.assertTrue(np.all(np.isnan(values[1])))
+
+        # The least recently used molecules are evicted when the store is full
+        store.insert(["d", "e"], np.ones((2, 4)))
+        store.lookup(["a", "c", "d", "e"])
+        store.insert(["f", "a"], np.zeros((2, 4)))
+        self.assertNotIn("b", store)
+        self.assertEqual(len(store), 5)
+        np.testing.assert_array_equal(store.lookup(["a"])[0], np.zeros((1, 4)))
+
+        # The store is reopened from disk
+        store.flush()
+        store = EmbeddingStore(path)
+        self.assertEqual(len(store), 5)
+        np.testing.assert_array_equal(store.lookup(["c"])[0], [[8, 9, 10, 11]])
+
+    def test_predict_to_parquet(self):
+        input_path = os.path.join(self.tmpdir.name, "input.csv")
+        output_path = os.path.join(self.tmpdir.name, "output.parquet")
+        pd.DataFrame({"mol_id": np.arange(len(SMILES)), "smiles": SMILES}).to_csv(input_path, index=False)
+
+        counts = predict_to_parquet(
+            self.checkpoint_path,
+            input_path=input_path,
+            output_path=output_path,
+            outputs=["preds", "fingerprints"],
+            id_col="mol_id",
+            chunk_size=3,
+        )
+        self.assertDictEqual(counts, {"num_molecules": len(SMILES), "num_failed": 1})
+
+        df = pd.read_parquet(output_path, engine="fastparquet")
+        self.assertListEqual(df["mol_id"].tolist(), list(range(len(SMILES))))
+        self.assertListEqual(df["smiles"].tolist(), SMILES)
+        for column in ["valid", "graph_zinc_0", "graph_zinc_2", "fingerprint_0", "fingerprint_63"]:
+            self.assertIn(column, df.columns)
+
+        # Predicting all molecules at once gives the same results
+        expected = BatchPredictor.from_checkpoint(self.checkpoint_path).predict(SMILES)
+        np.testing.assert_allclose(
+            df[["graph_zinc_0", "graph_zinc_1", "graph_zinc_2"]].values, expected["graph_zinc"], rtol=1e-5
+        )
+
+    def test_predict_to_parquet_invalid_first_chunk(self):
+        input_path = os.path.join(self.tmpdir.name, "input_invalid.csv")
+        output_path = os.path.join(self.tmpdir.name, "output_invalid.parquet")
+        smiles = ["not a smiles", "invalid"] + SMILES
+        pd.DataFrame({"smiles": smiles}).to_csv(input_path, index=False)
+
+        # The first chunk only has invalid molecules, and must have the same columns as the others
+        counts = predict_to_parquet(
+            self.checkpoint_path,
+            input_path=input_path,
+            output_path=output_path,
+            outputs=["preds", "fingerprints"],
+            chunk_size=2,
+        )
+        self.assertDictEqual(counts, {"num_molecules": len(smiles), "num_failed": 3})
+
+        df = pd.read_parquet(output_path, engine="fastparquet")
+        self.assertListEqual(df["smiles"].tolist(), smiles)
+        self.assertListEqual(df["valid"].tolist(), [False, False, True, False, True, True, True, True, True])
+        fingerprint_cols = [f"fingerprint_{ii}" for ii in range(64)]
+        self.assertTrue(df.loc[~df["valid"], ["graph_zinc_0"] + fingerprint_cols].isna().all().all())
+        self.assertFalse(df.loc[df["valid"], ["graph_zinc_0"] + fingerprint_cols].isna().any().any())
+
+    def test_cli(self):
+        input_path = os.path.join(self.tmpdir.name, "input.smi")
+        output_path = os.path.join(self.tmpdir.name, "output_cli.parquet")
+        with open(input_path, "w") as file:
+            file.write("\n".join(SMILES))
+
+        runner = CliRunner()
+        result = runner.invoke(
+            main_cli,
+            ["predict", "-c", self.checkpoint_path, "-i", input_path, "-o", output_path, "--outputs", "both"],
+        )
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        df = pd.read_parquet(output_path, engine="fastparquet")
+        self.assertEqual(len(df), len(SMILES))
+        self.assertIn("fingerprint_0", df.columns)
+
+
+class test_PredictionServer(ut.TestCase):
+    def setUp(self):
+        self.predictor = BatchPredictor.from_checkpoint(CHECKPOINT_PATH)
+        self.expected = self.predictor.predict(SMILES)
+
+    def _check_results(self, smiles, results):
+        self.assertEqual(len(results), len(smiles))
+        for s, result in zip(smiles, results):
+            ii = SMILES.index(s)
+            self.assertEqual(result["smiles"], s)
+            self.assertEqual(result["valid"], self.expected["valid"][ii])
+            if result["valid"]:
+                np.testing.assert_allclose(result["graph_zinc"], self.expected["graph_zinc"][ii], rtol=1e-5)
+            else:
+                self.assertIsNone(result["graph_zinc"])
+
+    def test_micro_batching(self):
+        requests = [SMILES[ii : ii + 2] for ii in range(len(SMILES))]
+        with MicroBatcher(self.predictor, max_batch_size=64, max_latency_ms=200) as batcher:
+            # The concurrent requests are grouped in micro-batches
+            futures = [batcher.submit(smiles) for smiles in requests]
+            for smiles, future in zip(requests, futures):
+                self._check_results(smiles, future.result(timeout=60))
+            stats = batcher.stats()
+            self.assertEqual(stats["num_requests"], len(requests))
+            self.assertLess(stats["num_batches"], len(requests))
+            num_predicted = stats["num_predicted"]
+
+            # Repeated molecules are served from the prediction cache
+            self._check_results(SMILES, batcher.predict(SMILES, timeout=60))
+            stats = batcher.stats()
+            self.assertEqual(
+                stats["num_predicted"], num_predicted + 1
+            )  # Only the invalid SMILES is not cached
+            self.assertGreater(stats["prediction_cache"]["hits"], 0)
+            self.assertIsNotNone(stats["latency_p50_ms"])
+            self.assertGreater(stats["molecules_per_s"], 0)
+
+    def test_http_server(self):
+        server = PredictionServer(MicroBatcher(self.predictor, max_latency_ms=1), port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            request = urllib.request.Request(
+                f"{url}/predict",
+                data=json.dumps({"smiles": SMILES}).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+            with urllib.request.urlopen(request, timeout=60) as response:
+                self._check_results(SMILES, json.loads(response.read())["results"])
+            with urllib.request.urlopen(f"{url}/stats", timeout=60) as response:
+                self.assertEqual(json.loads(response.read())["num_molecules"], len(SMILES))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+if __name__ == "__main__":
+    ut.main()
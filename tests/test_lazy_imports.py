@@ -0,0 +1,75 @@
+"""
+Unit tests for the lazy imports of the packages, see graphium/_lazy.py
+"""
+
+from typing import List, Tuple
+
+import sys
+import subprocess
+import unittest as ut
+
+import graphium
+
+# Modules that are slow to import, and not needed by the featurization
+HEAVY_MODULES = ["pytorch_lightning", "wandb", "matplotlib", "graphium.config._loader"]
+
+
+def import_times(statement: str) -> Tuple[float, List[str]]:
+    r"""
+    Run `statement` in a new interpreter with `python -X importtime`.
+
+    Returns:
+        total_ms: The total import time, in milliseconds
+        modules: The modules imported by the statement
+    """
+    code = f"{statement}\nimport sys\nprint(','.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or ("cumulative" in line):
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):  # Only the top-level imports, which include the nested ones
+            total_us += int(cumulative)
+    return total_us / 1000, result.stdout.strip().split(",")
+
+
+class test_LazyImports(ut.TestCase):
+    def test_import_graphium(self):
+        total_ms, modules = import_times("import graphium")
+        self.assertIn("graphium", modules)
+        for module in HEAVY_MODULES + ["torch", "torch_geometric", "rdkit", "graphium.features"]:
+            self.assertNotIn(module, modules)
+        print(f"`import graphium`: {total_ms:.1f} ms")
+
+    def test_import_featurizer(self):
+        total_ms, modules = import_times("from graphium.features import mol_to_graph_dict")
+        self.assertIn("graphium.features.featurizer", modules)
+        for module in HEAVY_MODULES + ["graphium.nn", "graphium.trainer", "graphium.data"]:
+            self.assertNotIn(module, modules)
+        print(f"`from graphium.features import mol_to_graph_dict`: {total_ms:.1f} ms")
+
+    def test_public_names(self):
+        self.assertIsInstance(graphium.__version__, str)
+        self.assertTrue(callable(graphium.load_config))
+        self.assertIn("features", dir(graphium))
+        self.assertIn("mol_to_graph_dict", graphium.features.__all__)
+        self.assertTrue(callable(graphium.features.mol_to_graph_dict))
+        self.assertIs(graphium.trainer.PredictorModule, graphium.trainer.predictor.PredictorModule)
+        self.assertTrue(callable(graphium.utils.tensor.nan_mean))
+
+        from graphium.nn.architectures import FullGraphMultiTaskNetwork
+        from graphium.nn.architectures.global_architectures import FullGraphMultiTaskNetwork as Network
+
+        self.assertIs(FullGraphMultiTaskNetwork, Network)
+
+        with self.assertRaises(AttributeError):
+            graphium.unknown_attribute
+        with self.assertRaises(ImportError):
+            from graphium.features import unknown_attribute
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -13,6 +13,14 @@ from graphium.trainer.metrics import (
     Thresholder,
 )
 
+from graphium.trainer.streaming_metrics import (
+    StreamingMeanStd,
+    StreamingMetric,
+    ReservoirSampler,
+)
+from graphium.trainer.predictor_summaries import TaskSummaries
+from graphium.utils.tensor import nan_mean, nan_std
+
 from torchmetrics.functional import mean_squared_error
 
 
@@ -213,6 +221,193 @@ class test_MetricWrapper(ut.TestCase):
 
             assert score == expected_score
 
+    def test_mean_per_label_batched(self):
+        from graphium.utils.spaces import METRICS_DICT
+
+        torch.manual_seed(42)
+        preds = torch.round(torch.rand(60, 8) * 20) / 20  # Rounded to create ties
+        target_cls = (torch.rand(60, 8) > 0.6).float()
+        target_reg = torch.randn(60, 8)
+        is_nan = torch.rand(60, 8) < 0.3
+        is_nan[:, 0] = True  # Column without labels
+        is_nan[1:, 1] = True  # Column with a single label
+        target_cls[is_nan] = float("nan")
+        target_reg[is_nan] = float("nan")
+        target_cls[~is_nan[:, 2], 2] = 0.0  # Column with a single class
+
+        metrics = {
+            "mse": (target_reg, {}),
+            "mae": (target_reg, {}),
+            "pearsonr": (target_reg, {}),
+            "r2": (target_reg, {}),
+            "auroc": (target_cls, {"target_to_int": True}),
+            "averageprecision": (target_cls, {}),
+            "accuracy": (target_cls, {"target_to_int": True}),
+        }
+        for metric, (target, kwargs) in metrics.items():
+            batched = MetricWrapper(
+                metric=metric, target_nan_mask="ignore", multitask_handling="mean-per-label", **kwargs
+            )
+            # Metrics passed as a callable are computed with the loop over the columns
+            looped = MetricWrapper(
+                metric=METRICS_DICT[metric],
+                target_nan_mask="ignore",
+                multitask_handling="mean-per-label",
+                **kwargs,
+            )
+            self.assertAlmostEqual(
+                batched(preds, target).item(), looped(preds, target).item(), places=5, msg=metric
+            )
+
+
+class test_StreamingMetrics(ut.TestCase):
+    def _make_batches(self, num_batches=5, batch_size=40, num_labels=3, nan_frac=0.3):
+        torch.manual_seed(42)
+        preds = torch.rand(num_batches * batch_size, num_labels)
+        target = (torch.rand(num_batches * batch_size, num_labels) > 0.5).float()
+        target[torch.rand(target.shape) < nan_frac] = float("nan")
+        return preds, target, list(zip(preds.split(batch_size), target.split(batch_size)))
+
+    def test_streaming_mean_std(self):
+        preds, target, batches = self._make_batches()
+        stats = StreamingMeanStd()
+        for _, this_target in batches:
+            stats.update(this_target)
+        torch.testing.assert_close(stats.mean(), nan_mean(target))
+        torch.testing.assert_close(stats.std(), nan_std(target))
+
+    def test_reservoir_sampler(self):
+        values = torch.arange(1000)
+        reservoir = ReservoirSampler(max_elements=200)
+        for batch in values.split(64):
+            reservoir.update(batch, 2 * batch)
+            self.assertLessEqual(reservoir._num_buffered, 2 * reservoir.max_rows)
+        samples, doubled = reservoir.get_samples()
+
+        # The budget of elements is shared between the two tensors
+        self.assertEqual(len(samples), 100)
+        self.assertEqual(len(torch.unique(samples)), 100)
+        self.assertListEqual(doubled.tolist(), (2 * samples).tolist())
+        self.assertEqual(reservoir.num_seen, 1000)
+        self.assertEqual(samples.device.type, "cpu")
+
+        # The budget counts all the elements of a row
+        reservoir = ReservoirSampler(max_elements=200)
+        for batch in values.reshape(-1, 10).split(7):
+            reservoir.update(batch)
+        self.assertListEqual(list(reservoir.get_samples()[0].shape), [20, 10])
+
+    def test_additive_metrics_are_exact(self):
+        preds, target, batches = self._make_batches()
+        options = [("ignore", "flatten"), ("ignore", "mean-per-label"), (0.0, "flatten"), (0.0, None)]
+        for name in ["mse", "mae"]:
+            for target_nan_mask, multitask_handling in options:
+                err_msg = f"{name} - {target_nan_mask} - {multitask_handling}"
+                metric = MetricWrapper(
+                    metric=name,
+                    target_nan_mask=target_nan_mask,
+                    multitask_handling=multitask_handling,
+                    streaming=True,
+                )
+                streaming = StreamingMetric(metric)
+                self.assertTrue(streaming.is_additive, msg=err_msg)
+                for this_preds, this_target in batches:
+                    streaming.update(this_preds, this_target)
+                torch.testing.assert_close(streaming.compute(), metric(preds, target), msg=err_msg)
+
+                # The state is cleared between epochs
+                streaming.reset()
+                streaming.update(*batches[0])
+                torch.testing.assert_close(streaming.compute(), metric(*batches[0]), msg=err_msg)
+
+    def test_sampled_metrics(self):
+        preds, target, batches = self._make_batches()
+        for multitask_handling in ["flatten", "mean-per-label"]:
+            metric = MetricWrapper(
+                metric="auroc",
+                target_nan_mask="ignore",
+                multitask_handling=multitask_handling,
+                target_to_int=True,
+                task="binary",
+                streaming=True,
+                streaming_max_samples=100_000,
+            )
+            streaming = StreamingMetric(metric)
+            self.assertFalse(streaming.is_additive)
+            for this_preds, this_target in batches:
+                streaming.update(this_preds, this_target)
+
+            # All the samples fit in the reservoir, so the metric is exact up to the order
+            torch.testing.assert_close(streaming.compute(), metric(preds, target))
+
+            # With a smaller reservoir, the memory is bounded
+            metric.streaming_max_samples = 50
+            streaming = StreamingMetric(metric)
+            for this_preds, this_target in batches:
+                streaming.update(this_preds, this_target)
+            self.assertLessEqual(len(streaming.reservoir.get_samples()[0]), 50)
+            self.assertFalse(torch.isnan(streaming.compute()))
+
+    def test_task_summaries_fully_streaming(self):
+        preds, target, batches = self._make_batches()
+        metric = MetricWrapper(
+            metric="mae", target_nan_mask="ignore", multitask_handling="flatten", streaming=True
+        )
+        summaries = TaskSummaries(
+            task_loss_fun={"task": torch.nn.L1Loss()},
+            task_metrics={"task": {"mae": metric}},
+            task_metrics_on_training_set={"task": []},
+            task_metrics_on_progress_bar={"task": []},
+        )
+        self.assertTrue(summaries.is_fully_streaming)
+
+        summaries.reset_streaming_state()
+        for this_preds, this_target in batches:
+            loss = metric(this_preds, this_target)
+            summaries.update_streaming_state(
+                targets={"task": this_target}, predictions={"task": this_preds}, task_losses={"task": loss}
+            )
+        loss, task_losses = summaries.compute_streaming_loss()
+        torch.testing.assert_close(loss, metric(preds, target))
+
+        summaries.update_predictor_state(
+            step_name="val",
+            targets=None,
+            predictions=None,
+            loss=loss,
+            task_losses=task_losses,
+            n_epochs=0,
+            use_streaming=True,
+        )
+        logs = summaries.get_metrics_logs()
+        torch.testing.assert_close(logs["task"]["task/mae/val"], metric(preds, target))
+        torch.testing.assert_close(logs["task"]["task/mean_pred/val"], nan_mean(preds))
+        torch.testing.assert_close(logs["task"]["task/std_target/val"], nan_std(target))
+        summaries.set_results(task_metrics=logs)
+
+    def test_task_without_metrics_is_streaming(self):
+        metric = MetricWrapper(
+            metric="mae", target_nan_mask="ignore", multitask_handling="flatten", streaming=True
+        )
+        summaries = TaskSummaries(
+            task_loss_fun={"task": torch.nn.L1Loss(), "other": torch.nn.L1Loss()},
+            task_metrics={"task": {"mae": metric}, "other": {}},
+            task_metrics_on_training_set={"task": [], "other": []},
+            task_metrics_on_progress_bar={"task": [], "other": []},
+        )
+        self.assertTrue(summaries.has_streaming_metrics)
+        self.assertTrue(summaries.is_fully_streaming)
+
+        # Without any streaming metric, the streaming mode is not used
+        summaries = TaskSummaries(
+            task_loss_fun={"other": torch.nn.L1Loss()},
+            task_metrics={"other": {}},
+            task_metrics_on_training_set={"other": []},
+            task_metrics_on_progress_bar={"other": []},
+        )
+        self.assertFalse(summaries.has_streaming_metrics)
+        self.assertFalse(summaries.is_fully_streaming)
+
 
 if __name__ == "__main__":
     ut.main()
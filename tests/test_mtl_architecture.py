@@ -240,6 +240,54 @@ class test_GraphOutputNN(ut.TestCase):
         out = torch.nan_to_num(out, nan=-1)
         self.assertListEqual(expected_result, out.tolist())
 
+    def test_nodepair_sparse_and_chunked(self):
+        graph_output_nn_kwargs = {"nodepair": deepcopy(nodepair_level_kwargs)}
+        graph_output_nn = GraphOutputNN(
+            in_dim=3,
+            in_dim_edges=8,
+            task_level="nodepair",
+            graph_output_nn_kwargs=graph_output_nn_kwargs,
+        )
+        x, batch, expected_result = self.generate_test_data()
+
+        # Computing the pairs by chunks gives the same padded result
+        out = graph_output_nn.compute_nodepairs(node_feats=x, batch=batch, chunk_size=4)
+        out = torch.nan_to_num(out, nan=-1)
+        self.assertListEqual(expected_result, out.tolist())
+
+        # The sparse result only has the pairs of each graph: 6 + 3 + 10
+        out = graph_output_nn.compute_nodepairs(node_feats=x, batch=batch, sparse=True, chunk_size=4)
+        expected_sparse = [pair for graph in expected_result for pair in graph if pair[0] != -1]
+        self.assertEqual(len(expected_sparse), 19)
+        self.assertListEqual(expected_sparse, out.tolist())
+
+    def test_nodepair_sparse_matches_dense(self):
+        graph_output_nn_kwargs = {"nodepair": deepcopy(nodepair_level_kwargs)}
+        graph_output_nn = GraphOutputNN(
+            in_dim=5,
+            in_dim_edges=8,
+            task_level="nodepair",
+            graph_output_nn_kwargs=graph_output_nn_kwargs,
+        )
+        torch.manual_seed(42)
+        num_nodes = torch.tensor([1, 7, 2, 12, 3, 1, 9])
+        batch = torch.repeat_interleave(torch.arange(len(num_nodes)), num_nodes)
+        x = torch.randn(batch.shape[0], 5)
+
+        # Dense gather through the padded batch of all the pairs
+        dense = graph_output_nn._compute_nodepairs_dense(node_feats=x, batch=batch)
+        is_pair = ~torch.isnan(dense[..., 0])
+
+        out = graph_output_nn.compute_nodepairs(node_feats=x, batch=batch)
+        torch.testing.assert_close(out, dense, equal_nan=True)
+
+        for chunk_size in [None, 5]:
+            out = graph_output_nn.compute_nodepairs(
+                node_feats=x, batch=batch, sparse=True, chunk_size=chunk_size
+            )
+            self.assertEqual(out.shape[0], int((num_nodes * (num_nodes - 1) // 2).sum()))
+            torch.testing.assert_close(out, dense[is_pair])
+
 
 class test_TaskHeads(ut.TestCase):
     def test_task_heads_forward(self):
@@ -2,11 +2,19 @@
 Unit tests for the file graphium/trainer/predictor.py
 """
 
+from copy import copy
+
 import torch
-from torch.nn import BCELoss, MSELoss
+from torch.nn import BCELoss, MSELoss, L1Loss
 import unittest as ut
 
+from pytorch_lightning.trainer.states import RunningStage
+
+from graphium.benchmarks.dataloader import make_benchmark_datamodule
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.trainer.predictor import PredictorModule
 from graphium.trainer.predictor_options import EvalOptions
+from graphium.trainer.metrics import MetricWrapper
 
 
 class test_Predictor(ut.TestCase):
@@ -18,6 +26,125 @@ class test_Predictor(ut.TestCase):
             loss_fun = EvalOptions.parse_loss_fun(this_loss)
             loss = loss_fun(preds, target)
 
+    def test_compute_loss_vectorized(self):
+        torch.manual_seed(42)
+        tasks = [f"task_{ii}" for ii in range(5)]
+        options = [("ignore", "flatten"), (0.0, "flatten"), (None, None), (0.0, None)]
+
+        for loss_cls in [MSELoss, L1Loss, BCELoss]:
+            for target_nan_mask, multitask_handling in options:
+                err_msg = (
+                    f"loss={loss_cls.__name__}, nan_mask={target_nan_mask}, handling={multitask_handling}"
+                )
+                preds = {task: torch.rand(16, 3, requires_grad=True) for task in tasks}
+                targets = {task: (torch.rand(16, 3) > 0.5).float() for task in tasks}
+                if target_nan_mask is not None:
+                    for task in tasks:
+                        targets[task][torch.rand(16, 3) > 0.7] = float("nan")
+                    targets[tasks[0]][:] = float("nan")  # A task with only NaNs
+                loss_fun = {task: loss_cls() for task in tasks}
+                wrapped = PredictorModule.wrap_loss_fun(loss_fun, target_nan_mask, multitask_handling)
+                self.assertIsNotNone(PredictorModule._compute_vectorized_task_losses(preds, targets, wrapped))
+
+                # Compare the vectorized loss to the loss computed task by task
+                loss, task_losses = PredictorModule.compute_loss(
+                    preds, targets, weights=None, loss_fun=wrapped
+                )
+                expected = {
+                    task: PredictorModule.compute_loss(
+                        {task: preds[task]},
+                        {task: targets[task]},
+                        weights=None,
+                        loss_fun={task: wrapped[task]},
+                    )[0]
+                    for task in tasks
+                }
+                for task in tasks:
+                    torch.testing.assert_close(task_losses[task], expected[task], equal_nan=True, msg=err_msg)
+                expected_loss = torch.stack(list(expected.values())).mean()
+                torch.testing.assert_close(loss, expected_loss, equal_nan=True, msg=err_msg)
+
+                # The gradients must not be NaN when ignoring the NaNs
+                if target_nan_mask == "ignore":
+                    loss = torch.stack([task_losses[task] for task in tasks[1:]]).sum()
+                    loss.backward()
+                    self.assertFalse(torch.isnan(preds[tasks[1]].grad).any(), msg=err_msg)
+
+    def test_compute_loss_not_vectorized(self):
+        tasks = ["task_1", "task_2"]
+        preds = {"task_1": torch.rand(16, 3), "task_2": torch.rand(16, 2)}
+        targets = {"task_1": torch.rand(16, 3), "task_2": torch.rand(16, 2)}
+
+        # Different shapes cannot be stacked
+        wrapped = PredictorModule.wrap_loss_fun({task: MSELoss() for task in tasks}, "ignore", "flatten")
+        self.assertIsNone(PredictorModule._compute_vectorized_task_losses(preds, targets, wrapped))
+        loss, task_losses = PredictorModule.compute_loss(preds, targets, weights=None, loss_fun=wrapped)
+        torch.testing.assert_close(task_losses["task_2"], MSELoss()(preds["task_2"], targets["task_2"]))
+
+        # Different losses, or mean-per-label, are not vectorized
+        targets["task_2"] = torch.rand(16, 3)
+        preds["task_2"] = torch.rand(16, 3)
+        wrapped = PredictorModule.wrap_loss_fun(
+            {"task_1": MSELoss(), "task_2": L1Loss()}, "ignore", "flatten"
+        )
+        self.assertIsNone(PredictorModule._compute_vectorized_task_losses(preds, targets, wrapped))
+        wrapped = PredictorModule.wrap_loss_fun(
+            {task: MSELoss() for task in tasks}, "ignore", "mean-per-label"
+        )
+        self.assertIsNone(PredictorModule._compute_vectorized_task_losses(preds, targets, wrapped))
+
+        # Already wrapped losses are kept as is
+        wrapped_again = PredictorModule.wrap_loss_fun(wrapped, None, None)
+        for task in tasks:
+            self.assertIs(wrapped_again[task], wrapped[task])
+            self.assertIsInstance(wrapped_again[task], MetricWrapper)
+
+    def _get_training_batch(self):
+        datamodule = make_benchmark_datamodule("tiny_ZINC", load_from_file=False, batch_size_training=16)
+        dataloader = datamodule.get_dataloader(
+            datamodule.train_ds, shuffle=False, stage=RunningStage.TRAINING
+        )
+        return datamodule, next(iter(dataloader))
+
+    def test_flag_step(self):
+        torch.manual_seed(42)
+        datamodule, batch = self._get_training_batch()
+        predictor = make_benchmark_predictor(datamodule, n_flag_steps=3)
+        predictor.train()
+        num_graphs = batch["features"].num_graphs
+        feat = batch["features"]["feat"]
+
+        step_dict = predictor.flag_step(batch={**batch}, step_name="train", to_cpu=True)
+        step_dict["loss"].backward()
+        self.assertTrue(torch.isfinite(step_dict["loss"]))
+        for task, preds in step_dict["preds"].items():
+            self.assertEqual(preds.shape[0], num_graphs)
+            self.assertEqual(preds.device.type, "cpu")
+            self.assertFalse(preds.requires_grad)
+        self.assertTrue(all(param.grad is not None for param in predictor.model.parameters()))
+
+        # The features of the original batch are neither perturbed nor overwritten by the forward pass
+        torch.testing.assert_close(batch["features"]["feat"], feat.to(batch["features"]["feat"].dtype))
+
+    def test_training_step_keep_outputs(self):
+        torch.manual_seed(42)
+        datamodule, batch = self._get_training_batch()
+        predictor = make_benchmark_predictor(datamodule, n_flag_steps=0)
+        predictor.train()
+
+        step_dict = predictor.training_step({**batch, "features": copy(batch["features"])}, keep_outputs=True)
+        for task, preds in step_dict["preds"].items():
+            self.assertEqual(preds.shape, step_dict["targets"][task].shape)
+            self.assertEqual(preds.device.type, "cpu")
+
+        # Outside of the logging steps, the predictions are neither denormalized nor moved to CPU
+        step_dict = predictor.training_step(
+            {**batch, "features": copy(batch["features"])}, keep_outputs=False
+        )
+        self.assertIsNone(step_dict["preds"])
+        self.assertIsNone(step_dict["targets"])
+        self.assertTrue(step_dict["loss"].requires_grad)
+
 
 if __name__ == "__main__":
     ut.main()
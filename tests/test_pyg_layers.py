@@ -24,6 +24,7 @@ from graphium.nn.pyg_layers import (
 from graphium.nn.pyg_layers.utils import (
     PreprocessPositions,
     GaussianLayer,
+    get_batch_triplets,
 )
 
 
@@ -81,6 +82,45 @@ class test_Pyg_Layers(ut.TestCase):
         self.assertEqual(bg.feat.shape[0], feat_in.shape[0])
         self.assertEqual(bg.feat.shape[1], self.out_dim * layer.out_dim_factor)
 
+    def test_gpslayer_varlen_attention(self):
+        # Graphs of many sizes, such that they fall in different buckets
+        graphs = []
+        for num_nodes in [1, 4, 9, 3, 17, 8, 2]:
+            edge_index = torch.stack([torch.arange(num_nodes), torch.arange(num_nodes).roll(1)])
+            feat = torch.randn(num_nodes, self.in_dim, dtype=torch.float32)
+            edge_feat = torch.randn(num_nodes, self.in_dim, dtype=torch.float32)
+            graphs.append(Data(feat=feat, edge_index=edge_index, edge_feat=edge_feat))
+        bg = Batch.from_data_list(graphs)
+
+        kwargs = deepcopy(self.kwargs)
+        kwargs.pop("droppath_rate")
+        kwargs["attn_kwargs"] = {"num_heads": 3}
+        layer_dense = GPSLayerPyg(in_dim=self.in_dim, out_dim=self.out_dim, **kwargs).eval()
+        layer_varlen = GPSLayerPyg(
+            in_dim=self.in_dim,
+            out_dim=self.out_dim,
+            attn_type="varlen-attention",
+            varlen_bucket_multiple=4,
+            **deepcopy(kwargs),
+        ).eval()
+        layer_varlen.load_state_dict(layer_dense.state_dict())
+
+        # The variable-length attention gives the same outputs as the dense attention
+        feat_dense = layer_dense.forward(deepcopy(bg)).feat
+        feat_varlen = layer_varlen.forward(deepcopy(bg)).feat
+        self.assertEqual(feat_varlen.shape, (bg.num_nodes, self.out_dim))
+        np.testing.assert_allclose(feat_varlen.detach().numpy(), feat_dense.detach().numpy(), atol=1e-5)
+
+        # Same with an attention bias padded to the largest graph
+        num_nodes = bg.batch.bincount()
+        attn_bias = torch.randn(len(graphs), 3, int(num_nodes.max()), int(num_nodes.max()))
+        bg.nodepair_gaussian_bias_3d = attn_bias
+        layer_dense.biased_attention_key = layer_varlen.biased_attention_key = "nodepair_gaussian_bias_3d"
+        layer_dense.attn_layer.biased_attention = layer_varlen.attn_layer.biased_attention = True
+        feat_dense = layer_dense.forward(deepcopy(bg)).feat
+        feat_varlen = layer_varlen.forward(deepcopy(bg)).feat
+        np.testing.assert_allclose(feat_varlen.detach().numpy(), feat_dense.detach().numpy(), atol=1e-5)
+
     def test_ginlayer(self):
         bg = deepcopy(self.bg)
         feat_in = bg.feat
@@ -279,6 +319,68 @@ class test_Pyg_Layers(ut.TestCase):
         self.assertTrue((bg2.edge_rbf == bg.edge_rbf).all)
         self.assertTrue((bg2.triplet_sbf == bg.triplet_sbf).all)
 
+    def test_dimenetlayer_precomputed_triplets(self):
+        from graphium.nn.encoders.bessel_pos_encoder import BesselSphericalPosEncoder
+        from graphium.features.featurizer import get_radius_graph_and_triplets, RadiusGraphData
+
+        # Graphs with the radius graph and triplets precomputed by the featurization
+        graphs = []
+        for g in [self.g1, self.g2]:
+            pos = torch.randn((g.feat.shape[0], 3), dtype=torch.float32)
+            radius_edge_index, triplet_index = get_radius_graph_and_triplets(pos.numpy(), cutoff=5.0)
+            graphs.append(
+                RadiusGraphData(
+                    feat=g.feat,
+                    edge_index=g.edge_index,
+                    pos=pos,
+                    precomputed_radius_edge_index=torch.as_tensor(radius_edge_index),
+                    precomputed_triplet_index=torch.as_tensor(triplet_index),
+                )
+            )
+        bg = Batch.from_data_list(graphs)
+
+        pos_enc = BesselSphericalPosEncoder(
+            input_keys=["pos"],
+            output_keys=["node_feat", "edge_feat", "edge_rbf", "triplet_sbf", "radius_edge_index"],
+            in_dim=3,
+            out_dim=self.in_dim,
+            out_dim_edges=self.in_dim_edges,
+            num_output_layers=2,
+            num_layers=2,
+            num_spherical=4,
+            num_radial=32,
+        )
+        enc_output = pos_enc(bg, None)
+        self.assertTrue(torch.equal(enc_output["radius_edge_index"], bg.precomputed_radius_edge_index))
+        for key in ["node_feat", "edge_feat", "edge_rbf", "triplet_sbf", "radius_edge_index"]:
+            bg[key] = enc_output[
+                key
+            ].clone()  # The encoder outputs are pooled before being added to the batch
+        bg.feat = bg.feat + bg.node_feat
+
+        # The triplets of the encoder are cached on the batch, and shared by the layers
+        cached = bg._radius_triplets[1]
+        self.assertEqual(cached[5].shape[0], enc_output["triplet_sbf"].shape[0])
+        self.assertIs(get_batch_triplets(bg, bg.radius_edge_index, num_nodes=bg.num_nodes), cached)
+
+        kwargs = deepcopy(self.kwargs)
+        kwargs.update(num_bilinear=32, num_spherical=4, num_radial=32)
+        layers = [
+            DimeNetPyg(
+                in_dim=self.in_dim,
+                out_dim=self.in_dim,
+                in_dim_edges=self.in_dim_edges,
+                out_dim_edges=self.in_dim_edges,
+                **kwargs,
+            )
+            for _ in range(2)
+        ]
+        for layer in layers:
+            bg = layer.forward(bg)
+        self.assertEqual(bg.feat.shape, (bg.num_nodes, self.in_dim))
+        self.assertEqual(bg.edge_feat.shape, (bg.radius_edge_index.shape[1], self.in_dim_edges))
+        self.assertIs(bg._radius_triplets[1], cached)
+
     def test_preprocess3Dfeaturelayer(self):
         bg = deepcopy(self.bg)
         num_heads = 2
@@ -301,6 +403,34 @@ class test_Pyg_Layers(ut.TestCase):
         self.assertFalse(np.isnan(bias.detach().numpy()).any())
         self.assertEqual(node_feature.size(), torch.Size([7, self.out_dim]))
 
+    def test_preprocess3Dfeaturelayer_chunked(self):
+        torch.manual_seed(42)
+        graphs = [
+            Data(positions_3d=torch.randn(num_nodes, 3), num_nodes=num_nodes) for num_nodes in [5, 9, 1, 7]
+        ]
+        graphs[2].positions_3d[:] = float("nan")  # A molecule without conformer
+        bg = Batch.from_data_list(graphs)
+        layer = PreprocessPositions(num_heads=3, embed_dim=8, num_kernel=16)
+
+        # Same outputs and gradients with the pairs computed by chunks, on the rows of the real nodes
+        outputs, grads = [], []
+        for chunk_size in [None, 10]:
+            layer.chunk_size = chunk_size
+            layer.zero_grad()
+            bias, node_feature = layer.forward(bg, None, on_ipu=False, positions_3d_key="positions_3d")
+            real_rows = (torch.arange(9)[None, :] < bg.ptr.diff()[:, None])[:, None, :, None].expand_as(bias)
+            (bias[real_rows].pow(2).sum() + node_feature.pow(2).sum()).backward()
+            outputs.append((bias[real_rows], node_feature))
+            grads.append([param.grad.clone() for param in layer.parameters()])
+
+        self.assertEqual(bias.size(), torch.Size([4, 3, 9, 9]))
+        self.assertEqual(node_feature.size(), torch.Size([22, 8]))
+        self.assertTrue(torch.allclose(outputs[0][0], outputs[1][0], atol=1e-5))
+        self.assertTrue(torch.allclose(outputs[0][1], outputs[1][1], atol=1e-5))
+        self.assertTrue((node_feature[14] == 0).all())
+        for grad_dense, grad_chunked in zip(*grads):
+            self.assertTrue(torch.allclose(grad_dense, grad_chunked, rtol=1e-4, atol=1e-4))
+
     def test_gaussianlayer(self):
         num_kernels = 3
         input = torch.zeros(2, 4, 4)
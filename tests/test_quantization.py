@@ -0,0 +1,103 @@
+"""
+Unit tests for the file graphium/inference/quantization.py
+"""
+
+import unittest as ut
+from copy import copy
+
+import numpy as np
+import torch
+from torch import nn
+from pytorch_lightning.trainer.states import RunningStage
+
+from graphium.benchmarks.dataloader import make_benchmark_datamodule, DEFAULT_FEATURIZATION
+from graphium.benchmarks.flag import make_benchmark_predictor
+from graphium.features import mol_to_graph_signature
+from graphium.inference import BatchPredictor, quantization_report, quantize_model
+from graphium.inference.quantization import BFloat16Autocast
+
+SMILES = ["CCO", "c1ccccc1O", "CC(=O)Nc1ccc(O)cc1", "C1CCCCC1N"]
+
+
+class test_Quantization(ut.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(42)
+        cls.datamodule = make_benchmark_datamodule("tiny_ZINC", load_from_file=False, batch_size_training=16)
+        cls.predictor = make_benchmark_predictor(cls.datamodule, n_flag_steps=0).eval()
+        dataloader = cls.datamodule.get_dataloader(
+            cls.datamodule.val_ds, shuffle=False, stage=RunningStage.VALIDATING
+        )
+        cls.batches = list(dataloader)
+
+    def test_quantize_model(self):
+        model = self.predictor.model
+        quantized = quantize_model(model, "int8")
+        self.assertIs(type(model.pre_nn.layers[0].linear), nn.Linear)  # The original model is not modified
+        self.assertIsInstance(quantized.pre_nn.layers[0].linear, torch.ao.nn.quantized.dynamic.Linear)
+        self.assertIsInstance(
+            quantized.gnn.layers[0].model.nn.fully_connected[0].linear, torch.ao.nn.quantized.dynamic.Linear
+        )
+        # The graph-level layers are kept in float32 by default
+        self.assertIs(
+            type(quantized.task_heads.graph_output_nn["graph"].graph_output_nn.layers[0].linear), nn.Linear
+        )
+        quantized = quantize_model(model, "int8", quantize_graph_level=True)
+        self.assertIsInstance(
+            quantized.task_heads.graph_output_nn["graph"].graph_output_nn.layers[0].linear,
+            torch.ao.nn.quantized.dynamic.Linear,
+        )
+
+        # The message passing runs in bfloat16, and its linear layers are not quantized
+        quantized = quantize_model(model, "int8-bf16")
+        self.assertIsInstance(quantized.gnn, BFloat16Autocast)
+        self.assertIs(type(quantized.gnn.layers[0].model.nn.fully_connected[0].linear), nn.Linear)
+        self.assertEqual(quantized.gnn.out_dim, model.gnn.out_dim)
+
+        with self.assertRaises(ValueError):
+            quantize_model(model, "int4")
+
+    def test_quantized_outputs(self):
+        features = self.predictor._convert_features_dtype(self.batches[0]["features"])
+        with torch.no_grad():
+            expected = self.predictor.model(copy(features))
+            for mode in ["int8", "bf16", "int8-bf16"]:
+                outputs = quantize_model(self.predictor.model, mode)(copy(features))
+                for task, output in outputs.items():
+                    self.assertEqual(output.dtype, torch.float32)
+                    scale = expected[task].abs().max()
+                    self.assertLess(float((output - expected[task]).abs().max() / scale), 0.1)
+
+    def test_quantization_report(self):
+        report = quantization_report(
+            self.predictor, quantize_model(self.predictor.model, "int8"), self.batches
+        )
+        self.assertSetEqual(set(report.keys()), {"graph_SA", "graph_logp", "graph_score"})
+        for metrics in report.values():
+            self.assertEqual(metrics["num_labels"], 20)  # 20% of the 100 molecules are in the validation set
+            self.assertGreater(metrics["max_abs_diff"], 0)
+            self.assertGreaterEqual(metrics["max_abs_diff"], metrics["mean_abs_diff"])
+            self.assertAlmostEqual(metrics["mae_quantized"], metrics["mae"], delta=0.1 * metrics["mae"])
+
+        # Identical models have identical predictions
+        report = quantization_report(self.predictor, self.predictor.model, self.batches)
+        self.assertEqual(report["graph_SA"]["max_abs_diff"], 0)
+
+    def test_batch_predictor(self):
+        featurization = mol_to_graph_signature(DEFAULT_FEATURIZATION)
+        results = BatchPredictor(self.predictor, featurization).predict(SMILES)
+        quantized_predictor = BatchPredictor(make_benchmark_predictor(self.datamodule, 0), featurization)
+        quantized_predictor.predictor.model.load_state_dict(self.predictor.model.state_dict())
+        quantized_predictor = BatchPredictor(
+            quantized_predictor.predictor, featurization, quantization="bf16"
+        )
+        quantized_results = quantized_predictor.predict(SMILES)
+        for key in ["graph_SA", "graph_logp", "graph_score"]:
+            np.testing.assert_allclose(quantized_results[key], results[key], rtol=0.1, atol=0.1)
+
+        with self.assertRaises(ValueError):
+            BatchPredictor(self.predictor, featurization, device="meta", quantization="int8")
+
+
+if __name__ == "__main__":
+    ut.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for the file graphium/data/quarantine.py
+"""
+
+import os
+import pickle
+import tempfile
+import unittest as ut
+
+import graphium
+from graphium.features import mol_to_graph_dict
+from graphium.data.smiles_transform import did_featurization_fail
+from graphium.data.quarantine import (
+    FeaturizationError,
+    FeaturizationQuarantine,
+    PrefilteredTransform,
+    get_failure_reason,
+    prefilter_smiles,
+)
+
+# Parsed without sanitization, but failing the featurization because of the pentavalent carbon
+INVALID_VALENCE = "CC(C)(C)(C)(C)C"
+
+
+class test_Quarantine(ut.TestCase):
+    def test_prefilter_smiles(self):
+        self.assertIsNone(prefilter_smiles("CCO"))
+        self.assertIsNone(prefilter_smiles(INVALID_VALENCE))
+        self.assertEqual(prefilter_smiles(""), "Empty SMILES")
+        self.assertEqual(prefilter_smiles(None), "Empty SMILES")
+        self.assertEqual(prefilter_smiles("C1CC(("), "Unparseable SMILES")
+        self.assertIsNone(prefilter_smiles("[H]OC([H])([H])C", max_num_atoms=3))  # Only the heavy atoms count
+        self.assertEqual(
+            get_failure_reason(prefilter_smiles("CCCCC", max_num_atoms=3)),
+            get_failure_reason("Maximum number of atoms greater than permitted 12>10"),
+        )
+
+    def test_prefiltered_transform(self):
+        transform = PrefilteredTransform(mol_to_graph_dict, max_num_atoms=7)
+        self.assertFalse(did_featurization_fail(transform("CCO")))
+        for smiles, stage in [
+            ("CCCCCCCC", "prefilter"),
+            ("C1CC((", "prefilter"),
+            (INVALID_VALENCE, "featurizer"),
+        ]:
+            error = transform(smiles)
+            self.assertTrue(did_featurization_fail(error))
+            self.assertIsInstance(error, FeaturizationError)
+            self.assertEqual(error.stage, stage)
+            self.assertGreaterEqual(error.elapsed_s, 0.0)
+
+        # The errors keep their attributes through the worker processes
+        error = pickle.loads(pickle.dumps(transform("CCCCCCCC")))
+        self.assertEqual(error.stage, "prefilter")
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "quarantine.jsonl")
+            quarantine = FeaturizationQuarantine(path, signature="a")
+            quarantine.add("id1", FeaturizationError("Explicit valence for atom # 1 C, 5", 0.5))
+            quarantine.add("id2", "Unparseable SMILES")
+            quarantine.add("id2", "Unparseable SMILES")  # Already quarantined
+            quarantine.flush()
+            FeaturizationQuarantine(path, signature="b").add("id3", "error")
+            with open(path, "a") as file:
+                file.write('{"mol_id": "trunc')  # Interrupted write
+
+            quarantine = FeaturizationQuarantine(path, signature="a")
+            self.assertEqual(len(quarantine), 2)
+            self.assertIn("id1", quarantine)
+            self.assertNotIn("id3", quarantine)
+            error = quarantine.skip("id1")
+            self.assertEqual(error, "Explicit valence for atom # 1 C, 5")
+            self.assertEqual(error.stage, "quarantine")
+            self.assertAlmostEqual(sum(quarantine.time_saved_s.values()), 0.5)
+            self.assertIn("1 quarantined molecules skipped", quarantine.report())
+
+    def test_datamodule(self):
+        df = graphium.data.load_tiny_zinc()
+        df.loc[0, "SMILES"] = INVALID_VALENCE
+        df.loc[1, "SMILES"] = "C1CC(("
+        num_too_large = sum(
+            prefilter_smiles(smiles, max_num_atoms=25) is not None for smiles in df["SMILES"].iloc[2:]
+        )
+        self.assertGreater(num_too_large, 0)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            datamodules = []
+            for _ in range(2):
+                dm = graphium.data.MultitaskFromSmilesDataModule(
+                    task_specific_args={
+                        "SA": {
+                            "df": df,
+                            "task_level": "graph",
+                            "smiles_col": "SMILES",
+                            "label_cols": ["SA"],
+                            "split_val": 0.2,
+                            "split_test": 0.2,
+                        }
+                    },
+                    featurization={"atom_property_list_onehot": ["atomic-number"], "max_num_atoms": 25},
+                    featurization_n_jobs=0,
+                    featurization_quarantine_path=os.path.join(tmpdir, "quarantine.jsonl"),
+                )
+                dm.prepare_data()
+                datamodules.append(dm)
+
+            # The first preparation quarantines the failures, and the second one skips them.
+            # The two invalid molecules have the same empty molecule id, so they are quarantined once.
+            first, second = [dm.featurization_quarantine for dm in datamodules]
+            self.assertEqual(sum(first.added.values()), num_too_large + 1)
+            self.assertEqual(sum(first.skipped.values()), 0)
+            self.assertEqual(sum(second.added.values()), 0)
+            self.assertEqual(sum(second.skipped.values()), num_too_large + 1)
+            self.assertEqual(len(datamodules[1].single_task_datasets["graph_SA"]), 100 - num_too_large - 2)
+            self.assertEqual(len(datamodules[0].single_task_datasets["graph_SA"]), 100 - num_too_large - 2)
+
+
+if __name__ == "__main__":
+    ut.main()
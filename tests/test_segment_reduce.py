@@ -0,0 +1,125 @@
+"""
+Unit tests for the file graphium/nn/pyg_layers/segment_reduce.py
+"""
+
+import torch
+import unittest as ut
+from torch_geometric.data import Data, Batch
+
+from graphium.nn.pyg_layers.segment_reduce import segment_statistics, segment_aggregate
+from graphium.nn.pyg_layers.pooling_pyg import parse_pooling_layer_pyg
+from graphium.nn.pyg_layers import PNAMessagePassingPyg
+from graphium.benchmarks.segment_reduce import (
+    multi_scatter_aggregate,
+    run_segment_reduce_benchmark,
+    segment_reduce_report_to_dataframe,
+)
+
+AGGREGATORS = ["sum", "mean", "logsum", "min", "max", "var", "std"]
+
+
+class test_SegmentReduce(ut.TestCase):
+    def _make_inputs(self):
+        torch.manual_seed(42)
+        num_nodes = torch.tensor([3, 1, 0, 7, 2, 5])  # With an empty segment
+        index = torch.repeat_interleave(torch.arange(len(num_nodes)), num_nodes)
+        x = torch.randn(index.shape[0], 4)
+        return x, index, len(num_nodes)
+
+    def test_segment_statistics(self):
+        x, index, dim_size = self._make_inputs()
+        shuffle = torch.randperm(index.shape[0])
+        for is_sorted, this_x, this_index in [(True, x, index), (False, x[shuffle], index[shuffle])]:
+            stats = segment_statistics(this_x, this_index, dim_size=dim_size, is_sorted=is_sorted)
+            self.assertListEqual(stats["count"].tolist(), [3, 1, 0, 7, 2, 5])
+            for ii, start in enumerate([0, 3, 4, 4, 11, 13]):
+                rows = x[start : start + int(stats["count"][ii])]
+                if rows.shape[0] == 0:
+                    for key in ["sum", "sum_squares", "min", "max"]:
+                        self.assertTrue((stats[key][ii] == 0).all())
+                    continue
+                torch.testing.assert_close(stats["sum"][ii], rows.sum(0))
+                torch.testing.assert_close(stats["sum_squares"][ii], (rows * rows).sum(0))
+                torch.testing.assert_close(stats["min"][ii], rows.min(0).values)
+                torch.testing.assert_close(stats["max"][ii], rows.max(0).values)
+
+        # Only the requested statistics are computed
+        stats = segment_statistics(x, index, statistics=["max"], is_sorted=True)
+        self.assertListEqual(list(stats.keys()), ["max"])
+        with self.assertRaises(ValueError):
+            segment_statistics(x, index, statistics=["median"])
+
+    def test_segment_aggregate_matches_scatter(self):
+        x, index, dim_size = self._make_inputs()
+        shuffle = torch.randperm(index.shape[0])
+        x, index = x[shuffle], index[shuffle]
+        x_ref = x.clone().requires_grad_(True)
+        x_fused = x.clone().requires_grad_(True)
+
+        expected = multi_scatter_aggregate(x_ref, index, AGGREGATORS, dim_size=dim_size)
+        out, count = segment_aggregate(x_fused, index, AGGREGATORS, dim_size=dim_size)
+        self.assertListEqual(list(out.shape), [dim_size, 4 * len(AGGREGATORS)])
+        torch.testing.assert_close(out, expected, equal_nan=True)  # The logsum of an empty segment is NaN
+
+        # Same gradients, without the NaN of the empty segment
+        weights = torch.randn_like(out)
+        (torch.nan_to_num(expected) * weights).sum().backward()
+        (torch.nan_to_num(out) * weights).sum().backward()
+        torch.testing.assert_close(x_fused.grad, x_ref.grad)
+
+    def test_pooling(self):
+        torch.manual_seed(42)
+        graphs = [
+            Data(feat=torch.randn(n, 5), edge_index=torch.zeros(2, 0, dtype=torch.long)) for n in [3, 8, 1]
+        ]
+        g = Batch.from_data_list(graphs)
+        poolings = ["sum", "mean", "logsum", "max", "min", "std", "none"]
+        pool_layer, out_dim = parse_pooling_layer_pyg(in_dim=5, pooling=poolings)
+        self.assertEqual(out_dim, 5 * len(poolings))
+        self.assertEqual(len(pool_layer), 1)
+
+        out = pool_layer(g, g.feat)
+        expected = multi_scatter_aggregate(g.feat, g.batch, poolings[:-1], dim_size=3)
+        torch.testing.assert_close(out, expected)
+
+        pool_layer, out_dim = parse_pooling_layer_pyg(in_dim=5, pooling="none")
+        self.assertEqual(len(pool_layer), 0)
+
+    def test_pna_aggregate(self):
+        torch.manual_seed(42)
+        aggregators = ["mean", "max", "min", "std", "sum", "var"]
+        scalers = ["identity", "amplification", "attenuation", "linear", "inverse_linear"]
+        layer = PNAMessagePassingPyg(
+            in_dim=4, out_dim=4, aggregators=aggregators, scalers=scalers, avg_d={"log": 1.3, "lin": 2.5}
+        )
+        x, index, dim_size = self._make_inputs()
+        index = index[torch.randperm(index.shape[0])]
+        out = layer.aggregate(x, index, edge_index=None, dim_size=dim_size)
+
+        # One block per scaler, each with all the aggregators
+        agg = multi_scatter_aggregate(x, index, aggregators, dim_size=dim_size)
+        deg = torch.bincount(index, minlength=dim_size).to(x.dtype).clamp(1).view(-1, 1)
+        factors = [
+            torch.ones_like(deg),
+            torch.log(deg + 1) / 1.3,
+            1.3 / torch.log(deg + 1),
+            deg / 2.5,
+            2.5 / deg,
+        ]
+        expected = torch.cat([agg * factor for factor in factors], dim=-1)
+        torch.testing.assert_close(out, expected)
+
+        layer.aggregators = ["median"]
+        with self.assertRaises(ValueError):
+            layer.aggregate(x, index, edge_index=None, dim_size=dim_size)
+
+    def test_benchmark(self):
+        report = run_segment_reduce_benchmark(num_graphs=20, num_feats=8, n_repeats=1)
+        df = segment_reduce_report_to_dataframe(report)
+        self.assertEqual(len(df), 4)
+        self.assertTrue((df["max_abs_diff"] < 1e-4).all())
+        self.assertTrue((df[df["implementation"] == "multi_scatter"]["forward_speedup"] == 1).all())
+
+
+if __name__ == "__main__":
+    ut.main()
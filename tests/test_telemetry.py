@@ -0,0 +1,93 @@
+"""
+Unit tests for the file graphium/trainer/telemetry.py
+"""
+
+import time
+import torch
+import unittest as ut
+
+from graphium.trainer.telemetry import StepTimer, compute_gradient_norm
+from graphium.trainer.predictor_options import TelemetryOptions
+from graphium.trainer.predictor_summaries import Summary
+from graphium.trainer.metrics import MetricWrapper
+
+
+class test_Telemetry(ut.TestCase):
+    def test_compute_gradient_norm(self):
+        torch.manual_seed(42)
+        model = torch.nn.Sequential(torch.nn.Linear(5, 7), torch.nn.ReLU(), torch.nn.Linear(7, 3))
+        unused = torch.nn.Linear(3, 3)  # Parameters without gradients are ignored
+        model(torch.randn(11, 5)).sum().backward()
+        params = list(model.parameters()) + list(unused.parameters())
+
+        expected = torch.sqrt(sum((p.grad**2).sum() for p in model.parameters()))
+        norm = compute_gradient_norm(params)
+        self.assertIsInstance(norm, torch.Tensor)
+        torch.testing.assert_close(norm, expected)
+        torch.testing.assert_close(
+            compute_gradient_norm(params, norm_type=1.0), sum(p.grad.abs().sum() for p in model.parameters())
+        )
+
+        # No gradients at all
+        self.assertEqual(compute_gradient_norm(unused.parameters()).item(), 0.0)
+
+    def test_step_timer(self):
+        timer = StepTimer()
+        self.assertEqual(timer.pop_completed(), (None, None))
+        for _ in range(3):
+            timer.start()
+            time.sleep(0.01)
+            timer.stop(num_samples=10)
+        mean_time, tput = timer.pop_completed()
+        self.assertGreaterEqual(mean_time, 0.01)
+        self.assertAlmostEqual(tput, 10 / mean_time)
+
+        # The completed steps are only reported once
+        self.assertEqual(timer.pop_completed(), (None, None))
+
+    def test_telemetry_options(self):
+        options = TelemetryOptions()
+        options.set_kwargs()
+        self.assertTrue(all(options.is_logging_step(step) for step in range(5)))
+
+        options = TelemetryOptions(telemetry_kwargs={"log_every_n_steps": 3})
+        options.set_kwargs()
+        self.assertListEqual(
+            [options.is_logging_step(step) for step in range(5)], [True, False, False, True, False]
+        )
+
+        with self.assertRaises(AssertionError):
+            TelemetryOptions(telemetry_kwargs={"log_every_n_steps": 0}).set_kwargs()
+
+    def test_metrics_log_every_n_steps(self):
+        metrics = {
+            "mae": MetricWrapper(metric="mae"),
+            "mse": MetricWrapper(metric="mse", log_every_n_steps=4),
+        }
+        summary = Summary(
+            loss_fun=torch.nn.L1Loss(),
+            metrics=metrics,
+            metrics_on_training_set=["mae", "mse"],
+            task_name="task",
+        )
+        summary.update_predictor_state(
+            step_name="train",
+            targets=torch.rand(10, 1),
+            predictions=torch.rand(10, 1),
+            loss=torch.tensor(0.5),
+            n_epochs=0,
+        )
+        logs = summary.get_metrics_logs(global_step=2)
+        self.assertIn("task/mae/train", logs)
+        self.assertNotIn("task/mse/train", logs)
+
+        logs = summary.get_metrics_logs(global_step=8)
+        self.assertIn("task/mse/train", logs)
+
+        # Without the step, all the metrics are computed
+        logs = summary.get_metrics_logs()
+        self.assertIn("task/mse/train", logs)
+
+
+if __name__ == "__main__":
+    ut.main()
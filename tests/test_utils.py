@@ -4,10 +4,16 @@ Unit tests for the metrics and wrappers of graphium/utils/...
 
 from graphium.utils.tensor import nan_mad, nan_mean, nan_std, nan_var, nan_median
 from graphium.utils.safe_run import SafeRun
+from graphium.utils.hashing import get_structured_hash, hash_file, StructuredHasher
 import torch
 import numpy as np
 import scipy as sp
 import unittest as ut
+import os
+import tempfile
+from functools import partial
+import pandas as pd
+from omegaconf import OmegaConf
 
 
 class test_nan_statistics(ut.TestCase):
@@ -154,5 +160,67 @@ class test_SafeRun(ut.TestCase):
             print("This is not an error")
 
 
+class test_hashing(ut.TestCase):
+    def test_structured_hash(self):
+        df = pd.DataFrame({"smiles": ["CCO", "CCN", "c1ccccc1"], "label": [0.1, 0.2, np.nan]})
+        config = {"df": df, "cols": ["label"], "seed": 42, "array": np.arange(6).reshape(2, 3)}
+        this_hash = get_structured_hash(config)
+
+        # Stable, and independent of the ordering of the dictionaries
+        self.assertEqual(this_hash, get_structured_hash(dict(reversed(list(config.items())))))
+        self.assertEqual(this_hash, get_structured_hash({**config, "df": df.copy()}))
+        self.assertEqual(
+            get_structured_hash(OmegaConf.create({"a": [1, 2]})), get_structured_hash({"a": [1, 2]})
+        )
+
+        # Any change of the values, columns, index, types or shapes changes the hash
+        changes = [
+            {**config, "df": df.assign(label=[0.1, 0.2, 0.3])},
+            {**config, "df": df.rename(columns={"label": "other"})},
+            {**config, "df": df.iloc[::-1]},
+            {**config, "df": df.astype({"label": "float32"})},
+            {**config, "array": np.arange(6).reshape(3, 2)},
+            {**config, "cols": ("label",)},
+            {**config, "seed": 42.0},
+            {**config, "seed": "42"},
+        ]
+        for change in changes:
+            self.assertNotEqual(this_hash, get_structured_hash(change))
+
+        # Functions, partials and objects
+        self.assertEqual(
+            get_structured_hash(partial(np.sum, axis=0)), get_structured_hash(partial(np.sum, axis=0))
+        )
+        self.assertNotEqual(
+            get_structured_hash(partial(np.sum, axis=0)), get_structured_hash(partial(np.sum, axis=1))
+        )
+        self.assertNotEqual(get_structured_hash(np.sum), get_structured_hash(np.mean))
+        self.assertEqual(get_structured_hash(SafeRun("a")), get_structured_hash(SafeRun("a")))
+        self.assertNotEqual(get_structured_hash(SafeRun("a")), get_structured_hash(SafeRun("b")))
+
+    def test_hash_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.csv")
+            with open(path, "w") as file:
+                file.write("smiles\nCCO\n")
+            for mode in ["stat", "content"]:
+                hasher = StructuredHasher(hash_files=True, file_mode=mode)
+                this_hash = hasher.hash({"df_path": path})
+                self.assertNotEqual(this_hash, get_structured_hash({"df_path": path}))
+                self.assertEqual(hash_file(path, mode=mode), hash_file(path, mode=mode))
+
+                with open(path, "a") as file:
+                    file.write("CCN\n")
+                self.assertNotEqual(this_hash, hasher.hash({"df_path": path}))
+
+            # The missing files are hashed as strings
+            missing = os.path.join(tmpdir, "missing.csv")
+            self.assertEqual(
+                get_structured_hash(missing, hash_files=True), get_structured_hash(missing, hash_files=False)
+            )
+            with self.assertRaises(ValueError):
+                hash_file(path, mode="unknown")
+
+
 if __name__ == "__main__":
     ut.main()